@@ -1,14 +1,112 @@
+import json
+import os
+from urllib.parse import quote
+
+import aiohttp
 import boto3
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.exceptions import ClientError
+
+from pipeline_repair import estimate_tokens
+from prompt_builder import build_messages, prompt_version
+from rate_limiter import (PRIORITY_INTERACTIVE, RateLimited, call_limited, call_limited_async, coalescer,
+                          request_key, retry_after_seconds)
+from telemetry import record_tokens
+
+
+def _bedrock_settings():
+    """Model id, region and optional endpoint override (e.g. a local stub server) from the environment."""
+    model_id = os.getenv("AWS_BEDROCK_MODEL_ID")
+    if not model_id:
+        raise ValueError("AWS_BEDROCK_MODEL_ID is not set.")
+    region = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
+    return model_id, region, os.getenv("AWS_BEDROCK_ENDPOINT")
+
+
+def _converse_request(prompt, max_tokens, template="generation"):
+    system, user = build_messages(template, prompt)
+    system_blocks = [{"text": system["content"]}]
+    if os.getenv("AWS_BEDROCK_PROMPT_CACHE") == "1":
+        # Explicit cache checkpoint after the static prefix, for models that support prompt caching
+        system_blocks.append({"cachePoint": {"type": "default"}})
+    return {
+        "system": system_blocks,
+        "messages": [{"role": "user", "content": [{"text": user["content"]}]}],
+        "inferenceConfig": {"maxTokens": max_tokens, "temperature": 0.7, "topP": 1},
+    }
+
+
+def _converse_text(response):
+    """(generated text, total tokens) of a Converse response."""
+    usage = response.get("usage") or {}
+    # Bedrock reports cache reads apart from (not included in) inputTokens
+    cached = usage.get("cacheReadInputTokens")
+    record_tokens("AWS", (usage.get("inputTokens") or 0) + (cached or 0), usage.get("outputTokens"), cached)
+    text = "".join(block.get("text", "") for block in response["output"]["message"]["content"])
+    return text, usage.get("totalTokens")
+
+
+def generate_code_from_aws(prompt, max_tokens=5000, priority=PRIORITY_INTERACTIVE, template="generation"):
+    """
+    Generate code with the Amazon Bedrock Converse API.
+
+    The model comes from AWS_BEDROCK_MODEL_ID and the region from AWS_REGION; AWS_BEDROCK_ENDPOINT
+    overrides the endpoint. `template` names the prompt_builder template. Requests wait for the shared AWS rate limiter, and identical requests in
+    flight at the same time share one completion.
+
+    Returns:
+        The generated code as a string.
+
+    Raises:
+        ValueError: If AWS_BEDROCK_MODEL_ID is not set.
+        botocore.exceptions.ClientError: If Bedrock answers with an error.
+    """
+    model_id, region, endpoint = _bedrock_settings()
+    client = boto3.client("bedrock-runtime", region_name=region, endpoint_url=endpoint)
+
+    def complete():
+        try:
+            response = client.converse(modelId=model_id, **_converse_request(prompt, max_tokens, template))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ThrottlingException":
+                raise
+            headers = e.response.get("ResponseMetadata", {}).get("HTTPHeaders")
+            raise RateLimited(str(e), retry_after_seconds(headers)) from e
+        return _converse_text(response)
+
+    key = request_key("AWS", region, model_id, max_tokens, template, prompt_version(template), prompt)
+    tokens = estimate_tokens(prompt) + max_tokens
+    return coalescer.run(key, lambda: call_limited("AWS", tokens, complete, priority))
+
+
+async def generate_code_from_aws_async(prompt, max_tokens=5000, priority=PRIORITY_INTERACTIVE):
+    """
+    Same request as generate_code_from_aws, made with aiohttp so that it can be cancelled.
+
+    Raises:
+        RuntimeError: If Bedrock answers with an error.
+    """
+    model_id, region, endpoint = _bedrock_settings()
+    url = f"{endpoint or f'https://bedrock-runtime.{region}.amazonaws.com'}/model/{quote(model_id, safe='')}/converse"
+    body = json.dumps(_converse_request(prompt, max_tokens))
+
+    credentials = boto3.Session().get_credentials()
+    if credentials is None:
+        raise RuntimeError("No AWS credentials found.")
+
+    async def complete():
+        # Sign the request the way boto3 would, when it is sent (signatures expire)
+        request = AWSRequest(method="POST", url=url, data=body, headers={"Content-Type": "application/json"})
+        SigV4Auth(credentials.get_frozen_credentials(), "bedrock", region).add_auth(request)
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, data=body, headers=dict(request.headers)) as response:
+                if response.status == 429:
+                    raise RateLimited("Bedrock returned HTTP 429", retry_after_seconds(response.headers))
+                if response.status != 200:
+                    raise RuntimeError(f"Bedrock returned HTTP {response.status}: {await response.text()}")
+                return _converse_text(await response.json())
 
-def generate_code_from_aws(prompt):
-    """Generate code from AWS Bedrock (implement as needed)."""
-    try:
-        client = boto3.client('bedrock')
-        response = client.generate_code(
-            prompt=prompt,
-            model='bedrock-model-name'  # Update with correct Bedrock model
-        )
-        return response['generated_code']
-    except Exception as e:
-        print(f"Error in AWS code generation: {e}")
-        return f"Error: {e}"
\ No newline at end of file
+    key = request_key("AWS", region, model_id, max_tokens, "generation", prompt_version("generation"), prompt)
+    tokens = estimate_tokens(prompt) + max_tokens
+    return await coalescer.run_async(key, lambda: call_limited_async("AWS", tokens, complete, priority))
@@ -1,15 +1,43 @@
-from openai import AzureOpenAI
+from openai import AzureOpenAI, RateLimitError
 import aiohttp
-def generate_code_from_azure(endpoint, api_key, prompt, api_version, deployment_name):
+from pipeline_repair import estimate_tokens
+from prompt_builder import build_messages, prompt_version
+from rate_limiter import (PRIORITY_INTERACTIVE, PRIORITY_REPAIR, RateLimited, call_limited, call_limited_async,
+                          coalescer, request_key, retry_after_seconds, stream_limited)
+from telemetry import record_tokens
+
+
+def _record_usage(usage):
+    """Count the token usage of an SDK response, including the prompt tokens served from the prompt cache."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    record_tokens("Azure", getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None),
+                  getattr(details, "cached_tokens", None))
+
+
+def _create_completion(client, **request):
+    """chat.completions.create, with a 429 turned into RateLimited for the rate limiter."""
+    try:
+        return client.chat.completions.create(**request)
+    except RateLimitError as e:
+        raise RateLimited(str(e), retry_after_seconds(e.response.headers)) from e
+
+
+def generate_code_from_azure(endpoint, api_key, prompt, api_version, deployment_name, max_tokens=5000,
+                             priority=PRIORITY_INTERACTIVE):
     """
     Sends a request to Azure OpenAI's gpt-4o-mini model to generate YAML.
 
+    Requests wait for the shared Azure rate limiter, and identical requests in flight at the same
+    time share one completion.
+
     Args:
         endpoint: Azure OpenAI endpoint URL.
         api_key: Your Azure OpenAI API key.
         prompt: Additional information to guide the code generation.
         api_version: API version supported by your model deployment (check Azure OpenAI documentation).
         deployment_name: The exact deployment name of your gpt-4o-mini model in Azure OpenAI.
+        max_tokens: Upper bound for the completion.
+        priority: Place in the rate limiter's queue (lower goes first).
 
     Returns:
         The generated YAML code as a string.
@@ -21,72 +49,139 @@ def generate_code_from_azure(endpoint, api_key, prompt, api_version, deployment_
         api_version=api_version
     )
 
-    response = client.chat.completions.create(
-        model=deployment_name,
-         messages=[
-        {
-            "role": "system",
-            "content": (
-               "You are an expert in generating clean, modular, scalable, and reusable code. "
-                "The code should follow best practices for software architecture, focusing on high maintainability and easy scalability. "
-                "Please organize the code into functions, classes, or modules as appropriate to make it easy to reuse in different contexts. "
-                "Ensure the code is well-commented and follows the principles of SOLID design patterns, aiming for simplicity and clarity. "
-                "Additionally, ensure that security and performance considerations are addressed while maintaining modularity and reusability. "
-                "Where applicable, provide meaningful variable names, and break down complex logic into smaller, easier-to-understand components."
-            ),
-        },
-        {
-            "role": "user",
-            "content": (
-                f"{prompt}\n\n"
-                "The output must be syntactically correct, correctly indented, and formatted as per the type of generated output."
-                "In addition to generating the code, also provide a list of all placeholders, variables, "
-                "and values that need to be replaced, along with a brief description of each. Ensure the list is at the bottom of the generated output."
-            ),
-        },
-    ],
-    max_tokens=5000,
-    temperature=0.7,  # Adjust temperature for creativity vs. accuracy
-    top_p=1,
-    n=1,
-    stop=None,
-)
-
-    generated_code = response.choices[0].message.content 
-    return generated_code
-
-async def generate_code_from_azure_async(endpoint, api_key, prompt, api_version, deployment_name):
+    def complete():
+        response = _create_completion(
+            client,
+            model=deployment_name,
+            messages=build_messages("generation", prompt),
+            max_tokens=max_tokens,
+            temperature=0.7,  # Adjust temperature for creativity vs. accuracy
+            top_p=1,
+            n=1,
+            stop=None,
+        )
+        usage = getattr(response, "usage", None)
+        _record_usage(usage)
+        return response.choices[0].message.content, getattr(usage, "total_tokens", None)
+
+    key = request_key("Azure", endpoint, deployment_name, max_tokens, prompt_version("generation"), prompt)
+    tokens = estimate_tokens(prompt) + max_tokens
+    return coalescer.run(key, lambda: call_limited("Azure", tokens, complete, priority))
+
+def stream_code_from_azure(endpoint, api_key, prompt, api_version, deployment_name, max_tokens=5000,
+                           priority=PRIORITY_INTERACTIVE):
+    """
+    Same request as generate_code_from_azure, streamed (and never coalesced). The token usage
+    arrives in a last chunk without choices; it is recorded and settles the rate limiter's reservation.
+
+    Yields:
+        str: The pieces of the completion as the model produces them.
+    """
+    client = AzureOpenAI(
+        azure_endpoint=endpoint,
+        api_key=api_key,
+        api_version=api_version
+    )
+
+    def start():
+        response = _create_completion(
+            client,
+            model=deployment_name,
+            messages=build_messages("generation", prompt),
+            max_tokens=max_tokens,
+            temperature=0.7,
+            top_p=1,
+            n=1,
+            stop=None,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        return _stream_pieces(response)
+
+    yield from stream_limited("Azure", estimate_tokens(prompt) + max_tokens, start, priority)
+
+
+def _stream_pieces(response):
+    """(content, total tokens or None) for each chunk of a streamed completion."""
+    for chunk in response:
+        usage = getattr(chunk, "usage", None)
+        if usage is not None:
+            _record_usage(usage)
+        # Azure sends content-filter results as chunks without choices
+        content = chunk.choices[0].delta.content if chunk.choices else None
+        yield content, getattr(usage, "total_tokens", None)
+
+def generate_patch_from_azure(endpoint, api_key, prompt, api_version, deployment_name, max_tokens=800,
+                              priority=PRIORITY_REPAIR, template="repair"):
+    """
+    Sends a small repair or edit request to Azure OpenAI and returns the replacement code or patch.
+
+    Args:
+        endpoint: Azure OpenAI endpoint URL.
+        api_key: Your Azure OpenAI API key.
+        prompt: The patch request built by pipeline_repair or pipeline_editor.
+        api_version: API version supported by your model deployment.
+        deployment_name: The deployment name of your model in Azure OpenAI.
+        max_tokens: Upper bound for the completion; patches are much shorter than full pipelines.
+        priority: Place in the rate limiter's queue (lower goes first).
+        template: The prompt_builder template, "repair" or "edit".
+
+    Returns:
+        tuple: (patch text, total tokens used or None when the service does not report usage)
+    """
+    client = AzureOpenAI(
+        azure_endpoint=endpoint,
+        api_key=api_key,
+        api_version=api_version
+    )
+
+    def complete():
+        response = _create_completion(
+            client,
+            model=deployment_name,
+            messages=build_messages(template, prompt),
+            max_tokens=max_tokens,
+            temperature=0,  # Repairs should be deterministic
+            top_p=1,
+            n=1,
+        )
+        usage = getattr(response, "usage", None)
+        _record_usage(usage)
+        total_tokens = getattr(usage, "total_tokens", None)
+        return (response.choices[0].message.content, total_tokens), total_tokens
+
+    key = request_key("Azure-patch", endpoint, deployment_name, max_tokens, template, prompt_version(template), prompt)
+    tokens = estimate_tokens(prompt) + max_tokens
+    return coalescer.run(key, lambda: call_limited("Azure", tokens, complete, priority))
+
+async def generate_code_from_azure_async(endpoint, api_key, prompt, api_version, deployment_name, max_tokens=5000,
+                                         priority=PRIORITY_INTERACTIVE):
   """
-  Sends a request to Azure OpenAI's GPT-4o-mini model to generate YAML asynchronously.
+  Same request as generate_code_from_azure, made with aiohttp so that it can be cancelled.
 
   Args:
       endpoint: Azure OpenAI endpoint URL.
-      api_key: Your Azure OpenAI API key (**verify correctness**).
+      api_key: Your Azure OpenAI API key.
       prompt: Additional information to guide the code generation.
       api_version: API version supported by your model deployment (check Azure OpenAI documentation).
-      deployment_name: The exact deployment name of your GPT-4o-mini model in Azure OpenAI (**match exactly**).
+      deployment_name: The exact deployment name of your model in Azure OpenAI.
+      max_tokens: Upper bound for the completion.
+      priority: Place in the rate limiter's queue (lower goes first).
 
   Returns:
-      The generated code as a string, or an error message if the request fails.
+      The generated code as a string.
+
+  Raises:
+      RuntimeError: If Azure OpenAI answers with an error.
   """
   headers = {
-      "Authorization": f"Bearer {api_key}",
+      "api-key": api_key,
       "Content-Type": "application/json",
   }
 
-  # Prepare the data to send to the model
   data = {
-      "model": deployment_name,
-      "messages": [
-          {"role": "system", "content":
-              "You are an expert in generating CI/CD pipelines and DevOps automation code. "
-              "You should strive to produce high-quality, secure, and well-structured code. "
-              "Pay close attention to best practices and security considerations. "
-              "Consider incorporating features like vulnerability scanning, service mesh integration, and configuration management."
-          },
-          {"role": "user", "content": prompt}
-      ],
-      "max_tokens": 5000,
+      "messages": build_messages("generation", prompt),
+      "max_tokens": max_tokens,
       "temperature": 0.7,  # Adjust temperature for creativity vs. accuracy
       "top_p": 1,
       "n": 1,
@@ -94,16 +189,21 @@ async def generate_code_from_azure_async(endpoint, api_key, prompt, api_version,
   }
 
   # Construct the complete URL with endpoint, deployment, and API version
-  url = f"{endpoint}/openai/deployments/{deployment_name}/completions?api-version={api_version}"
+  url = f"{endpoint.rstrip('/')}/openai/deployments/{deployment_name}/chat/completions?api-version={api_version}"
 
-  async with aiohttp.ClientSession() as session:
-      async with session.post(url, headers=headers, json=data) as response:
-          if response.status == 200:
+  async def complete():
+      async with aiohttp.ClientSession() as session:
+          async with session.post(url, headers=headers, json=data) as response:
+              if response.status == 429:
+                  raise RateLimited("Azure OpenAI returned HTTP 429", retry_after_seconds(response.headers))
+              if response.status != 200:
+                  raise RuntimeError(f"Azure OpenAI returned HTTP {response.status}: {await response.text()}")
               response_json = await response.json()
-              # Extract the generated code from the response
-              generated_code = response_json["choices"][0]["message"]["content"]
-              return generated_code
-          else:
-              # If there is an error, print the error message and status code
-              print(f"Error: HTTP {response.status} - {await response.text()}")
-              return f"Error: HTTP {response.status}"
\ No newline at end of file
+      usage = response_json.get("usage") or {}
+      details = usage.get("prompt_tokens_details") or {}
+      record_tokens("Azure", usage.get("prompt_tokens"), usage.get("completion_tokens"), details.get("cached_tokens"))
+      return response_json["choices"][0]["message"]["content"], usage.get("total_tokens")
+
+  key = request_key("Azure", endpoint, deployment_name, max_tokens, prompt_version("generation"), prompt)
+  tokens = estimate_tokens(prompt) + max_tokens
+  return await coalescer.run_async(key, lambda: call_limited_async("Azure", tokens, complete, priority))
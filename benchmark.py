@@ -0,0 +1,415 @@
+# benchmark.py
+
+"""
+Evaluation and latency benchmark for the copilot.
+
+Replays a prompt set through main.generate_pipeline with the deterministic stub LLM (or a real
+provider) and records, per prompt, the seconds spent in each stage (ingest, embed, retrieve,
+llm, parse, diagram), the prompt size in tokens, retrieval recall and whether the generated
+pipeline parsed. Results are written as JSON so runs on different commits can be compared:
+
+    python benchmark.py --output results.json
+    python benchmark.py --output new.json --compare results.json
+
+`--vector-index` instead compares the NumPy and Qdrant vector stores of vector_index on random
+embeddings of several corpus sizes: build time, query latency (one at a time and batched) and how
+many of the exact top-k Qdrant returns:
+
+    python benchmark.py --vector-index --sizes 1000 10000 50000
+
+`--chunking` indexes the documents once per chunking mode (sentence, section) with a cold
+embedding cache and reports index size, ingest time, retrieval latency, prompt tokens and
+recall over the prompt set.
+
+`--segmentation` splits the documents with every sentence segmenter of segmentation.py and
+reports load time, throughput and how well each one's sentence boundaries agree with the full
+spaCy pipeline's.
+
+Prompt sets are JSON lines. Each line needs a "prompt" (or a "title" and "body", as in
+requests.jsonl) and may list "relevant_sentences": the document sentences retrieval should
+put into the prompt, used to compute recall.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+
+import nlp_processing
+from main import generate_pipeline
+from pipeline_converter import parse_pipeline
+from pipeline_repair import estimate_tokens
+from pipelinetypes import *
+from prompt_builder import prompt_version
+from segmentation import SEGMENTERS, Segmenter
+from qdrant_client import QdrantClient
+from streamlit_app import identify_pipeline_type
+from telemetry import configure_from_environment
+from chunking import CHUNKING_MODES
+from embedding_cache import EmbeddingCache
+from extract_text import extract_sections_from_docx
+from vector_index import NumpyVectorStore, QdrantVectorStore
+from visualdiagram import clear_diagram_cache, generate_diagram_from_pipeline
+
+BENCHMARK_STAGES = ("ingest", "embed", "retrieve", "llm", "parse", "diagram")
+DEFAULT_PROMPT_SET = "requests.jsonl"
+DEFAULT_DOCUMENTS = "best_practices"
+# A stage regresses when its median grows by more than this fraction and by at least MIN_REGRESSION_SECONDS.
+REGRESSION_TOLERANCE = 0.10
+MIN_REGRESSION_SECONDS = 0.005
+VECTOR_BENCHMARK_SIZES = (1000, 10000)
+# all-MiniLM-L6-v2 embeddings
+VECTOR_BENCHMARK_DIMENSION = 384
+
+
+def load_prompt_set(path):
+    """Read a JSON-lines prompt set into a list of {id, prompt, relevant_sentences}."""
+    cases = []
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            prompt = entry.get("prompt") or "\n".join(part for part in (entry.get("title"), entry.get("body")) if part)
+            if not prompt:
+                raise ValueError(f"{path}:{number}: entry has no prompt, title or body")
+            cases.append({
+                "id": entry.get("id") or entry.get("request_id") or f"case-{number}",
+                "prompt": prompt,
+                "relevant_sentences": entry.get("relevant_sentences") or [],
+            })
+    return cases
+
+
+def retrieval_recall(final_prompt, relevant_sentences):
+    """Fraction of the labelled sentences that retrieval put into the prompt, or None without labels."""
+    if not relevant_sentences:
+        return None
+    # Sentences may be retrieved on their own line or inside a section chunk
+    retrieved = " ".join(final_prompt.split())
+    found = sum(1 for sentence in relevant_sentences if " ".join(sentence.split()) in retrieved)
+    return found / len(relevant_sentences)
+
+
+def run_case(case, documents=DEFAULT_DOCUMENTS, provider="Stub", diagram_renderer="auto"):
+    """Generate, parse and draw one prompt; returns the benchmark record."""
+    metrics = {"timings": {}}
+    record = {"id": case["id"], "pipeline_type": None, "parsed": False, "error": None}
+
+    try:
+        generated_code = asyncio.run(generate_pipeline(case["prompt"], documents, provider, metrics))
+    except Exception as e:
+        generated_code = None
+        record["error"] = str(e)
+    final_prompt = metrics.get("prompt", "")
+    record["prompt_tokens"] = estimate_tokens(final_prompt) if final_prompt else 0
+    record["completion_tokens"] = estimate_tokens(generated_code or "")
+    record["recall"] = retrieval_recall(final_prompt, case["relevant_sentences"])
+
+    if not generated_code:
+        record["error"] = record["error"] or "No code was generated."
+    else:
+        pipeline_type = identify_pipeline_type(generated_code)[0]
+        record["pipeline_type"] = pipeline_type
+        started = time.perf_counter()
+        try:
+            pipeline = parse_pipeline(generated_code, pipeline_type)
+            record["parsed"] = True
+        except ValueError as e:
+            pipeline = None
+            record["error"] = str(e)
+        metrics["timings"]["parse"] = time.perf_counter() - started
+
+        if pipeline is not None:
+            clear_diagram_cache()  # time a cold render; repeated prompts would otherwise hit the cache
+            started = time.perf_counter()
+            diagram = generate_diagram_from_pipeline(pipeline, PIPELINE_TYPE_CLASSES[pipeline_type], "svg",
+                                                     renderer=diagram_renderer)
+            if diagram is None:
+                record["error"] = "Diagram could not be rendered."
+            metrics["timings"]["diagram"] = time.perf_counter() - started
+
+    record["timings"] = {stage: metrics["timings"].get(stage, 0.0) for stage in BENCHMARK_STAGES}
+    record["timings"]["total"] = sum(record["timings"].values())
+    return record
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(records):
+    """Aggregate the per-prompt records: stage latency (mean/p50/p95 seconds), tokens, recall and parse rate."""
+    recalls = [record["recall"] for record in records if record["recall"] is not None]
+    stages = {}
+    for stage in BENCHMARK_STAGES + ("total",):
+        values = [record["timings"][stage] for record in records]
+        stages[stage] = {
+            "mean": sum(values) / len(values) if values else 0.0,
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+        }
+    return {
+        "runs": len(records),
+        "parse_success_rate": sum(record["parsed"] for record in records) / len(records) if records else 0.0,
+        "mean_recall": sum(recalls) / len(recalls) if recalls else None,
+        "mean_prompt_tokens": sum(record["prompt_tokens"] for record in records) / len(records) if records else 0.0,
+        "stages": stages,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(prompt_set=DEFAULT_PROMPT_SET, documents=DEFAULT_DOCUMENTS, provider="Stub", repeat=1,
+                  limit=None, diagram_renderer="auto"):
+    """Run every prompt of the set `repeat` times and return {"metadata", "summary", "records"}."""
+    cases = load_prompt_set(prompt_set)[:limit]
+    records = []
+    for run in range(repeat):
+        for case in cases:
+            record = run_case(case, documents, provider, diagram_renderer)
+            record["run"] = run
+            records.append(record)
+            print(f"[{case['id']}] parsed={record['parsed']} total={record['timings']['total'] * 1000:.0f} ms")
+    return {
+        "metadata": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "prompt_set": prompt_set,
+            "documents": documents,
+            "provider": provider,
+            "prompt_version": prompt_version("generation"),
+            "repeat": repeat,
+            "diagram_renderer": diagram_renderer,
+        },
+        "summary": summarize(records),
+        "records": records,
+    }
+
+
+def benchmark_vector_stores(sizes=VECTOR_BENCHMARK_SIZES, dimension=VECTOR_BENCHMARK_DIMENSION, queries=100, top_k=10,
+                            seed=0):
+    """Build both vector stores over random unit vectors of each size and time top-k queries against them."""
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in sizes:
+        vectors = rng.standard_normal((size, dimension), dtype=np.float32)
+        query_vectors = rng.standard_normal((queries, dimension), dtype=np.float32)
+        texts = [str(number) for number in range(size)]
+        collection = f"benchmark-{uuid.uuid4().hex[:8]}"
+        stores = {"numpy": NumpyVectorStore(path=None), "qdrant": QdrantVectorStore(QdrantClient(":memory:"))}
+        result = {"size": size, "dimension": dimension, "queries": queries, "top_k": top_k}
+        hits = {}
+        for name, store in stores.items():
+            started = time.perf_counter()
+            store.create(collection, texts, vectors)
+            build = time.perf_counter() - started
+            latencies = []
+            hits[name] = []
+            for query in query_vectors:
+                started = time.perf_counter()
+                hits[name].append(store.search([collection], [query], top_k)[0])
+                latencies.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            store.search([collection], query_vectors, top_k)
+            batched = time.perf_counter() - started
+            result[name] = {
+                "build_seconds": build,
+                "query_p50_ms": _percentile(latencies, 0.5) * 1000,
+                "query_p95_ms": _percentile(latencies, 0.95) * 1000,
+                "batched_ms_per_query": batched / queries * 1000,
+            }
+            store.delete(collection)
+        # NumPy is exact, so this is Qdrant's recall
+        overlaps = [
+            len({hit["content"] for hit in exact} & {hit["content"] for hit in approximate}) / top_k
+            for exact, approximate in zip(hits["numpy"], hits["qdrant"])
+        ]
+        result["qdrant_recall"] = sum(overlaps) / len(overlaps)
+        results.append(result)
+        print(f"[{size} vectors] numpy p50={result['numpy']['query_p50_ms']:.2f} ms "
+              f"qdrant p50={result['qdrant']['query_p50_ms']:.2f} ms recall={result['qdrant_recall']:.2f}")
+    return results
+
+
+def benchmark_chunking(prompt_set=DEFAULT_PROMPT_SET, documents=DEFAULT_DOCUMENTS, modes=CHUNKING_MODES, limit=None):
+    """Index the documents in each chunking mode and measure index size, ingest time and retrieval over the prompt set."""
+    cases = load_prompt_set(prompt_set)[:limit]
+    filenames = sorted(name for name in os.listdir(documents) if name.endswith(".docx") and not name.startswith("~$"))
+    collections = [os.path.splitext(name)[0] for name in filenames]
+    shared_cache = nlp_processing.embedding_cache
+    results = []
+    try:
+        for mode in modes:
+            # A cold cache, so that the ingest time includes encoding
+            nlp_processing.embedding_cache = EmbeddingCache(":memory:", nlp_processing.EMBEDDING_MODEL_NAME)
+            store = NumpyVectorStore(path=None)
+            started = time.perf_counter()
+            for filename, collection in zip(filenames, collections):
+                texts, vectors, _ = nlp_processing.embed_document(os.path.join(documents, filename), chunking=mode,
+                                                                  summarize=False)
+                nlp_processing.store_document(store, collection, texts, vectors)
+            ingest = time.perf_counter() - started
+
+            top_k = nlp_processing.RETRIEVAL_TOP_K if mode == "sentence" else nlp_processing.CHUNK_RETRIEVAL_TOP_K
+            latencies, tokens, recalls = [], [], []
+            for case in cases:
+                started = time.perf_counter()
+                final_prompt = nlp_processing.create_dynamic_prompt(case["prompt"], store, documents, None, collections, top_k)
+                latencies.append(time.perf_counter() - started)
+                tokens.append(estimate_tokens(final_prompt))
+                recall = retrieval_recall(final_prompt, case["relevant_sentences"])
+                if recall is not None:
+                    recalls.append(recall)
+            result = {
+                "mode": mode,
+                "vectors": len(store),
+                "index_bytes": sum(entry[0].nbytes for entry in store.collections.values()),
+                "ingest_seconds": ingest,
+                "retrieve_p50_ms": _percentile(latencies, 0.5) * 1000,
+                "retrieve_p95_ms": _percentile(latencies, 0.95) * 1000,
+                "mean_prompt_tokens": sum(tokens) / len(tokens) if tokens else 0.0,
+                "mean_recall": sum(recalls) / len(recalls) if recalls else None,
+            }
+            results.append(result)
+            print(f"[{mode}] {result['vectors']} vectors, ingest {ingest:.1f} s, "
+                  f"retrieve p50 {result['retrieve_p50_ms']:.1f} ms, {result['mean_prompt_tokens']:.0f} prompt tokens")
+    finally:
+        nlp_processing.embedding_cache = shared_cache
+    return results
+
+
+def _boundaries(sentences_per_text):
+    """(text number, character offset) of every sentence end, whitespace ignored."""
+    boundaries = set()
+    for number, sentences in enumerate(sentences_per_text):
+        offset = 0
+        for sentence in sentences:
+            offset += len("".join(sentence.split()))
+            boundaries.add((number, offset))
+    return boundaries
+
+
+def benchmark_segmentation(documents=DEFAULT_DOCUMENTS, segmenters=SEGMENTERS, reference="full", repeat=3):
+    """Split every paragraph of the documents with each segmenter; throughput and boundary F1 against `reference`."""
+    paragraphs = [
+        paragraph
+        for name in sorted(os.listdir(documents)) if name.endswith(".docx") and not name.startswith("~$")
+        for _, section in extract_sections_from_docx(os.path.join(documents, name))
+        for paragraph in section
+    ]
+    characters = sum(len(paragraph) for paragraph in paragraphs)
+    runs = {}
+    for name in segmenters:
+        started = time.perf_counter()
+        segmenter = Segmenter(name)
+        load = time.perf_counter() - started
+        cpu_started, started = time.process_time(), time.perf_counter()
+        for _ in range(repeat):
+            sentences = segmenter.split(paragraphs)
+        elapsed = (time.perf_counter() - started) / repeat
+        runs[name] = {
+            "segmenter": name,
+            "load_seconds": load,
+            "seconds": elapsed,
+            "cpu_seconds": (time.process_time() - cpu_started) / repeat,
+            "characters_per_second": characters / elapsed if elapsed else None,
+            "sentences": sum(len(split) for split in sentences),
+            "_boundaries": _boundaries(sentences),
+        }
+    expected = runs[reference]["_boundaries"] if reference in runs else None
+    results = []
+    for name, run in runs.items():
+        found = run.pop("_boundaries")
+        if expected is not None:
+            agreed = len(found & expected)
+            precision = agreed / len(found) if found else 1.0
+            recall = agreed / len(expected) if expected else 1.0
+            run["boundary_f1"] = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        results.append(run)
+        print(f"[{name}] {run['sentences']} sentences, {run['characters_per_second'] or 0:.0f} chars/s, "
+              f"boundary F1 {run.get('boundary_f1', float('nan')):.3f}")
+    return results
+
+
+def compare_results(baseline, current, tolerance=REGRESSION_TOLERANCE):
+    """Return human-readable regressions of `current` against `baseline` (both run_benchmark results)."""
+    regressions = []
+    old, new = baseline["summary"], current["summary"]
+    for stage, stats in new["stages"].items():
+        before = old["stages"].get(stage, {}).get("p50")
+        after = stats["p50"]
+        if before is not None and after > before * (1 + tolerance) and after - before >= MIN_REGRESSION_SECONDS:
+            regressions.append(f"{stage}: median {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+    if new["parse_success_rate"] < old["parse_success_rate"]:
+        regressions.append(f"parse success rate {old['parse_success_rate']:.0%} -> {new['parse_success_rate']:.0%}")
+    if old["mean_recall"] is not None and new["mean_recall"] is not None and new["mean_recall"] < old["mean_recall"]:
+        regressions.append(f"retrieval recall {old['mean_recall']:.2f} -> {new['mean_recall']:.2f}")
+    if new["mean_prompt_tokens"] > old["mean_prompt_tokens"] * (1 + tolerance):
+        regressions.append(f"prompt tokens {old['mean_prompt_tokens']:.0f} -> {new['mean_prompt_tokens']:.0f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval, generation, parsing and diagram latency.")
+    parser.add_argument("--prompts", default=DEFAULT_PROMPT_SET, help="JSON-lines prompt set")
+    parser.add_argument("--documents", default=DEFAULT_DOCUMENTS, help="directory of best-practice documents")
+    parser.add_argument("--provider", default="Stub", choices=("Stub", "Auto", "Azure", "AWS"))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=None, help="only run the first N prompts")
+    parser.add_argument("--diagram-renderer", default="auto", choices=("auto", "graphviz", "layered"))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="results file of an earlier run; exit 1 on regressions")
+    parser.add_argument("--vector-index", action="store_true", help="compare the NumPy and Qdrant vector stores instead")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(VECTOR_BENCHMARK_SIZES),
+                        help="corpus sizes of --vector-index")
+    parser.add_argument("--chunking", action="store_true", help="compare sentence and section chunking instead")
+    parser.add_argument("--segmentation", action="store_true", help="compare the sentence segmenters instead")
+    args = parser.parse_args()
+    configure_from_environment()
+
+    if args.vector_index or args.chunking or args.segmentation:
+        if args.vector_index:
+            results = benchmark_vector_stores(args.sizes)
+        elif args.segmentation:
+            results = benchmark_segmentation(args.documents)
+        else:
+            results = benchmark_chunking(args.prompts, args.documents, limit=args.limit)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+        return
+
+    results = run_benchmark(args.prompts, args.documents, args.provider, args.repeat, args.limit, args.diagram_renderer)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    print(json.dumps(results["summary"], indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare_results(json.load(file), results)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# chunking.py
+
+"""
+Section-aware chunking of the best-practice documents.
+
+With COPILOT_CHUNKING=section (the default) a document is split at its headings
+(extract_text.extract_sections_from_docx) and the sentences of each section are grouped into
+chunks of at most CHUNK_TOKENS tokens; consecutive chunks of a section share up to
+CHUNK_OVERLAP_TOKENS tokens of sentences. Each chunk is stored and retrieved as one passage that
+starts with its heading, so retrieval returns a piece of guidance with its context instead of a
+lone sentence, and the index holds several times fewer vectors.
+
+Chunks never cross a heading and are cut greedily from the start of their section, so editing
+one section leaves the chunks of every other section unchanged and the embedding cache supplies
+their vectors on re-ingestion.
+
+COPILOT_CHUNKING=sentence keeps the original one-point-per-sentence index.
+`python benchmark.py --chunking` compares the two.
+"""
+
+import os
+
+from segmentation import SEGMENTER
+
+CHUNKING_MODES = ("section", "sentence")
+CHUNKING = os.getenv("COPILOT_CHUNKING", "section")
+# Tokens of the embedding model's tokenizer; all-MiniLM-L6-v2 reads at most 256.
+CHUNK_TOKENS = int(os.getenv("COPILOT_CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("COPILOT_CHUNK_OVERLAP_TOKENS", "40"))
+
+
+def chunking_signature(chunking=None, segmenter=None):
+    """Identifies how an index was split into texts; an index built differently has to be rebuilt."""
+    chunking = chunking or CHUNKING
+    if chunking not in CHUNKING_MODES:
+        raise ValueError(f"Unknown chunking mode: {chunking}")
+    size = "" if chunking == "sentence" else f":{CHUNK_TOKENS}:{CHUNK_OVERLAP_TOKENS}"
+    return f"{chunking}{size}/{segmenter or SEGMENTER}"
+
+
+def chunk_sentences(sentences, count_tokens, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Group consecutive sentences into chunks of at most `max_tokens` tokens.
+
+    Each chunk starts with the last sentences of the previous one, up to `overlap_tokens` tokens.
+    A sentence longer than `max_tokens` is a chunk of its own.
+
+    Returns:
+        list: Lists of sentences.
+    """
+    counts = [count_tokens(sentence) for sentence in sentences]
+    chunks = []
+    start = 0
+    while start < len(sentences):
+        end, size = start, 0
+        while end < len(sentences) and (end == start or size + counts[end] <= max_tokens):
+            size += counts[end]
+            end += 1
+        chunks.append(sentences[start:end])
+        if end == len(sentences):
+            break
+        # Step back over the overlap, but always move forward
+        next_start, overlap = end, 0
+        while next_start - 1 > start and overlap + counts[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            overlap += counts[next_start]
+        start = next_start
+    return chunks
+
+
+def chunk_sections(sections, segment, count_tokens, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Chunk texts of a document's (heading, paragraphs) sections.
+
+    `segment(paragraphs)` splits paragraphs into sentences and `count_tokens(text)` counts the
+    embedding model's tokens. Every chunk is one line: the heading, then its sentences.
+    """
+    chunks = []
+    for heading, paragraphs in sections:
+        title = heading.rstrip(":").strip()
+        budget = max(max_tokens - (count_tokens(title) if title else 0), 1)
+        for sentences in chunk_sentences(segment(paragraphs), count_tokens, budget, overlap_tokens):
+            body = " ".join(" ".join(sentence.split()) for sentence in sentences)
+            chunks.append(f"{title}: {body}" if title else body)
+    return chunks
@@ -1,86 +1,591 @@
 from pipelinetypes import *
-import streamlit as st
+import glob
+import itertools
+import json
+import logging
+import os
+import re
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+class GitLabReference(list):
+    """Path of a GitLab `!reference [job, key, ...]` tag, resolved once the whole configuration is known."""
+
+
+class _CILoader(getattr(yaml, "CSafeLoader", yaml.SafeLoader)):
+    """Safe YAML loader (libyaml when available) that also understands the custom tags CI platforms use."""
+
+
+# YAML 1.1 reads yes/no/on/off as booleans, which would turn GitHub's `on:` key into True; CI platforms
+# follow YAML 1.2, where only true and false are.
+_CILoader.yaml_implicit_resolvers = {
+    first: [(tag, regexp) for tag, regexp in resolvers if tag != "tag:yaml.org,2002:bool"]
+    for first, resolvers in yaml.SafeLoader.yaml_implicit_resolvers.items()
+}
+_CILoader.add_implicit_resolver(
+    "tag:yaml.org,2002:bool", re.compile(r"^(?:true|True|TRUE|false|False|FALSE)$"), list("tTfF")
+)
+_CILoader.add_constructor(
+    "!reference", lambda loader, node: GitLabReference(loader.construct_sequence(node, deep=True))
+)
+
+
+def load_ci_yaml(code):
+    """
+    Load CI configuration YAML safely; anchors, aliases and `<<` merge keys are resolved by the loader.
+    Raises yaml.YAMLError for invalid YAML.
+    """
+    return yaml.load(code, Loader=_CILoader)
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _azure_step_to_pipeline_step(step):
+    """Map one Azure DevOps step (script/bash/pwsh/checkout/task) to a PipelineStep."""
+    step_name = step.get("displayName") or step.get("name")
+    condition = step.get("condition")
+
+    for script_key in ("script", "bash", "pwsh", "powershell"):
+        if script_key in step:
+            return script_step(str(step[script_key]), step_name, condition)
+
+    if "checkout" in step:
+        inputs = {} if step["checkout"] == "self" else {"repository": step["checkout"]}
+        # Keep options such as fetchDepth, clean or lfs next to the repository.
+        inputs.update({key: value for key, value in step.items() if key not in ("checkout", "displayName", "name", "condition")})
+        return PipelineStep(step_name or default_step_name(CHECKOUT_TASK, inputs), CHECKOUT_TASK, inputs, condition)
+
+    task = step.get("task") or step.get("template") or "Unknown Task"
+    return PipelineStep(step_name or task, task, step.get("inputs", {}) or {}, condition)
+
+
+def _azure_job_steps(job):
+    """Return the steps of a job, including the lifecycle hooks of deployment jobs."""
+    if "steps" in job:
+        return job.get("steps") or []
+
+    steps = []
+    for strategy in (job.get("strategy") or {}).values():
+        if not isinstance(strategy, dict):
+            continue
+        for hook in strategy.values():
+            if isinstance(hook, dict):
+                steps.extend(hook.get("steps") or [])
+    return steps
+
 
 def convert_azure_devops_to_pipeline(parsed_data):
-    print(f"Parsed Azure DevOps data: {parsed_data}")
     if isinstance(parsed_data, AzureDevOpsPipeline):
         return parsed_data  # If already an AzureDevOpsPipeline, return it directly.
+    if not isinstance(parsed_data, dict):
+        raise ValueError("Expected a mapping for the Azure DevOps pipeline.")
 
     pipeline = AzureDevOpsPipeline()  # Create an AzureDevOpsPipeline instance
 
+    # Single-stage pipelines may declare `jobs` or even `steps` at the top level.
+    stages = parsed_data.get("stages")
+    if stages is None and "jobs" in parsed_data:
+        stages = [{"stage": "Default", "jobs": parsed_data.get("jobs") or []}]
+    elif stages is None and "steps" in parsed_data:
+        stages = [{"stage": "Default", "jobs": [{"job": "Default", "steps": parsed_data.get("steps") or []}]}]
+    stages = [stage for stage in stages or [] if isinstance(stage, dict)]
+
+    # dependsOn refers to stage and job ids, while the model uses display names.
+    stage_jobs = {}
+    previous_stage_id = None
+    for stage in stages:
+        stage_jobs[stage.get("stage")] = [
+            job.get("displayName") or job.get("job") or job.get("deployment") or "Unnamed Job"
+            for job in stage.get("jobs") or []
+        ]
+
     # Preserve the order of stages
-    for stage in parsed_data.get("stages", []):
-        stage_name = stage.get("stage", "Unnamed Stage")  # Correctly get the stage name
-        pipeline.add_stage(PipelineStage(stage_name))
+    for stage in stages:
+        stage_name = stage.get("displayName") or stage.get("stage", "Unnamed Stage")
+        stage_obj = PipelineStage(stage_name)
+        pipeline.add_stage(stage_obj)
+
+        # A stage waits for the previous stage unless it lists its own dependsOn (which may be empty).
+        if "dependsOn" in stage:
+            stage_dependencies = [job for stage_id in _as_list(stage["dependsOn"]) for job in stage_jobs.get(stage_id, [])]
+        else:
+            stage_dependencies = None
+        job_names = {job.get("job") or job.get("deployment"): name for job, name in zip(stage.get("jobs") or [], stage_jobs[stage.get("stage")])}
 
         # Add jobs to each stage
-        for job in stage.get("jobs", []):
-            job_name = job.get("displayName", "Unnamed Job")
-            job_obj = PipelineJob(job_name)
+        for job, job_name in zip(stage.get("jobs") or [], stage_jobs[stage.get("stage")]):
+            depends_on = stage_dependencies
+            if "dependsOn" in job:
+                inherited = stage_dependencies if stage_dependencies is not None else stage_jobs.get(previous_stage_id, [])
+                depends_on = list(inherited) + [job_names.get(job_id, job_id) for job_id in _as_list(job["dependsOn"])]
+            job_obj = PipelineJob(job_name, depends_on)
 
             # Process steps in each job
-            for step in job.get("steps", []):
-                step_name = step.get("displayName", "Unnamed Step")
-                step_obj = PipelineStep(step_name, step.get("task", "Unknown Task"), step.get("inputs", {}))
-                job_obj.add_step(step_obj)
+            for step in _azure_job_steps(job):
+                if isinstance(step, dict):
+                    job_obj.add_step(_azure_step_to_pipeline_step(step))
 
-            pipeline.add_job_to_stage(stage_name, job_obj)
+            stage_obj.add_job(job_obj)
+
+        if stage_jobs[stage.get("stage")]:
+            previous_stage_id = stage.get("stage")
 
     return pipeline
 
 
+_GITHUB_MATRIX_EXPRESSION = re.compile(r"\$\{\{\s*matrix\.([\w-]+)\s*\}\}")
+
+
+def expand_matrix(matrix):
+    """
+    Expand a GitHub Actions `strategy.matrix` into its combinations, honouring `include` and `exclude`.
+
+    Returns an empty list when the matrix is computed at runtime (e.g. `${{ fromJson(...) }}`).
+    """
+    if not isinstance(matrix, dict):
+        return []
+    axes = {key: value for key, value in matrix.items() if key not in ("include", "exclude")}
+    if any(not isinstance(values, list) for values in axes.values()):
+        return []
+
+    combinations = [dict(zip(axes, values)) for values in itertools.product(*axes.values())] if axes else []
+    for exclude in _as_list(matrix.get("exclude")):
+        if isinstance(exclude, dict):
+            combinations = [c for c in combinations if any(c.get(key) != value for key, value in exclude.items())]
+
+    # An include entry extends every combination whose original values it does not overwrite,
+    # and becomes a combination of its own when it extends none.
+    original_count = len(combinations)
+    for include in _as_list(matrix.get("include")):
+        if not isinstance(include, dict):
+            continue
+        extended = False
+        for combination in combinations[:original_count]:
+            if all(combination.get(key) == value for key, value in include.items() if key in axes):
+                combination.update({key: value for key, value in include.items() if key not in axes})
+                extended = True
+        if not extended:
+            combinations.append(dict(include))
+    return combinations
+
+
+def _matrix_value(value):
+    return value if isinstance(value, str) else json.dumps(value, separators=(",", ":"))
+
+
+def _substitute_matrix(value, combination):
+    """Replace `${{ matrix.<key> }}` expressions in strings, lists and mappings."""
+    if isinstance(value, str):
+        return _GITHUB_MATRIX_EXPRESSION.sub(
+            lambda match: _matrix_value(combination[match.group(1)]) if match.group(1) in combination else match.group(0),
+            value,
+        )
+    if isinstance(value, list):
+        return [_substitute_matrix(item, combination) for item in value]
+    if isinstance(value, dict):
+        return {key: _substitute_matrix(item, combination) for key, item in value.items()}
+    return value
+
+
+def _github_step_to_pipeline_step(step):
+    """Map one GitHub Actions step (`run` or `uses`) to a PipelineStep."""
+    step_name = step.get("name")
+    condition = step.get("if")
+
+    if "run" in step:
+        return script_step(str(step["run"]), step_name, condition)
+
+    uses = str(step.get("uses", "Unknown Task"))
+    inputs = step.get("with", {}) or {}
+    if uses.startswith("actions/checkout@"):
+        return PipelineStep(step_name or default_step_name(CHECKOUT_TASK, inputs), CHECKOUT_TASK, inputs, condition)
+    return PipelineStep(step_name or uses, uses, inputs, condition)
+
+
 def convert_github_actions_to_pipeline(parsed_data):
     if isinstance(parsed_data, GitHubActionsPipeline):
         return parsed_data  # If already a GitHubActionsPipeline, return it directly.
+    if not isinstance(parsed_data, dict):
+        raise ValueError("Expected a mapping for the GitHub Actions workflow.")
 
     pipeline = GitHubActionsPipeline()  # Create a GitHubActionsPipeline instance
 
-    jobs = parsed_data.get("jobs", [])
-    # Preserve the order of jobs
-    for job in jobs:
-        job_name = job.get("name", "Unnamed Job")
-        pipeline.add_stage(PipelineStage(job_name))
-
-        # Add jobs to each stage
-        job_obj = PipelineJob(job_name)
-        pipeline.add_job_to_stage(job_name, job_obj)
+    # `jobs` is a mapping of job id to job definition; each job becomes a stage of its own and
+    # each matrix combination a job within that stage.
+    jobs = parsed_data.get("jobs") or {}
+    instances = {}
+    for job_id, job in jobs.items():
+        job = job or {}
+        job_name = str(job.get("name", job_id))
+        combinations = expand_matrix((job.get("strategy") or {}).get("matrix"))
+        if not combinations:
+            instances[job_id] = [(job_name, job)]
+            continue
+        # GitHub names combinations "build (ubuntu, 20)" unless the name itself uses matrix values.
+        names = [_substitute_matrix(job_name, combination) for combination in combinations]
+        if not _GITHUB_MATRIX_EXPRESSION.search(job_name) or len(set(names)) < len(names):
+            names = [
+                f"{name} ({', '.join(_matrix_value(value) for value in combination.values())})"
+                for name, combination in zip(names, combinations)
+            ]
+        instances[job_id] = [
+            (name, _substitute_matrix(job, combination)) for name, combination in zip(names, combinations)
+        ]
+
+    for job_id, job in jobs.items():
+        job = job or {}
+        job_name = str(job.get("name", job_id))
+        stage_obj = PipelineStage(job_id if _GITHUB_MATRIX_EXPRESSION.search(job_name) else job_name)
+        pipeline.add_stage(stage_obj)
+
+        # Jobs without `needs` start right away; a need on a matrix job waits for all of its combinations.
+        depends_on = [name for need in _as_list(job.get("needs")) for name, _ in instances.get(need, [])]
+        for instance_name, instance in instances[job_id]:
+            job_obj = PipelineJob(instance_name, list(depends_on))
+            for step in instance.get("steps") or []:
+                if isinstance(step, dict):
+                    job_obj.add_step(_github_step_to_pipeline_step(step))
+            stage_obj.add_job(job_obj)
 
     return pipeline
 
-def convert_gitlab_ci_to_pipeline(parsed_data):
+
+# Top-level GitLab CI keywords that are not job definitions.
+GITLAB_RESERVED_KEYWORDS = {
+    "stages", "variables", "default", "include", "workflow", "image", "services",
+    "before_script", "after_script", "cache", "types",
+}
+# GitLab allows `extends` chains of up to 11 levels; deeper nesting is rejected.
+GITLAB_MAX_EXTENDS_DEPTH = 11
+
+
+def _gitlab_script_lines(value):
+    """GitLab scripts may be a string or an arbitrarily nested list of strings."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        lines = []
+        for item in value:
+            lines.extend(_gitlab_script_lines(item))
+        return lines
+    return [str(value)]
+
+
+def _gitlab_merge(base, override):
+    """Deep-merge two GitLab mappings the way `extends` and `include` do: mappings merge, everything else is replaced."""
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _gitlab_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _gitlab_include_paths(include, base_path):
+    """Yield the local files an `include` entry refers to; remote, template and project includes are skipped."""
+    for entry in _as_list(include):
+        if isinstance(entry, str):
+            local = None if re.match(r"^https?://", entry) else entry
+        elif isinstance(entry, dict):
+            local = entry.get("local")
+        else:
+            local = None
+        if local is None:
+            logger.warning("Skipping non-local GitLab include: %s", entry)
+            continue
+        if base_path is None:
+            logger.warning("Skipping GitLab include %s: no repository path to resolve it against.", local)
+            continue
+        pattern = os.path.join(base_path, str(local).lstrip("/"))
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            yield path
+
+
+def load_gitlab_includes(config, base_path, depth=0):
+    """
+    Merge the local files listed under `include` into the configuration.
+
+    Included files are merged first so the including file can override them, matching GitLab.
+    """
+    if not isinstance(config, dict) or "include" not in config:
+        return config
+    if depth > 100:
+        raise ValueError("GitLab includes are nested too deeply (circular include?).")
+
+    merged = {}
+    for path in _gitlab_include_paths(config["include"], base_path):
+        with open(path) as included_file:
+            included = load_ci_yaml(included_file.read()) or {}
+        merged = _gitlab_merge(merged, load_gitlab_includes(included, base_path, depth + 1))
+
+    config = {key: value for key, value in config.items() if key != "include"}
+    return _gitlab_merge(merged, config)
+
+
+def gitlab_resolve_extends(name, config, resolved, depth=0):
+    """Return the job definition with its `extends` chain merged in, caching results in `resolved`."""
+    if name in resolved:
+        return resolved[name]
+    if depth > GITLAB_MAX_EXTENDS_DEPTH:
+        raise ValueError(f"GitLab job '{name}' exceeds the maximum `extends` depth (circular extends?).")
+
+    job = config.get(name)
+    if not isinstance(job, dict):
+        raise ValueError(f"GitLab job '{name}' extends an unknown job.")
+
+    merged = {}
+    for parent in _as_list(job.get("extends")):
+        merged = _gitlab_merge(merged, gitlab_resolve_extends(parent, config, resolved, depth + 1))
+    merged = _gitlab_merge(merged, {key: value for key, value in job.items() if key != "extends"})
+    resolved[name] = merged
+    return merged
+
+
+def _gitlab_resolve_references(value, config, depth=0):
+    """Replace `!reference [job, key, ...]` tags with the values they point to."""
+    if isinstance(value, GitLabReference):
+        if depth > 10:
+            raise ValueError(f"GitLab !reference {list(value)} is nested too deeply.")
+        target = config
+        for key in value:
+            target = target.get(key) if isinstance(target, dict) else None
+        return _gitlab_resolve_references(target, config, depth + 1)
+    if isinstance(value, list):
+        return [_gitlab_resolve_references(item, config, depth) for item in value]
+    if isinstance(value, dict):
+        return {key: _gitlab_resolve_references(item, config, depth) for key, item in value.items()}
+    return value
+
+
+def gitlab_job_instances(name, job):
+    """Expand `parallel: N` and `parallel: matrix:` into the job names GitLab would create."""
+    parallel = job.get("parallel")
+    if isinstance(parallel, int) and parallel > 1:
+        return [f"{name} {index}/{parallel}" for index in range(1, parallel + 1)]
+    if isinstance(parallel, dict):
+        names = []
+        for entry in _as_list(parallel.get("matrix")):
+            if not isinstance(entry, dict):
+                continue
+            axes = [[_matrix_value(value) for value in _as_list(values)] for values in entry.values()]
+            names.extend(f"{name}: [{', '.join(values)}]" for values in itertools.product(*axes))
+        if names:
+            return names
+    return [name]
+
+
+def gitlab_inherits(job, key):
+    """Whether a job takes `key` from the `default` section, according to `inherit:default`."""
+    inherit = (job.get("inherit") or {}).get("default", True)
+    return inherit is True or (isinstance(inherit, list) and key in inherit)
+
+
+def convert_gitlab_ci_to_pipeline(parsed_data, base_path=None):
+    """
+    Convert a GitLab CI configuration into a GitLabPipeline.
+
+    :param base_path: Repository directory used to resolve local `include` entries.
+    """
     if isinstance(parsed_data, GitLabPipeline):
         return parsed_data  # If already a GitLabCIPipeline, return it directly.
+    if not isinstance(parsed_data, dict):
+        raise ValueError("Expected a mapping for the GitLab CI configuration.")
 
     pipeline = GitLabPipeline()  # Create a GitLabCIPipeline instance
+    config = load_gitlab_includes(parsed_data, base_path)
 
-    stages = parsed_data.get("stages", [])
-    # Preserve the order of stages
+    # Preserve the order of stages; GitLab falls back to build/test/deploy when none are declared
+    # and always wraps them in .pre and .post.
+    stages = [".pre"] + [stage for stage in config.get("stages") or ["build", "test", "deploy"] if stage not in (".pre", ".post")] + [".post"]
+    stage_objs = {}
     for stage in stages:
-        pipeline.add_stage(PipelineStage(stage))
+        stage_objs[stage] = PipelineStage(stage)
+        pipeline.add_stage(stage_objs[stage])
+
+    defaults = config.get("default") or {}
+    resolved = {}
+    jobs = []
+    for job_name, job in config.items():
+        if job_name in GITLAB_RESERVED_KEYWORDS or str(job_name).startswith(".") or not isinstance(job, dict):
+            continue
+        job = _gitlab_resolve_references(gitlab_resolve_extends(job_name, config, resolved), config)
+        for key in ("before_script", "after_script"):
+            if key not in job and gitlab_inherits(job, key):
+                job[key] = _gitlab_resolve_references(defaults.get(key, config.get(key)), config)
+        jobs.append((str(job_name), job, gitlab_job_instances(str(job_name), job)))
+
+    instances = {job_name: names for job_name, _, names in jobs}
+    for job_name, job, names in jobs:
+        stage = job.get("stage", "test")
+        if stage not in stage_objs:
+            stage_objs[stage] = PipelineStage(stage)
+            pipeline.stages.insert(len(pipeline.stages) - 1, stage_objs[stage])
+
+        # Without `needs` a job waits for the previous stages; `needs: []` lets it start immediately.
+        depends_on = None
+        if "needs" in job:
+            needed = [need.get("job") if isinstance(need, dict) else need for need in _as_list(job["needs"])]
+            depends_on = [name for need in needed for name in instances.get(need, [])]
+
+        for instance_name in names:
+            job_obj = PipelineJob(instance_name, list(depends_on) if depends_on is not None else None)
+            for key in ("before_script", "script", "after_script"):
+                for line in _gitlab_script_lines(job.get(key)):
+                    job_obj.add_step(script_step(line))
+            stage_objs[stage].add_job(job_obj)
+
+    # Drop declared stages that no job uses, as GitLab does.
+    pipeline.stages = [stage for stage in pipeline.stages if stage.jobs]
+    return pipeline
 
-        # Add jobs to each stage
-        stage_obj = PipelineStage(stage)
-        pipeline.add_job_to_stage(stage, PipelineJob(f"{stage}_job"))
+
+_GROOVY_STRING = r"'((?:[^'\\\n]|\\.)*)'|\"((?:[^\"\\\n]|\\.)*)\""
+GROOVY_STAGE = re.compile(r"\bstage\s*\(\s*(?:" + _GROOVY_STRING + r")\s*\)\s*\{")
+_GROOVY_STEPS = re.compile(r"\bsteps\s*\{")
+_GROOVY_SHELL = re.compile(
+    r"\b(?:sh|bat|powershell|pwsh)\b\s*\(?\s*(?:script\s*:\s*)?"
+    r"(?:'''(.*?)'''|\"\"\"(.*?)\"\"\"|" + _GROOVY_STRING + r")"
+    r"(?:\s*,\s*label\s*:\s*(?:" + _GROOVY_STRING + r"))?[^\n;}]*",
+    re.DOTALL,
+)
+
+
+def _groovy_unescape(value):
+    return re.sub(r"\\(.)", r"\1", value, flags=re.DOTALL)
+
+
+def groovy_block_end(script, open_index):
+    """Return the index of the brace closing the block opened at `open_index`, skipping string literals."""
+    depth = 0
+    index = open_index
+    length = len(script)
+    while index < length:
+        char = script[index]
+        if script.startswith("'''", index) or script.startswith('"""', index):
+            end = script.find(script[index:index + 3], index + 3)
+            index = length if end == -1 else end + 3
+            continue
+        if char in ("'", '"'):
+            index += 1
+            while index < length and script[index] != char and script[index] != "\n":
+                index += 2 if script[index] == "\\" else 1
+            index += 1
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return index
+        index += 1
+    return length
+
+
+def groovy_stage_spans(script):
+    """Return (name, open brace index, close brace index) for every outermost `stage('...') { ... }` block."""
+    spans = []
+    position = 0
+    while True:
+        match = GROOVY_STAGE.search(script, position)
+        if not match:
+            return spans
+        open_index = match.end() - 1
+        close_index = groovy_block_end(script, open_index)
+        name = match.group(1) if match.group(1) is not None else match.group(2)
+        spans.append((_groovy_unescape(name), open_index, close_index))
+        position = close_index + 1
+
+
+def groovy_stage_blocks(script):
+    """Return (name, body) for every outermost `stage('...') { ... }` block in the script."""
+    return [(name, script[open_index + 1:close_index]) for name, open_index, close_index in groovy_stage_spans(script)]
+
+
+def _groovy_statements(text, offset=0):
+    """(start, end, step) of the plain Groovy statements between shell steps; block delimiters themselves are skipped."""
+    steps = []
+    position = offset
+    for line in text.splitlines(keepends=True):
+        statement = line.strip()
+        if statement and not statement.startswith("}") and not statement.endswith("{"):
+            start = position + len(line) - len(line.lstrip())
+            steps.append((start, start + len(statement),
+                          PipelineStep(statement[:60], GROOVY_TASK, {"statement": statement})))
+        position += len(line)
+    return steps
+
+
+def groovy_step_spans(body):
+    """
+    (start, end, step) of every step of a Jenkins stage body (declarative `steps { }` or scripted
+    stage body); start and end index into `body`.
+    """
+    start, end = 0, len(body)
+    steps_match = _GROOVY_STEPS.search(body)
+    if steps_match:
+        start, end = steps_match.end(), groovy_block_end(body, steps_match.end() - 1)
+    text = body[start:end]
+
+    steps = []
+    position = 0
+    for match in _GROOVY_SHELL.finditer(text):
+        steps.extend(_groovy_statements(text[position:match.start()], start + position))
+        script = next(group for group in match.groups()[:4] if group is not None)
+        label = match.group(5) if match.group(5) is not None else match.group(6)
+        steps.append((start + match.start(), start + match.end(),
+                      script_step(_groovy_unescape(script), _groovy_unescape(label) if label is not None else None)))
+        position = match.end()
+    steps.extend(_groovy_statements(text[position:], start + position))
+    return [(step_start, step_end, _normalize_groovy_step(step)) for step_start, step_end, step in steps]
+
+
+def _groovy_steps(body):
+    """Extract the steps of a Jenkins stage body (declarative `steps { }` or scripted stage body)."""
+    return [step for _, _, step in groovy_step_spans(body)]
+
+
+def _normalize_groovy_step(step):
+    if step.task == GROOVY_TASK and step.inputs.get("statement") == "checkout scm":
+        return PipelineStep(default_step_name(CHECKOUT_TASK, {}), CHECKOUT_TASK)
+    return step
+
+
+def _convert_groovy_to_pipeline(script):
+    """Build a JenkinsPipeline from Groovy source; parallel/nested stages become jobs of their parent stage."""
+    stage_blocks = groovy_stage_blocks(script)
+    if not stage_blocks:
+        raise ValueError("No stages found in the provided Jenkins pipeline script.")
+
+    pipeline = JenkinsPipeline()  # Create a JenkinsPipeline instance
+
+    # Iterate over stages in the order they appear, not as a set (to preserve order)
+    for stage_name, body in stage_blocks:
+        stage_obj = PipelineStage(stage_name)
+        pipeline.add_stage(stage_obj)
+
+        nested_blocks = groovy_stage_blocks(body)
+        for job_name, job_body in nested_blocks or [(stage_name, body)]:
+            job_obj = PipelineJob(job_name)
+            for step in _groovy_steps(job_body):
+                job_obj.add_step(step)
+            stage_obj.add_job(job_obj)
 
     return pipeline
 
+
 def convert_jenkins_scripted_to_pipeline(parsed_data):
-    st.write(parsed_data)
     if isinstance(parsed_data, JenkinsPipeline):
         return parsed_data  # If already a JenkinsPipeline, return it directly.
 
     if isinstance(parsed_data, str):
-        stages = extract_stages_from_script(parsed_data)
-        if not stages:
-            raise ValueError("No stages found in the provided Jenkins scripted pipeline script.")
-
-        pipeline = JenkinsPipeline()  # Create a JenkinsPipeline instance
-
-        # Iterate over stages in the order they appear, not as a set (to preserve order)
-        for stage in stages:  
-            pipeline.add_stage(PipelineStage(stage))
-            job_obj = PipelineJob(f"{stage}_job")
-            pipeline.add_job_to_stage(stage, job_obj)
+        pipeline = _convert_groovy_to_pipeline(parsed_data)
     else:
         raise ValueError("Expected raw Groovy script for Jenkins scripted pipeline.")
 
@@ -90,6 +595,10 @@ def convert_jenkins_declarative_to_pipeline(parsed_data):
     if isinstance(parsed_data, JenkinsPipeline):
         return parsed_data  # If already a JenkinsPipeline, return it directly.
 
+    # Declarative Jenkinsfiles reach us as Groovy source, the same as scripted ones.
+    if isinstance(parsed_data, str):
+        return _convert_groovy_to_pipeline(parsed_data)
+
     pipeline = JenkinsPipeline()  # Create a JenkinsPipeline instance
 
     if isinstance(parsed_data, dict):
@@ -136,14 +645,27 @@ def convert_bamboo_to_pipeline(parsed_data):
 def convert_aws_codepipeline_to_pipeline(parsed_data):
     if isinstance(parsed_data, AWSPipeline):
         return parsed_data  # If already an AWSPipeline, return it directly.
+    if not isinstance(parsed_data, dict):
+        raise ValueError("Expected a mapping for the AWS CodePipeline definition.")
 
     pipeline = AWSPipeline()  # Create an AWSPipeline instance
 
-    stages = parsed_data.get("stages", [])
+    # Definitions exported with `aws codepipeline get-pipeline` wrap everything in a `pipeline` key.
+    stages = (parsed_data.get("pipeline") or parsed_data).get("stages", [])
     # Preserve the order of stages
     for stage in stages:
         stage_name = stage if isinstance(stage, str) else stage.get("name", "Unnamed Stage")
         pipeline.add_stage(PipelineStage(stage_name))
+        if isinstance(stage, str):
+            continue
+
+        # Every CodePipeline action is a unit of work of its own: one job with a single step.
+        for action in stage.get("actions", []):
+            action_name = action.get("name", "Unnamed Action")
+            provider = (action.get("actionTypeId") or {}).get("provider", "Unknown Task")
+            job_obj = PipelineJob(action_name)
+            job_obj.add_step(PipelineStep(action_name, provider, action.get("configuration", {})))
+            pipeline.add_job_to_stage(stage_name, job_obj)
 
         # For AWS CodeBuild, CodeDeploy, we can add corresponding jobs
         for job in stage.get("jobs", []):
@@ -162,6 +684,183 @@ def convert_aws_codepipeline_to_pipeline(parsed_data):
     return pipeline
 
 
+# Keys the converters above keep in the Pipeline model, by platform and level. Every other key of the
+# source is lost when the pipeline is written out, so unmodelled_settings reports it.
+MODELLED_KEYS = {
+    "azure-pipelines": {
+        "pipeline": {"stages", "jobs", "steps"},
+        "stage": {"stage", "displayName", "dependsOn", "jobs"},
+        "job": {"job", "deployment", "displayName", "dependsOn", "steps"},
+        "step": {"script", "bash", "pwsh", "powershell", "task", "template", "inputs", "displayName", "name", "condition"},
+    },
+    "github-actions": {
+        "pipeline": {"jobs"},
+        "job": {"name", "needs", "steps", "strategy"},
+        "step": {"name", "run", "uses", "with", "if"},
+    },
+    "gitlab-ci": {
+        "pipeline": {"stages", "default", "before_script", "after_script"},
+        "default": {"before_script", "after_script"},
+        "job": {"stage", "script", "before_script", "after_script", "needs", "extends", "parallel", "inherit"},
+    },
+    "codepipeline": {
+        "pipeline": {"stages", "version"},
+        "stage": {"name", "actions"},
+        "action": {"name", "actionTypeId", "configuration", "inputArtifacts", "outputArtifacts", "runOrder"},
+    },
+}
+# Groovy blocks that only group the steps the parser reads.
+_GROOVY_STRUCTURE = {"pipeline", "stages", "stage", "steps", "parallel", "script", "node"}
+
+
+def _unmodelled(mapping, level, modelled_keys):
+    return [str(key) for key, value in mapping.items()
+            if key not in modelled_keys[level] and value not in (None, "", [], {})]
+
+
+def _azure_unmodelled(config):
+    modelled_keys = MODELLED_KEYS["azure-pipelines"]
+    settings = [("the pipeline", _unmodelled(config, "pipeline", modelled_keys))]
+    stages = config.get("stages")
+    if stages is None and "jobs" in config:
+        stages = [{"jobs": config.get("jobs") or []}]
+    elif stages is None:
+        stages = [{"jobs": [{"steps": config.get("steps") or []}]}]
+    for stage in stages:
+        if not isinstance(stage, dict):
+            continue
+        if "stage" in stage:
+            where = f"stage '{stage.get('displayName') or stage['stage']}'"
+            settings.append((where, _unmodelled(stage, "stage", modelled_keys)))
+        for job in stage.get("jobs") or []:
+            if not isinstance(job, dict):
+                continue
+            job_name = job.get("displayName") or job.get("job") or job.get("deployment") or "Unnamed Job"
+            # The lifecycle hooks of deployment jobs hold their steps; the rest of a strategy is lost
+            job_keys = {key: value for key, value in job.items() if key != "strategy" or "deployment" not in job}
+            if "job" in job or "deployment" in job:
+                settings.append((f"job '{job_name}'", _unmodelled(job_keys, "job", modelled_keys)))
+            for step in _azure_job_steps(job):
+                if isinstance(step, dict) and "checkout" not in step:  # checkout options are kept as inputs
+                    where = f"step '{_azure_step_to_pipeline_step(step).name}' of job '{job_name}'"
+                    settings.append((where, _unmodelled(step, "step", modelled_keys)))
+    return settings
+
+
+def _github_unmodelled(config):
+    modelled_keys = MODELLED_KEYS["github-actions"]
+    settings = [("the workflow", _unmodelled(config, "pipeline", modelled_keys))]
+    for job_id, job in (config.get("jobs") or {}).items():
+        if not isinstance(job, dict):
+            continue
+        job_name = str(job.get("name", job_id))
+        unmodelled = _unmodelled(job, "job", modelled_keys)
+        strategy = job.get("strategy") or {}
+        # Only a matrix known before the run becomes jobs of its own
+        if strategy and (set(strategy) != {"matrix"} or not expand_matrix(strategy.get("matrix"))):
+            unmodelled.append("strategy")
+        settings.append((f"job '{job_name}'", unmodelled))
+        for step in job.get("steps") or []:
+            if isinstance(step, dict):
+                where = f"step '{_github_step_to_pipeline_step(step).name}' of job '{job_name}'"
+                settings.append((where, _unmodelled(step, "step", modelled_keys)))
+    return settings
+
+
+def _gitlab_unmodelled(config):
+    modelled_keys = MODELLED_KEYS["gitlab-ci"]
+    jobs = [name for name, job in config.items()
+            if name not in GITLAB_RESERVED_KEYWORDS and not str(name).startswith(".") and isinstance(job, dict)]
+    # Local includes are only read when the repository is at hand (see convert_gitlab_ci_to_pipeline)
+    settings = [("the pipeline", _unmodelled({key: value for key, value in config.items() if key not in jobs
+                                              and not str(key).startswith(".")}, "pipeline", modelled_keys))]
+    if isinstance(config.get("default"), dict):
+        settings.append(("`default`", _unmodelled(config["default"], "default", modelled_keys)))
+    resolved = {}
+    for name in jobs:
+        job = gitlab_resolve_extends(name, config, resolved)
+        settings.append((f"job '{name}'", _unmodelled(job, "job", modelled_keys)))
+    return settings
+
+
+def _codepipeline_unmodelled(config):
+    modelled_keys = MODELLED_KEYS["codepipeline"]
+    definition = config.get("pipeline") or config
+    settings = [("the pipeline", _unmodelled(definition, "pipeline", modelled_keys))]
+    for stage in definition.get("stages") or []:
+        if not isinstance(stage, dict):
+            continue
+        stage_name = stage.get("name", "Unnamed Stage")
+        settings.append((f"stage '{stage_name}'", _unmodelled(stage, "stage", modelled_keys)))
+        for action in stage.get("actions") or []:
+            if not isinstance(action, dict):
+                continue
+            unmodelled = _unmodelled(action, "action", modelled_keys)
+            # Artifacts and run order are derived from the jobs when the pipeline is written out
+            unmodelled += [key for key in ("inputArtifacts", "outputArtifacts") if action.get(key)]
+            if action.get("runOrder", 1) != 1:
+                unmodelled.append("runOrder")
+            settings.append((f"action '{action.get('name', 'Unnamed Action')}'", unmodelled))
+    return settings
+
+
+def _groovy_unmodelled(script):
+    """Groovy outside the steps: directives such as `agent` or `post`, wrappers such as `withCredentials`."""
+    masked = list(script)
+    for _, open_index, close_index in groovy_stage_spans(script):
+        body_start = open_index + 1
+        nested = groovy_stage_spans(script[body_start:close_index])
+        bodies = [(body_start + start + 1, body_start + end) for _, start, end in nested] or [(body_start, close_index)]
+        for start, end in bodies:
+            for step_start, step_end, _ in groovy_step_spans(script[start:end]):
+                masked[start + step_start:start + step_end] = [" "] * (step_end - step_start)
+    masked = "".join(masked)
+
+    unmodelled = []
+    skip_to = 0
+    for match in re.finditer(r"[^\n]+", masked):
+        line = match.group().strip()
+        if match.start() < skip_to or not line or line.startswith("}"):
+            continue
+        keyword = re.match(r"[A-Za-z_][\w.]*", line)
+        keyword = keyword.group() if keyword else line
+        if line.endswith("{"):
+            if keyword in _GROOVY_STRUCTURE:
+                continue
+            skip_to = groovy_block_end(masked, match.start() + len(match.group().rstrip()) - 1)
+            unmodelled.append(keyword)
+        else:
+            unmodelled.append(line[:40])
+    return [("the Jenkinsfile", unmodelled)]
+
+
+def unmodelled_settings(parsed_data, pipeline_type):
+    """
+    Describe the settings of a source pipeline that the Pipeline model does not hold, e.g. GitHub
+    `runs-on`, GitLab `rules` or Azure `trigger`, so conversions can report them instead of
+    dropping them silently.
+
+    :param parsed_data: The loaded YAML/JSON mapping, or the Groovy source of a Jenkinsfile.
+    :return: A list of messages, one for each part of the pipeline that has such settings.
+    """
+    if isinstance(parsed_data, str):
+        settings = _groovy_unmodelled(parsed_data)
+    elif not isinstance(parsed_data, dict):
+        return []
+    else:
+        collect = {
+            "azure-pipelines": _azure_unmodelled,
+            "github-actions": _github_unmodelled,
+            "gitlab-ci": _gitlab_unmodelled,
+            "codepipeline": _codepipeline_unmodelled,
+        }.get(pipeline_type)
+        settings = collect(parsed_data) if collect else []
+    return [
+        f"Settings of {where} are not converted: {', '.join(f'`{key}`' for key in dict.fromkeys(keys))}."
+        for where, keys in settings if keys
+    ]
+
+
 def convert_circleci_to_pipeline(parsed_data):
     if isinstance(parsed_data, CircleCIPipeline):
         return parsed_data  # If already a CircleCIPipeline, return it directly.
@@ -189,7 +888,7 @@ def convert_circleci_to_pipeline(parsed_data):
 #     for stage in stages:
 #         stage_name = stage if isinstance(stage, str) else stage.get("name", "Unnamed Stage")
 #         pipeline.add_stage(PipelineStage(stage_name))
-        
+
 #         # For AWS CodeBuild, CodeDeploy, we can add corresponding jobs
 #         job_obj = PipelineJob(f"{stage_name}_job")
 #         pipeline.add_job_to_stage(stage_name, job_obj)
@@ -207,6 +906,6 @@ def extract_stages_from_script(script):
     stages = re.findall(stage_pattern, script)
 
     if not stages:
-        print("No stages found. Check if the script follows the expected format.")
-    
+        logger.warning("No stages found. Check if the script follows the expected format.")
+
     return stages
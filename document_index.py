@@ -0,0 +1,392 @@
+# document_index.py
+
+"""
+Process-wide index of the best-practice documents that follows changes to the directory.
+
+DocumentIndex ingests every .docx once and then watches the directory (watchdog events when the
+package is installed, a stat() poll every POLL_INTERVAL_SECONDS either way). Added and changed
+documents are re-ingested in the background into new collections, deleted ones are dropped, and
+the new set of collections is swapped in at once. Queries run against the snapshot they started
+with, so they never wait for a reindex and never see a half-built one:
+
+    index = get_document_index("best_practices")
+    with index.snapshot() as snapshot:
+        prompt = create_dynamic_prompt(user_prompt, index.store, directory, collections=snapshot.collections)
+
+Collections of replaced documents are deleted once no query uses a snapshot containing them.
+A document that cannot be read (corrupt, or still being written) keeps its previous version in
+the index; it is retried as soon as it changes, and otherwise after a backoff that doubles from
+RETRY_BACKOFF_SECONDS up to RETRY_BACKOFF_MAX_SECONDS.
+
+Every new snapshot is also published as a manifest point in the MANIFEST_COLLECTION collection.
+With a shared Qdrant (COPILOT_QDRANT_URL) the UI workers are read-only: they take their snapshots
+from the manifest, and the index is built and kept up to date by one `python indexer.py`
+process. As the indexer cannot see the other processes' queries, it keeps replaced collections
+for RETIRED_GRACE_SECONDS. COPILOT_INDEX_READ_ONLY=0/1 overrides the default. With an on-disk
+index (COPILOT_QDRANT_PATH) the manifest lets a restarted process reindex only what changed.
+
+The sentence vectors live in the vector store chosen by vector_index.select_vector_store() when
+the index is first built: NumPy for a private index of a small corpus, Qdrant otherwise. The
+manifest always lives in Qdrant.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from qdrant_client.models import PointStruct
+
+from chunking import chunking_signature
+from nlp_processing import SUMMARIES, embed_document, store_document
+from qdrant_populate import create_qdrant_collection, initialize_qdrant_client
+from telemetry import metrics as telemetry_metrics, span
+from vector_index import NUMPY_INDEX_MAX_VECTORS, QdrantVectorStore, select_vector_store, vector_store_of_kind
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # polling only
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SECONDS = float(os.getenv("COPILOT_INDEX_POLL_SECONDS", "2"))
+# Quiet time after a filesystem event before reindexing; editors write a document in several steps.
+DEBOUNCE_SECONDS = 0.5
+MANIFEST_COLLECTION = "copilot_index_manifest"
+# How long a shared index keeps the collections of a replaced snapshot for queries still running elsewhere.
+RETIRED_GRACE_SECONDS = float(os.getenv("COPILOT_INDEX_GRACE_SECONDS", "120"))
+# Wait before ingesting an unchanged document that failed again, doubled on every further failure.
+RETRY_BACKOFF_SECONDS = 5
+RETRY_BACKOFF_MAX_SECONDS = 300
+
+
+def _ingest_signature():
+    """How the documents are split and what is stored per text; an index built differently is rebuilt on resume."""
+    return chunking_signature() + ("+summaries" if SUMMARIES else "")
+
+
+def scan_documents(directory_path):
+    """{filename: (mtime_ns, size)} of the .docx documents in the directory (Word lock files excluded)."""
+    documents = {}
+    for entry in os.scandir(directory_path):
+        if entry.is_file() and entry.name.endswith(".docx") and not entry.name.startswith("~$"):
+            stat = entry.stat()
+            documents[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return documents
+
+
+class IndexSnapshot:
+    """One consistent version of the index: filename -> (signature, collection name)."""
+
+    def __init__(self, generation, documents):
+        self.generation = generation
+        self.documents = documents
+        self.readers = 0
+        self.pending_deletion = {}
+        self.store = None  # kind of vector store and chunking, for snapshots loaded from the manifest
+        self.chunking = None
+
+    @property
+    def collections(self):
+        # Sorted by document so that the retrieved context keeps a stable order
+        return [self.documents[filename][1] for filename in sorted(self.documents)]
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, changed):
+        self.changed = changed
+
+    def on_any_event(self, event):
+        if str(event.src_path).endswith(".docx") or str(getattr(event, "dest_path", "")).endswith(".docx"):
+            self.changed.set()
+
+
+class DocumentIndex:
+    def __init__(self, directory_path, client=None, poll_interval=POLL_INTERVAL_SECONDS, read_only=False,
+                 retire_after=0, name=None, shared=False):
+        self.directory_path = directory_path
+        self.client = client or initialize_qdrant_client()
+        self.shared = shared
+        # Chosen by the first refresh (or taken from the manifest); readers of a shared index use Qdrant
+        self.store = QdrantVectorStore(self.client) if read_only else None
+        self.poll_interval = poll_interval
+        self.read_only = read_only
+        self.retire_after = retire_after
+        # Identifies the index in the manifest, the same for every process (whatever its working directory)
+        self.name = name or os.path.basename(os.path.abspath(directory_path))
+        self.current = IndexSnapshot(0, {})
+        self._retired = []  # (replaced snapshot, when) whose collections may still be read
+        self._pending_deletion = {}  # collection -> when it was replaced; published with the manifest
+        self._failures = {}  # filename -> (signature, failed attempts, when to retry) of documents that failed
+        self._lock = threading.Lock()  # snapshot swaps and reader counts
+        self._refresh_lock = threading.Lock()  # one reindex at a time
+        self._manifest_lock = threading.Lock()  # keeps the published manifest in step with self.current
+        self._changed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._observer = None
+
+    @contextmanager
+    def snapshot(self):
+        """The current snapshot, kept alive (its collections undeleted) until the block ends."""
+        if self.read_only:
+            snapshot = self.load_manifest()
+            if snapshot is None:
+                raise RuntimeError(f"The document index '{self.name}' has not been built yet; run `python indexer.py`.")
+            yield snapshot
+            return
+        with self._lock:
+            snapshot = self.current
+            snapshot.readers += 1
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                snapshot.readers -= 1
+            self._drop_retired()
+
+    def refresh(self, metrics=None):
+        """
+        Re-ingest the documents that were added or changed since the last refresh and swap them in.
+
+        Returns:
+            dict: {"added", "changed", "deleted", "failed"} lists of filenames.
+        """
+        if self.read_only:
+            raise RuntimeError("A read-only document index cannot be refreshed.")
+        with self._refresh_lock:
+            previous = self.current
+            found = scan_documents(self.directory_path)
+            documents = {}
+            result = {"added": [], "changed": [], "deleted": [], "failed": []}
+            generation = previous.generation + 1
+            embedded = {}
+            for filename, signature in found.items():
+                old = previous.documents.get(filename)
+                if old is not None and old[0] == signature:
+                    documents[filename] = old
+                    continue
+                failure = self._failures.get(filename)
+                if failure is not None and failure[0] == signature and time.time() < failure[2]:
+                    # Failed as it is now; backing off rather than reading it again on every poll
+                    if old is not None:
+                        documents[filename] = old
+                    continue
+                try:
+                    with span("documents.embed", document=filename):
+                        embedded[filename] = embed_document(os.path.join(self.directory_path, filename), metrics)
+                except Exception as e:
+                    # Corrupt, or still being written; retried once it changes or the backoff has passed
+                    logger.warning("Could not index %s: %s", filename, e)
+                    result["failed"].append(filename)
+                    self._record_failure(filename, signature)
+                    if old is not None:
+                        documents[filename] = old
+
+            if self.store is None:
+                # Sized on the first build, so the corpus is embedded before any vector is stored
+                vector_count = sum(len(texts) for texts, _, _ in embedded.values())
+                self.store = select_vector_store(self.client, vector_count, self.shared)
+                logger.info("Document index '%s' keeps %d vectors in %s.", self.name, vector_count, self.store.kind)
+            for filename, (texts, vectors, summaries) in embedded.items():
+                old = previous.documents.get(filename)
+                collection_name = f"{os.path.splitext(filename)[0]}-{generation}"
+                try:
+                    with span("documents.reindex", document=filename):
+                        store_document(self.store, collection_name, texts, vectors, metrics, summaries)
+                except Exception as e:
+                    logger.warning("Could not store %s: %s", filename, e)
+                    result["failed"].append(filename)
+                    self._record_failure(filename, found[filename])
+                    self._delete_collections([collection_name])
+                    if old is not None:
+                        documents[filename] = old
+                    continue
+                documents[filename] = (found[filename], collection_name)
+                self._failures.pop(filename, None)
+                result["changed" if old is not None else "added"].append(filename)
+            result["deleted"] = [filename for filename in previous.documents if filename not in found]
+            self._failures = {filename: failure for filename, failure in self._failures.items() if filename in found}
+
+            if any(result[kind] for kind in ("added", "changed", "deleted")):
+                snapshot = IndexSnapshot(generation, documents)
+                with self._manifest_lock:
+                    self._publish_manifest(snapshot)
+                    with self._lock:
+                        self.current = snapshot
+                        self._retired.append((previous, time.time()))
+                kind = "initial" if previous.generation == 0 else "incremental"
+                telemetry_metrics.increment("copilot_index_refreshes_total", kind=kind)
+                logger.info("Document index generation %d: %s", generation,
+                            {kind: names for kind, names in result.items() if names})
+                if self.store.kind == "numpy" and len(self.store) > NUMPY_INDEX_MAX_VECTORS:
+                    logger.warning("The document index holds %d vectors, more than the %d a NumPy index is meant "
+                                   "for; set COPILOT_VECTOR_INDEX=qdrant.", len(self.store), NUMPY_INDEX_MAX_VECTORS)
+                self._drop_retired()
+            return result
+
+    def _record_failure(self, filename, signature):
+        failure = self._failures.get(filename)
+        attempts = failure[1] + 1 if failure is not None and failure[0] == signature else 1
+        delay = min(RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1), RETRY_BACKOFF_MAX_SECONDS)
+        self._failures[filename] = (signature, attempts, time.time() + delay)
+
+    def _drop_retired(self):
+        """Delete the collections no snapshot in use refers to any more, once retire_after has passed."""
+        with self._lock:
+            in_use = [snapshot for snapshot, _ in self._retired if snapshot.readers > 0] + [self.current]
+            live = {collection for snapshot in in_use for collection in snapshot.collections}
+            scheduled = False
+            for snapshot, retired in self._retired:
+                if snapshot.readers == 0:
+                    for collection in snapshot.collections:
+                        if collection not in live and collection not in self._pending_deletion:
+                            self._pending_deletion[collection] = retired
+                            scheduled = True
+            self._retired = [(snapshot, retired) for snapshot, retired in self._retired if snapshot.readers > 0]
+            now = time.time()
+            due = [
+                collection for collection, retired in self._pending_deletion.items()
+                if collection not in live and now - retired >= self.retire_after
+            ]
+            for collection in due:
+                del self._pending_deletion[collection]
+        if due:
+            self._delete_collections(due)
+        if due or scheduled:
+            # Published so that a restarted indexer still deletes what this one scheduled
+            with self._manifest_lock:
+                self._publish_manifest(self.current)
+
+    def _manifest_id(self):
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"copilot-index:{self.name}"))
+
+    def _publish_manifest(self, snapshot):
+        if not self.client.collection_exists(MANIFEST_COLLECTION):
+            create_qdrant_collection(self.client, MANIFEST_COLLECTION, 1, "Cosine")
+        documents = {filename: [*signature, collection] for filename, (signature, collection) in snapshot.documents.items()}
+        self.client.upsert(collection_name=MANIFEST_COLLECTION, points=[PointStruct(
+            id=self._manifest_id(),
+            vector=[1.0],
+            payload={
+                "name": self.name,
+                "generation": snapshot.generation,
+                "documents": documents,
+                "pending_deletion": dict(self._pending_deletion),
+                "store": self.store.kind if self.store is not None else "qdrant",
+                "chunking": _ingest_signature(),
+            },
+        )])
+
+    def resume(self):
+        """Continue from the last published snapshot, including the collections it still has to delete."""
+        snapshot = self.load_manifest()
+        if snapshot is not None:
+            self.store = vector_store_of_kind(snapshot.store, self.client)
+            if snapshot.chunking != _ingest_signature():
+                logger.info("The index was chunked as %s; reindexing every document.", snapshot.chunking)
+                self._pending_deletion.update({collection: time.time() for collection in snapshot.collections})
+                snapshot.documents = {}
+            # An in-memory NumPy index does not outlive the process; what is missing is ingested again
+            snapshot.documents = {
+                filename: entry for filename, entry in snapshot.documents.items() if self.store.exists(entry[1])
+            }
+            self.current = snapshot
+            self._pending_deletion.update(snapshot.pending_deletion)
+            self._drop_retired()
+
+    def load_manifest(self):
+        """The last published snapshot of this index, or None when it was never built."""
+        if not self.client.collection_exists(MANIFEST_COLLECTION):
+            return None
+        points = self.client.retrieve(collection_name=MANIFEST_COLLECTION, ids=[self._manifest_id()])
+        if not points:
+            return None
+        payload = points[0].payload
+        documents = {
+            filename: ((mtime_ns, size), collection)
+            for filename, (mtime_ns, size, collection) in payload["documents"].items()
+        }
+        snapshot = IndexSnapshot(payload["generation"], documents)
+        snapshot.pending_deletion = payload.get("pending_deletion", {})
+        snapshot.store = payload.get("store", "qdrant")
+        snapshot.chunking = payload.get("chunking", "sentence/full")  # how indexes were built before chunking.py
+        return snapshot
+
+    def _delete_collections(self, collections):
+        for collection_name in collections:
+            try:
+                self.store.delete(collection_name)
+            except Exception as e:
+                logger.debug("Could not delete collection %s: %s", collection_name, e)
+
+    def start(self, metrics=None):
+        """Build the index if needed and follow the directory from a background thread (not when read-only)."""
+        if self._thread is not None or self.read_only:
+            return
+        if self.current.generation == 0:
+            # A persistent index only needs the documents that changed since it was last published
+            self.resume()
+            self.refresh(metrics)
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_ChangeHandler(self._changed), self.directory_path, recursive=False)
+                self._observer.daemon = True
+                self._observer.start()
+            except Exception as e:
+                logger.warning("Filesystem events unavailable, polling %s instead: %s", self.directory_path, e)
+                self._observer = None
+        self._thread = threading.Thread(target=self._watch, name="index-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._changed.set()
+        if self._observer is not None:
+            self._observer.stop()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            if self._changed.wait(self.poll_interval):
+                # Let a burst of events (a save is several writes and renames) settle first
+                while self._changed.is_set() and not self._stopped.is_set():
+                    self._changed.clear()
+                    time.sleep(DEBOUNCE_SECONDS)
+            if self._stopped.is_set():
+                break
+            try:
+                self.refresh()
+                self._drop_retired()
+            except Exception as e:
+                logger.exception("Reindexing %s failed: %s", self.directory_path, e)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_document_index(directory_path, metrics=None):
+    """
+    The process-wide index of a document directory; `metrics` gets the timings of the first build.
+
+    Self-updating by default, read-only when the index lives in a shared Qdrant server.
+    """
+    key = os.path.abspath(directory_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            shared = bool(os.getenv("COPILOT_QDRANT_URL"))
+            read_only = os.getenv("COPILOT_INDEX_READ_ONLY", "1" if shared else "0") == "1"
+            index = _indexes[key] = DocumentIndex(directory_path, read_only=read_only,
+                                                  retire_after=RETIRED_GRACE_SECONDS if shared else 0, shared=shared)
+            index.start(metrics)
+        return index
@@ -0,0 +1,55 @@
+# embedding_cache.py
+
+"""
+Persistent sentence embedding cache.
+
+Vectors are stored as float32 bytes in a SqliteCache keyed by (model id, SHA-256 of the normalized
+sentence), so editing one paragraph of a document only encodes the sentences that are new, and
+boilerplate sentences shared by several documents are encoded and stored once.
+
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, "all-MiniLM-L6-v2")
+    vectors = cache.encode(sentence_model, sentences)
+
+The database uses WAL mode, so several processes can share it. COPILOT_EMBEDDING_CACHE moves it.
+"""
+
+import logging
+import os
+
+import numpy as np
+
+from sqlite_cache import LOOKUP_BATCH_SIZE, SqliteCache, normalize_sentence, sentence_hash  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("COPILOT_EMBEDDING_CACHE", os.path.join(".cache", "embeddings.sqlite3"))
+
+
+class EmbeddingCache(SqliteCache):
+    TABLE = "embeddings"
+    COLUMN = "vector"
+    KIND = "embedding"
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, model_id=None):
+        super().__init__(path, model_id)
+
+    def dump_value(self, value):
+        return np.asarray(value, dtype=np.float32).tobytes()
+
+    def load_value(self, stored):
+        return np.frombuffer(stored, dtype=np.float32)
+
+    def encode(self, model, sentences):
+        """
+        Embeddings of `sentences`, encoding with `model` only the sentences not cached yet.
+
+        Returns:
+            list: One vector (list of floats) per sentence, in order.
+        """
+        return [vector.tolist() for vector in self.get_or_compute(sentences, model.encode)]
+
+    def stats(self):
+        """{"vectors", "bytes", "hits", "misses", "hit_rate"} of this model's part of the cache."""
+        stats = super().stats()
+        stats["vectors"] = stats.pop("entries")
+        return stats
@@ -1,10 +1,65 @@
+import logging
+import re
+
 from docx import Document
 
+logger = logging.getLogger(__name__)
+
 def extract_text_from_docx(docx_file):
-    """Extracts text from a Word document."""
+    """Extracts text from a Word document; raises ValueError when the file cannot be read."""
     try:
         document = Document(docx_file)
-        return "\n".join([paragraph.text.strip() for paragraph in document.paragraphs if paragraph.text.strip()])
     except Exception as e:
-        print(f"Error extracting text: {e}")
-        return ""
+        logger.warning("Could not read %s: %s", docx_file, e)
+        raise ValueError(f"Could not read {docx_file}: {e}") from e
+    return "\n".join([paragraph.text.strip() for paragraph in document.paragraphs if paragraph.text.strip()])
+
+# Unstyled documents mark headings with bold text, or else with short lines without closing punctuation.
+MAX_HEADING_WORDS = 12
+
+def _heading_level(paragraph):
+    """1 or more for a styled or bold heading, None for body text."""
+    text = paragraph.text.strip()
+    style = paragraph.style.name if paragraph.style is not None else ""
+    if style == "Title":
+        return 1
+    if style.startswith("Heading"):
+        return int(style.split()[-1]) if style.split()[-1].isdigit() else 1
+    # Trailing punctuation ("Example:") is often not bold
+    runs = [run for run in paragraph.runs if any(character.isalnum() for character in run.text)]
+    if runs and all(run.bold for run in runs) and len(text.split()) <= MAX_HEADING_WORDS:
+        return 1 if re.match(r"\d+\.\s", text) else 2
+    return None
+
+def _looks_like_heading(text):
+    words = text.split()
+    return 0 < len(words) <= MAX_HEADING_WORDS // 2 and text[0].isupper() and not re.search(r"[.,;:!?{}()\[\]='\"]$|[=']", text)
+
+def extract_sections_from_docx(docx_file):
+    """
+    Splits a Word document at its headings.
+
+    Returns a list of (heading, paragraphs); nested headings are joined with " > ", and text before
+    the first heading has the heading "". Raises ValueError when the file cannot be read.
+    """
+    try:
+        document = Document(docx_file)
+    except Exception as e:
+        # A corrupt or half-written file must not be indexed as an empty document
+        logger.warning("Could not read %s: %s", docx_file, e)
+        raise ValueError(f"Could not read {docx_file}: {e}") from e
+    paragraphs = [paragraph for paragraph in document.paragraphs if paragraph.text.strip()]
+    levels = [_heading_level(paragraph) for paragraph in paragraphs]
+    if not any(levels):
+        levels = [1 if _looks_like_heading(paragraph.text.strip()) else None for paragraph in paragraphs]
+
+    sections = [("", [])]
+    path = []
+    for paragraph, level in zip(paragraphs, levels):
+        text = paragraph.text.strip()
+        if level is None:
+            sections[-1][1].append(text)
+            continue
+        path = [entry for entry in path if entry[0] < level] + [(level, text)]
+        sections.append((" > ".join(heading for _, heading in path), []))
+    return [(heading, texts) for heading, texts in sections if texts]
@@ -0,0 +1,362 @@
+# git_publisher.py
+
+"""
+Publishes generated pipelines to Git repositories.
+
+Each target repository gets its own shallow clone under REPO_CACHE_DIR, reused by later
+publishes, which only fetch the tip of the branch. By default ("objects" mode) the clone is bare
+and tree-less: a publish hashes the new blobs, rewrites only the trees on the changed paths
+(mktree) and creates the commit with commit-tree, so it costs O(changed files) rather than
+O(repository size) and never checks anything out. "worktree" mode commits through a blob-less
+checkout instead. A file lock next to the clone keeps concurrent sessions and processes from
+using the same clone at the same time.
+
+Files are written in one commit and one push per publish. GitPublisher runs publishes on a
+background thread and merges publishes to the same repository and branch that are still queued
+into a single commit. With `new_branch` set, the commit goes to a fresh branch, and for GitHub
+remotes the result includes the URL that opens a pull request for it.
+
+The remote can be a GitHub "owner/name" path, any Git URL, or a local (bare) repository path.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import subprocess
+import threading
+from concurrent.futures import Future
+from contextlib import suppress
+from datetime import datetime
+from urllib.parse import quote, urlsplit, urlunsplit
+
+from git import GitCommandError, Repo
+
+from telemetry import span
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+REPO_CACHE_DIR = os.getenv("COPILOT_REPO_CACHE", os.path.abspath("./repo"))
+DEFAULT_BRANCH = "main"
+PUBLISH_MODES = ("objects", "worktree")
+PUBLISH_MODE = os.getenv("COPILOT_PUBLISH_MODE", "objects")
+BRANCH_PREFIX = "copilot/"
+COMMIT_AUTHOR_NAME = "DevSecOps Co-Pilot"
+COMMIT_AUTHOR_EMAIL = "copilot@users.noreply.github.com"
+
+
+def remote_url(repo_path, github_token=None, username=None):
+    """The clone URL for a GitHub "owner/name" path (with the token or password), a Git URL or a local repository path."""
+    if os.path.isdir(repo_path) or re.match(r"^[\w+.-]+://|^git@", repo_path):
+        return repo_path
+    if not re.match(r"^[\w.-]+/[\w.-]+$", repo_path):
+        raise ValueError(f"Not a repository path or URL: {repo_path}")
+    credentials = ""
+    if github_token:
+        user = f"{quote(username, safe='')}:" if username else ""
+        credentials = f"{user}{quote(github_token, safe='')}@"
+    return f"https://{credentials}github.com/{repo_path}.git"
+
+
+def _without_credentials(url):
+    parts = urlsplit(url)
+    if parts.scheme in ("http", "https") and "@" in parts.netloc:
+        return urlunsplit(parts._replace(netloc=parts.netloc.rsplit("@", 1)[1]))
+    return url
+
+
+def pull_request_url(url, branch, base_branch):
+    """URL that opens a pull request from `branch` into `base_branch`, for GitHub remotes (otherwise None)."""
+    match = re.match(r"^https://github\.com/([\w.-]+/[\w.-]+?)(\.git)?$", _without_credentials(url))
+    if not match:
+        return None
+    return f"https://github.com/{match.group(1)}/compare/{quote(base_branch)}...{quote(branch)}?expand=1"
+
+
+def clone_directory(url, mode="worktree"):
+    """Cache directory of the clone for a remote and publish mode; credentials do not change it."""
+    clean_url = _without_credentials(url)
+    name = re.sub(r"[^\w.-]+", "_", clean_url.rstrip("/").split("/")[-1].removesuffix(".git"))[:40] or "repo"
+    suffix = ".git" if mode == "objects" else ""
+    return os.path.join(REPO_CACHE_DIR, f"{name}-{hashlib.sha256(clean_url.encode('utf-8')).hexdigest()[:12]}{suffix}")
+
+
+class RepoLock:
+    """Exclusive lock on a clone directory, shared by threads and processes (via a lock file)."""
+
+    _thread_locks = {}
+    _thread_locks_guard = threading.Lock()
+
+    def __init__(self, directory):
+        self.path = directory + ".lock"
+        with RepoLock._thread_locks_guard:
+            self._thread_lock = RepoLock._thread_locks.setdefault(self.path, threading.Lock())
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+        finally:
+            self._thread_lock.release()
+
+
+def _fetch_base(repo, branch):
+    """Fetch the tip of `branch`; returns False when the remote is empty (the branch starts from scratch)."""
+    try:
+        repo.git.fetch("origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}", depth=1)
+        return True
+    except GitCommandError:
+        if repo.git.ls_remote("--heads", "origin").strip():
+            raise ValueError(f"Branch {branch} does not exist in the remote repository.")
+        return False
+
+
+def _checkout_base(repo, branch):
+    """Bring the working tree to the tip of `branch` on the remote."""
+    if not _fetch_base(repo, branch):
+        repo.git.symbolic_ref("HEAD", f"refs/heads/{branch}")
+        return
+    repo.git.checkout("-B", branch, f"origin/{branch}", force=True)
+    repo.git.clean("-fdx")
+
+
+def open_clone(url, branch=DEFAULT_BRANCH, mode="worktree"):
+    """
+    Return the cached clone of `url`, cloning it on first use. Call with the RepoLock held.
+
+    "worktree" clones are blob-less and check the branch out; "objects" clones are bare and
+    tree-less, so they only ever hold the commits, trees and blobs that a publish touches.
+    """
+    directory = clone_directory(url, mode)
+    if os.path.isdir(os.path.join(directory, ".git") if mode == "worktree" else directory):
+        repo = Repo(directory)
+        repo.remotes.origin.set_url(url)
+    else:
+        logger.info("Cloning %s into %s", _without_credentials(url), directory)
+        if mode == "worktree":
+            options = ["--filter=blob:none", "--no-checkout"]
+        else:
+            options = ["--bare", "--filter=tree:0"]
+        if not os.path.isdir(url):
+            options.append("--depth=1")  # local clones ignore --depth
+        repo = Repo.clone_from(url, directory, multi_options=options)
+    if mode == "worktree":
+        _checkout_base(repo, branch)
+    return repo
+
+
+def _git(repo, *args, input=None):
+    """Run a plumbing command in the repository with the publisher's identity; returns stdout without the newline."""
+    env = dict(os.environ, GIT_AUTHOR_NAME=COMMIT_AUTHOR_NAME, GIT_AUTHOR_EMAIL=COMMIT_AUTHOR_EMAIL,
+               GIT_COMMITTER_NAME=COMMIT_AUTHOR_NAME, GIT_COMMITTER_EMAIL=COMMIT_AUTHOR_EMAIL)
+    completed = subprocess.run(["git", *args], cwd=repo.git_dir, input=input, capture_output=True, env=env)
+    if completed.returncode != 0:
+        raise GitCommandError(["git", *args], completed.returncode, completed.stderr)
+    return completed.stdout.decode("utf-8").rstrip("\n")
+
+
+def _write_tree(repo, base_tree, changes):
+    """
+    Write the tree `base_tree` with `changes` ({path parts: blob sha}) applied and return its sha.
+
+    Only the trees on the changed paths are read and written; with a tree-less clone the few
+    that are needed are fetched on demand.
+    """
+    entries = {}  # name -> [mode, type, sha]
+    if base_tree:
+        for line in _git(repo, "ls-tree", "-z", base_tree).split("\0"):
+            if line:
+                info, name = line.split("\t", 1)
+                entries[name] = info.split(" ")
+
+    subtrees = {}
+    for parts, blob in changes.items():
+        if len(parts) == 1:
+            entry = entries.get(parts[0])
+            mode = entry[0] if entry and entry[1] == "blob" else "100644"  # keep executable bits
+            entries[parts[0]] = [mode, "blob", blob]
+        else:
+            subtrees.setdefault(parts[0], {})[parts[1:]] = blob
+    for name, subchanges in subtrees.items():
+        entry = entries.get(name)
+        entries[name] = ["040000", "tree", _write_tree(repo, entry[2] if entry and entry[1] == "tree" else None, subchanges)]
+
+    listing = "".join(f"{mode} {kind} {sha}\t{name}\0" for name, (mode, kind, sha) in entries.items())
+    # --missing: a partial clone does not have the unchanged blobs and trees the entries point to
+    return _git(repo, "mktree", "-z", "--missing", input=listing.encode("utf-8"))
+
+
+def _repository_parts(path):
+    parts = tuple(part for part in path.replace("\\", "/").split("/") if part not in ("", "."))
+    if not parts or ".." in parts or parts[0] == ".git":
+        raise ValueError(f"File path leaves the repository: {path}")
+    return parts
+
+
+def _publish_objects(repo, files, message, branch, target_branch):
+    """Commit by writing blob, tree and commit objects directly; returns the new commit sha or None."""
+    if _fetch_base(repo, branch):
+        parent = _git(repo, "rev-parse", f"refs/remotes/origin/{branch}")
+        base_tree = _git(repo, "rev-parse", f"{parent}^{{tree}}")
+    else:
+        parent = base_tree = None
+
+    changes = {}
+    for path, content in files.items():
+        changes[_repository_parts(path)] = _git(repo, "hash-object", "-w", "--stdin", input=content.encode("utf-8"))
+    tree = _write_tree(repo, base_tree, changes)
+    if tree == base_tree:
+        return None
+    commit = _git(repo, "commit-tree", tree, *(["-p", parent] if parent else []), input=message.encode("utf-8"))
+    _git(repo, "update-ref", f"refs/heads/{target_branch}", commit)
+    return commit
+
+
+def _publish_worktree(repo, files, message, target_branch):
+    """Commit through a checked-out working tree; returns the new commit sha or None."""
+    if target_branch != repo.active_branch.name:
+        repo.git.checkout("-B", target_branch)
+    for path, content in files.items():
+        target_path = os.path.join(repo.working_tree_dir, *_repository_parts(path))
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(target_path, "w", encoding="utf-8") as file:
+            file.write(content)
+    repo.git.add("--", *files)
+    if repo.head.is_valid() and not repo.index.diff("HEAD"):
+        return None
+    repo.git.commit("-m", message, author=f"{COMMIT_AUTHOR_NAME} <{COMMIT_AUTHOR_EMAIL}>",
+                    env={"GIT_COMMITTER_NAME": COMMIT_AUTHOR_NAME, "GIT_COMMITTER_EMAIL": COMMIT_AUTHOR_EMAIL})
+    return repo.head.commit.hexsha
+
+
+def publish_files(url, files, message, branch=DEFAULT_BRANCH, new_branch=None, push=True, mode=None):
+    """
+    Commit `files` ({path in the repository: content}) in one commit and push it.
+
+    Args:
+        url: Remote URL (see remote_url).
+        files: The files to write, relative to the repository root.
+        message: Commit message.
+        branch: Branch the commit is based on (and pushed to without `new_branch`).
+        new_branch: Push the commit to this new branch instead, ready for a pull request.
+        push: False only commits to the cached clone.
+        mode: "objects" (default) writes the git objects directly into a bare, tree-less clone,
+            so the cost grows with the changed files rather than the repository; "worktree"
+            commits through a checkout. Defaults to PUBLISH_MODE.
+
+    Returns:
+        dict: commit (sha or None when nothing changed), branch, files, pushed, pull_request_url
+    """
+    if not files:
+        raise ValueError("No files to publish.")
+    mode = mode or PUBLISH_MODE
+    if mode not in PUBLISH_MODES:
+        raise ValueError(f"Unsupported publish mode: {mode}")
+    target_branch = new_branch or branch
+    directory = clone_directory(url, mode)
+    with span("git.publish", files=len(files), branch=target_branch, mode=mode), RepoLock(directory):
+        repo = None
+        try:
+            repo = open_clone(url, branch, mode)
+            if mode == "objects":
+                commit = _publish_objects(repo, files, message, branch, target_branch)
+            else:
+                commit = _publish_worktree(repo, files, message, target_branch)
+
+            result = {"commit": commit, "branch": target_branch, "files": sorted(files), "pushed": False,
+                      "pull_request_url": None}
+            if commit is None:
+                logger.info("Nothing to commit; the files are unchanged.")
+                return result
+            if push:
+                # Only the objects the remote lacks (the new blobs, trees and commit) are sent
+                repo.git.push("origin", f"{commit}:refs/heads/{target_branch}")
+                result["pushed"] = True
+                if new_branch:
+                    result["pull_request_url"] = pull_request_url(url, new_branch, branch)
+            return result
+        finally:
+            # Tokens are passed per publish and not kept in the cached clone's config
+            if repo is None and os.path.isdir(directory):
+                with suppress(Exception):
+                    repo = Repo(directory)
+            if repo is not None:
+                repo.remotes.origin.set_url(_without_credentials(url))
+
+
+def default_branch_name():
+    return f"{BRANCH_PREFIX}pipeline-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+
+class GitPublisher:
+    """
+    Runs publish_files on a background thread.
+
+    Publishes queued for the same remote, branch and new branch are merged into one commit and
+    push; every caller gets the same Future, whose result is the publish_files result.
+    """
+
+    def __init__(self):
+        self._pending = {}  # (clean url, branch, new_branch, mode) -> [url, files, messages, future]
+        self._queue = []
+        self._condition = threading.Condition()
+        self._worker = None
+
+    def submit(self, url, files, message, branch=DEFAULT_BRANCH, new_branch=None, mode=None):
+        key = (_without_credentials(url), branch, new_branch, mode)
+        with self._condition:
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = [url, {}, [], Future()]
+                self._queue.append(key)
+            batch[0] = url  # the newest credentials win
+            batch[1].update(files)
+            batch[2].append(message)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="copilot-git-publisher", daemon=True)
+                self._worker.start()
+            self._condition.notify()
+            return batch[3]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._queue:
+                    self._worker = None
+                    return
+                key = self._queue.pop(0)
+                url, files, messages, future = self._pending.pop(key)
+            message = messages[0] if len(messages) == 1 else "\n".join(
+                [f"Publish {len(files)} generated pipeline files", ""] + [f"- {line}" for line in messages])
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(publish_files(url, files, message, key[1], key[2], mode=key[3]))
+            except Exception as e:
+                logger.error("Publishing to %s failed: %s", key[0], e)
+                future.set_exception(e)
+
+
+publisher = GitPublisher()
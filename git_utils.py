@@ -1,69 +1,48 @@
-import os
-import streamlit as st
-from git import Repo, GitCommandError
-from urllib.parse import quote
-import requests
+import logging
+from git import GitCommandError
+from telemetry import traced
+from git_publisher import DEFAULT_BRANCH, publish_files, remote_url
 
+logger = logging.getLogger(__name__)
 
+
+@traced("git.commit")
 def commit_to_git(repo_path, commit_message, file_path, generated_code, 
                  github_token=None, username=None, password=None, 
-                 client_id=None, client_secret=None, redirect_uri=None):
-    
+                 client_id=None, client_secret=None, redirect_uri=None, branch=DEFAULT_BRANCH, new_branch=None):
+    """
+    Commit one generated file and push it, waiting for the push.
+
+    Uses git_publisher's per-repository clone cache; use git_publisher.publisher to batch several
+    files into one commit or to push in the background.
 
+    Returns:
+        tuple: (success, message)
+    """
     try:
         if not repo_path:
             return False, "Git repository path is required."
 
         # Determine the repository URL based on authentication method
         if github_token:
-            encoded_token = quote(github_token)
-            repo_url = f"https://{encoded_token}@github.com/{repo_path}.git" 
+            repo_url = remote_url(repo_path, github_token)
         elif username and password:
-            auth = (username, password)
-            repo_url = f"https://{username}@{username}.github.io/{repo_path}.git"
+            repo_url = remote_url(repo_path, password, username)
         elif client_id and client_secret and redirect_uri:
             # For OAuth, you'll use the repository URL without authentication details
-            repo_url = f"https://github.com/{repo_path}.git" 
-        else:
+            repo_url = remote_url(repo_path)
+        elif repo_path != remote_url(repo_path):
             return False, "Either GitHub Token, username/password, or Client ID/Secret and Redirect URI are required."
-
-        # Print where the file is being pushed
-        st.write(f"Repository URL: {repo_url}")
-
-        # Initialize or clone repository
-        repo_dir = os.path.abspath("./repo")
-        if not os.path.exists(repo_dir):
-            st.write(f"Cloning repository from {repo_url}...")
-            repo = Repo.clone_from(repo_url, repo_dir)
-            st.success(f"Repository cloned successfully: {repo_dir}")
         else:
-            repo = Repo(repo_dir) 
-
-        # Save the generated code to file within the repo
-        target_path = os.path.join(repo_dir, file_path)
-        os.makedirs(os.path.dirname(target_path), exist_ok=True)
-        st.write(f"Saving file to: {target_path}")
-        with open(target_path, 'w') as f:
-            f.write(generated_code)
-
-        # Print file being pushed to
-        st.write(f"File being pushed to: {target_path}")
-
-        # Stage the file and commit changes
-        repo_path_relative = os.path.relpath(target_path, repo.working_tree_dir) 
-        st.write(f"Staging file: {repo_path_relative}")
-        repo.git.add(repo_path_relative)
-
-        st.write(f"Committing changes with message: {commit_message}")
-        repo.index.commit(commit_message)
-
-        # Push changes to the remote repository
-        st.write("Pushing changes to the remote repository...")
-        repo.git.push("origin", "main") 
-        # Handle authentication and push (code for pushing would be here)
-
-        os.remove(repo_path_relative)
-        return True, "Code successfully committed and pushed to Git!"
+            repo_url = repo_path  # a local repository or a URL with its own credentials
+
+        logger.info("Committing %s to %s", file_path, repo_path)
+        result = publish_files(repo_url, {file_path: generated_code}, commit_message, branch, new_branch)
+        if result["commit"] is None:
+            return True, "The file is already up to date in the repository."
+        if result["pull_request_url"]:
+            return True, f"Code pushed to branch {result['branch']}. Open a pull request: {result['pull_request_url']}"
+        return True, f"Code successfully committed and pushed to {result['branch']}!"
 
     except GitCommandError as git_error:
         if 'Authentication failed' in str(git_error):
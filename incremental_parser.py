@@ -0,0 +1,172 @@
+# incremental_parser.py
+
+"""
+Parse a pipeline while the LLM is still writing it.
+
+IncrementalPipelineParser consumes the completion chunk by chunk and re-parses the pipeline
+whenever another top-level block (a GitHub/GitLab job, an Azure stage or job, a CodePipeline
+stage, a Jenkins stage) is complete. Only the complete blocks are handed to PipelineParser, so
+every snapshot is valid code even though the completion is not finished yet.
+"""
+
+import logging
+import re
+
+from conversion import GROOVY_STAGE, groovy_block_end
+from pipeline_converter import parse_pipeline
+from pipeline_repair import CODE_BLOCK_LANGUAGES
+from pipelinetypes import *
+
+logger = logging.getLogger(__name__)
+
+GROOVY_PIPELINE_TYPES = ("jenkinsfile-scripted", "jenkinsfile-declarative")
+
+# (section line the blocks live under or None for the whole document, first line of the first block).
+# Later blocks are the lines indented no deeper than the first one.
+YAML_BLOCKS = {
+    "github-actions": (r"^jobs\s*:\s*(#.*)?$", r"^\s+[^\s#]"),
+    "gitlab-ci": (None, r"^[^\s#]"),
+    "azure-pipelines": (None, r"^\s*-\s*(stage|job|deployment)\s*:"),
+    "codepipeline": (r"^\s*[Ss]tages\s*:", r"^\s*-\s"),
+}
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip(" "))
+
+
+class IncrementalPipelineParser:
+    """
+    Usage:
+        parser = IncrementalPipelineParser("github-actions")
+        for chunk in completion:
+            pipeline = parser.feed(chunk)
+            if pipeline:
+                ...  # a new block is complete, redraw
+        pipeline = parser.finish()
+    """
+
+    def __init__(self, pipeline_type):
+        if pipeline_type not in CODE_BLOCK_LANGUAGES:
+            raise ValueError(f"Unsupported pipeline type: {pipeline_type}")
+        self.pipeline_type = pipeline_type
+        self.text = ""
+        self.pipeline = None
+        self.snapshots = 0
+        self._fence = re.compile(r"```(?:" + "|".join(CODE_BLOCK_LANGUAGES[pipeline_type]) + r")[ \t]*\n")
+        self._code_start = None
+        self._closed = False
+        self._complete_blocks = 0
+        self._structure_hash = None
+        # YAML: complete lines of the code block and the line numbers where blocks start
+        self._lines = []
+        self._scanned = 0
+        self._in_section = False
+        self._block_indent = None
+        self._block_starts = []
+        # Groovy: end of the last complete outermost stage
+        self._groovy_end = 0
+
+    def feed(self, chunk):
+        """
+        Add the next piece of the completion.
+
+        Returns:
+            Pipeline | None: A new snapshot when another block became complete, otherwise None.
+        """
+        self.text += chunk
+        if self._closed:
+            return None
+        if self._code_start is None:
+            match = self._fence.search(self.text)
+            if not match:
+                return None
+            self._code_start = match.end()
+
+        if self.pipeline_type in GROOVY_PIPELINE_TYPES:
+            if "}" not in chunk and "`" not in chunk:
+                return None
+            code, blocks = self._groovy_prefix()
+        else:
+            if "\n" not in chunk:
+                return None
+            code, blocks = self._yaml_prefix()
+        return self._parse(code, blocks)
+
+    def finish(self):
+        """Parse the whole completion once the stream has ended and return the final Pipeline (or the last snapshot)."""
+        self._closed = True
+        try:
+            pipeline = parse_pipeline(self.text, self.pipeline_type)
+        except Exception as e:
+            logger.warning("Final parse of the streamed pipeline failed: %s", e)
+            return self.pipeline
+        self.pipeline = pipeline
+        self._structure_hash = pipeline.structure_hash()
+        return pipeline
+
+    def _yaml_prefix(self):
+        """Code made of the complete blocks so far and the number of complete blocks."""
+        section, first_block = YAML_BLOCKS[self.pipeline_type]
+        end = self.text.rfind("\n")
+        new_lines = self.text[self._code_start + self._scanned:end + 1].splitlines()
+        self._scanned = end + 1 - self._code_start
+        for line in new_lines:
+            if line.startswith("```"):
+                self._closed = True
+                break
+            number = len(self._lines)
+            self._lines.append(line)
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            if self._block_indent is not None:
+                if _indent(line) <= self._block_indent:
+                    self._block_starts.append(number)
+            elif section is not None and not self._in_section:
+                self._in_section = bool(re.match(section, line))
+            elif re.match(first_block, line):
+                self._block_indent = _indent(line)
+                self._block_starts.append(number)
+
+        if self._closed:
+            return "\n".join(self._lines) + "\n", len(self._block_starts)
+        if len(self._block_starts) < 2:
+            return None, 0
+        return "\n".join(self._lines[:self._block_starts[-1]]) + "\n", len(self._block_starts) - 1
+
+    def _groovy_prefix(self):
+        close = self.text.find("\n```", self._code_start)
+        if close != -1:
+            self._closed = True
+            return self.text[self._code_start:close], self._complete_blocks + 1
+
+        code = self.text[self._code_start:]
+        blocks = self._complete_blocks
+        while True:
+            match = GROOVY_STAGE.search(code, self._groovy_end)
+            if not match:
+                break
+            close_index = groovy_block_end(code, match.end() - 1)
+            if close_index >= len(code):
+                break
+            self._groovy_end = close_index + 1
+            blocks += 1
+        # The Groovy converter only needs the stage blocks, so unclosed `pipeline { stages {` are fine
+        return code[:self._groovy_end], blocks
+
+    def _parse(self, code, blocks):
+        if code is None or blocks <= self._complete_blocks:
+            return None
+        self._complete_blocks = blocks
+        try:
+            pipeline = parse_pipeline(code, self.pipeline_type)
+        except Exception as e:
+            logger.debug("Partial pipeline could not be parsed yet: %s", e)
+            return None
+        structure_hash = pipeline.structure_hash()
+        if structure_hash == self._structure_hash:
+            return None
+        self._structure_hash = structure_hash
+        self.pipeline = pipeline
+        self.snapshots += 1
+        return pipeline
@@ -0,0 +1,50 @@
+# indexer.py
+
+"""
+Build the shared document index, and optionally keep it up to date.
+
+UI workers pointed at a shared Qdrant server (COPILOT_QDRANT_URL) only read the index; this
+command is the one process that ingests the documents:
+
+    python indexer.py best_practices            # ingest what changed since the last run, then exit
+    python indexer.py best_practices --watch    # and keep following the directory
+"""
+
+import argparse
+import logging
+import time
+
+from document_index import DocumentIndex, RETIRED_GRACE_SECONDS
+from nlp_processing import embedding_cache
+from telemetry import configure_from_environment
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest the best-practice documents into the shared index.")
+    parser.add_argument("directory", nargs="?", default="best_practices", help="directory of .docx documents")
+    parser.add_argument("--watch", action="store_true", help="keep reindexing documents as they change")
+    parser.add_argument("--name", help="index name shared with the workers (default: the directory name)")
+    args = parser.parse_args()
+    configure_from_environment()
+
+    index = DocumentIndex(args.directory, retire_after=RETIRED_GRACE_SECONDS, name=args.name, shared=True)
+    index.resume()
+    started = time.perf_counter()
+    result = index.refresh()
+    logger.info("Index '%s' is at generation %d after %.1f s: %s", index.name, index.current.generation,
+                time.perf_counter() - started, {kind: names for kind, names in result.items() if names} or "no changes")
+    logger.info("Embedding cache: %s", embedding_cache.stats())
+
+    if args.watch:
+        index.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            index.stop()
+
+
+if __name__ == "__main__":
+    main()
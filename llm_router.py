@@ -0,0 +1,273 @@
+# llm_router.py
+
+"""
+Route generation requests across the configured LLM providers.
+
+Every provider keeps rolling statistics over its last STATS_WINDOW calls: latencies of the
+successful ones and the outcome of all of them. route() orders the healthy providers by median
+latency (providers without enough samples go first so they get measured); a provider is unhealthy
+for COOLDOWN_SECONDS after UNHEALTHY_AFTER_FAILURES failures in a row or while its error rate is
+above MAX_ERROR_RATE. A failed call falls through to the next provider.
+
+With hedging on, a request still running after the first provider's p90 latency is sent to the
+next provider as well; the first answer wins and the other request is cancelled (the backends
+use aiohttp, so cancelling the task closes the connection). The time the cancelled request had
+run counts as a latency of its provider when it is slower than the provider's median, so a
+provider that keeps losing the race drops in the ranking.
+
+    router = get_router()
+    code = await router.generate(prompt)
+
+COPILOT_LLM_PROVIDERS picks the providers ("Azure,AWS"; by default every provider whose
+settings are present) and COPILOT_LLM_HEDGE=1 turns hedging on.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_code_generator import generate_code_from_aws_async
+from azure_code_generator import generate_code_from_azure_async
+from stub_code_generator import generate_code_from_stub
+from telemetry import metrics, span, tracer
+
+logger = logging.getLogger(__name__)
+
+STATS_WINDOW = 50
+# Samples needed before a provider's latency is trusted for ranking and hedging.
+MIN_LATENCY_SAMPLES = 5
+UNHEALTHY_AFTER_FAILURES = 3
+MAX_ERROR_RATE = 0.5
+COOLDOWN_SECONDS = 30
+HEDGE_QUANTILE = 0.9
+# Hedge delay until the first provider has MIN_LATENCY_SAMPLES latencies.
+DEFAULT_HEDGE_DELAY_SECONDS = 30
+
+
+async def _azure_complete(prompt):
+    return await generate_code_from_azure_async(
+        os.getenv("AZURE_OPENAI_ENDPOINT"),
+        os.getenv("AZURE_OPENAI_API_KEY"),
+        prompt,
+        os.getenv("AZURE_OPENAI_API_VERSION"),
+        os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+    )
+
+
+async def _stub_complete(prompt):
+    return generate_code_from_stub(prompt)
+
+
+# name -> (async backend, environment variables it needs); Stub is only used when listed explicitly.
+PROVIDER_BACKENDS = {
+    "Azure": (_azure_complete, ("AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_API_KEY", "AZURE_OPENAI_DEPLOYMENT")),
+    "AWS": (generate_code_from_aws_async, ("AWS_BEDROCK_MODEL_ID",)),
+    "Stub": (_stub_complete, None),
+}
+
+
+class ProviderStats:
+    """Rolling latency and error statistics of one provider."""
+
+    def __init__(self, window=STATS_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.last_failure = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(seconds)
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+                self.last_failure = time.monotonic()
+
+    def record_cancelled(self, seconds):
+        """
+        A call cancelled after `seconds` (it lost a hedge race) would have taken at least that long;
+        it is a latency sample when it is slower than the median so far, and tells nothing otherwise.
+        """
+        with self._lock:
+            if seconds > (self.percentile(0.5) or 0.0):
+                self.latencies.append(seconds)
+
+    def percentile(self, fraction):
+        """Latency below which `fraction` of the recent successful calls finished (None without samples)."""
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    @property
+    def error_rate(self):
+        outcomes = list(self.outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def healthy(self):
+        if self.last_failure is None or time.monotonic() - self.last_failure >= COOLDOWN_SECONDS:
+            return True
+        if self.consecutive_failures >= UNHEALTHY_AFTER_FAILURES:
+            return False
+        return not (len(self.outcomes) >= MIN_LATENCY_SAMPLES and self.error_rate > MAX_ERROR_RATE)
+
+    def snapshot(self):
+        return {
+            "calls": len(self.outcomes),
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(HEDGE_QUANTILE),
+            "error_rate": self.error_rate,
+            "healthy": self.healthy(),
+        }
+
+
+class LLMProvider:
+    def __init__(self, name, complete):
+        self.name = name
+        self.complete = complete
+        self.stats = ProviderStats()
+
+    def expected_latency(self):
+        if len(self.stats.latencies) < MIN_LATENCY_SAMPLES:
+            return 0.0
+        return self.stats.percentile(0.5)
+
+    def hedge_delay(self):
+        if len(self.stats.latencies) < MIN_LATENCY_SAMPLES:
+            return DEFAULT_HEDGE_DELAY_SECONDS
+        return self.stats.percentile(HEDGE_QUANTILE)
+
+
+class LLMRouter:
+    def __init__(self, providers, hedge=False):
+        if not providers:
+            raise ValueError("No LLM providers are configured.")
+        self.providers = providers
+        self.hedge = hedge
+
+    def route(self):
+        """Providers in the order they should be tried: healthy ones fastest first, then the rest."""
+        healthy = [provider for provider in self.providers if provider.stats.healthy()]
+        unhealthy = [provider for provider in self.providers if provider not in healthy]
+        healthy.sort(key=lambda provider: provider.expected_latency())
+        unhealthy.sort(key=lambda provider: provider.stats.last_failure)
+        return healthy + unhealthy
+
+    def stats(self):
+        return {provider.name: provider.stats.snapshot() for provider in self.providers}
+
+    async def _call(self, provider, prompt):
+        started = time.perf_counter()
+        with span("llm.call", provider=provider.name):
+            try:
+                result = await provider.complete(prompt)
+            except asyncio.CancelledError:
+                provider.stats.record_cancelled(time.perf_counter() - started)
+                metrics.increment("copilot_llm_requests_total", provider=provider.name, outcome="cancelled")
+                raise
+            except Exception:
+                provider.stats.record(time.perf_counter() - started, False)
+                metrics.increment("copilot_llm_requests_total", provider=provider.name, outcome="error")
+                raise
+        provider.stats.record(time.perf_counter() - started, True)
+        metrics.increment("copilot_llm_requests_total", provider=provider.name, outcome="ok")
+        return result
+
+    async def generate(self, prompt):
+        """
+        Send the prompt to the best provider, falling back (or hedging) to the others.
+
+        Raises:
+            RuntimeError: If every provider failed.
+        """
+        candidates = self.route()
+        running = {}  # task -> provider
+        errors = []
+        next_index = 0
+        hedged = False
+
+        def launch():
+            nonlocal next_index
+            provider = candidates[next_index]
+            next_index += 1
+            running[asyncio.ensure_future(self._call(provider, prompt))] = provider
+            return time.monotonic() + provider.hedge_delay()
+
+        hedge_at = launch()
+        try:
+            while running:
+                timeout = None
+                if self.hedge and not hedged and next_index < len(candidates):
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slower than its p90: ask the next provider too and keep whichever answers first
+                    hedged = True
+                    metrics.increment("copilot_llm_hedges_total", provider=candidates[next_index - 1].name)
+                    logger.info("Hedging the request to %s", candidates[next_index].name)
+                    launch()
+                    continue
+                for task in done:
+                    provider = running.pop(task)
+                    if task.exception() is None:
+                        current = tracer.current_span()
+                        if current is not None:
+                            current.set_attribute("llm.provider", provider.name)
+                            current.set_attribute("llm.hedged", hedged)
+                        return task.result()
+                    logger.warning("LLM provider %s failed: %s", provider.name, task.exception())
+                    errors.append(f"{provider.name}: {task.exception()}")
+                if not running and next_index < len(candidates):
+                    hedge_at = launch()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        raise RuntimeError("All LLM providers failed: " + "; ".join(errors))
+
+    def generate_blocking(self, prompt):
+        """generate() for synchronous callers, also when they run inside an event loop (e.g. Streamlit's)."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.generate(prompt))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(contextvars.copy_context().run, asyncio.run, self.generate(prompt)).result()
+
+
+def configured_providers():
+    """Names of the providers listed in COPILOT_LLM_PROVIDERS, or of every provider whose settings are present."""
+    listed = os.getenv("COPILOT_LLM_PROVIDERS")
+    if listed:
+        names = [name.strip() for name in listed.split(",") if name.strip()]
+        unknown = [name for name in names if name not in PROVIDER_BACKENDS]
+        if unknown:
+            raise ValueError(f"Unknown LLM providers: {', '.join(unknown)}")
+        return names
+    return [
+        name for name, (_, settings) in PROVIDER_BACKENDS.items()
+        if settings is not None and all(os.getenv(setting) for setting in settings)
+    ]
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """The process-wide router, created from the environment on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            providers = [LLMProvider(name, PROVIDER_BACKENDS[name][0]) for name in configured_providers()]
+            _router = LLMRouter(providers, hedge=os.getenv("COPILOT_LLM_HEDGE") == "1")
+        return _router
@@ -1,59 +1,158 @@
-import requests
-import aiohttp
-from qdrant_client import QdrantClient
-from extract_text import extract_text_from_docx
-from nlp_processing import process_and_store_documents, create_dynamic_prompt
-from qdrant_populate import create_qdrant_collection
-from config import qdrant_config, embedding_model
-from azure_code_generator import generate_code_from_azure_async,generate_code_from_azure
-from sentence_transformers import SentenceTransformer
+from nlp_processing import create_dynamic_prompt, record_time
+from azure_code_generator import generate_code_from_azure,generate_patch_from_azure,stream_code_from_azure
 from aws_code_generator import generate_code_from_aws
-# from code_generators import generate_code
+from stub_code_generator import generate_code_from_stub, generate_patch_from_stub
+from llm_router import get_router
+from document_index import get_document_index
+from rate_limiter import PRIORITY_INTERACTIVE, PRIORITY_REPAIR
+from prefetch import RetrievalPrefetcher
 import os
+import time
+import logging
 from dotenv import load_dotenv
+from telemetry import span, traced
 
 load_dotenv()
 
-def initialize_qdrant_client():
-    """Initialize and return Qdrant client."""
-    return QdrantClient(path=":memory:")
+logger = logging.getLogger(__name__)
 
-async def generate_pipeline(user_prompt, directory_path, provider_flag):
-    try:
-        # Step 1: Process and store documents in Qdrant
-        print(f"Processing and storing documents from directory: {directory_path}")
-        qdrant_client = QdrantClient(path=":memory:")
-        process_and_store_documents(directory_path, qdrant_client)
+@traced("prompt.build")
+def build_generation_prompt(user_prompt, directory_path, metrics=None):
+    """Steps 1-3 of generation: index the best-practice documents and build the prompt for the provider."""
+    # Step 1: The documents are indexed once per process and re-ingested in the background when they change
+    logger.info("Using the document index of: %s", directory_path)
+    index = get_document_index(directory_path, metrics)
+
+    # Step 2: Process user query and get top matches
+    logger.info("Processing user query...")
+
+    # Step 3: Generate dynamic prompt based on the user input and document content
+    logger.info("Generating dynamic prompt...")
+    with index.snapshot() as snapshot:
+        prefetched = retrieval_prefetcher.take(user_prompt, directory_path, snapshot.generation)
+        if prefetched is not None:
+            logger.info("Using the retrieval prefetched while the prompt was typed.")
+            return prefetched
+        return create_dynamic_prompt(user_prompt, index.store, directory_path, metrics, snapshot.collections)
 
-        # Step 2: Process user query and get top matches
-        print("Processing user query...")
-        #top_sentences, keywords = get_top_matches(user_prompt, qdrant_client, directory_path)
+def _retrieve(user_prompt, directory_path):
+    """(index generation, generation prompt) of a request; what the prefetcher runs in the background."""
+    index = get_document_index(directory_path)
+    with index.snapshot() as snapshot:
+        return snapshot.generation, create_dynamic_prompt(user_prompt, index.store, directory_path, None,
+                                                          snapshot.collections)
 
+# Retrieval started by the UI while the user types the request
+retrieval_prefetcher = RetrievalPrefetcher(_retrieve)
 
-        # Step 3: Generate dynamic prompt based on the user input and document content
-        print("Generating dynamic prompt...")
-        final_prompt = create_dynamic_prompt(user_prompt, qdrant_client, directory_path)
+@traced("generate_pipeline")
+async def generate_pipeline(user_prompt, directory_path, provider_flag, metrics=None):
+    """
+    Generate a pipeline for the user's request.
+
+    provider_flag is "Auto" (llm_router picks among the configured providers), "Azure", "AWS" or
+    "Stub" (the offline benchmark stand-in). When `metrics` is a dict it receives the prompt sent to
+    the provider and the seconds spent per stage under "timings". Provider errors are raised, so an
+    error message can never be mistaken for generated code.
+    """
+    try:
+        final_prompt = build_generation_prompt(user_prompt, directory_path, metrics)
+        if metrics is not None:
+            metrics["prompt"] = final_prompt
 
         # Step 4: Send the prompt to Azure or AWS for code generation
-        print("Sending to the provider...")
-        if provider_flag == "Azure":
-            print("Sending to Azure OpenAI...")
-            generated_code = generate_code_from_azure(
+        logger.info("Sending to the provider (%s)...", provider_flag)
+        started = time.perf_counter()
+        with span("llm", provider=provider_flag):
+            if provider_flag == "Auto":
+                generated_code = await get_router().generate(final_prompt)
+            elif provider_flag == "Azure":
+                generated_code = generate_code_from_azure(
+                    os.getenv("AZURE_OPENAI_ENDPOINT"),
+                    os.getenv("AZURE_OPENAI_API_KEY"),
+                    final_prompt,  # No need for truncation
+                    os.getenv("AZURE_OPENAI_API_VERSION"),
+                    os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+                )
+            elif provider_flag == "AWS":
+                generated_code = generate_code_from_aws(final_prompt)
+            elif provider_flag == "Stub":
+                generated_code = generate_code_from_stub(final_prompt)
+            else:
+                raise ValueError("Invalid provider flag")
+        record_time(metrics, "llm", started)
+
+        logger.debug("Generated code:\n%s", generated_code)
+        return generated_code
+
+    except Exception as e:
+        logger.error("Error generating code: %s", e)
+        raise
+
+
+def stream_pipeline(user_prompt, directory_path, provider_flag, metrics=None):
+    """
+    Like generate_pipeline, but yields the completion piece by piece so the UI can show it while it is written.
+    Bedrock, the stub and the router ("Auto") are not streamed and yield the whole completion at once.
+    """
+    final_prompt = build_generation_prompt(user_prompt, directory_path, metrics)
+    if metrics is not None:
+        metrics["prompt"] = final_prompt
+    logger.info("Streaming from the provider (%s)...", provider_flag)
+    if provider_flag == "Azure":
+        # The span covers the whole stream, so it measures the full generation and carries its token usage
+        with span("llm", provider=provider_flag):
+            yield from stream_code_from_azure(
                 os.getenv("AZURE_OPENAI_ENDPOINT"),
                 os.getenv("AZURE_OPENAI_API_KEY"),
-                final_prompt,  # No need for truncation
+                final_prompt,
                 os.getenv("AZURE_OPENAI_API_VERSION"),
                 os.getenv("AZURE_OPENAI_DEPLOYMENT"),
             )
-        elif provider_flag == "AWS":
-            print("Sending to AWS Bedrock...")
-            generated_code = generate_code_from_aws(final_prompt)  # Implement AWS-specific code generator here
-        else:
-            raise ValueError("Invalid provider flag")
+    elif provider_flag == "AWS":
+        with span("llm", provider=provider_flag):
+            generated_code = generate_code_from_aws(final_prompt)
+        yield generated_code
+    elif provider_flag == "Auto":
+        with span("llm", provider=provider_flag):
+            generated_code = get_router().generate_blocking(final_prompt)
+        yield generated_code
+    elif provider_flag == "Stub":
+        with span("llm", provider=provider_flag):
+            generated_code = generate_code_from_stub(final_prompt)
+        yield generated_code
+    else:
+        raise ValueError("Invalid provider flag")
 
-        print(f"Generated Code:\n{generated_code}")
-        return generated_code
 
-    except Exception as e:
-        print(f"Error generating code: {e}")
-        return f"Error: {e}"
+def get_patch_completion(provider_flag, template="repair"):
+    """
+    Return a function (prompt, max_tokens) -> (text, tokens_used) for small patch requests.
+    `template` is "repair" for generated code that failed validation or "edit" for requested changes,
+    which the user waits for and so are not queued behind other requests.
+    """
+    priority = PRIORITY_REPAIR if template == "repair" else PRIORITY_INTERACTIVE
+    if provider_flag == "Auto":
+        provider_flag = get_router().route()[0].name
+    if provider_flag == "Azure":
+        def complete(prompt, max_tokens):
+            return generate_patch_from_azure(
+                os.getenv("AZURE_OPENAI_ENDPOINT"),
+                os.getenv("AZURE_OPENAI_API_KEY"),
+                prompt,
+                os.getenv("AZURE_OPENAI_API_VERSION"),
+                os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+                max_tokens=max_tokens,
+                priority=priority,
+                template=template,
+            )
+        return complete
+    if provider_flag == "AWS":
+        def complete(prompt, max_tokens):
+            return generate_code_from_aws(prompt, max_tokens, priority, template=template), None
+        return complete
+    if provider_flag == "Stub":
+        def complete(prompt, max_tokens):
+            return generate_patch_from_stub(prompt, template), None
+        return complete
+    raise ValueError("Invalid provider flag")
@@ -1,87 +1,183 @@
 import os
-import spacy
-from qdrant_client.models import PointStruct
-from sentence_transformers import SentenceTransformer, util
+import time
+import logging
+from sentence_transformers import SentenceTransformer
 from transformers import pipeline, AutoTokenizer
-from qdrant_populate import create_qdrant_collection
-from extract_text import extract_text_from_docx
-import uuid
-
-# Load pre-trained models
-nlp = spacy.load("en_core_web_sm")
-sentence_model = SentenceTransformer("all-MiniLM-L6-v2")
-summarizer = pipeline("summarization", model="t5-small")
+from extract_text import extract_text_from_docx, extract_sections_from_docx
+from chunking import CHUNKING, chunk_sections
+from segmentation import get_segmenter
+from telemetry import metrics as telemetry_metrics, traced
+from embedding_cache import EMBEDDING_CACHE_PATH, EmbeddingCache
+from summary_cache import SUMMARY_CACHE_PATH, SummaryCache
+from vector_index import as_vector_store
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Retrieval keeps at most RETRIEVAL_TOP_K sentences whose cosine similarity to the request reaches the threshold.
+RETRIEVAL_TOP_K = 50
+# A section chunk holds several sentences, so fewer of them fill the context.
+CHUNK_RETRIEVAL_TOP_K = 8
+SIMILARITY_THRESHOLD = 0.5
+# Tokens of retrieved context per prompt: summaries first, full texts while they fit.
+CONTEXT_TOKENS = int(os.getenv("COPILOT_CONTEXT_TOKENS", "1500"))
+SUMMARIZER_MODEL_NAME = "t5-small"
+# Texts are summarized at ingestion (COPILOT_SUMMARIES=0 turns it off); shorter ones are their own summary.
+SUMMARIES = os.getenv("COPILOT_SUMMARIES", "1") == "1"
+SUMMARY_MIN_TOKENS = 60
+SUMMARY_MAX_TOKENS = 60
+SUMMARY_BATCH_SIZE = 8
+
+# Load pre-trained models; the spaCy segmenter is loaded on first use (segmentation.py)
+sentence_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL_NAME)
+summarizer = pipeline("summarization", model=SUMMARIZER_MODEL_NAME)
+summary_cache = SummaryCache(SUMMARY_CACHE_PATH, SUMMARIZER_MODEL_NAME)
 tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
 
+def record_time(metrics, stage, started):
+    """
+    Observe the time since `started` (a time.perf_counter() value) in the stage latency histogram,
+    and add it to metrics["timings"][stage] when a metrics dict is given.
+    """
+    elapsed = time.perf_counter() - started
+    telemetry_metrics.observe("copilot_stage_seconds", elapsed, stage=stage)
+    if metrics is not None:
+        timings = metrics.setdefault("timings", {})
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
 # Function to process and store documents efficiently
-from qdrant_client.http.models import PointStruct
-import os
-import uuid
+def count_tokens(text):
+    """Tokens of `text` for the embedding model."""
+    return len(tokenizer.tokenize(text))
+
+def segment_sentences(paragraphs, segmenter=None):
+    """The sentences of the paragraphs, in order, split by the segmenter `segmenter` (see segmentation.py)."""
+    return [sentence for sentences in get_segmenter(segmenter).split(paragraphs) for sentence in sentences]
+
+def _summarize_batch(texts):
+    outputs = summarizer(texts, max_length=SUMMARY_MAX_TOKENS, min_length=10, truncation=True,
+                         batch_size=SUMMARY_BATCH_SIZE)
+    return [output["summary_text"].strip() for output in outputs]
+
+def summarize_texts(texts, metrics=None):
+    """Summaries of the texts of at least SUMMARY_MIN_TOKENS tokens (None for the others), made once per text."""
+    started = time.perf_counter()
+    long_texts = [text for text in texts if count_tokens(text) >= SUMMARY_MIN_TOKENS]
+    summaries = dict(zip(long_texts, summary_cache.summarize(long_texts, _summarize_batch))) if long_texts else {}
+    record_time(metrics, "summarize", started)
+    return [summaries.get(text) for text in texts]
+
+def embed_document(file_path, metrics=None, chunking=None, segmenter=None, summarize=None):
+    """
+    Split one .docx into chunks (see chunking.py) or sentences, embed them and summarize the long ones.
+    `chunking` is "section" or "sentence", by default COPILOT_CHUNKING; `segmenter` defaults to
+    COPILOT_SEGMENTER and `summarize` to COPILOT_SUMMARIES.
+
+    Returns:
+        tuple: (texts, vectors, summaries); summaries is None when not summarizing.
+    """
+    logger.info("Processing file: %s", file_path)
 
-def process_and_store_documents(directory_path, qdrant_client):
-    """Extract, process, and store documents in Qdrant."""
+    # Extract and process text
+    started = time.perf_counter()
+    if (chunking or CHUNKING) == "sentence":
+        texts = segment_sentences([extract_text_from_docx(file_path)], segmenter)
+    else:
+        texts = chunk_sections(extract_sections_from_docx(file_path),
+                               lambda paragraphs: segment_sentences(paragraphs, segmenter), count_tokens)
+    record_time(metrics, "ingest", started)
+
+    started = time.perf_counter()
+    misses_before = embedding_cache.misses
+    # Only texts the cache has never seen are encoded
+    vectors = embedding_cache.encode(sentence_model, texts)
+    record_time(metrics, "embed", started)
+    cache_stats = embedding_cache.stats()
+    logger.info("Embedding cache: %d of %d texts encoded; %d vectors (%.1f MB) cached, overall hit rate %.0f%%.",
+                embedding_cache.misses - misses_before, len(texts), cache_stats["vectors"], cache_stats["bytes"] / 1e6,
+                100 * (cache_stats["hit_rate"] or 0))
+    summaries = summarize_texts(texts, metrics) if (SUMMARIES if summarize is None else summarize) else None
+    return texts, vectors, summaries
+
+def store_document(store, collection_name, texts, vectors, metrics=None, summaries=None):
+    """Store embedded texts in a fresh collection of `store` (a vector_index store or a QdrantClient)."""
+    started = time.perf_counter()
+    as_vector_store(store).create(collection_name, texts, vectors, summaries)
+    record_time(metrics, "ingest", started)
+    logger.info("Stored %d texts in %s.", len(texts), collection_name)
+    return len(texts)
+
+def ingest_document(file_path, store, collection_name, metrics=None):
+    """Split one .docx into chunks or sentences and store their embeddings in a fresh collection; returns their count."""
+    texts, vectors, summaries = embed_document(file_path, metrics)
+    return store_document(store, collection_name, texts, vectors, metrics, summaries)
+
+@traced("documents.ingest")
+def process_and_store_documents(directory_path, store, metrics=None):
+    """Extract, process, and store documents in a vector store or Qdrant. Stage timings go to `metrics` when given."""
     for filename in os.listdir(directory_path):
         if filename.endswith(".docx") and not filename.startswith("~$"):
             file_path = os.path.join(directory_path, filename)
-            print(f"Processing file: {file_path}")
-
-            # Extract and process text
-            text = extract_text_from_docx(file_path)
-            doc = nlp(text)
-            
-            points = []
-            for sentence in doc.sents:
-                vector = sentence_model.encode(sentence.text).tolist()
-                points.append(
-                    PointStruct(
-                        id=str(uuid.uuid4()),
-                        vector=vector,
-                        payload={"content": sentence.text}
-                    )
-                )
-            
-            # Store in Qdrant
-            collection_name = os.path.splitext(filename)[0]
-            create_qdrant_collection(
-                qdrant_client, 
-                collection_name, 
-                sentence_model.get_sentence_embedding_dimension(), 
-                "Cosine"
-            )
-            if points:
-                response = qdrant_client.upsert(collection_name=collection_name, points=points)
-            print(type(response))
-            print(f"File {filename} processed and stored in Qdrant.")
+            ingest_document(file_path, store, os.path.splitext(filename)[0], metrics)
 
 
 # Function to generate dynamic prompt based on user input and document content
-def create_dynamic_prompt(user_prompt, qdrant_client, directory_path):
-    """Generate a prompt dynamically based on user input and document content."""
+def select_context(hits, budget):
+    """
+    The passages of `hits` (best first) that fit in `budget` tokens, as [hit, text] pairs.
+
+    Every hit goes in as its summary when it has one; then, best hit first, summaries are
+    replaced by the full text while the budget allows.
+    """
+    selected = []
+    used = 0
+    for hit in hits:
+        text = hit.get("summary") or hit["content"]
+        tokens = count_tokens(text)
+        if used + tokens <= budget:
+            selected.append([hit, text, tokens])
+            used += tokens
+    for entry in selected:
+        hit, text, tokens = entry
+        if text != hit["content"]:
+            full_tokens = count_tokens(hit["content"])
+            if used - tokens + full_tokens <= budget:
+                entry[1:] = [hit["content"], full_tokens]
+                used += full_tokens - tokens
+    return [(hit, text) for hit, text, _ in selected]
+
+@traced("prompt.retrieve")
+def create_dynamic_prompt(user_prompt, store, directory_path, metrics=None, collections=None, top_k=None):
+    """
+    Generate a prompt dynamically based on user input and document content. Stage timings go to `metrics` when given.
+    `store` is a vector_index store or a QdrantClient; `collections` lists the collections to search
+    (a document_index snapshot's), by default one per .docx. At most `top_k` passages are used,
+    by default RETRIEVAL_TOP_K sentences or CHUNK_RETRIEVAL_TOP_K chunks.
+    """
+    started = time.perf_counter()
     user_prompt_embedding = sentence_model.encode(user_prompt).tolist()
     if user_prompt_embedding is None:
         raise ValueError("Failed to generate embedding for user prompt.")
+    record_time(metrics, "embed", started)
 
-    all_points = []
-
-    for filename in os.listdir(directory_path):
-        if filename.endswith(".docx") and not filename.startswith("~$"):
-            collection_name = os.path.splitext(filename)[0]
-            response = qdrant_client.scroll(collection_name=collection_name, scroll_filter=None, limit=100)
-            points = response[0] if response and isinstance(response, tuple) else []
-
-            for point in points:
-                if point.vector is None:
-                    #print(f"Point {point.id} has no vector. Skipping...")
-                    continue
+    started = time.perf_counter()
+    if collections is None:
+        collections = [
+            os.path.splitext(filename)[0] for filename in sorted(os.listdir(directory_path))
+            if filename.endswith(".docx") and not filename.startswith("~$")
+        ]
 
-                point_vector = point.vector
-                similarity = util.cos_sim(user_prompt_embedding, point_vector).item()
-                if similarity > 0.5:  # Similarity threshold
-                    all_points.append(point)
+    if top_k is None:
+        top_k = RETRIEVAL_TOP_K if CHUNKING == "sentence" else CHUNK_RETRIEVAL_TOP_K
+    hits = as_vector_store(store).search(collections, [user_prompt_embedding], top_k, SIMILARITY_THRESHOLD)[0]
+    selected = select_context([hit for hit in hits if hit["content"]], CONTEXT_TOKENS)
+    # Document order, then sentence order: the context stays identical for similar requests, so prompt caching can reuse it
+    order = {collection: number for number, collection in enumerate(collections)}
+    selected.sort(key=lambda entry: (order.get(entry[0]["collection"], len(order)), entry[0]["position"]))
 
     # Create a dynamic prompt from relevant content
-    selected_sentences = [point.payload["content"] for point in all_points if point.payload and "content" in point.payload]
-    final_prompt = "\n".join(selected_sentences) + f"\nUser Prompt: {user_prompt}"
-    
+    final_prompt = "\n".join(text for _, text in selected) + f"\nUser Prompt: {user_prompt}"
+    record_time(metrics, "retrieve", started)
 
     return final_prompt
@@ -0,0 +1,419 @@
+# pipeline_analyzer.py
+
+"""
+Static performance analysis of a parsed Pipeline.
+
+Works on the model produced by PipelineParser: it builds the job graph, estimates how long
+each job takes, finds the critical path and the achievable parallelism, and points out
+common CI slowdowns (serialized independent jobs, missing dependency caches, full clones,
+repeated container builds) together with an estimate of the time each fix would save.
+"""
+
+import re
+
+import yaml
+
+from conversion import (GITLAB_RESERVED_KEYWORDS, gitlab_inherits, gitlab_job_instances, gitlab_resolve_extends,
+                        groovy_stage_blocks, load_ci_yaml)
+from pipelineparser import extract_code_block
+from pipelinetypes import *
+
+# Rough durations in seconds used when no measured timings are supplied.
+STEP_ESTIMATES = {
+    "checkout": 15,
+    "setup": 10,
+    "cache": 5,
+    "install": 60,
+    "build": 120,
+    "container-build": 180,
+    "test": 180,
+    "lint": 45,
+    "scan": 120,
+    "deploy": 90,
+    "other": 20,
+}
+# Time to provision an agent/runner and start a job.
+JOB_STARTUP_SECONDS = 20
+# Share of the dependency download time a warm cache typically saves.
+CACHE_HIT_SAVINGS = 0.7
+# Time a shallow clone saves over a full-history clone of a typical repository.
+SHALLOW_CLONE_SAVINGS = 10
+
+# Checked in order; the first matching category wins.
+STEP_CATEGORIES = [
+    ("cache", re.compile(r"^Cache(Beta)?@\d|^actions/cache(/\w+)?@|\bcache (restore|save)\b", re.I)),
+    ("checkout", re.compile(r"^checkout$|^git (clone|checkout)\b|^git\s+['\"]", re.I)),
+    ("setup", re.compile(r"^actions/setup-|^Use(Node|Python|Dotnet)\w*@\d|Installer@\d", re.I)),
+    ("container-build", re.compile(
+        r"\b(docker|podman) (buildx )?build\b|\bbuildah bud\b|\bkaniko\b|^docker/build-push-action@|^Docker@\d", re.I)),
+    ("scan", re.compile(
+        r"\b(sast|dast|sonar\w*|snyk|trivy|grype|bandit|semgrep|checkmarx|codeql|gitleaks|trufflehog|owasp|"
+        r"dependency-check|zap|anchore|clair|kube-hunter|kube-bench|checkov|tfsec|npm audit|pip-audit|safety check)\b", re.I)),
+    ("test", re.compile(r"\b(test|tests|pytest|jest|mocha|junit|unittest|coverage|mvn verify)\b", re.I)),
+    ("lint", re.compile(
+        r"\b(lint|flake8|ruff|eslint|pylint|prettier|black --check|golangci-lint|terraform validate|fmt -check)\b", re.I)),
+    ("deploy", re.compile(
+        r"\b(deploy|kubectl apply|helm (upgrade|install)|terraform apply|az webapp|sam deploy|kubectl rollout)\b|"
+        r"^(AzureWebApp|AzureRmWebAppDeployment|KubernetesManifest|HelmDeploy|AzureFunctionApp)@\d", re.I)),
+    ("install", re.compile(
+        r"\b(npm (ci|install)|yarn install|pnpm install|pip3? install|poetry install|bundle install|go mod download|"
+        r"dotnet restore|composer install|nuget restore)\b|^(Npm|NuGetCommand|DotNetCoreCLI)@\d", re.I)),
+    ("build", re.compile(r"\b(build|compile|mvn|gradle|make|dotnet build|go build|cargo build|tsc|package)\b", re.I)),
+]
+
+# Dependency managers that download packages on every run unless a cache is restored first.
+DEPENDENCY_MANAGERS = {
+    "npm": (re.compile(r"\bnpm (ci|install)\b|^Npm@\d", re.I), "~/.npm"),
+    "yarn": (re.compile(r"\byarn( install)?\s*$|\byarn install\b", re.I | re.M), "~/.cache/yarn"),
+    "pnpm": (re.compile(r"\bpnpm install\b", re.I), "~/.local/share/pnpm/store"),
+    "pip": (re.compile(r"\b(pip3?|poetry) install\b", re.I), "~/.cache/pip"),
+    "maven": (re.compile(r"\bmvnw?\b|^Maven@\d", re.I), "~/.m2/repository"),
+    "gradle": (re.compile(r"\bgradlew?\b|^Gradle@\d", re.I), "~/.gradle/caches"),
+    "go": (re.compile(r"\bgo (mod download|build|test)\b", re.I), "~/go/pkg/mod"),
+    "nuget": (re.compile(r"\bdotnet (restore|build)\b|\bnuget restore\b|^NuGetCommand@\d", re.I), "~/.nuget/packages"),
+    "bundler": (re.compile(r"\bbundle install\b", re.I), "vendor/bundle"),
+    "composer": (re.compile(r"\bcomposer install\b", re.I), "~/.composer/cache"),
+}
+
+# Verification jobs that only need the sources can start as soon as the code is built.
+RELOCATABLE_CATEGORIES = {"test", "lint", "scan"}
+# Scans that need a running deployment or a built image must keep their position.
+POSITION_BOUND = re.compile(r"\b(dast|zap|kube-hunter|kube-bench|image|container)\b", re.I)
+
+# The jobcacher plugin's `cache(...) { }` wrapper; the parser skips block openers, so it is found in the source.
+_JENKINS_CACHE = re.compile(r"\bcache\s*\(|jobcacher", re.I)
+
+_DOCKER_BUILD_TAG = re.compile(r"\b(?:docker|podman) (?:buildx )?build\b[^\n]*?(?:-t|--tag)[ =](\S+)", re.I)
+
+
+def step_text(step):
+    """All the text that describes what a step does, for keyword matching."""
+    parts = [str(step.task), str(step.name)]
+    for key in ("script", "statement", "inlineScript", "command", "arguments", "goals", "tasks"):
+        if key in step.inputs:
+            parts.append(str(step.inputs[key]))
+    return "\n".join(parts)
+
+
+def classify_step(step):
+    """Return the category (see STEP_ESTIMATES) a step belongs to."""
+    if step.task == CHECKOUT_TASK:
+        return "checkout"
+    text = step_text(step)
+    if re.match(r"^actions/setup-", str(step.task)) and "cache" in step.inputs:
+        return "cache"
+    for category, pattern in STEP_CATEGORIES:
+        if category in ("cache", "checkout", "setup") and not pattern.search(str(step.task)) and step.task != SCRIPT_TASK:
+            continue
+        if pattern.search(text):
+            return category
+    return "other"
+
+
+def classify_job(job, step_categories=None):
+    """A job's category is the category of its most expensive step."""
+    step_categories = step_categories or {}
+    categories = [step_categories.get(id(step)) or classify_step(step) for step in job.steps]
+    if not categories:
+        return "other"
+    meaningful = [category for category in categories if category not in ("checkout", "setup", "cache", "other")]
+    return max(meaningful or categories, key=lambda category: STEP_ESTIMATES[category])
+
+
+def estimate_job_seconds(job, step_categories=None):
+    """Estimated wall-clock time of a job, including agent start-up."""
+    step_categories = step_categories or {}
+    return JOB_STARTUP_SECONDS + sum(
+        STEP_ESTIMATES[step_categories.get(id(step)) or classify_step(step)] for step in job.steps
+    )
+
+
+def _all_jobs(pipeline):
+    return [(stage, job) for stage in pipeline.stages for job in stage.jobs]
+
+
+def job_labels(pipeline):
+    """
+    Name of every job key (see Pipeline.job_dependencies) for reports: the job name, with the stage
+    added when several stages have a job of that name.
+    """
+    keys = list(dict.fromkeys((stage.name, job.name) for stage, job in _all_jobs(pipeline)))
+    shared = {name for _, name in keys if sum(1 for _, other in keys if other == name) > 1}
+    return {(stage, name): f"{name} ({stage})" if name in shared else name for stage, name in keys}
+
+
+def _relaxed_dependencies(pipeline, dependencies, step_categories):
+    """
+    Dependencies if verification jobs that only wait because of stage ordering started right after
+    the most recent stage that produces something (build, package, deploy...).
+    """
+    relaxed = dict(dependencies)
+    moved = {}
+    anchor_jobs = []
+    for stage in pipeline.stages:
+        relocatable = [
+            job for job in stage.jobs
+            if job.depends_on is None
+            and classify_job(job, step_categories) in RELOCATABLE_CATEGORIES
+            and not any(POSITION_BOUND.search(step_text(step)) for step in job.steps)
+            and not POSITION_BOUND.search(job.name)
+        ]
+        if stage.jobs and len(relocatable) == len(stage.jobs):
+            for job in relocatable:
+                key = (stage.name, job.name)
+                if set(anchor_jobs) != set(dependencies[key]):
+                    relaxed[key] = list(anchor_jobs)
+                    moved[key] = stage.name
+        elif stage.jobs:
+            anchor_jobs = [(stage.name, job.name) for job in stage.jobs]
+    return relaxed, moved
+
+
+def _longest_path(pipeline, dependencies, durations):
+    finish = {}
+    for key in pipeline.topological_order(dependencies):
+        finish[key] = max((finish[predecessor] for predecessor in dependencies[key]), default=0) + durations[key]
+    return max(finish.values(), default=0)
+
+
+def _finding(rule, message, jobs, savings):
+    return {"rule": rule, "message": message, "jobs": jobs, "estimated_savings_seconds": round(savings)}
+
+
+def _find_serialized_jobs(pipeline, dependencies, durations, critical_seconds, step_categories, labels):
+    relaxed, moved = _relaxed_dependencies(pipeline, dependencies, step_categories)
+    if not moved:
+        return []
+    savings = critical_seconds - _longest_path(pipeline, relaxed, durations)
+    stages = list(dict.fromkeys(moved.values()))
+    message = (
+        f"Verification stage(s) {', '.join(repr(stage) for stage in stages)} wait for the stage before them; "
+        "let their jobs depend on the build instead so they run in parallel."
+    )
+    return [_finding("serialized-jobs", message, [labels[key] for key in moved], savings)]
+
+
+def _gitlab_cached_jobs(code):
+    """GitLab jobs with a `cache:` of their own, from an `extends` parent or from `default:`."""
+    config = load_ci_yaml(code)
+    if not isinstance(config, dict):
+        return set()
+    # A top-level `cache:` is the deprecated spelling of `default: cache:`.
+    default_cache = (config.get("default") or {}).get("cache", config.get("cache"))
+    cached = set()
+    resolved = {}
+    for name, job in config.items():
+        if name in GITLAB_RESERVED_KEYWORDS or str(name).startswith(".") or not isinstance(job, dict):
+            continue
+        job = gitlab_resolve_extends(name, config, resolved)
+        cache = job["cache"] if "cache" in job else default_cache if gitlab_inherits(job, "cache") else None
+        if cache:  # `cache: []` turns an inherited cache off
+            cached.update(gitlab_job_instances(str(name), job))
+    return cached
+
+
+def _jenkins_cached_jobs(pipeline, code):
+    """Jenkins jobs whose stage uses jobcacher, or every job when it wraps the stages themselves."""
+    blocks = groovy_stage_blocks(code)
+    outside = code
+    for _, body in blocks:
+        outside = outside.replace(body, "", 1)
+    if _JENKINS_CACHE.search(outside):
+        return {(stage.name, job.name) for stage, job in _all_jobs(pipeline)}
+    cached = set()
+    for stage_name, body in blocks:
+        for job_name, job_body in groovy_stage_blocks(body) or [(stage_name, body)]:
+            if _JENKINS_CACHE.search(job_body):
+                cached.add((stage_name, job_name))
+    return cached
+
+
+def _cached_jobs(pipeline, raw_code):
+    """
+    Keys of the jobs whose dependency cache is set up outside their steps, which the model does
+    not keep: GitLab `cache:` and the Jenkins jobcacher plugin. Cache steps (Cache@2, actions/cache)
+    are found in the steps themselves.
+
+    Raises ValueError or yaml.YAMLError when the source cannot be read (e.g. a job extends a job
+    from an include that is not part of `raw_code`).
+    """
+    if not raw_code:
+        return set()
+    if isinstance(pipeline, GitLabPipeline):
+        names = _gitlab_cached_jobs(extract_code_block(raw_code, ("yaml", "yml")))
+        return {(stage.name, job.name) for stage, job in _all_jobs(pipeline) if job.name in names}
+    if isinstance(pipeline, JenkinsPipeline):
+        return _jenkins_cached_jobs(pipeline, extract_code_block(raw_code, ("groovy", "jenkinsfile", "Jenkinsfile"))
+                                    or raw_code)
+    return set()
+
+
+def _find_missing_caches(pipeline, raw_code, step_categories, labels, warnings):
+    try:
+        cached_jobs = _cached_jobs(pipeline, raw_code)
+    except (ValueError, yaml.YAMLError) as e:
+        # Without the cache settings every job would look uncached, so the rule is skipped
+        warnings.append(f"Dependency caches were not checked: {e}")
+        return []
+
+    findings = []
+    for stage, job in _all_jobs(pipeline):
+        # Each job restores its own cache, so a cache in one job does not help another
+        label = labels[(stage.name, job.name)]
+        if (stage.name, job.name) in cached_jobs or any(step_categories[id(step)] == "cache" for step in job.steps):
+            continue
+        job_text = "\n".join(step_text(step) for step in job.steps)
+        managers = [
+            (manager, path)
+            for manager, (pattern, path) in DEPENDENCY_MANAGERS.items()
+            if pattern.search(job_text)
+        ]
+        if not managers:
+            continue
+        names = ", ".join(manager for manager, _ in managers)
+        paths = ", ".join(path for _, path in managers)
+        task = {
+            AzureDevOpsPipeline: "a Cache@2 task",
+            GitHubActionsPipeline: "actions/cache (or the cache input of actions/setup-*)",
+            GitLabPipeline: "a `cache:` section",
+            JenkinsPipeline: "the jobcacher plugin or a persistent agent volume",
+        }.get(type(pipeline), "a dependency cache")
+        message = f"Job '{label}' downloads {names} dependencies on every run; restore {paths} with {task}."
+        findings.append(_finding("missing-dependency-cache", message, [label], STEP_ESTIMATES["install"] * CACHE_HIT_SAVINGS * len(managers)))
+    return findings
+
+
+def _is_full_clone(pipeline, step, raw_code):
+    if isinstance(pipeline, GitHubActionsPipeline):
+        return str(step.inputs.get("fetch-depth", 1)) == "0"  # actions/checkout is shallow by default
+    if isinstance(pipeline, AzureDevOpsPipeline):
+        return str(step.inputs.get("fetchDepth", "0")) == "0" and not (raw_code and "fetchDepth" in raw_code)
+    if isinstance(pipeline, JenkinsPipeline):
+        return not (raw_code and re.search(r"shallow\s*:\s*true", raw_code))
+    return False
+
+
+def _find_full_clones(pipeline, raw_code, step_categories, labels):
+    findings = []
+    if isinstance(pipeline, GitLabPipeline):
+        if raw_code and re.search(r"GIT_DEPTH\s*:\s*['\"]?0\b", raw_code):
+            jobs = list(labels.values())
+            message = "GIT_DEPTH is 0, so every job clones the full history; use a small depth such as 20."
+            findings.append(_finding("full-clone", message, jobs, SHALLOW_CLONE_SAVINGS * len(jobs)))
+        return findings
+
+    hint = {
+        AzureDevOpsPipeline: "set `fetchDepth: 1` on the checkout step",
+        GitHubActionsPipeline: "drop `fetch-depth: 0` unless the job needs the full history",
+        JenkinsPipeline: "use a CloneOption with `shallow: true, depth: 1`",
+    }.get(type(pipeline))
+    for stage, job in _all_jobs(pipeline):
+        for step in job.steps:
+            if step_categories[id(step)] == "checkout" and hint and _is_full_clone(pipeline, step, raw_code):
+                label = labels[(stage.name, job.name)]
+                message = f"Job '{label}' clones the full repository history; {hint}."
+                findings.append(_finding("full-clone", message, [label], SHALLOW_CLONE_SAVINGS))
+    return findings
+
+
+def _container_image(step):
+    """Best-effort name of the image a container build step produces."""
+    match = _DOCKER_BUILD_TAG.search(step_text(step))
+    if match:
+        image = match.group(1).strip("'\"")
+    else:
+        image = str(step.inputs.get("repository") or step.inputs.get("tags") or step.inputs.get("context") or
+                    step.inputs.get("Dockerfile") or ".")
+    # Different tags of the same repository are still the same build.
+    return re.sub(r":[^/:]*$", "", image.strip().splitlines()[0] if image.strip() else ".")
+
+
+def _find_redundant_container_builds(pipeline, step_categories, labels):
+    builds = {}
+    for stage, job in _all_jobs(pipeline):
+        for step in job.steps:
+            if step_categories[id(step)] != "container-build":
+                continue
+            if step.task.startswith("Docker@") and str(step.inputs.get("command", "buildAndPush")) not in ("build", "buildAndPush"):
+                continue
+            builds.setdefault(_container_image(step), []).append(labels[(stage.name, job.name)])
+
+    findings = []
+    for image, jobs in builds.items():
+        if len(jobs) > 1:
+            message = (
+                f"Image '{image}' is built {len(jobs)} times (in {', '.join(dict.fromkeys(jobs))}); build it once, "
+                "push it with a unique tag and reuse it in later jobs."
+            )
+            findings.append(_finding("redundant-container-build", message, list(dict.fromkeys(jobs)),
+                                     STEP_ESTIMATES["container-build"] * (len(jobs) - 1)))
+    return findings
+
+
+def analyze_pipeline(pipeline, raw_code=None, durations=None):
+    """
+    Analyze the performance characteristics of a parsed pipeline.
+
+    Args:
+        pipeline: A Pipeline produced by PipelineParser.
+        raw_code: Optional source of the pipeline, used for settings the model does not keep
+            (e.g. GitLab `cache:` or GIT_DEPTH).
+        durations: Optional dictionary of job name to measured seconds; estimates are used otherwise.
+            Jobs whose name several stages share are named "job (stage)", as in the report.
+
+    Returns:
+        dict: Critical path, parallelism and a list of findings with estimated savings in seconds.
+        Jobs are named as in `durations`. `warnings` lists the rules that could not be checked.
+    """
+    if not isinstance(pipeline, Pipeline):
+        raise ValueError("Expected a parsed Pipeline object.")
+
+    step_categories = {id(step): classify_step(step) for _, job in _all_jobs(pipeline) for step in job.steps}
+    labels = job_labels(pipeline)
+    dependencies = pipeline.job_dependencies()
+    job_seconds = {(stage.name, job.name): estimate_job_seconds(job, step_categories) for stage, job in _all_jobs(pipeline)}
+    if durations:
+        job_seconds.update({key: durations[label] for key, label in labels.items() if label in durations})
+
+    critical_path, critical_seconds = pipeline.critical_path(job_seconds)
+    levels = pipeline.execution_levels()
+
+    warnings = []
+    findings = (
+        _find_serialized_jobs(pipeline, dependencies, job_seconds, critical_seconds, step_categories, labels)
+        + _find_missing_caches(pipeline, raw_code, step_categories, labels, warnings)
+        + _find_full_clones(pipeline, raw_code, step_categories, labels)
+        + _find_redundant_container_builds(pipeline, step_categories, labels)
+    )
+    findings.sort(key=lambda finding: finding["estimated_savings_seconds"], reverse=True)
+
+    return {
+        "dependencies": {labels[key]: [labels[predecessor] for predecessor in predecessors]
+                         for key, predecessors in dependencies.items()},
+        "job_seconds": {labels[key]: seconds for key, seconds in job_seconds.items()},
+        "critical_path": [labels[key] for key in critical_path],
+        "critical_path_seconds": critical_seconds,
+        "total_job_seconds": sum(job_seconds.values()),
+        "execution_levels": [[labels[key] for key in level] for level in levels],
+        "max_parallelism": max((len(level) for level in levels), default=0),
+        "findings": findings,
+        "estimated_savings_seconds": sum(finding["estimated_savings_seconds"] for finding in findings),
+        "warnings": warnings,
+    }
+
+
+def format_analysis_report(report):
+    """Render an analysis report as Markdown for the UI."""
+    lines = [
+        f"**Critical path:** {' → '.join(report['critical_path']) or 'n/a'} "
+        f"(~{report['critical_path_seconds'] // 60} min {report['critical_path_seconds'] % 60} s)",
+        f"**Total job time:** ~{report['total_job_seconds'] // 60} min, "
+        f"**maximum parallelism:** {report['max_parallelism']} jobs",
+    ]
+    if not report["findings"]:
+        lines.append("No performance issues found.")
+    for finding in report["findings"]:
+        lines.append(f"- {finding['message']} _(saves ~{finding['estimated_savings_seconds']} s)_")
+    for warning in report.get("warnings", []):
+        lines.append(f"- _{warning}_")
+    return "\n\n".join(lines[:2]) + "\n\n" + "\n".join(lines[2:])
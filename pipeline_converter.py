@@ -0,0 +1,145 @@
+# pipeline_converter.py
+
+"""
+Deterministic conversion of pipelines between CI/CD platforms.
+
+Source code is parsed into the Pipeline model with PipelineParser and re-emitted with the
+target platform's `to_raw_code()`, so porting a pipeline needs no LLM call. Content the
+target platform cannot express, and settings of the source the model does not hold (e.g.
+triggers or runners), are reported as warnings instead of being silently dropped.
+"""
+
+import copy
+import json
+
+from conversion import unmodelled_settings
+from pipelineparser import PipelineParser
+from pipelinetypes import *
+
+SUPPORTED_PIPELINE_TYPES = tuple(PIPELINE_TYPE_CLASSES)
+
+# Platforms that clone the repository on their own, so a missing checkout step is not a loss.
+IMPLICIT_CHECKOUT_TYPES = {"gitlab-ci", "codepipeline"}
+
+
+def parse_pipeline(pipeline_code, pipeline_type):
+    """
+    Parse pipeline source into its Pipeline model.
+
+    Raises:
+        ValueError: If the type is unsupported or the code cannot be parsed.
+    """
+    return _parse(pipeline_code, pipeline_type)[0]
+
+
+def _parse(pipeline_code, pipeline_type):
+    """(pipeline, messages about the source settings the model does not hold)"""
+    if pipeline_type not in PIPELINE_TYPE_CLASSES:
+        raise ValueError(f"Unsupported pipeline type: {pipeline_type}")
+
+    parser = PipelineParser(pipeline_code, pipeline_type)
+    pipeline = parser.parse_pipeline_code()
+    if not isinstance(pipeline, Pipeline):
+        raise ValueError(f"Could not parse the {pipeline_type} pipeline.")
+    return pipeline, unmodelled_settings(parser.config, pipeline_type)
+
+
+def convert_pipeline(pipeline, target_type):
+    """Return a copy of the pipeline as an instance of the target platform's Pipeline subclass."""
+    if target_type not in PIPELINE_TYPE_CLASSES:
+        raise ValueError(f"Unsupported pipeline type: {target_type}")
+
+    target = PIPELINE_TYPE_CLASSES[target_type]()
+    target.stages = copy.deepcopy(pipeline.stages)
+    return target
+
+
+def convert_pipeline_code(pipeline_code, source_type, target_type):
+    """
+    Translate pipeline source from one platform to another.
+
+    Returns:
+        tuple: (converted_code, warnings) where warnings lists the source settings that are not
+        converted and the content the target cannot express.
+    """
+    pipeline, unmodelled = _parse(pipeline_code, source_type)
+    target = convert_pipeline(pipeline, target_type)
+    converted_code = target.to_raw_code()
+    return converted_code, unmodelled + list(target.warnings)
+
+
+def pipeline_signature(pipeline, skip_checkout=False):
+    """
+    Describe the work a pipeline performs as a list of (job name, steps) in execution order.
+
+    Steps are compared by task, inputs and condition; display names are cosmetic and some
+    platforms (e.g. GitLab script lines) cannot carry them.
+    """
+    signature = []
+    for stage in pipeline.stages:
+        for job in stage.jobs:
+            steps = [
+                (step.task, json.dumps(step.inputs, sort_keys=True, default=str), step.condition)
+                for step in job.steps
+                if not (skip_checkout and step.task == CHECKOUT_TASK)
+            ]
+            signature.append((job.name, steps))
+    return signature
+
+
+def compare_pipelines(expected, actual, skip_checkout=False):
+    """Return human readable differences between the work of two pipelines (empty when equivalent)."""
+    expected_jobs = pipeline_signature(expected, skip_checkout)
+    actual_jobs = pipeline_signature(actual, skip_checkout)
+    differences = []
+
+    if len(expected_jobs) != len(actual_jobs):
+        differences.append(f"Expected {len(expected_jobs)} jobs, found {len(actual_jobs)}.")
+
+    for (expected_name, expected_steps), (actual_name, actual_steps) in zip(expected_jobs, actual_jobs):
+        if expected_name != actual_name:
+            differences.append(f"Job '{expected_name}' became '{actual_name}'.")
+        if expected_steps == actual_steps:
+            continue
+        missing = [step for step in expected_steps if step not in actual_steps]
+        added = [step for step in actual_steps if step not in expected_steps]
+        for task, inputs, _ in missing:
+            differences.append(f"Job '{expected_name}' lost step {task} {inputs}.")
+        for task, inputs, _ in added:
+            differences.append(f"Job '{expected_name}' gained step {task} {inputs}.")
+        if not missing and not added:
+            differences.append(f"Job '{expected_name}' has its steps reordered or conditions changed.")
+
+    return differences
+
+
+def verify_round_trip(pipeline_code, source_type, target_type):
+    """
+    Convert source -> target -> source and check that every job still performs the same steps.
+
+    Returns:
+        tuple: (is_lossless, differences, warnings); a conversion the target platform cannot emit
+        is reported as a difference. The round trip is only lossless without warnings too, as
+        they name settings the signature does not compare (e.g. `runs-on` or GitLab `rules`).
+
+    Raises:
+        ValueError: If the source pipeline cannot be parsed.
+    """
+    original = parse_pipeline(pipeline_code, source_type)
+    # A platform that cannot express what is left of the pipeline makes the round trip lossy, not invalid.
+    try:
+        target_code, warnings = convert_pipeline_code(pipeline_code, source_type, target_type)
+    except ValueError as e:
+        return False, [f"Conversion to {target_type} failed: {e}"], []
+    try:
+        # Settings the target emitter writes by itself (its runner, its triggers) are not the source's
+        back = convert_pipeline(parse_pipeline(target_code, target_type), source_type)
+        source_code = back.to_raw_code()
+        round_tripped = parse_pipeline(source_code, source_type)
+    except ValueError as e:
+        return False, [f"Conversion back to {source_type} failed: {e}"], warnings
+
+    skip_checkout = target_type in IMPLICIT_CHECKOUT_TYPES or source_type in IMPLICIT_CHECKOUT_TYPES
+    differences = compare_pipelines(original, round_tripped, skip_checkout)
+    warnings += back.warnings
+    return not differences and not warnings, differences, warnings
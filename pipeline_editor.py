@@ -0,0 +1,672 @@
+# pipeline_editor.py
+
+"""
+Edit-in-place of existing pipelines.
+
+Instead of regenerating a whole pipeline to change part of it, the pipeline is parsed into the
+Pipeline model with PipelineParser, the LLM is shown a compact outline of its stages, jobs and
+steps and asked only for a structural patch, and the patch is applied to the model and then
+written into the pipeline code:
+
+    result = edit_pipeline(pipeline_code, "azure-pipelines", "Add a Trivy scan after the build", complete)
+    result["code"]   # the edited pipeline
+
+A patch is a JSON object with a list of operations:
+
+    {"operations": [
+        {"op": "add_step", "stage": "Build", "job": "Build", "after": "Build image",
+         "step": {"name": "Scan image", "script": "trivy image app:latest"}}
+    ]}
+
+so the completion, and with it the latency, grows with the size of the change rather than the
+size of the pipeline.
+
+Changed steps are spliced into the original code: only the lines of the steps that were added,
+changed or removed are rewritten, in the platform's syntax, and everything else (triggers,
+conditions, ids, comments) stays as it was. Other changes (stages and jobs) re-emit the whole
+pipeline with the platform's `to_raw_code()`, which is only done when re-emitting the unedited
+pipeline gives it back unchanged; otherwise the LLM is asked for step operations only.
+"""
+
+import copy
+import json
+import logging
+
+import yaml
+from ruamel.yaml.error import YAMLError
+
+from conversion import (GITLAB_RESERVED_KEYWORDS, gitlab_inherits, groovy_stage_spans, groovy_step_spans,
+                        load_ci_yaml)
+from pipeline_converter import convert_pipeline, parse_pipeline
+from pipeline_repair import (CODE_BLOCK_LANGUAGES, _indent, _item_line, _key_line, _load_positioned, estimate_tokens,
+                             extract_patch, validate_pipeline_code)
+from pipelineparser import find_code_block
+from pipelinetypes import *
+
+logger = logging.getLogger(__name__)
+
+# A patch request is retried once with the error when its patch cannot be applied.
+MAX_EDIT_ATTEMPTS = 2
+EDIT_MAX_TOKENS = 800
+EDIT_TOKEN_BUDGET = 6000
+# Longer input values are cut in the outline; the model only needs to recognise them.
+OUTLINE_VALUE_CHARS = 80
+EDIT_OPERATIONS = ("add_stage", "remove_stage", "add_job", "update_job", "remove_job",
+                   "add_step", "update_step", "remove_step")
+STEP_OPERATIONS = ("add_step", "update_step", "remove_step")
+JENKINS_TYPES = ("jenkinsfile-scripted", "jenkinsfile-declarative")
+# Step keys the model holds; the others (env, timeouts, ids, ...) are kept when a step is changed.
+MODELLED_STEP_KEYS = {
+    "azure-pipelines": {"script", "bash", "pwsh", "powershell", "checkout", "task", "template", "inputs",
+                        "displayName", "condition"},
+    "github-actions": {"name", "run", "uses", "with", "if"},
+}
+
+
+def _short(value):
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    text = " ".join(text.split())
+    return text if len(text) <= OUTLINE_VALUE_CHARS else text[:OUTLINE_VALUE_CHARS - 3] + "..."
+
+
+def describe_pipeline(pipeline):
+    """A compact outline of the stages, jobs and steps of a pipeline for the patch prompt."""
+    lines = []
+    for stage in pipeline.stages:
+        lines.append(f"Stage {json.dumps(stage.name)}")
+        for job in stage.jobs:
+            depends_on = f" (depends on {', '.join(json.dumps(name) for name in job.depends_on)})" \
+                if job.depends_on else ""
+            lines.append(f"  Job {json.dumps(job.name)}{depends_on}")
+            for step in job.steps:
+                inputs = ", ".join(f"{key}={_short(value)}" for key, value in step.inputs.items())
+                condition = f" if {_short(step.condition)}" if step.condition else ""
+                lines.append(f"    Step {json.dumps(step.name)}: {step.task}{condition}"
+                             + (f" [{inputs}]" if inputs else ""))
+    return "\n".join(lines)
+
+
+def build_edit_prompt(pipeline_type, pipeline, request, error=None, losses=None):
+    """
+    Prompt asking for a patch of `pipeline` that makes the requested change; `losses` are the
+    settings re-emitting the pipeline would lose, which limit the patch to step operations.
+    """
+    prompt = (
+        f"Current {pipeline_type} pipeline:\n{describe_pipeline(pipeline)}\n\n"
+        f"Requested change: {request}"
+    )
+    if losses:
+        prompt += (f"\n\nWriting out the whole pipeline again would change its {_listing(losses)}, so only the "
+                   f"steps of existing jobs can be changed: use only {_listing(STEP_OPERATIONS)}.")
+    if error:
+        prompt += f"\n\nYour previous patch could not be applied: {error}\nReply with a corrected patch."
+    return prompt
+
+
+def parse_patch(response):
+    """
+    The operations of a patch response.
+
+    Raises:
+        ValueError: If the response holds no JSON patch.
+    """
+    text = "\n".join(extract_patch(response or ""))
+    try:
+        patch = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"The patch is not valid JSON: {e.msg}")
+    operations = patch.get("operations") if isinstance(patch, dict) else patch
+    if not isinstance(operations, list) or not all(isinstance(operation, dict) for operation in operations):
+        raise ValueError('The patch must be an object with a list of "operations".')
+    return operations
+
+
+def _step(spec):
+    """A PipelineStep from a patch step: {"name", "script"} or {"name", "task", "inputs", "condition"}."""
+    if not isinstance(spec, dict):
+        raise ValueError(f"A step must be an object, not {spec!r}.")
+    if "script" in spec:
+        return script_step(spec["script"], spec.get("name"), spec.get("condition"))
+    if not spec.get("task"):
+        raise ValueError(f"Step {json.dumps(spec)} needs a `script` or a `task`.")
+    inputs = spec.get("inputs") or {}
+    return PipelineStep(spec.get("name") or default_step_name(spec["task"], inputs), spec["task"], inputs,
+                        spec.get("condition"))
+
+
+def _job(name, depends_on, steps):
+    if not name:
+        raise ValueError("A new job needs a name.")
+    job = PipelineJob(name, depends_on)
+    for spec in steps or []:
+        job.add_step(_step(spec))
+    return job
+
+
+def _index(items, name, kind):
+    for index, item in enumerate(items):
+        if item.name == name:
+            return index
+    raise ValueError(f"There is no {kind} named {json.dumps(name)}.")
+
+
+def _find_job(pipeline, stage_name, job_name):
+    """The (stage, job index) of a job; the stage may be omitted when the job name is unique."""
+    if stage_name is not None:
+        stage = pipeline.stages[_index(pipeline.stages, stage_name, "stage")]
+        return stage, _index(stage.jobs, job_name, f"job in stage {json.dumps(stage_name)}")
+    matches = [(stage, index) for stage in pipeline.stages for index, job in enumerate(stage.jobs) if job.name == job_name]
+    if len(matches) != 1:
+        raise ValueError(f"There is {'no' if not matches else 'more than one'} job named {json.dumps(job_name)}; "
+                         "give its stage.")
+    return matches[0]
+
+
+def _position(items, operation, kind):
+    """Insertion index for an operation's "after" or "before" item name; the end by default."""
+    if operation.get("before") is not None:
+        return _index(items, operation["before"], kind)
+    if operation.get("after") is not None:
+        return _index(items, operation["after"], kind) + 1
+    return len(items)
+
+
+def apply_operation(pipeline, operation):
+    """
+    Apply one patch operation to a pipeline in place.
+
+    Raises:
+        ValueError: If the operation is unknown or refers to a missing stage, job or step.
+    """
+    op = operation.get("op")
+    if op == "add_stage":
+        if not operation.get("stage"):
+            raise ValueError("add_stage needs a `stage` name.")
+        stage = PipelineStage(operation["stage"])
+        for spec in operation.get("jobs") or []:
+            if not isinstance(spec, dict):
+                raise ValueError(f"A job must be an object, not {spec!r}.")
+            stage.add_job(_job(spec.get("job"), spec.get("depends_on"), spec.get("steps")))
+        pipeline.stages.insert(_position(pipeline.stages, operation, "stage"), stage)
+    elif op == "remove_stage":
+        del pipeline.stages[_index(pipeline.stages, operation.get("stage"), "stage")]
+    elif op == "add_job":
+        stage = pipeline.stages[_index(pipeline.stages, operation.get("stage"), "stage")]
+        job = _job(operation.get("job"), operation.get("depends_on"), operation.get("steps"))
+        stage.jobs.insert(_position(stage.jobs, operation, "job"), job)
+    elif op in ("update_job", "remove_job"):
+        stage, index = _find_job(pipeline, operation.get("stage"), operation.get("job"))
+        if op == "remove_job":
+            del stage.jobs[index]
+        else:
+            changes = operation.get("set") or {}
+            if "name" in changes:
+                stage.jobs[index].name = changes["name"]
+            if "depends_on" in changes:
+                stage.jobs[index].depends_on = changes["depends_on"] or None
+    elif op in ("add_step", "update_step", "remove_step"):
+        stage, index = _find_job(pipeline, operation.get("stage"), operation.get("job"))
+        steps = stage.jobs[index].steps
+        kind = f"step in job {json.dumps(stage.jobs[index].name)}"
+        if op == "add_step":
+            steps.insert(_position(steps, operation, kind), _step(operation.get("step")))
+        elif op == "remove_step":
+            del steps[_index(steps, operation.get("step"), kind)]
+        else:
+            step = steps[_index(steps, operation.get("step"), kind)]
+            changes = operation.get("set") or {}
+            # A name derived from the script or task follows it
+            derived = "name" not in changes and step.name == default_step_name(step.task, step.inputs)
+            if "script" in changes:
+                step.task = SCRIPT_TASK
+                step.inputs = {"script": changes["script"]}
+            if "task" in changes:
+                step.task = changes["task"]
+            if "inputs" in changes:
+                step.inputs = changes["inputs"] or {}
+            if "condition" in changes:
+                step.condition = changes["condition"]
+            if "name" in changes:
+                step.name = changes["name"]
+            elif derived:
+                step.name = default_step_name(step.task, step.inputs)
+    else:
+        raise ValueError(f"Unknown operation {json.dumps(op)}; use one of {', '.join(EDIT_OPERATIONS)}.")
+
+
+def apply_patch(pipeline, operations, copies=None):
+    """
+    Return a copy of the pipeline with every operation applied; the pipeline itself is left unchanged.
+    `copies`, when given, is filled with id(stage, job or step of the pipeline) -> its copy.
+    """
+    patched = copy.deepcopy(pipeline, copies)
+    for number, operation in enumerate(operations, 1):
+        try:
+            apply_operation(patched, operation)
+        except ValueError as e:
+            raise ValueError(f"Operation {number} ({operation.get('op')}): {e}")
+    return patched
+
+
+def _has_comments(node):
+    """Whether YAML loaded in round-trip mode has comments (blank lines are kept as comment tokens too)."""
+    def tokens(value):
+        if isinstance(value, list):
+            return [token for item in value for token in tokens(item)]
+        return [value] if value is not None else []
+
+    comments = getattr(node, "ca", None)
+    if comments is not None:
+        attached = [comments.comment, getattr(comments, "end", None), *comments.items.values()]
+        if any("#" in token.value for token in tokens(attached)):
+            return True
+    if isinstance(node, dict):
+        return any(_has_comments(value) for value in node.values())
+    if isinstance(node, list):
+        return any(_has_comments(item) for item in node)
+    return False
+
+
+def _listing(items):
+    return ", ".join(items[:-1]) + " and " + items[-1] if len(items) > 1 else "".join(items)
+
+
+def round_trip_losses(code, pipeline, pipeline_type):
+    """
+    What re-emitting the unedited pipeline from its model would change: the top-level settings
+    that come out different, comments, or Groovy around the steps. Empty when the model holds the
+    whole pipeline.
+    """
+    try:
+        emitted = convert_pipeline(pipeline, pipeline_type).to_raw_code()
+    except ValueError:
+        return ["content"]
+    if pipeline_type in JENKINS_TYPES:
+        return [] if code.split() == emitted.split() else ["Groovy around the steps"]
+    try:
+        before, after = load_ci_yaml(code), load_ci_yaml(emitted)
+        commented = _has_comments(_load_positioned(code))
+    except (yaml.YAMLError, YAMLError):
+        return ["content"]
+    if isinstance(before, dict) and isinstance(after, dict):
+        losses = [f"`{key}`" for key in dict.fromkeys([*before, *after]) if before.get(key) != after.get(key)]
+    else:
+        losses = [] if before == after else ["layout"]
+    return losses + (["comments"] if commented else [])
+
+
+def _block_end(lines, start, column):
+    """End of the block starting on lines[start]: the lines indented beyond `column`, without trailing blank lines."""
+    end = start + 1
+    while end < len(lines) and (not lines[end].strip() or _indent(lines[end]) > column):
+        end += 1
+    while end > start + 1 and not lines[end - 1].strip():
+        end -= 1
+    return end
+
+
+def _yaml_step_regions(lines, sequence, owner_line):
+    """
+    (start, end) lines of every item of a block list of steps written below `owner_line`, or None
+    when the list is not written one block per item (flow style, an alias, empty, ...).
+    """
+    if owner_line is None or not isinstance(sequence, list) or not sequence:
+        return None
+    regions = []
+    for index, item in enumerate(sequence):
+        line = _item_line(sequence, index)
+        if line is None or line < (regions[-1][1] if regions else owner_line + 1):
+            return None
+        if not lines[line].lstrip().startswith("-") or _indent(lines[line]) != _indent(lines[regions[0][0] if regions else line]):
+            return None
+        if isinstance(item, dict) and item.fa.flow_style():
+            return None
+        regions.append((line, _block_end(lines, line, _indent(lines[line]))))
+    return regions
+
+
+def _azure_step_lists(data, lines, pipeline):
+    stages = data.get("stages")
+    if stages is None and "jobs" in data:
+        stages = [{"jobs": data["jobs"]}]
+    elif stages is None and "steps" in data:
+        stages = [{"jobs": [data]}]  # The top level is the only job
+    stages = [stage for stage in stages or [] if isinstance(stage, dict)]
+    if len(stages) != len(pipeline.stages):
+        return {}
+    located = {}
+    for stage, stage_obj in zip(stages, pipeline.stages):
+        jobs = stage.get("jobs") or []
+        if not isinstance(jobs, list) or len(jobs) != len(stage_obj.jobs):
+            continue
+        for job, job_obj in zip(jobs, stage_obj.jobs):
+            steps = job.get("steps") if isinstance(job, dict) else None  # Deployment jobs keep theirs in hooks
+            if isinstance(steps, list) and len(steps) == len(job_obj.steps) and all(isinstance(step, dict) for step in steps):
+                located[id(job_obj)] = (steps, _yaml_step_regions(lines, steps, _key_line(job, "steps")))
+    return located
+
+
+def _github_step_lists(data, lines, pipeline):
+    jobs = data.get("jobs")
+    if not isinstance(jobs, dict) or len(jobs) != len(pipeline.stages):
+        return {}
+    located = {}
+    for job, stage_obj in zip(jobs.values(), pipeline.stages):
+        if not isinstance(job, dict) or len(stage_obj.jobs) != 1:
+            continue  # Matrix combinations share one list of steps
+        steps = job.get("steps")
+        if isinstance(steps, list) and len(steps) == len(stage_obj.jobs[0].steps) and all(isinstance(step, dict) for step in steps):
+            located[id(stage_obj.jobs[0])] = (steps, _yaml_step_regions(lines, steps, _key_line(job, "steps")))
+    return located
+
+
+def _gitlab_step_lists(data, lines, pipeline):
+    if "include" in data:
+        return {}  # Included files may redefine the jobs
+    defaults = data.get("default") or {}
+    jobs = {}
+    for stage in pipeline.stages:
+        for job in stage.jobs:
+            jobs.setdefault(job.name, []).append(job)
+    located = {}
+    for name, job in data.items():
+        if name in GITLAB_RESERVED_KEYWORDS or str(name).startswith(".") or not isinstance(job, dict):
+            continue
+        # Only jobs whose steps are exactly the lines of their own `script`
+        if {"extends", "parallel", "before_script", "after_script"} & set(job) or any(
+                gitlab_inherits(job, key) and (defaults.get(key) or data.get(key))
+                for key in ("before_script", "after_script")):
+            continue
+        script = job.get("script")
+        matches = jobs.get(str(name), [])
+        if (len(matches) == 1 and isinstance(script, list) and len(script) == len(matches[0].steps)
+                and all(isinstance(line, str) for line in script)):
+            located[id(matches[0])] = (script, _yaml_step_regions(lines, script, _key_line(job, "script")))
+    return located
+
+
+def _groovy_step_regions(code, spans):
+    """(start, end) lines of steps at the given character spans, or None unless every step has its lines to itself."""
+    regions = []
+    for start, end in spans:
+        line_start = code.rfind("\n", 0, start) + 1
+        line_end = code.find("\n", end)
+        line_end = len(code) if line_end == -1 else line_end
+        rest = code[end:line_end].strip()
+        if code[line_start:start].strip() or rest not in ("", ";") and not rest.startswith("//"):
+            return None
+        first, last = code.count("\n", 0, start), code.count("\n", 0, end)
+        if regions and first < regions[-1][1]:
+            return None
+        regions.append((first, last + 1))
+    return regions or None
+
+
+def _groovy_step_lists(code, pipeline):
+    # The parser reads the script without its comments: a commented-out step makes the counts differ and
+    # leaves the job unlocated, and splice_steps parses its result to check the mapping
+    stages = groovy_stage_spans(code)
+    if len(stages) != len(pipeline.stages):
+        return {}
+    located = {}
+    for (_, open_index, close_index), stage_obj in zip(stages, pipeline.stages):
+        body_start = open_index + 1
+        nested = groovy_stage_spans(code[body_start:close_index])
+        bodies = [(body_start + start + 1, body_start + end) for _, start, end in nested] or [(body_start, close_index)]
+        if len(bodies) != len(stage_obj.jobs):
+            continue
+        for (start, end), job_obj in zip(bodies, stage_obj.jobs):
+            spans = [(start + step_start, start + step_end) for step_start, step_end, _ in groovy_step_spans(code[start:end])]
+            if len(spans) == len(job_obj.steps):
+                located[id(job_obj)] = (None, _groovy_step_regions(code, spans))
+    return located
+
+
+def locate_steps(code, pipeline_type, pipeline):
+    """
+    id(job of `pipeline`) -> (list of steps in the loaded YAML or None, (start, end) lines of every
+    step or None) for the jobs whose steps are written in `code` one after another.
+    """
+    lines = code.split("\n")
+    if pipeline_type in JENKINS_TYPES:
+        return _groovy_step_lists(code, pipeline)
+    locate = {"azure-pipelines": _azure_step_lists, "github-actions": _github_step_lists,
+              "gitlab-ci": _gitlab_step_lists}.get(pipeline_type)
+    if locate is None:
+        return {}
+    try:
+        data = _load_positioned(code)
+    except YAMLError:
+        return {}
+    return locate(data, lines, pipeline) if isinstance(data, dict) else {}
+
+
+def _step_lines(emitter, step, pipeline_type):
+    """A step as the platform writes it, starting at column 0; no lines for a step it leaves out."""
+    if pipeline_type == "gitlab-ci":
+        script = emitter._script_line(step)
+        code = "" if script is None else f"- {yaml_scalar(script, 2)}\n"
+    elif pipeline_type in JENKINS_TYPES:
+        # One line even when a string spans several, whose lines must not be indented
+        return [emitter._step_code(step, "").rstrip("\n")]
+    else:
+        code = emitter._step_code(step)
+    lines = code.rstrip("\n").split("\n") if code else []
+    indent = min((_indent(line) for line in lines if line.strip()), default=0)
+    return [line[indent:] for line in lines]
+
+
+def _unmodelled_lines(lines, item, region, pipeline_type):
+    """The lines of the keys of a YAML step the model does not hold, with the keys at column 2."""
+    modelled = MODELLED_STEP_KEYS.get(pipeline_type)
+    if modelled is None or not isinstance(item, dict):
+        return []
+    if pipeline_type == "azure-pipelines" and "checkout" in item:
+        modelled = set(item) - {"name"}  # The options of a checkout are its inputs
+    keys = list(item)
+    starts = [_key_line(item, key) for key in keys] + [region[1]]
+    column = item.lc.col
+    kept = []
+    for index, key in enumerate(keys):
+        if key in modelled or starts[index] is None or starts[index + 1] is None:
+            continue
+        end = starts[index + 1]
+        while end > starts[index] + 1 and not lines[end - 1].strip():
+            end -= 1
+        for number in range(starts[index], end):
+            # The first key shares its line with the dash
+            line = " " * column + lines[number][column:] if number == region[0] else lines[number]
+            kept.append(line[column - 2:])
+    return kept
+
+
+def _step_state(step):
+    return step.name, step.task, json.dumps(step.inputs, sort_keys=True, default=str), step.condition
+
+
+def _expressed_steps(step, pipeline_type):
+    """What a step reads back as once the platform has written it."""
+    job = PipelineJob("Edit")
+    job.add_step(copy.deepcopy(step))
+    written = PIPELINE_TYPE_CLASSES[pipeline_type]()
+    written.stages = [PipelineStage("Edit", [job])]
+    return parse_pipeline(written.to_raw_code(), pipeline_type).stages[0].jobs[0].steps
+
+
+def _changed_jobs(pipeline, patched, copies):
+    """(job, patched job) of the jobs whose steps the patch changed, or None when it changes stages or jobs."""
+    if len(patched.stages) != len(pipeline.stages):
+        return None
+    changed = []
+    for stage, patched_stage in zip(pipeline.stages, patched.stages):
+        if patched_stage is not copies.get(id(stage)) or patched_stage.name != stage.name \
+                or len(patched_stage.jobs) != len(stage.jobs):
+            return None
+        for job, patched_job in zip(stage.jobs, patched_stage.jobs):
+            if patched_job is not copies.get(id(job)) or (patched_job.name, patched_job.depends_on) != (job.name, job.depends_on):
+                return None
+            if [copies.get(id(step)) for step in job.steps] != patched_job.steps or any(
+                    _step_state(step) != _step_state(copies[id(step)]) for step in job.steps):
+                changed.append((job, patched_job))
+    return changed
+
+
+def splice_steps(code, pipeline_type, pipeline, patched, copies, emitter):
+    """
+    The code with the steps the patch added, changed or removed rewritten in place, or None when
+    the patch also changes stages or jobs. Warnings about the new steps go to `emitter.warnings`.
+
+    Raises:
+        ValueError: If the steps of a changed job cannot be located in the code.
+    """
+    changed = _changed_jobs(pipeline, patched, copies)
+    if changed is None:
+        return None
+    lines = code.split("\n")
+    located = locate_steps(code, pipeline_type, pipeline) if changed else {}
+    expected_copies = {}
+    expected = copy.deepcopy(patched, expected_copies)
+    edits = []
+    for job, patched_job in changed:
+        steps, regions = located.get(id(job), (None, None))
+        if regions is None:
+            raise ValueError(f"The steps of job {json.dumps(job.name)} are not written as a plain list in the "
+                             "pipeline, so they cannot be changed in place.")
+        first = lines[regions[0][0]]
+        indent = first[:_indent(first)]
+        originals = {id(copies[id(step)]): index for index, step in enumerate(job.steps)}
+        kept = set()
+        expressed = []
+        position = regions[0][0]
+        inserted = []
+        job_edits = []
+        for step in patched_job.steps:
+            index = originals.get(id(step))
+            if index is None:
+                inserted += _step_lines(emitter, step, pipeline_type)
+                expressed += _expressed_steps(step, pipeline_type)
+                continue
+            if inserted:
+                job_edits.append((position, position, inserted))
+                inserted = []
+            kept.add(index)
+            start, end = regions[index]
+            if _step_state(step) != _step_state(job.steps[index]):
+                replacement = _step_lines(emitter, step, pipeline_type)
+                if replacement and replacement[0].startswith("-"):
+                    replacement += _unmodelled_lines(lines, steps[index] if steps else None, regions[index], pipeline_type)
+                job_edits.append((start, end, replacement))
+                expressed += _expressed_steps(step, pipeline_type)
+            else:
+                expressed.append(job.steps[index])
+            position = end
+        if inserted:
+            job_edits.append((position, position, inserted))
+        job_edits += [(start, end, []) for index, (start, end) in enumerate(regions) if index not in kept]
+        edits += [(start, end, [indent + line if line.strip() else line for line in replacement])
+                  for start, end, replacement in job_edits]
+        expected_copies[id(patched_job)].steps = expressed
+
+    # Bottom up, so that the line numbers of the edits still to make stay valid; an insertion at
+    # the start of a replaced step goes before it.
+    for start, end, replacement in sorted(edits, key=lambda edit: (edit[0], edit[1]), reverse=True):
+        lines[start:end] = replacement
+    edited_code = "\n".join(lines)
+    if parse_pipeline(edited_code, pipeline_type).structure_hash() != expected.structure_hash():
+        raise ValueError("The changed steps could not be written into the pipeline code.")
+    return edited_code
+
+
+def write_patch(code, pipeline_type, pipeline, patched, copies, losses):
+    """
+    The code of the patched pipeline and the warnings about what the platform cannot express.
+
+    Step changes are spliced into `code`; other changes re-emit the whole pipeline, which is only
+    done when re-emitting it loses nothing (`losses` is empty).
+
+    Raises:
+        ValueError: If the patch cannot be written without losing settings of the pipeline.
+    """
+    emitter = PIPELINE_TYPE_CLASSES[pipeline_type]()
+    try:
+        edited_code = splice_steps(code, pipeline_type, pipeline, patched, copies, emitter)
+    except ValueError:
+        if losses:
+            raise
+        edited_code = None
+    if edited_code is not None:
+        return edited_code, list(emitter.warnings)
+    if losses:
+        raise ValueError(f"Only the steps of existing jobs can be changed ({_listing(STEP_OPERATIONS)}): "
+                         f"writing out the whole pipeline again would change its {_listing(losses)}.")
+    target = convert_pipeline(patched, pipeline_type)
+    edited_code = target.to_raw_code().rstrip("\n") + ("\n" if code.endswith("\n") else "")
+    return edited_code, list(target.warnings)
+
+
+def edit_pipeline(pipeline_code, pipeline_type, request, complete, max_attempts=MAX_EDIT_ATTEMPTS,
+                  max_tokens=EDIT_MAX_TOKENS, token_budget=EDIT_TOKEN_BUDGET):
+    """
+    Change an existing pipeline by asking the LLM for a structural patch instead of a new pipeline.
+
+    Args:
+        pipeline_code: The pipeline (a saved generation with explanations around the code block, or raw code).
+        pipeline_type: One of the PIPELINE_TYPE_CLASSES keys.
+        request: The change to make, in plain words.
+        complete: Callable (prompt, max_tokens) -> (text, tokens_used or None) sending an edit request.
+        max_attempts: Maximum number of patch requests.
+        max_tokens: Upper bound for each patch completion.
+        token_budget: Maximum number of tokens to spend on patch requests.
+
+    Returns:
+        dict: code (pipeline_code with the code block replaced by the edited pipeline, or the
+        unchanged code when no patch could be applied), applied, operations, attempts,
+        tokens_used, errors and warnings (content the platform cannot express and validation
+        errors of the result).
+
+    Raises:
+        ValueError: If the pipeline cannot be parsed.
+    """
+    result = {"code": pipeline_code, "applied": False, "operations": [], "attempts": 0, "tokens_used": 0,
+              "errors": [], "warnings": []}
+    span = find_code_block(pipeline_code, CODE_BLOCK_LANGUAGES.get(pipeline_type, ()))
+    if span is None:
+        raise ValueError(f"No {pipeline_type} code block found.")
+    code = pipeline_code[span[0]:span[1]]
+    pipeline = parse_pipeline(code, pipeline_type)
+    losses = round_trip_losses(code, pipeline, pipeline_type)
+
+    error = None
+    edited_code = None
+    while edited_code is None:
+        if result["attempts"] >= max_attempts:
+            logger.warning("Edit stopped after %d attempt(s): %s", result["attempts"], error)
+            return result
+        prompt = build_edit_prompt(pipeline_type, pipeline, request, error, losses)
+        if result["tokens_used"] + estimate_tokens(prompt) + max_tokens > token_budget:
+            logger.warning("Edit stopped: the next patch would exceed the token budget of %d.", token_budget)
+            return result
+
+        result["attempts"] += 1
+        try:
+            response, tokens_used = complete(prompt, max_tokens)
+        except Exception as e:
+            logger.warning("Edit request failed: %s", e)
+            result["errors"].append(str(e))
+            return result
+        result["tokens_used"] += tokens_used or estimate_tokens(prompt) + estimate_tokens(response or "")
+        try:
+            operations = parse_patch(response)
+            copies = {}
+            patched = apply_patch(pipeline, operations, copies)
+            edited_code, warnings = write_patch(code, pipeline_type, pipeline, patched, copies, losses)
+        except ValueError as e:
+            error = str(e)
+            result["errors"].append(error)
+
+    result["code"] = pipeline_code[:span[0]] + edited_code + pipeline_code[span[1]:]
+    result.update(applied=True, operations=operations, errors=[])
+
+    result["warnings"] += warnings
+    result["warnings"] += [error["message"] for error in validate_pipeline_code(result["code"], pipeline_type)]
+    return result
@@ -0,0 +1,349 @@
+# pipeline_linter.py
+
+"""
+Rule-based DevSecOps linter for parsed pipelines.
+
+Rules (see pipeline_rules.py) are compiled once into a RuleIndex that buckets them by node
+type, platform and task family. Within a bucket, rules are looked up by keyword or guarded by
+combined regexes, so a node only runs the rules that can possibly match it and thousands of
+rules cost little more than a handful. Linting walks the pipeline once.
+"""
+
+import bisect
+import glob
+import logging
+import os
+import re
+
+from ruamel.yaml import YAML
+
+from pipeline_analyzer import step_text
+from pipeline_converter import parse_pipeline
+from pipeline_rules import DEVSECOPS_RULES
+from pipelinetypes import *
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_ORDER = {"error": 0, "warning": 1, "info": 2}
+NODE_TYPES = ("pipeline", "step", "raw")
+# Largest number of patterns a GuardTree checks one by one.
+GUARD_LEAF_SIZE = 8
+
+_WORD = re.compile(r"[a-z0-9]+")
+_INLINE_FLAGS = re.compile(r"^\(\?([aiLmsux]+)\)")
+
+
+def _flagged(pattern, flags=0):
+    """Split leading inline flags such as (?i) off a pattern so it can be combined with others."""
+    match = _INLINE_FLAGS.match(pattern)
+    if match:
+        for flag in match.group(1):
+            flags |= {"i": re.I, "m": re.M, "s": re.S, "x": re.X, "a": re.A, "u": re.U, "L": re.L}[flag]
+        pattern = pattern[match.end():]
+    return pattern, flags
+
+
+def _scoped(pattern, flags):
+    """Wrap a pattern in a group that carries its own flags."""
+    letters = "".join(letter for flag, letter in ((re.I, "i"), (re.M, "m"), (re.S, "s"), (re.X, "x")) if flags & flag)
+    return f"(?{letters}:{pattern})" if letters else f"(?:{pattern})"
+
+
+class CompiledRule:
+    """A rule with its regexes compiled and its trigger (the text pattern that must match first) extracted."""
+
+    def __init__(self, rule):
+        for key in ("id", "severity", "message", "node"):
+            if key not in rule:
+                raise ValueError(f"Rule {rule.get('id', rule)} is missing '{key}'.")
+        if rule["node"] not in NODE_TYPES:
+            raise ValueError(f"Rule {rule['id']} has unknown node type '{rule['node']}'.")
+        if rule["severity"] not in SEVERITY_ORDER:
+            raise ValueError(f"Rule {rule['id']} has unknown severity '{rule['severity']}'.")
+
+        self.id = rule["id"]
+        self.severity = rule["severity"]
+        self.message = rule["message"]
+        self.node = rule["node"]
+        self.platforms = rule.get("platforms")
+        task = rule.get("task", "*")
+        self.tasks = [task] if isinstance(task, str) else list(task)
+        self.keywords = [keyword.lower() for keyword in rule.get("keywords", [])]
+        if any(not _WORD.fullmatch(keyword) for keyword in self.keywords):
+            raise ValueError(f"Rule {self.id} keywords must be letters and digits only.")
+
+        base_flags = re.M if self.node == "raw" else 0
+        self.when = self._compile(rule.get("when"), base_flags)
+        self.forbid = self._compile(rule.get("forbid"), base_flags)
+        self.require = self._compile(rule.get("require"), base_flags)
+        self.when_any_step = self._compile({"text": rule["when_any_step"]}) if "when_any_step" in rule else []
+        self.require_any_step = self._compile({"text": rule["require_any_step"]}) if "require_any_step" in rule else []
+
+        if self.node == "pipeline" and not self.require_any_step:
+            raise ValueError(f"Pipeline rule {self.id} needs 'require_any_step'.")
+        if self.node != "pipeline" and not (self.forbid or self.require):
+            raise ValueError(f"Rule {self.id} needs 'forbid' or 'require'.")
+        if self.node == "raw" and any(field != "text" for field, _, _ in self.when + self.forbid + self.require):
+            raise ValueError(f"Raw rule {self.id} can only match the field 'text'.")
+        # A missing `require` match fires on texts without the keywords, so they must come from `when`.
+        if self.keywords and self.require and not self.when:
+            raise ValueError(f"Rule {self.id} has 'require' and keywords but no 'when' they belong to.")
+
+        # A rule can only fire on text its first `when` (or `forbid`, when unconditional) text pattern matches.
+        trigger = [source for field, _, source in self.when if field == "text"]
+        if not trigger and not self.when and len(self.forbid) == 1 and self.forbid[0][0] == "text":
+            trigger = [self.forbid[0][2]]
+        self.trigger = trigger[0] if trigger else None
+
+    @staticmethod
+    def _compile(conditions, base_flags=0):
+        compiled = []
+        for field, pattern in (conditions or {}).items():
+            pattern, flags = _flagged(pattern, base_flags)
+            compiled.append((field, re.compile(pattern, flags), _scoped(pattern, flags)))
+        return compiled
+
+    def violations(self, fields):
+        """Return the forbidden matches for a node (a list, empty when the node complies)."""
+        if not all(regex.search(fields(field)) for field, regex, _ in self.when):
+            return []
+        found = [match for field, regex, _ in self.forbid for match in [regex.search(fields(field))] if match]
+        found += [True for field, regex, _ in self.require if not regex.search(fields(field))]
+        return found
+
+
+class GuardTree:
+    """
+    Finds which of many patterns match a text without trying each one.
+
+    Patterns are combined into one alternation per node of a binary tree; a subtree is only
+    searched when its combined pattern matches, so a text that matches nothing costs one search.
+    """
+
+    def __init__(self, items):
+        # items: list of (value, scoped pattern source)
+        self.guard = re.compile("|".join(source for _, source in items)) if items else None
+        if len(items) > GUARD_LEAF_SIZE:
+            middle = len(items) // 2
+            self.children = [GuardTree(items[:middle]), GuardTree(items[middle:])]
+            self.leaves = []
+        else:
+            self.children = []
+            self.leaves = [(value, re.compile(source)) for value, source in items]
+
+    def matches(self, text):
+        """Values whose pattern matches the text."""
+        if self.guard is None or not self.guard.search(text):
+            return []
+        if not self.children:
+            return [value for value, regex in self.leaves if regex.search(text)]
+        return self.children[0].matches(text) + self.children[1].matches(text)
+
+
+class RuleGroup:
+    """
+    Rules sharing a node type, platform and task family.
+
+    Rules with keywords sit in an inverted index from keyword to rules, so a node's words select
+    its candidates directly; the others are guarded by their trigger patterns.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.by_keyword = {}
+        for rule in rules:
+            for keyword in rule.keywords:
+                self.by_keyword.setdefault(keyword, []).append(rule)
+        unindexed = [rule for rule in rules if not rule.keywords]
+        self.unconditional = [rule for rule in unindexed if rule.trigger is None]
+        self.triggered = GuardTree([(rule, rule.trigger) for rule in unindexed if rule.trigger is not None])
+
+    def candidates(self, text):
+        """Rules that may fire on a node with the given text."""
+        rules = self.unconditional + self.triggered.matches(text)
+        if self.by_keyword:
+            selected = {}
+            for word in set(_WORD.findall(text.lower())) & self.by_keyword.keys():
+                for rule in self.by_keyword[word]:
+                    selected[id(rule)] = rule
+            rules += selected.values()
+        return rules
+
+
+class RuleIndex:
+    """Compiled rules bucketed by node type, platform class and task family."""
+
+    def __init__(self, rules):
+        self.rules = [rule if isinstance(rule, CompiledRule) else CompiledRule(rule) for rule in rules]
+        self._groups = {}
+
+    def _platform_rules(self, node, pipeline_class):
+        return [
+            rule for rule in self.rules
+            if rule.node == node
+            and (rule.platforms is None
+                 or any(issubclass(pipeline_class, PIPELINE_TYPE_CLASSES.get(platform, type(None)))
+                        for platform in rule.platforms))
+        ]
+
+    def group(self, node, pipeline_class, task="*"):
+        """The RuleGroup for a node type, platform and task family, built on first use."""
+        key = (node, pipeline_class, task)
+        if key not in self._groups:
+            rules = self._platform_rules(node, pipeline_class)
+            if node == "step":
+                rules = [rule for rule in rules if task in rule.tasks or "*" in rule.tasks]
+            self._groups[key] = RuleGroup(rules)
+        return self._groups[key]
+
+
+def load_rules(path):
+    """Load a list of rules from a YAML or JSON file."""
+    with open(path, "r") as file:
+        rules = YAML(typ="safe").load(file)
+    if isinstance(rules, dict):
+        rules = rules.get("rules", [])
+    if not isinstance(rules, list):
+        raise ValueError(f"{path} does not contain a list of rules.")
+    return rules
+
+
+_default_index = None
+
+
+def default_rule_index():
+    """The RuleIndex for the built-in DEVSECOPS_RULES, compiled once per process."""
+    global _default_index
+    if _default_index is None:
+        _default_index = RuleIndex(DEVSECOPS_RULES)
+    return _default_index
+
+
+def _task_family(task):
+    return str(task).split("@", 1)[0]
+
+
+def _step_fields(step, text):
+    def fields(field):
+        if field == "text":
+            return text
+        if field.startswith("inputs."):
+            value = step.inputs.get(field[len("inputs."):])
+            return "" if value is None else str(value)
+        value = getattr(step, field, None)
+        return "" if value is None else str(value)
+    return fields
+
+
+def _finding(rule, location):
+    return {"rule": rule.id, "severity": rule.severity, "message": rule.message, "location": location}
+
+
+def lint_pipeline(pipeline, raw_code=None, rule_index=None):
+    """
+    Check a parsed pipeline (and optionally its source) against the DevSecOps rules.
+
+    Args:
+        pipeline: A Pipeline produced by PipelineParser, or None to lint only the source.
+        raw_code: Optional pipeline source for rules on settings the model does not keep.
+        rule_index: Optional RuleIndex; the built-in rules are used by default.
+
+    Returns:
+        list: Findings as dictionaries with rule, severity, message and location, most severe first.
+    """
+    rule_index = rule_index or default_rule_index()
+    pipeline_class = type(pipeline) if pipeline is not None else Pipeline
+    findings = []
+
+    if pipeline is not None:
+        # Pipeline rules stay pending until some step satisfies them.
+        pending = rule_index.group("pipeline", pipeline_class).rules
+        conditions = GuardTree([(rule, rule.when_any_step[0][2]) for rule in pending if rule.when_any_step])
+        requirements = GuardTree([(rule, rule.require_any_step[0][2]) for rule in pending])
+        conditions_met = {rule for rule in pending if not rule.when_any_step}
+        satisfied = set()
+        # Generated pipelines repeat steps; candidates only depend on the task family and text.
+        seen = {}
+
+        for stage in pipeline.stages:
+            for job in stage.jobs:
+                for step in job.steps:
+                    text = step_text(step)
+                    key = (_task_family(step.task), text)
+                    if key not in seen:
+                        seen[key] = rule_index.group("step", pipeline_class, key[0]).candidates(text)
+                        if len(satisfied) < len(pending):
+                            conditions_met.update(conditions.matches(text))
+                            satisfied.update(requirements.matches(text))
+                    fields = _step_fields(step, text)
+                    for rule in seen[key]:
+                        if rule.violations(fields):
+                            findings.append(_finding(rule, f"{stage.name} / {job.name} / {step.name}"))
+
+        for rule in pending:
+            if rule in conditions_met and rule not in satisfied:
+                findings.append(_finding(rule, "pipeline"))
+
+    if raw_code:
+        line_starts = [0] + [match.end() for match in re.finditer("\n", raw_code)]
+        for rule in rule_index.group("raw", pipeline_class).candidates(raw_code):
+            if not all(regex.search(raw_code) for _, regex, _ in rule.when):
+                continue
+            for _, regex, _ in rule.forbid:
+                for match in regex.finditer(raw_code):
+                    findings.append(_finding(rule, f"line {bisect.bisect_right(line_starts, match.start())}"))
+            if any(not regex.search(raw_code) for _, regex, _ in rule.require):
+                findings.append(_finding(rule, "pipeline"))
+
+    findings.sort(key=lambda finding: SEVERITY_ORDER[finding["severity"]])
+    return findings
+
+
+def pipeline_type_from_filename(path):
+    """Pipeline type of a file saved by the app (named <pipeline-type>-<timestamp>.<ext>), or None."""
+    name = os.path.basename(path)
+    for pipeline_type in sorted(PIPELINE_TYPE_CLASSES, key=len, reverse=True):
+        if name.startswith(pipeline_type + "-"):
+            return pipeline_type
+    return None
+
+
+def lint_pipeline_code(pipeline_code, pipeline_type=None, rule_index=None):
+    """Parse and lint pipeline source; when it cannot be parsed only the source rules are applied."""
+    pipeline = None
+    if pipeline_type in PIPELINE_TYPE_CLASSES:
+        try:
+            pipeline = parse_pipeline(pipeline_code, pipeline_type)
+        except Exception as e:
+            logger.warning("Could not parse %s pipeline for linting: %s", pipeline_type, e)
+    return lint_pipeline(pipeline, pipeline_code, rule_index)
+
+
+def lint_directory(directory_path="pipelines", rule_index=None):
+    """Lint every saved pipeline in a directory. Returns a dictionary of file path to findings."""
+    results = {}
+    for path in sorted(glob.glob(os.path.join(directory_path, "*"))):
+        if not os.path.isfile(path):
+            continue
+        with open(path, "r") as file:
+            code = file.read()
+        results[path] = lint_pipeline_code(code, pipeline_type_from_filename(path), rule_index)
+    return results
+
+
+def format_lint_report(findings):
+    """Render findings as Markdown for the UI."""
+    if not findings:
+        return "No DevSecOps issues found."
+    icons = {"error": "🔴", "warning": "🟠", "info": "🔵"}
+    return "\n".join(
+        f"- {icons[finding['severity']]} **{finding['rule']}** ({finding['location']}): {finding['message']}"
+        for finding in findings
+    )
+
+
+if __name__ == "__main__":
+    for path, findings in lint_directory().items():
+        print(f"{path}: {len(findings)} finding(s)")
+        for finding in findings:
+            print(f"  [{finding['severity']}] {finding['rule']} at {finding['location']}: {finding['message']}")
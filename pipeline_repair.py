@@ -0,0 +1,441 @@
+# pipeline_repair.py
+
+"""
+Generate-validate-repair loop for LLM generated pipelines.
+
+Generated code is validated with a YAML/JSON/Groovy syntax check, a small structural schema
+for the platform and the PipelineParser. When it fails, only the failing region and the error
+are sent back to the LLM as a patch request and the answer is spliced into the code, instead
+of regenerating the whole pipeline. The loop is bounded by a number of attempts and a token
+budget.
+"""
+
+import io
+import json
+import logging
+import re
+
+from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
+
+from conversion import GITLAB_RESERVED_KEYWORDS
+from pipelineparser import PipelineParser, find_code_block
+from pipelinetypes import *
+
+logger = logging.getLogger(__name__)
+
+MAX_REPAIR_ATTEMPTS = 3
+REPAIR_TOKEN_BUDGET = 4000
+# Regions larger than this are cut down to a window around the error.
+MAX_REGION_LINES = 40
+REGION_WINDOW = 8
+# Lines shown above and below the region so the model can match the indentation.
+CONTEXT_LINES = 3
+
+CODE_BLOCK_LANGUAGES = {
+    "jenkinsfile-scripted": ("groovy", "jenkinsfile", "Jenkinsfile"),
+    "jenkinsfile-declarative": ("groovy", "jenkinsfile", "Jenkinsfile"),
+    "azure-pipelines": ("yaml", "yml"),
+    "github-actions": ("yaml", "yml"),
+    "gitlab-ci": ("yaml", "yml"),
+    "codepipeline": ("json", "yaml", "yml"),
+}
+
+AZURE_STEP_KEYS = {"script", "bash", "pwsh", "powershell", "task", "checkout", "template", "download",
+                   "downloadBuild", "publish", "getPackage", "reviewApp", "restoreCache", "saveCache"}
+GITLAB_DEFAULT_STAGES = [".pre", "build", "test", "deploy", ".post"]
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) used when the service reports none."""
+    return len(text) // 4 + 1
+
+
+def _error(message, line=None):
+    """A validation error; line is a 0-based index into the code block, or None when unknown."""
+    return {"message": message, "line": line}
+
+
+def _key_line(mapping, key):
+    try:
+        return mapping.lc.key(key)[0]
+    except Exception:
+        return None
+
+
+def _item_line(sequence, index):
+    try:
+        return sequence.lc.item(index)[0]
+    except Exception:
+        return None
+
+
+def _load_positioned(code):
+    """Load YAML keeping line numbers (round-trip mode also accepts GitLab's !reference tags)."""
+    return YAML(typ="rt").load(io.StringIO(code))
+
+
+def _github_schema_errors(data):
+    errors = []
+    jobs = data.get("jobs")
+    if not isinstance(jobs, dict) or not jobs:
+        return [_error("A workflow needs a `jobs` mapping.", _key_line(data, "jobs"))]
+    for job_id, job in jobs.items():
+        line = _key_line(jobs, job_id)
+        if not isinstance(job, dict):
+            errors.append(_error(f"Job '{job_id}' must be a mapping.", line))
+            continue
+        if "uses" in job:
+            continue  # Reusable workflow call
+        if "runs-on" not in job:
+            errors.append(_error(f"Job '{job_id}' has no `runs-on`.", line))
+        steps = job.get("steps")
+        if not isinstance(steps, list) or not steps:
+            errors.append(_error(f"Job '{job_id}' needs a list of `steps`.", _key_line(job, "steps") or line))
+            continue
+        for index, step in enumerate(steps):
+            if not isinstance(step, dict) or ("run" in step) == ("uses" in step):
+                errors.append(_error(f"Step {index + 1} of job '{job_id}' needs exactly one of `run` or `uses`.",
+                                     _item_line(steps, index)))
+        needs = job.get("needs")
+        for need in [needs] if isinstance(needs, str) else needs or []:
+            if need not in jobs:
+                errors.append(_error(f"Job '{job_id}' needs unknown job '{need}'.", _key_line(job, "needs")))
+    return errors
+
+
+def _azure_steps_errors(steps, owner, line):
+    if not isinstance(steps, list) or not steps:
+        return [_error(f"{owner} needs a list of `steps`.", line)]
+    return [
+        _error(f"Step {index + 1} of {owner} has no step type ({', '.join(sorted(AZURE_STEP_KEYS))}).",
+               _item_line(steps, index))
+        for index, step in enumerate(steps)
+        if not isinstance(step, dict) or not AZURE_STEP_KEYS & set(step)
+    ]
+
+
+def _azure_jobs_errors(jobs, owner, line):
+    if not isinstance(jobs, list) or not jobs:
+        return [_error(f"{owner} needs a list of `jobs`.", line)]
+    errors = []
+    for index, job in enumerate(jobs):
+        job_line = _item_line(jobs, index)
+        if not isinstance(job, dict) or not {"job", "deployment", "template"} & set(job):
+            errors.append(_error(f"Job {index + 1} of {owner} needs a `job`, `deployment` or `template` key.", job_line))
+        elif "job" in job:
+            errors += _azure_steps_errors(job.get("steps"), f"job '{job['job']}'", job_line)
+        elif "deployment" in job and "strategy" not in job:
+            errors.append(_error(f"Deployment '{job['deployment']}' has no `strategy`.", job_line))
+    return errors
+
+
+def _azure_schema_errors(data):
+    if "stages" in data:
+        stages = data["stages"]
+        if not isinstance(stages, list) or not stages:
+            return [_error("`stages` must be a list of stages.", _key_line(data, "stages"))]
+        errors = []
+        for index, stage in enumerate(stages):
+            line = _item_line(stages, index)
+            if not isinstance(stage, dict) or not {"stage", "template"} & set(stage):
+                errors.append(_error(f"Stage {index + 1} needs a `stage` or `template` key.", line))
+            elif "stage" in stage:
+                errors += _azure_jobs_errors(stage.get("jobs"), f"stage '{stage['stage']}'", line)
+        return errors
+    if "jobs" in data:
+        return _azure_jobs_errors(data["jobs"], "the pipeline", _key_line(data, "jobs"))
+    if "steps" in data:
+        return _azure_steps_errors(data["steps"], "the pipeline", _key_line(data, "steps"))
+    return [_error("A pipeline needs `stages`, `jobs` or `steps`.", 0)]
+
+
+def _gitlab_schema_errors(data):
+    errors = []
+    stages = data.get("stages", GITLAB_DEFAULT_STAGES)
+    if not isinstance(stages, list):
+        return [_error("`stages` must be a list.", _key_line(data, "stages"))]
+    stages = list(stages) + [".pre", ".post"]
+    jobs = {
+        name: job for name, job in data.items()
+        if name not in GITLAB_RESERVED_KEYWORDS and not str(name).startswith(".")
+    }
+    if not jobs:
+        return [_error("The configuration defines no jobs.", 0)]
+    # Jobs may come from included files, so references are only checked for self-contained files.
+    self_contained = "include" not in data
+    for name, job in jobs.items():
+        line = _key_line(data, name)
+        if not isinstance(job, dict):
+            errors.append(_error(f"Job '{name}' must be a mapping.", line))
+            continue
+        if not {"script", "trigger", "extends", "run"} & set(job):
+            errors.append(_error(f"Job '{name}' has no `script`.", line))
+        if "extends" not in job and job.get("stage", "test") not in stages:
+            errors.append(_error(f"Job '{name}' uses undeclared stage '{job.get('stage', 'test')}'.",
+                                 _key_line(job, "stage") or line))
+        for need in (job.get("needs") or []) if self_contained else []:
+            need_name = need.get("job") if isinstance(need, dict) else need
+            if isinstance(need_name, str) and need_name not in jobs:
+                errors.append(_error(f"Job '{name}' needs unknown job '{need_name}'.", _key_line(job, "needs")))
+    return errors
+
+
+def _codepipeline_schema_errors(data):
+    data = data.get("pipeline", data)
+    stages = data.get("stages")
+    if not isinstance(stages, list) or not stages:
+        return [_error("A pipeline needs a list of `stages`.", _key_line(data, "stages"))]
+    errors = []
+    for index, stage in enumerate(stages):
+        line = _item_line(stages, index)
+        if not isinstance(stage, dict) or "name" not in stage:
+            errors.append(_error(f"Stage {index + 1} has no `name`.", line))
+        elif not isinstance(stage.get("actions"), list) or not stage["actions"]:
+            errors.append(_error(f"Stage '{stage['name']}' needs a list of `actions`.", line))
+    return errors
+
+
+SCHEMA_CHECKS = {
+    "github-actions": _github_schema_errors,
+    "azure-pipelines": _azure_schema_errors,
+    "gitlab-ci": _gitlab_schema_errors,
+    "codepipeline": _codepipeline_schema_errors,
+}
+
+
+def _groovy_errors(code):
+    """Report unbalanced braces, brackets and parentheses, ignoring strings and comments."""
+    pairs = {")": "(", "]": "[", "}": "{"}
+    stack = []
+    lines = code.splitlines()
+    line = 0
+    position = 0
+    token = re.compile(r"'''.*?'''|\"\"\".*?\"\"\"|'(?:[^'\\\n]|\\.)*'|\"(?:[^\"\\\n]|\\.)*\"|//[^\n]*|/\*.*?\*/|[(){}\[\]\n]",
+                       re.DOTALL)
+    misplaced = None
+    for match in token.finditer(code):
+        line += code.count("\n", position, match.start())
+        position = match.start()
+        text = match.group(0)
+        if text in "([{":
+            stack.append((text, line))
+        elif text in ")]}":
+            if not stack or stack[-1][0] != pairs[text]:
+                return [_error(f"Unexpected '{text}'.", line)]
+            opener, opener_line = stack.pop()
+            # A brace closed at a different indentation usually closes the wrong block.
+            if text == "}" and misplaced is None and lines[line].lstrip().startswith("}") \
+                    and _indent(lines[opener_line]) != _indent(lines[line]):
+                misplaced = opener_line
+    if stack:
+        opener, opener_line = stack[-1]
+        return [_error(f"'{opener}' is never closed.", opener_line if misplaced is None else misplaced)]
+    if not re.search(r"\b(pipeline|node|stage)\s*[({]", code):
+        return [_error("No `pipeline {` or `node {` block found.", 0)]
+    return []
+
+
+def validate_pipeline_code(pipeline_code, pipeline_type):
+    """
+    Validate generated pipeline code for a platform.
+
+    Returns:
+        list: Errors as dictionaries with a message and the 0-based line in the code block
+        (None when unknown); empty when the code is valid.
+    """
+    languages = CODE_BLOCK_LANGUAGES.get(pipeline_type)
+    if languages is None:
+        raise ValueError(f"Unsupported pipeline type: {pipeline_type}")
+    span = find_code_block(pipeline_code, languages)
+    if span is None or not pipeline_code[span[0]:span[1]].strip():
+        return [_error("No code block found in the generated output.")]
+    code = pipeline_code[span[0]:span[1]]
+
+    if pipeline_type.startswith("jenkinsfile"):
+        errors = _groovy_errors(code)
+    elif pipeline_type == "codepipeline" and code.lstrip().startswith("{"):
+        try:
+            errors = _codepipeline_schema_errors(json.loads(code))
+        except json.JSONDecodeError as e:
+            errors = [_error(f"JSON error: {e.msg}", e.lineno - 1)]
+    else:
+        try:
+            data = _load_positioned(code)
+        except YAMLError as e:
+            mark = getattr(e, "problem_mark", None) or getattr(e, "context_mark", None)
+            problem = getattr(e, "problem", None) or str(e).splitlines()[0]
+            errors = [_error(f"YAML error: {problem}", mark.line if mark else None)]
+        else:
+            if not isinstance(data, dict):
+                errors = [_error("The document must be a mapping.", 0)]
+            else:
+                errors = SCHEMA_CHECKS[pipeline_type](data)
+    if errors:
+        return errors
+
+    try:
+        pipeline = PipelineParser(pipeline_code, pipeline_type).parse_pipeline_code()
+    except Exception as e:
+        return [_error(f"The pipeline could not be converted: {e}")]
+    if not isinstance(pipeline, Pipeline) or not any(stage.jobs for stage in pipeline.stages):
+        return [_error("The pipeline could not be parsed into stages and jobs.")]
+    return []
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def failing_region(lines, line):
+    """
+    Return the (start, end) line range to regenerate for an error on `line`: the block that
+    contains it (its parent key and everything indented below), or a window around the
+    error when that block is too large.
+    """
+    if not lines:
+        return 0, 0
+    line = min(max(line, 0), len(lines) - 1)
+    # Parsers often report the line after the culprit, so the region starts from the line above.
+    anchor = line - 1 if line > 0 and lines[line - 1].strip() else line
+    indent = _indent(lines[anchor]) if lines[anchor].strip() else 0
+
+    start = anchor
+    while start > 0 and (not lines[start].strip() or _indent(lines[start]) >= indent):
+        start -= 1
+    parent_indent = _indent(lines[start])
+    end = max(line, anchor) + 1
+    while end < len(lines) and (not lines[end].strip() or _indent(lines[end]) > parent_indent):
+        end += 1
+    while end > start + 1 and not lines[end - 1].strip():
+        end -= 1
+
+    if end - start > MAX_REGION_LINES:
+        start = max(0, line - REGION_WINDOW)
+        end = min(len(lines), line + REGION_WINDOW + 1)
+    return start, end
+
+
+def widen_region(lines, start, end):
+    """Grow a region to the block of its parent key."""
+    if start <= 0:
+        return 0, len(lines)
+    indent = _indent(lines[start])
+    parent = start - 1
+    while parent > 0 and (not lines[parent].strip() or _indent(lines[parent]) >= indent):
+        parent -= 1
+    parent_indent = _indent(lines[parent])
+    while end < len(lines) and (not lines[end].strip() or _indent(lines[end]) > parent_indent):
+        end += 1
+    return parent, end
+
+
+def build_patch_prompt(pipeline_type, error, lines, start, end):
+    """Prompt asking for a replacement of lines[start:end] only."""
+    before = lines[max(0, start - CONTEXT_LINES):start]
+    after = lines[end:end + CONTEXT_LINES]
+    region = "\n".join(lines[start:end])
+    location = f" (line {error['line'] + 1})" if error["line"] is not None else ""
+    return (
+        f"The following {pipeline_type} pipeline excerpt is invalid{location}: {error['message']}\n\n"
+        f"Lines before the excerpt (do not repeat them):\n```\n" + "\n".join(before) + "\n```\n\n"
+        f"Excerpt to fix (lines {start + 1}-{end}):\n```\n{region}\n```\n\n"
+        f"Lines after the excerpt (do not repeat them):\n```\n" + "\n".join(after) + "\n```\n\n"
+        "Return only the corrected excerpt in one fenced code block, keeping its indentation relative "
+        "to the surrounding lines. Do not add explanations."
+    )
+
+
+def extract_patch(response):
+    """The code inside the first fenced block of a response, or the whole response without fences."""
+    match = re.search(r"```[\w-]*[ \t]*\n(.*?)(?:\n```|$)", response, re.DOTALL)
+    text = match.group(1) if match else response
+    return [line.rstrip() for line in text.strip("\n").splitlines()]
+
+
+def splice_patch(lines, start, end, patch):
+    """
+    Replace lines[start:end] with the patch, shifting the patch when the model changed the base
+    indentation of the excerpt.
+    """
+    original = [line for line in lines[start:end] if line.strip()]
+    replacement = [line for line in patch if line.strip()]
+    if original and replacement:
+        shift = min(_indent(line) for line in original) - min(_indent(line) for line in replacement)
+        if shift > 0:
+            patch = [(" " * shift + line) if line.strip() else line for line in patch]
+        elif shift < 0:
+            patch = [line[min(-shift, _indent(line)):] for line in patch]
+    return lines[:start] + patch + lines[end:]
+
+
+def repair_pipeline_code(pipeline_code, pipeline_type, complete, max_attempts=MAX_REPAIR_ATTEMPTS,
+                         token_budget=REPAIR_TOKEN_BUDGET):
+    """
+    Validate generated pipeline code and patch failing regions until it is valid.
+
+    Args:
+        pipeline_code: Generated output (may contain explanations around the code block).
+        pipeline_type: One of the PIPELINE_TYPE_CLASSES keys.
+        complete: Callable (prompt, max_tokens) -> (text, tokens_used or None) sending a patch request.
+        max_attempts: Maximum number of patch requests.
+        token_budget: Maximum number of tokens to spend on patch requests.
+
+    Returns:
+        dict: code (the repaired output), valid, errors (remaining), attempts, tokens_used and
+        patches (the line ranges that were replaced).
+    """
+    result = {"code": pipeline_code, "valid": False, "errors": [], "attempts": 0, "tokens_used": 0, "patches": []}
+    errors = validate_pipeline_code(pipeline_code, pipeline_type)
+    widen = 0
+
+    while errors:
+        result["errors"] = errors
+        if result["attempts"] >= max_attempts:
+            logger.warning("Repair stopped after %d attempt(s): %s", result["attempts"], errors[0]["message"])
+            return result
+
+        span = find_code_block(result["code"], CODE_BLOCK_LANGUAGES[pipeline_type])
+        if span is None:
+            return result
+        code = result["code"][span[0]:span[1]]
+        lines = code.splitlines()
+        error = errors[0]
+        if error["line"] is None:
+            start, end = 0, len(lines)  # Nothing to localize; the whole block is the region
+        else:
+            start, end = failing_region(lines, error["line"])
+            # A region whose patch did not fix the error is widened to its parent block.
+            for _ in range(widen):
+                start, end = widen_region(lines, start, end)
+
+        prompt = build_patch_prompt(pipeline_type, error, lines, start, end)
+        max_tokens = 2 * estimate_tokens("\n".join(lines[start:end])) + 100
+        if result["tokens_used"] + estimate_tokens(prompt) + max_tokens > token_budget:
+            logger.warning("Repair stopped: the next patch would exceed the token budget of %d.", token_budget)
+            return result
+
+        result["attempts"] += 1
+        try:
+            response, tokens_used = complete(prompt, max_tokens)
+        except Exception as e:
+            logger.warning("Repair request failed: %s", e)
+            return result
+        result["tokens_used"] += tokens_used or estimate_tokens(prompt) + estimate_tokens(response or "")
+        patch = extract_patch(response or "")
+        if not patch:
+            widen += 1
+            continue
+
+        patched = splice_patch(lines, start, end, patch)
+        trailing_newline = "\n" if code.endswith("\n") else ""
+        result["code"] = result["code"][:span[0]] + "\n".join(patched) + trailing_newline + result["code"][span[1]:]
+        result["patches"].append({"start": start + 1, "end": end, "error": error["message"]})
+
+        errors = validate_pipeline_code(result["code"], pipeline_type)
+        still_inside = errors and errors[0]["line"] is not None and start <= errors[0]["line"] <= start + len(patch)
+        widen = widen + 1 if still_inside else 0
+
+    result["valid"] = True
+    result["errors"] = []
+    return result
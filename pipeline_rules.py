@@ -0,0 +1,182 @@
+# pipeline_rules.py
+
+"""
+Declarative DevSecOps rules checked by pipeline_linter.
+
+Each rule is a dictionary:
+    id, severity ("error", "warning" or "info"), message
+    node: "pipeline", "step" or "raw"
+    platforms: optional list of pipeline types the rule applies to (all when omitted)
+    task: optional task family (or list of them) a step rule applies to, e.g. "script" or
+          "Docker" (the part of the task before "@"); the rule applies to every step when omitted
+    when: optional {field: regex} that must all match for the rule to apply
+    forbid: {field: regex}, a violation when any of them matches
+    require: {field: regex}, a violation when any of them does not match
+    keywords: optional words (letters and digits, any case) of which at least one appears in
+              every text the rule can match; the linter skips the rule for nodes without them
+
+Step fields are task, name, condition, text (everything the step runs) and inputs.<key>.
+Pipeline rules use when_any_step / require_any_step, regexes matched against the text of
+every step. Raw rules only have the field text, the pipeline source: each `forbid` match is
+reported with its line number, and a `require` that does not match (when every `when` matches)
+is reported for the whole pipeline.
+"""
+
+SAST_TOOLS = (
+    r"(?i)\b(sast|sonar\w*|semgrep|codeql|bandit|checkmarx|cxflow|fortify|spotbugs|gosec|brakeman|"
+    r"njsscan|horusec|eslint-plugin-security|veracode|AdvancedSecurity-Codeql\w*)\b"
+)
+SCA_TOOLS = (
+    r"(?i)\b(sca|snyk|dependency-check|owasp|npm audit|yarn audit|pip-audit|safety check|trivy fs|grype|"
+    r"osv-scanner|retire|govulncheck|bundler-audit|whitesource|mend|blackduck|dependency-scanning|"
+    r"dependency-review-action)\b"
+)
+SECRET_SCAN_TOOLS = r"(?i)\b(gitleaks|trufflehog|detect-secrets|ggshield|secret[-_ ]?(scan|detection)|git-secrets|CredScan)\b"
+CONTAINER_BUILD = r"\b(docker|podman) (buildx )?build\b|\bbuildah bud\b|\bkaniko\b|^docker/build-push-action@|^Docker@\d"
+IMAGE_SCAN_TOOLS = r"(?i)\b(trivy (image|i)\b|grype|anchore|clair|docker scout|snyk container|aquasec|prisma|twistlock|xray)\b"
+
+DEVSECOPS_RULES = [
+    # Required security stages
+    {
+        "id": "require-sast",
+        "severity": "error",
+        "node": "pipeline",
+        "require_any_step": SAST_TOOLS,
+        "message": "No static application security testing (SAST) step, e.g. SonarQube, Semgrep or CodeQL.",
+    },
+    {
+        "id": "require-sca",
+        "severity": "error",
+        "node": "pipeline",
+        "require_any_step": SCA_TOOLS,
+        "message": "No software composition analysis (SCA) step, e.g. OWASP Dependency-Check, Snyk or Trivy fs.",
+    },
+    {
+        "id": "require-secret-scan",
+        "severity": "error",
+        "node": "pipeline",
+        "require_any_step": SECRET_SCAN_TOOLS,
+        "message": "No secret scanning step, e.g. Gitleaks or TruffleHog.",
+    },
+    {
+        "id": "require-image-scan",
+        "severity": "warning",
+        "node": "pipeline",
+        "when_any_step": CONTAINER_BUILD,
+        "require_any_step": IMAGE_SCAN_TOOLS,
+        "message": "Container images are built but never scanned, e.g. with Trivy or Grype.",
+    },
+    # Supply chain
+    {
+        "id": "unpinned-action",
+        "severity": "error",
+        "node": "raw",
+        "platforms": ["github-actions"],
+        "forbid": {"text": r"^[\s-]*uses\s*:\s*['\"]?(?!\./|docker://)[^@\s'\"]+(@(main|master|latest|HEAD|dev|develop))?['\"]?\s*(#.*)?$"},
+        "keywords": ["uses"],
+        "message": "Action is not pinned to a release; reference a version tag or commit SHA.",
+    },
+    {
+        "id": "action-not-sha-pinned",
+        "severity": "info",
+        "node": "step",
+        "platforms": ["github-actions"],
+        "when": {"task": r"^(?!actions/|github/|\./|docker://)[^/]+/"},
+        "require": {"task": r"@[0-9a-f]{40}$"},
+        "message": "Third-party action is referenced by a tag; pin it to a full commit SHA.",
+    },
+    {
+        "id": "unpinned-azure-task",
+        "severity": "warning",
+        "node": "step",
+        "platforms": ["azure-pipelines"],
+        "when": {"task": r"^[A-Za-z][\w.-]*(@|$)"},
+        "forbid": {"task": r"^(?!(script|bash|pwsh|powershell|checkout|download|publish)$)[^@]+$"},
+        "message": "Azure DevOps task has no major version; reference it as Task@<version>.",
+    },
+    {
+        "id": "latest-image-tag",
+        "severity": "warning",
+        "node": "raw",
+        "forbid": {"text": r"^\s*-?\s*(image|container)\s*:\s*['\"]?[\w./:-]+:latest['\"]?\s*$|\b(docker|podman) (run|pull)\b[^\n]*:latest\b"},
+        "keywords": ["latest"],
+        "message": "Container image uses the mutable `latest` tag; pin a version or digest.",
+    },
+    {
+        "id": "curl-pipe-shell",
+        "severity": "warning",
+        "node": "step",
+        "task": ["script", "groovy"],
+        "forbid": {"text": r"\b(curl|wget)\b[^\n|]*\|\s*(sudo\s+)?(ba|z)?sh\b"},
+        "keywords": ["curl", "wget"],
+        "message": "Script pipes a downloaded file straight into a shell; download, verify and then run it.",
+    },
+    # Credentials
+    {
+        "id": "plaintext-credential",
+        "severity": "error",
+        "node": "raw",
+        "forbid": {
+            "text": (
+                r"(?i)(password|passwd|pwd|secret|token|api[_-]?key|access[_-]?key)['\"]?\s*[:=]\s*['\"]?"
+                r"(?![$%{<(\[]|credentials\(|env\.|secrets\.|vars\.|\*{3})[^\s'\"#,;)]{6,}"
+            )
+        },
+        "message": "Credential is written in plain text; use the platform's secret store.",
+    },
+    {
+        "id": "cloud-access-key",
+        "severity": "error",
+        "node": "raw",
+        "forbid": {
+            "text": (
+                r"\b(AKIA|ASIA)[0-9A-Z]{16}\b|\bgh[pousr]_[A-Za-z0-9]{36}\b|\bglpat-[\w-]{20}\b|"
+                r"\bxox[baprs]-[\w-]{10,}|-----BEGIN ([A-Z]+ )?PRIVATE KEY-----"
+            )
+        },
+        "message": "Access key or private key embedded in the pipeline; revoke it and use a secret store.",
+    },
+    {
+        "id": "password-on-command-line",
+        "severity": "warning",
+        "node": "raw",
+        "forbid": {"text": r"\b(docker|podman|helm|oras) (registry )?login\b[^\n]*\s(-p|--password)([ =]|$)"},
+        "keywords": ["login"],
+        "message": "Password passed as a command-line argument is visible in process lists; use --password-stdin.",
+    },
+    # Hardening
+    {
+        "id": "privileged-container",
+        "severity": "warning",
+        "node": "raw",
+        "forbid": {"text": r"--privileged\b|\bprivileged\s*:\s*true\b"},
+        "keywords": ["privileged"],
+        "message": "Privileged containers can take over the build host; drop the privileged flag.",
+    },
+    {
+        "id": "write-all-permissions",
+        "severity": "warning",
+        "node": "raw",
+        "platforms": ["github-actions"],
+        "forbid": {"text": r"^\s*permissions\s*:\s*write-all\b"},
+        "keywords": ["permissions"],
+        "message": "Workflow token has write access to everything; grant only the permissions each job needs.",
+    },
+    {
+        "id": "tls-verification-disabled",
+        "severity": "warning",
+        "node": "raw",
+        "forbid": {"text": r"\bcurl\b[^\n]*\s(-k|--insecure)\b|--no-check-certificate\b|GIT_SSL_NO_VERIFY\s*[:=]\s*['\"]?(1|true)|sslVerify\s*[:=]\s*['\"]?false"},
+        "keywords": ["curl", "check", "verify", "sslverify"],
+        "message": "TLS certificate verification is disabled; fix the trust store instead.",
+    },
+    {
+        "id": "unguarded-auto-approve",
+        "severity": "info",
+        "node": "step",
+        "when": {"text": r"\bterraform (apply|destroy)\b[^\n]*-auto-approve"},
+        "require": {"condition": r"\S"},
+        "keywords": ["terraform"],
+        "message": "Infrastructure is changed with -auto-approve and no condition; restrict it to the main branch or add an approval.",
+    },
+]
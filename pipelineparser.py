@@ -1,10 +1,14 @@
 from conversion import *
 from pipelinetypes import *
 import re
-from ruamel.yaml import YAML
-from ruamel.yaml.error import YAMLError
+from yaml import YAMLError
 import streamlit as st
 import json
+import logging
+from telemetry import traced
+
+logger = logging.getLogger(__name__)
+
 def clean_and_format_yaml(code):
     """Cleans and formats YAML code while preserving indentation."""
 
@@ -24,8 +28,8 @@ def clean_and_format_yaml(code):
     if lines and not lines[0].startswith("---"):
         lines.insert(0, "---")
 
-    # Join cleaned lines with proper indentation
-    return "\n".join(lines)
+    # Join cleaned lines with proper indentation; the final newline keeps trailing `|` blocks intact
+    return "\n".join(lines) + "\n"
 
 
 
@@ -37,8 +41,7 @@ def parse_yaml_code(code, handler_name):
 
     try:
         cleaned_code = clean_and_format_yaml(code)
-        ruamel_yaml = YAML(typ='safe')
-        ci_config = ruamel_yaml.load(cleaned_code)
+        ci_config = load_ci_yaml(cleaned_code)
         return handler_name(ci_config)
     except YAMLError as e:
         error_details = re.search(r"line (\d+), column (\d+)", str(e))
@@ -50,11 +53,14 @@ def parse_yaml_code(code, handler_name):
 
 def clean_jenkins_script(script):
     """Remove comments, explanations, and unnecessary placeholders from Jenkins Groovy scripts."""
-    # Remove single-line comments (e.g., // comment)
-    script = re.sub(r'//.*$', '', script, flags=re.MULTILINE)
-
-    # Remove multi-line comments (e.g., /* comment */)
-    script = re.sub(r'/\*.*?\*/', '', script, flags=re.DOTALL)
+    # Remove single-line (// comment) and multi-line (/* comment */) comments, leaving string
+    # literals such as 'https://example.com' untouched
+    script = re.sub(
+        r"('''.*?'''|\"\"\".*?\"\"\"|'(?:[^'\\\n]|\\.)*'|\"(?:[^\"\\\n]|\\.)*\")|//[^\n]*|/\*.*?\*/",
+        lambda match: match.group(1) or '',
+        script,
+        flags=re.DOTALL,
+    )
 
     # Remove unnecessary placeholders like AWS GetAtt or Sub
     script = re.sub(r'AWS-GetAtt-Placeholder', '', script)
@@ -70,23 +76,43 @@ def clean_jenkins_script(script):
     return script
 
 
+def find_code_block(text, languages):
+    """
+    Returns the (start, end) character span of the first code block fenced with one of the given
+    languages (e.g. ```yaml), the whole text when it has no fences, or None when no block matches.
+    """
+    for language in languages:
+        match = re.search(rf"```{language}[ \t]*\n(.*?)\n```", text, re.DOTALL)
+        if match:
+            return match.span(1)
+    if "```" not in text:
+        return 0, len(text)
+    return None
+
+
+def extract_code_block(text, languages):
+    """
+    Extracts the first code block fenced with one of the given languages (e.g. ```yaml).
+    Text without any fences is treated as raw code, so pasted pipelines parse as well.
+    """
+    span = find_code_block(text, languages)
+    return text[span[0]:span[1]] if span else ""
+
+
 def extract_yaml_code(text):
     """Extracts YAML code enclosed in ```yaml delimiters and preserves indentation."""
-    match = re.search(r"```yaml\n(.*?)\n```", text, re.DOTALL)
-    if match:
-        yaml_content = match.group(1)
-        # Split into lines and preserve original indentation
-        lines = yaml_content.splitlines()
-        return "\n".join(lines)  # Return lines with correct indentation preserved
-    return ""
+    return extract_code_block(text, ("yaml", "yml"))
 
 
 
 class PipelineParser:
-    def __init__(self, pipeline_code, pipeline_type):
+    def __init__(self, pipeline_code, pipeline_type, base_path=None):
         self.pipeline_code = pipeline_code
         self.pipeline_type = pipeline_type
+        self.base_path = base_path  # Repository directory for resolving local GitLab `include` files.
+        self.config = None  # What the pipeline was built from: the loaded YAML/JSON, or the cleaned Groovy.
 
+    @traced("pipeline.parse")
     def parse_pipeline_code(self):
         pipeline_class_map = {
             "azure-pipelines": convert_azure_devops_to_pipeline,
@@ -101,56 +127,61 @@ class PipelineParser:
         if isinstance(self.pipeline_code, str):
             if self.pipeline_type in ["jenkinsfile-scripted", "jenkinsfile-declarative"]:
                 # Groovy-based Jenkins pipelines (clean and parse the script)
-                print("Processing Jenkins pipeline...")
-                cleaned_script = clean_jenkins_script(self.pipeline_code)
+                logger.debug("Processing Jenkins pipeline...")
+                groovy_code = extract_code_block(self.pipeline_code, ("groovy", "jenkinsfile", "Jenkinsfile")) or self.pipeline_code
+                cleaned_script = clean_jenkins_script(groovy_code)
+                self.config = cleaned_script
                 convert_func = pipeline_class_map.get(self.pipeline_type)
                 if not convert_func:
                     raise ValueError(f"Unsupported pipeline type for conversion: {self.pipeline_type}")
                 pipeline = convert_func(cleaned_script)
             elif self.pipeline_type in ["azure-pipelines", "github-actions", "gitlab-ci"]:
                 # YAML-based pipelines (parse with YAML)
-                print("Processing non-Jenkins (YAML/JSON) pipeline...")
-                print(f"Pipeline type: {self.pipeline_type}")
+                logger.debug("Processing %s YAML pipeline...", self.pipeline_type)
                 yaml_code = extract_yaml_code(self.pipeline_code)
-                print(f"Extracted YAML: {yaml_code}")
 
                 if not yaml_code.startswith("---"):
                     yaml_code = "---\n" + yaml_code
 
                 try:
-                    print("===========================yaml_code: \n", yaml_code)
                     cleaned_code = clean_and_format_yaml(yaml_code)
-                    print(f"Cleaned YAML: {cleaned_code}")  # Print cleaned YAML
-                    ruamel_yaml = YAML(typ='safe')
-                    ci_config = ruamel_yaml.load(cleaned_code)
+                    logger.debug("Cleaned YAML:\n%s", cleaned_code)
+                    ci_config = load_ci_yaml(cleaned_code)
+                    self.config = ci_config
                 except YAMLError as e:
                     error_details = re.search(r"line (\d+), column (\d+)", str(e))
-                    print(f"YAML parsing error on line {error_details.group(1)}, column {error_details.group(2)}" if error_details else f"YAML parsing error: {e}")
+                    logger.warning(f"YAML parsing error on line {error_details.group(1)}, column {error_details.group(2)}" if error_details else f"YAML parsing error: {e}")
                     return None
                 
                 # Convert the parsed YAML to the respective pipeline
                 convert_func = pipeline_class_map.get(self.pipeline_type)
                 if not convert_func:
                     raise ValueError(f"Unsupported pipeline type for conversion: {self.pipeline_type}")
-                pipeline = convert_func(ci_config)
+                if self.pipeline_type == "gitlab-ci":
+                    pipeline = convert_func(ci_config, base_path=self.base_path)
+                else:
+                    pipeline = convert_func(ci_config)
             elif self.pipeline_type == "codepipeline":
-                print("Processing AWS CodePipeline...")
+                logger.debug("Processing AWS CodePipeline...")
 
                 try:
                     # Detect JSON or YAML format
                     pipeline_config = None
+                    json_code = extract_code_block(self.pipeline_code, ("json",))
                     if self.pipeline_code.strip().startswith("{"):
                         pipeline_config = json.loads(self.pipeline_code)
+                    elif json_code.strip().startswith("{"):
+                        pipeline_config = json.loads(json_code)
                     else:
                         yaml_code = extract_yaml_code(self.pipeline_code)
                         cleaned_code = clean_and_format_yaml(yaml_code)
-                        ruamel_yaml = YAML(typ='safe')
-                        pipeline_config = ruamel_yaml.load(cleaned_code)
+                        pipeline_config = load_ci_yaml(cleaned_code)
 
                     if not pipeline_config:
                         raise ValueError("Invalid AWS CodePipeline configuration.")
+                    self.config = pipeline_config
 
-                    print(f"Extracted AWS CodePipeline config: {pipeline_config}")
+                    logger.debug("Extracted AWS CodePipeline config: %s", pipeline_config)
 
                     # Convert parsed AWS CodePipeline to internal format
                     convert_func = pipeline_class_map.get(self.pipeline_type)
@@ -160,7 +191,7 @@ class PipelineParser:
                     return convert_func(pipeline_config)
 
                 except (YAMLError, json.JSONDecodeError) as e:
-                    print(f"Parsing error: {e}")
+                    logger.warning("Parsing error: %s", e)
                     return None
 
             else:
@@ -1,4 +1,15 @@
+import hashlib
 import json
+import re
+
+# Steps that run shell commands use this task name and keep the command in inputs["script"].
+SCRIPT_TASK = "script"
+# Repository checkout is the one step every platform has; it is kept platform neutral.
+CHECKOUT_TASK = "checkout"
+# Raw Groovy statements from a Jenkinsfile (e.g. `checkout scm`) keep the code in inputs["statement"].
+GROOVY_TASK = "groovy"
+
+
 class PipelineStep:
     def __init__(self, name, task, inputs=None,condition=None):
         """
@@ -31,9 +42,12 @@ class PipelineStep:
 
 
 class PipelineJob:
-    def __init__(self, name):
+    def __init__(self, name, depends_on=None):
         self.name = name
         self.steps = []  # A list to store steps in the job.
+        # Names of the jobs this job waits for. None means every job of the previous stage,
+        # which is the default ordering of stage-based platforms (Azure DevOps, GitLab, Jenkins).
+        self.depends_on = depends_on
 
     def add_step(self, step):
         """
@@ -50,10 +64,10 @@ class PipelineJob:
         """
         job_code = f"      - job: {self.name}\n"
         job_code += f"        steps:\n"
-        
+
         for step in self.steps:
             job_code += step.to_raw_code()  # Calling `to_raw_code()` on the individual step
-        
+
         return job_code
 
 
@@ -77,16 +91,17 @@ class PipelineStage:
         """
         stage_code = f"  - stage: {self.name}\n"
         stage_code += f"    jobs:\n"
-        
+
         for job in self.jobs:
             stage_code += job.to_raw_code()  # Calling `to_raw_code()` on the individual job
-        
+
         return stage_code
 
 
 class Pipeline:
     def __init__(self):
         self.stages = []
+        self.warnings = []  # Notes about content the last to_raw_code() call could not express.
 
     def add_stage(self, stage):
         """
@@ -108,15 +123,244 @@ class Pipeline:
                 stage.add_job(job)
                 break
 
+    def job_dependencies(self):
+        """
+        Resolve the job graph of the pipeline.
+
+        Jobs are keyed by (stage name, job name), as stages may reuse a job name (a `deploy` job in
+        both Dev and Prod). A name in depends_on means the job of that name in the same stage, else
+        in the closest stage before it.
+
+        :return: A dictionary mapping every job key to the keys of the jobs it waits for.
+        """
+        stages_of = {}  # job name -> indexes of the stages that have a job of that name
+        for index, stage in enumerate(self.stages):
+            for job in stage.jobs:
+                stages_of.setdefault(job.name, []).append(index)
+
+        def resolve(name, index, own_name):
+            candidates = stages_of.get(name, [])
+            if index in candidates and name != own_name:
+                return (self.stages[index].name, name)
+            earlier = [i for i in candidates if i < index]
+            later = [i for i in candidates if i > index]
+            if earlier or later:
+                return (self.stages[earlier[-1] if earlier else later[0]].name, name)
+            return None  # Dependencies on jobs that do not exist (e.g. optional needs) are ignored, as CI servers do
+
+        dependencies = {}
+        previous_stage_jobs = []
+        for index, stage in enumerate(self.stages):
+            for job in stage.jobs:
+                key = (stage.name, job.name)
+                if job.depends_on is None:
+                    predecessors = previous_stage_jobs
+                else:
+                    predecessors = [resolve(name, index, job.name) for name in job.depends_on]
+                dependencies[key] = [predecessor for predecessor in dict.fromkeys(predecessors)
+                                     if predecessor is not None and predecessor != key]
+            if stage.jobs:
+                previous_stage_jobs = [(stage.name, job.name) for job in stage.jobs]
+        return dependencies
+
+    def topological_order(self, dependencies=None):
+        """
+        Order the jobs so that every job comes after the jobs it waits for.
+
+        :raises ValueError: If the dependencies contain a cycle.
+        """
+        dependencies = dependencies if dependencies is not None else self.job_dependencies()
+        remaining = {key: len(predecessors) for key, predecessors in dependencies.items()}
+        successors = {key: [] for key in dependencies}
+        for key, predecessors in dependencies.items():
+            for predecessor in predecessors:
+                successors[predecessor].append(key)
+
+        order = [key for key, count in remaining.items() if count == 0]
+        for key in order:  # `order` grows while we iterate over it
+            for successor in successors[key]:
+                remaining[successor] -= 1
+                if remaining[successor] == 0:
+                    order.append(successor)
+
+        if len(order) != len(dependencies):
+            cyclic = sorted(f"{job} ({stage})" for (stage, job), count in remaining.items() if count > 0)
+            raise ValueError(f"Job dependencies contain a cycle: {', '.join(cyclic)}")
+        return order
+
+    def critical_path(self, durations=None):
+        """
+        Find the longest chain of dependent jobs, which bounds the pipeline's wall-clock time.
+
+        :param durations: Optional dictionary of job key (see job_dependencies) to duration; every job counts as 1 otherwise.
+        :return: Tuple of (job keys along the path, total length of the path).
+        """
+        dependencies = self.job_dependencies()
+        finish = {}
+        via = {}
+        for key in self.topological_order(dependencies):
+            start = 0
+            for predecessor in dependencies[key]:
+                if finish[predecessor] > start:
+                    start = finish[predecessor]
+                    via[key] = predecessor
+            finish[key] = start + (durations.get(key, 1) if durations else 1)
+
+        if not finish:
+            return [], 0
+        key = max(finish, key=finish.get)
+        length = finish[key]
+        path = [key]
+        while path[-1] in via:
+            path.append(via[path[-1]])
+        return path[::-1], length
+
+    def execution_levels(self):
+        """
+        Group job keys by the earliest wave they can run in when every runner is free.
+
+        The size of the largest level is the maximum parallelism the pipeline can use.
+        """
+        dependencies = self.job_dependencies()
+        level = {}
+        levels = []
+        for key in self.topological_order(dependencies):
+            level[key] = max((level[predecessor] + 1 for predecessor in dependencies[key]), default=0)
+            if level[key] == len(levels):
+                levels.append([])
+            levels[level[key]].append(key)
+        return levels
+
+    def structure_hash(self):
+        """
+        Hash of the pipeline's structure (type, stages, jobs, dependencies and steps).
+
+        Equal pipelines hash equally across runs, so the hash can key caches of derived artifacts
+        such as rendered diagrams.
+        """
+        structure = [type(self).__name__] + [
+            [stage.name] + [
+                [job.name, job.depends_on] + [
+                    [step.name, step.task, step.inputs, step.condition] for step in job.steps
+                ]
+                for job in stage.jobs
+            ]
+            for stage in self.stages
+        ]
+        encoded = json.dumps(structure, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
     def to_raw_code(self):
         pipeline_code = "trigger: none\n\npr:\n  branches:\n    include:\n      - main\n\njobs:\n"
-        
+
         for stage in self.stages:
             pipeline_code += stage.to_raw_code()  # Calling `to_raw_code()` on the individual stage
-        
+
         return pipeline_code
 
 
+# Helpers shared by the format implementations
+
+_PLAIN_YAML_SCALAR = re.compile(r"^[A-Za-z0-9_$(./][A-Za-z0-9_ .\-/@$()*=+]*$")
+_YAML_RESERVED_WORDS = {"true", "false", "yes", "no", "on", "off", "null", "y", "n", "~"}
+
+
+def yaml_scalar(value, indent=0):
+    """
+    Render a value as a YAML scalar that loads back to exactly the same value.
+
+    Multi-line strings become literal blocks indented by `indent` spaces, plain-safe strings
+    are written as-is and everything else falls back to JSON, which is valid YAML.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        if "\n" in value and not value.startswith((" ", "\n")):
+            indicator = "|" if value.endswith("\n") and not value.endswith("\n\n") else "|-"
+            padding = " " * indent
+            lines = value[:-1].split("\n") if indicator == "|" else value.split("\n")
+            return indicator + "\n" + "\n".join(padding + line if line else "" for line in lines)
+        if (
+            _PLAIN_YAML_SCALAR.match(value)
+            and value.lower() not in _YAML_RESERVED_WORDS
+            and not value.endswith(" ")
+            and not _looks_numeric(value)
+        ):
+            return value
+    return json.dumps(value)
+
+
+def _looks_numeric(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def yaml_mapping(mapping, indent):
+    """Render a dictionary as block-style YAML lines indented by `indent` spaces."""
+    padding = " " * indent
+    code = ""
+    for key, value in mapping.items():
+        code += f"{padding}{yaml_scalar(str(key))}: {yaml_scalar(value, indent + 2)}\n"
+    return code
+
+
+def identifier(name, used=None):
+    """
+    Derive a platform-safe identifier (job/stage id) from a display name.
+
+    :param used: Optional set of identifiers already taken; the result is made unique and added to it.
+    """
+    base = re.sub(r"[^A-Za-z0-9_]+", "_", str(name)).strip("_") or "job"
+    if base[0].isdigit():
+        base = f"_{base}"
+    candidate = base
+    if used is not None:
+        suffix = 2
+        while candidate in used:
+            candidate = f"{base}_{suffix}"
+            suffix += 1
+        used.add(candidate)
+    return candidate
+
+
+def default_step_name(task, inputs):
+    """Name used for steps that carry no explicit name (e.g. GitLab script lines)."""
+    if task == SCRIPT_TASK:
+        first_line = str(inputs.get("script", "")).strip().splitlines()
+        return first_line[0][:60] if first_line else "Run script"
+    if task == GROOVY_TASK:
+        return str(inputs.get("statement", "")).strip()[:60] or "Groovy"
+    if task == CHECKOUT_TASK:
+        return "Checkout"
+    return task
+
+
+def script_step(command, name=None, condition=None):
+    """Create a PipelineStep running a shell command."""
+    inputs = {"script": command}
+    return PipelineStep(name or default_step_name(SCRIPT_TASK, inputs), SCRIPT_TASK, inputs, condition)
+
+
+def _checkout_options_warning(step, hint):
+    options = ", ".join(f"`{key}`" for key in step.inputs)
+    return f"Options {options} of checkout step '{step.name}' were dropped; {hint}."
+
+
+def _groovy_string(value):
+    """Quote a value as a Groovy string literal that does not interpolate."""
+    escaped = str(value).replace("\\", "\\\\")
+    if "\n" in escaped:
+        return "'''" + escaped.replace("'''", "\\'\\'\\'") + "'''"
+    return "'" + escaped.replace("'", "\\'") + "'"
+
+
 # Pipeline Format Implementations
 
 class BambooPipeline(Pipeline):
@@ -140,10 +384,27 @@ class AWSPipeline(Pipeline):
     def __init__(self):
         super().__init__()
 
+    # Action categories for the providers CodePipeline ships with; anything else is a Build action.
+    ACTION_CATEGORIES = {
+        "CodeCommit": "Source",
+        "CodeStarSourceConnection": "Source",
+        "GitHub": "Source",
+        "S3": "Source",
+        "ECR": "Source",
+        "CodeBuild": "Build",
+        "CodeDeploy": "Deploy",
+        "CloudFormation": "Deploy",
+        "ECS": "Deploy",
+        "ElasticBeanstalk": "Deploy",
+        "Manual": "Approval",
+        "Lambda": "Invoke",
+    }
+
     def to_raw_code(self):
         if not self.stages:
             raise ValueError("No stages found in the pipeline.")
 
+        self.warnings = []
         aws_code_pipeline_json = {
             "version": "1.0",
             "stages": []
@@ -155,28 +416,47 @@ class AWSPipeline(Pipeline):
                 "actions": []
             }
 
+            action_names = set()
             for job in stage.jobs:
+                # Steps of one job run one after another; separate jobs run side by side.
+                steps = [step for step in job.steps if step.task != CHECKOUT_TASK]  # Sources arrive as input artifacts.
                 for step in job.steps:
+                    if step.task == CHECKOUT_TASK and step.inputs:
+                        self.warnings.append(_checkout_options_warning(step, "configure the source action instead"))
+                for run_order, step in enumerate(steps, start=1):
+                    provider = step.task
+                    configuration = dict(step.inputs) if step.inputs else {}
+                    if step.task not in self.ACTION_CATEGORIES:
+                        self.warnings.append(
+                            f"Step '{step.name}' ({step.task}) runs as a CodeBuild action; "
+                            f"move its commands into the buildspec of project '{identifier(job.name)}'."
+                        )
+                        provider = "CodeBuild"
+                        configuration = {"ProjectName": identifier(job.name)}
                     action = {
-                        "name": step.name,
+                        "name": identifier(step.name, action_names),
                         "actionTypeId": {
-                            "category": "Build",  # Modify as per actual AWS CodePipeline stage type
+                            "category": self.ACTION_CATEGORIES.get(provider, "Build"),
                             "owner": "AWS",
-                            "provider": step.task,
+                            "provider": provider,
                             "version": "1"
                         },
-                        "configuration": step.inputs if step.inputs else {},
+                        "configuration": configuration,
                         "outputArtifacts": [],
                         "inputArtifacts": [],
-                        "runOrder": 1  # AWS CodePipeline requires a run order
+                        "runOrder": run_order
                     }
                     stage_dict["actions"].append(action)
 
             if not stage_dict["actions"]:
-                raise ValueError(f"No actions found in stage: {stage.name}")
+                self.warnings.append(f"Stage '{stage.name}' has no actions and was left out.")
+                continue
 
             aws_code_pipeline_json["stages"].append(stage_dict)
 
+        if not aws_code_pipeline_json["stages"]:
+            raise ValueError("No actions found in any stage of the pipeline.")
+
         return json.dumps(aws_code_pipeline_json, indent=2)
 
 
@@ -202,64 +482,248 @@ class JenkinsPipeline(Pipeline):
         super().__init__()
 
     def to_raw_code(self):
-        jenkinsfile = "pipeline {\n"
+        self.warnings = []
+        jenkinsfile = "pipeline {\n    agent any\n\n    stages {\n"
         for stage in self.stages:
-            jenkinsfile += f"    stage('{stage.name}') {{\n"
-            for job in stage.jobs:
-                jenkinsfile += f"        {job.name}()\n"
-                for step in job.steps:
-                    jenkinsfile += f"        script: {step.name} - {step.task}\n"
-            jenkinsfile += "    }\n"
-        jenkinsfile += "}"
+            jenkinsfile += f"        stage({_groovy_string(stage.name)}) {{\n"
+            if len(stage.jobs) == 1 and stage.jobs[0].name == stage.name:
+                jenkinsfile += self._steps_block(stage.jobs[0], 12)
+            else:
+                # Several jobs in one stage map to parallel branches.
+                jenkinsfile += "            parallel {\n"
+                for job in stage.jobs:
+                    jenkinsfile += f"                stage({_groovy_string(job.name)}) {{\n"
+                    jenkinsfile += self._steps_block(job, 20)
+                    jenkinsfile += "                }\n"
+                jenkinsfile += "            }\n"
+            jenkinsfile += "        }\n"
+        jenkinsfile += "    }\n}\n"
         return jenkinsfile
 
+    def _steps_block(self, job, indent):
+        padding = " " * indent
+        block = f"{padding}steps {{\n"
+        for step in job.steps:
+            block += self._step_code(step, padding + "    ")
+        if not job.steps:
+            # Declarative pipelines reject empty `steps` blocks.
+            self.warnings.append(f"Job '{job.name}' has no steps; a placeholder echo was added.")
+            block += f"{padding}    echo {_groovy_string(job.name)}\n"
+        block += f"{padding}}}\n"
+        return block
+
+    def _step_code(self, step, padding):
+        if step.condition:
+            self.warnings.append(f"Condition of step '{step.name}' was dropped; use a `when` block instead.")
+        if step.task == SCRIPT_TASK:
+            script = step.inputs.get("script", "")
+            if step.name == default_step_name(SCRIPT_TASK, step.inputs):
+                return f"{padding}sh {_groovy_string(script)}\n"
+            return f"{padding}sh script: {_groovy_string(script)}, label: {_groovy_string(step.name)}\n"
+        if step.task == CHECKOUT_TASK:
+            if step.inputs:
+                self.warnings.append(_checkout_options_warning(step, "pass them to a GitSCM checkout instead"))
+            return f"{padding}checkout scm\n"
+        if step.task == GROOVY_TASK:
+            return f"{padding}{step.inputs.get('statement', '')}\n"
+        self.warnings.append(f"Step '{step.name}' ({step.task}) has no Jenkins equivalent and was left out.")
+        return f"{padding}// {step.name}: {step.task} has no Jenkins equivalent\n"
+
 
 class GitLabPipeline(Pipeline):
     def __init__(self):
         super().__init__()
 
     def to_raw_code(self):
+        self.warnings = []
         gitlab_yaml = "stages:\n"
         for stage in self.stages:
-            gitlab_yaml += f"  - {stage.name}\n"
+            gitlab_yaml += f"  - {yaml_scalar(stage.name)}\n"
         for stage in self.stages:
-            gitlab_yaml += f"\n{stage.name}:\n"
             for job in stage.jobs:
-                gitlab_yaml += f"  script: {job.name}\n"
+                gitlab_yaml += f"\n{yaml_scalar(job.name)}:\n"
+                gitlab_yaml += f"  stage: {yaml_scalar(stage.name)}\n"
+                if job.depends_on is not None:
+                    gitlab_yaml += f"  needs: [{', '.join(yaml_scalar(name) for name in job.depends_on)}]\n"
+                script_lines = []
                 for step in job.steps:
-                    gitlab_yaml += f"    - {step.name}: {step.task}\n"
+                    script_line = self._script_line(step)
+                    if script_line is not None:
+                        script_lines.append(script_line)
+                    elif step.task != CHECKOUT_TASK:
+                        gitlab_yaml += f"  # {step.name}: {step.task} has no GitLab CI equivalent\n"
+                if not script_lines:
+                    self.warnings.append(f"Job '{job.name}' has no script steps; GitLab CI requires at least one.")
+                    gitlab_yaml += "  script: []\n"
+                    continue
+                gitlab_yaml += "  script:\n"
+                for line in script_lines:
+                    gitlab_yaml += f"    - {yaml_scalar(line, 6)}\n"
         return gitlab_yaml
 
+    def _script_line(self, step):
+        """The `script` line of a step, or None for a step GitLab CI cannot run or, like checkout, does not need."""
+        if step.condition:
+            self.warnings.append(f"Condition of step '{step.name}' was dropped; use job `rules` instead.")
+        if step.task == SCRIPT_TASK:
+            return step.inputs.get("script", "")
+        if step.task != CHECKOUT_TASK:  # GitLab runners clone the repository before the job starts.
+            self.warnings.append(f"Step '{step.name}' ({step.task}) has no GitLab CI equivalent and was left out.")
+        elif step.inputs:
+            self.warnings.append(_checkout_options_warning(step, "use GIT_DEPTH and the other Git variables instead"))
+        return None
+
 
 class AzureDevOpsPipeline(Pipeline):
     def __init__(self):
         super().__init__()
 
+    AZURE_TASK = re.compile(r"^[A-Za-z][\w.-]*@\d+$")
+
     def to_raw_code(self):
-        azure_yaml = "trigger:\n  branches:\n    include:\n      - main\n\njobs:\n"
-        for stage in self.stages:
-            azure_yaml += f"  - job: {stage.name}\n"
-            azure_yaml += f"    steps:\n"
+        self.warnings = []
+        azure_yaml = "trigger:\n  branches:\n    include:\n      - main\n\nstages:\n"
+        used_stage_ids = set()
+        stage_ids = [identifier(stage.name, used_stage_ids) for stage in self.stages]
+        stage_of_job = {job.name: index for index, stage in enumerate(self.stages) for job in stage.jobs}
+
+        previous_stage_index = None
+        for index, stage in enumerate(self.stages):
+            stage_id = stage_ids[index]
+            azure_yaml += f"  - stage: {stage_id}\n"
+            if stage_id != stage.name:
+                azure_yaml += f"    displayName: {yaml_scalar(stage.name)}\n"
+            stage_depends_on = self._stage_depends_on(stage, index, previous_stage_index, stage_of_job)
+            if stage_depends_on is not None:
+                azure_yaml += f"    dependsOn: [{', '.join(stage_ids[i] for i in stage_depends_on)}]\n"
+            azure_yaml += "    jobs:\n"
+            used_job_ids = set()
+            job_ids = {job.name: identifier(job.name, used_job_ids) for job in stage.jobs}
             for job in stage.jobs:
-                azure_yaml += f"      - script: {job.name}\n"
+                job_id = job_ids[job.name]
+                azure_yaml += f"      - job: {job_id}\n"
+                if job_id != job.name:
+                    azure_yaml += f"        displayName: {yaml_scalar(job.name)}\n"
+                same_stage = [job_ids[name] for name in job.depends_on or [] if stage_of_job.get(name) == index]
+                if same_stage:
+                    azure_yaml += f"        dependsOn: [{', '.join(same_stage)}]\n"
+                azure_yaml += "        pool:\n          vmImage: ubuntu-latest\n"
+                azure_yaml += "        steps:\n" if job.steps else "        steps: []\n"
                 for step in job.steps:
-                    azure_yaml += f"        - name: {step.name}\n"
-                    azure_yaml += f"          script: {step.task}\n"
+                    azure_yaml += self._step_code(step)
+            if stage.jobs:
+                previous_stage_index = index
         return azure_yaml
 
+    def _stage_depends_on(self, stage, index, previous_stage_index, stage_of_job):
+        """
+        Stage-level dependsOn covering the cross-stage dependencies of the stage's jobs.
+
+        Returns None when the default (wait for the previous stage) already expresses them.
+        """
+        if all(job.depends_on is None for job in stage.jobs):
+            return None
+        depends_on = set()
+        for job in stage.jobs:
+            if job.depends_on is None:
+                if previous_stage_index is not None:
+                    depends_on.add(previous_stage_index)
+                continue
+            depends_on.update(stage_of_job[name] for name in job.depends_on if stage_of_job.get(name, index) != index)
+        default = {previous_stage_index} if previous_stage_index is not None else set()
+        return None if depends_on == default else sorted(depends_on)
+
+    def _step_code(self, step):
+        if step.task == SCRIPT_TASK:
+            step_code = f"          - script: {yaml_scalar(step.inputs.get('script', ''), 14)}\n"
+            named = step.name != default_step_name(SCRIPT_TASK, step.inputs)
+        elif step.task == CHECKOUT_TASK:
+            step_code = f"          - checkout: {yaml_scalar(step.inputs.get('repository', 'self'))}\n"
+            step_code += yaml_mapping({key: value for key, value in step.inputs.items() if key != "repository"}, 12)
+            named = step.name != default_step_name(CHECKOUT_TASK, step.inputs)
+        elif self.AZURE_TASK.match(str(step.task)):
+            step_code = f"          - task: {step.task}\n"
+            named = step.name != step.task
+        else:
+            self.warnings.append(f"Step '{step.name}' ({step.task}) has no Azure DevOps equivalent and was left out.")
+            return f"          # {step.name}: {step.task} has no Azure DevOps equivalent\n"
+
+        if named:
+            step_code += f"            displayName: {yaml_scalar(step.name)}\n"
+        if step.condition:
+            step_code += f"            condition: {yaml_scalar(step.condition)}\n"
+        if step.inputs and step.task not in (SCRIPT_TASK, CHECKOUT_TASK):
+            step_code += "            inputs:\n"
+            step_code += yaml_mapping(step.inputs, 14)
+        return step_code
+
 
 class GitHubActionsPipeline(Pipeline):
     def __init__(self):
         super().__init__()
 
+    CHECKOUT_ACTION = "actions/checkout@v4"
+
     def to_raw_code(self):
+        self.warnings = []
         github_yaml = "name: CI/CD\non: [push]\n\njobs:\n"
+        used_ids = set()
+        job_ids = {}
+        for stage in self.stages:
+            for job in stage.jobs:
+                job_ids[id(job)] = identifier(job.name, used_ids)
+        ids_by_name = {job.name: job_ids[id(job)] for stage in self.stages for job in stage.jobs}
+
+        previous_stage_ids = []
         for stage in self.stages:
-            github_yaml += f"  {stage.name}:\n"
-            github_yaml += f"    runs-on: ubuntu-latest\n"
-            github_yaml += f"    steps:\n"
+            stage_ids = []
             for job in stage.jobs:
+                job_id = job_ids[id(job)]
+                stage_ids.append(job_id)
+                github_yaml += f"  {job_id}:\n"
+                if job_id != job.name:
+                    github_yaml += f"    name: {yaml_scalar(job.name)}\n"
+                # Without explicit dependencies stages run in order, so a job waits for the previous stage.
+                if job.depends_on is not None:
+                    needs = [ids_by_name[name] for name in job.depends_on if name in ids_by_name]
+                else:
+                    needs = previous_stage_ids
+                if needs:
+                    github_yaml += f"    needs: [{', '.join(needs)}]\n"
+                github_yaml += f"    runs-on: ubuntu-latest\n"
+                github_yaml += f"    steps:\n" if job.steps else "    steps: []\n"
                 for step in job.steps:
-                    github_yaml += f"      - name: {step.name}\n"
-                    github_yaml += f"        run: {step.task}\n"
+                    github_yaml += self._step_code(step)
+            if stage_ids:
+                previous_stage_ids = stage_ids
         return github_yaml
+
+    def _step_code(self, step):
+        if step.task == SCRIPT_TASK:
+            step_code = f"      - name: {yaml_scalar(step.name)}\n"
+            step_code += f"        run: {yaml_scalar(step.inputs.get('script', ''), 10)}\n"
+        elif step.task == CHECKOUT_TASK or "/" in str(step.task) or str(step.task).startswith("docker://"):
+            uses = self.CHECKOUT_ACTION if step.task == CHECKOUT_TASK else step.task
+            step_code = f"      - name: {yaml_scalar(step.name)}\n"
+            step_code += f"        uses: {yaml_scalar(uses)}\n"
+            if step.inputs:
+                step_code += "        with:\n"
+                step_code += yaml_mapping(step.inputs, 10)
+        else:
+            self.warnings.append(f"Step '{step.name}' ({step.task}) has no GitHub Actions equivalent and was left out.")
+            return f"      # {step.name}: {step.task} has no GitHub Actions equivalent\n"
+
+        if step.condition:
+            step_code += f"        if: {yaml_scalar(step.condition)}\n"
+        return step_code
+
+
+# Maps the pipeline type keys used by PipelineParser and the UI to their model classes.
+PIPELINE_TYPE_CLASSES = {
+    "jenkinsfile-scripted": JenkinsPipeline,
+    "jenkinsfile-declarative": JenkinsPipeline,
+    "azure-pipelines": AzureDevOpsPipeline,
+    "gitlab-ci": GitLabPipeline,
+    "github-actions": GitHubActionsPipeline,
+    "codepipeline": AWSPipeline,
+}
@@ -0,0 +1,120 @@
+# prefetch.py
+
+"""
+Speculative retrieval while the user is still writing the request.
+
+When the prompt text changes, the UI schedules a prefetch: after PREFETCH_DEBOUNCE_SECONDS without
+another change, a background thread embeds the prompt and runs retrieval, and the resulting
+generation prompt is kept, keyed by prompt, document directory and index generation. When
+"Generate Pipeline" is clicked, build_generation_prompt takes the prefetched prompt and goes
+straight to the provider:
+
+    retrieval_prefetcher.schedule(session_id, user_prompt, directory_path)   # on every change
+    final_prompt = retrieval_prefetcher.take(user_prompt, directory_path, generation)   # or None
+
+Each session has at most one pending prefetch: a newer prompt replaces (cancels) the older one
+before it starts. take() waits for a prefetch of the same prompt that is already running instead
+of retrieving twice, and drops one that has not started yet.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from telemetry import metrics, record_cache
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_DEBOUNCE_SECONDS = float(os.getenv("COPILOT_PREFETCH_DEBOUNCE_SECONDS", "0.3"))
+PREFETCH_CACHE_ENTRIES = 64
+# How long take() waits for a running prefetch of the requested prompt.
+PREFETCH_WAIT_SECONDS = 10
+
+
+class RetrievalPrefetcher:
+    def __init__(self, retrieve, debounce_seconds=PREFETCH_DEBOUNCE_SECONDS, max_entries=PREFETCH_CACHE_ENTRIES):
+        """`retrieve(prompt, directory_path)` returns (index generation, generation prompt)."""
+        self.retrieve = retrieve
+        self.debounce_seconds = debounce_seconds
+        self.max_entries = max_entries
+        self._results = OrderedDict()  # (prompt, directory, generation) -> generation prompt
+        self._pending = {}  # owner -> (prompt, directory, due)
+        self._running = None  # (prompt, directory)
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, owner, prompt, directory_path):
+        """Prefetch for `prompt` once it has not changed for the debounce time, replacing the owner's pending one."""
+        if not prompt or not prompt.strip():
+            self.cancel(owner)
+            return
+        directory = os.path.abspath(directory_path)
+        with self._condition:
+            previous = self._pending.get(owner)
+            if previous is not None and previous[:2] != (prompt, directory):
+                metrics.increment("copilot_prefetches_total", result="cancelled")
+            self._pending[owner] = (prompt, directory, time.monotonic() + self.debounce_seconds)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="retrieval-prefetch", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def cancel(self, owner):
+        with self._condition:
+            if self._pending.pop(owner, None) is not None:
+                metrics.increment("copilot_prefetches_total", result="cancelled")
+
+    def take(self, prompt, directory_path, generation, timeout=PREFETCH_WAIT_SECONDS):
+        """The prefetched generation prompt for this prompt and index generation, or None."""
+        directory = os.path.abspath(directory_path)
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            # Not started yet: the caller retrieves right away rather than waiting out the debounce
+            for owner, (pending_prompt, pending_directory, _) in list(self._pending.items()):
+                if (pending_prompt, pending_directory) == (prompt, directory):
+                    del self._pending[owner]
+            while self._running == (prompt, directory) and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            result = self._results.get((prompt, directory, generation))
+            if result is not None:
+                self._results.move_to_end((prompt, directory, generation))
+        record_cache("prefetch", result is not None)
+        return result
+
+    def _next(self):
+        """Wait for the earliest pending prefetch to be due and claim it."""
+        with self._condition:
+            while True:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                owner, (prompt, directory, due) = min(self._pending.items(), key=lambda item: item[1][2])
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                del self._pending[owner]
+                self._running = (prompt, directory)
+                return prompt, directory
+
+    def _work(self):
+        while True:
+            prompt, directory = self._next()
+            result = None
+            try:
+                generation, final_prompt = self.retrieve(prompt, directory)
+                result = ((prompt, directory, generation), final_prompt)
+                metrics.increment("copilot_prefetches_total", result="completed")
+            except Exception as e:
+                metrics.increment("copilot_prefetches_total", result="failed")
+                logger.debug("Retrieval prefetch failed: %s", e)
+            with self._condition:
+                if result is not None:
+                    self._results[result[0]] = result[1]
+                    self._results.move_to_end(result[0])
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+                self._running = None
+                self._condition.notify_all()
@@ -0,0 +1,119 @@
+# prompt_builder.py
+
+"""
+Versioned prompt templates for the LLM providers.
+
+A template has a "system" part and a "user" part with a {prompt} field for the retrieved context
+and the user's request. From version 2 on, everything that does not change between requests
+(system instructions, output format, the placeholder list) sits in the system part, so every call
+starts with the same prefix and the providers' prompt caching can reuse it; only the retrieved
+context and the request, in that order, follow. Version 1 is the original layout, kept so that
+benchmark runs can compare the two.
+
+    messages = build_messages("generation", prompt)
+
+COPILOT_PROMPT_VERSION pins the version of the generation template.
+"""
+
+import os
+
+from telemetry import tracer
+
+GENERATION_SYSTEM = (
+    "You are an expert in generating clean, modular, scalable, and reusable code. "
+    "The code should follow best practices for software architecture, focusing on high maintainability and easy scalability. "
+    "Please organize the code into functions, classes, or modules as appropriate to make it easy to reuse in different contexts. "
+    "Ensure the code is well-commented and follows the principles of SOLID design patterns, aiming for simplicity and clarity. "
+    "Additionally, ensure that security and performance considerations are addressed while maintaining modularity and reusability. "
+    "Where applicable, provide meaningful variable names, and break down complex logic into smaller, easier-to-understand components."
+)
+GENERATION_INSTRUCTIONS = (
+    "The output must be syntactically correct, correctly indented, and formatted as per the type of generated output."
+    "In addition to generating the code, also provide a list of all placeholders, variables, "
+    "and values that need to be replaced, along with a brief description of each. Ensure the list is at the bottom of the generated output."
+)
+CONTEXT_PREAMBLE = (
+    "The user's message starts with best-practice guidance retrieved from the organisation's documents, "
+    "one statement per line, followed by the request after \"User Prompt:\". "
+    "Apply the guidance wherever it is relevant to the request."
+)
+REPAIR_SYSTEM = (
+    "You fix syntax and structure errors in CI/CD pipeline code. "
+    "Reply with the corrected lines only, in a single fenced code block, and change nothing else."
+)
+EDIT_SYSTEM = (
+    "You change existing CI/CD pipelines. You are given an outline of a pipeline's stages, jobs and steps "
+    "and a requested change. Reply with only the change, as a JSON patch in a single fenced code block:\n"
+    '{"operations": [...]}\n'
+    "Operations, applied in order (stages, jobs and steps are referred to by their quoted names in the outline):\n"
+    '{"op": "add_stage", "stage": name, "after" or "before": stage, "jobs": [job]}\n'
+    '{"op": "remove_stage", "stage": name}\n'
+    '{"op": "add_job", "stage": stage, "job": name, "depends_on": [job names], "steps": [step], "after" or "before": job}\n'
+    '{"op": "update_job", "stage": stage, "job": name, "set": {"name", "depends_on"}}\n'
+    '{"op": "remove_job", "stage": stage, "job": name}\n'
+    '{"op": "add_step", "stage": stage, "job": job, "step": step, "after" or "before": step name}\n'
+    '{"op": "update_step", "stage": stage, "job": job, "step": name, "set": {"name", "script", "task", "inputs", "condition"}}\n'
+    '{"op": "remove_step", "stage": stage, "job": job, "step": name}\n'
+    'A job is {"job": name, "depends_on": [job names], "steps": [step]}. A step is {"name": ..., "script": shell commands} '
+    'or {"name": ..., "task": platform task or action, "inputs": {...}, "condition": ...}. '
+    "Without \"after\" or \"before\", items are added at the end. Leave out everything that does not change."
+)
+
+# (name, version) -> {"system", "user"}; published versions must not be edited, add a new one instead.
+PROMPT_TEMPLATES = {
+    ("generation", 1): {
+        "system": GENERATION_SYSTEM,
+        "user": "{prompt}\n\n" + GENERATION_INSTRUCTIONS,
+    },
+    ("generation", 2): {
+        "system": GENERATION_SYSTEM + "\n\n" + GENERATION_INSTRUCTIONS + "\n\n" + CONTEXT_PREAMBLE,
+        "user": "{prompt}",
+    },
+    ("repair", 1): {
+        "system": REPAIR_SYSTEM,
+        "user": "{prompt}",
+    },
+    ("edit", 1): {
+        "system": EDIT_SYSTEM,
+        "user": "{prompt}",
+    },
+}
+CURRENT_PROMPT_VERSIONS = {
+    "generation": 2,
+    "repair": 1,
+    "edit": 1,
+}
+
+
+def prompt_version(name):
+    """Version of the template `name` in use."""
+    if name == "generation" and os.getenv("COPILOT_PROMPT_VERSION"):
+        return int(os.getenv("COPILOT_PROMPT_VERSION"))
+    return CURRENT_PROMPT_VERSIONS[name]
+
+
+def prompt_template(name, version=None):
+    """
+    Returns:
+        tuple: (version, template)
+
+    Raises:
+        ValueError: If there is no such template.
+    """
+    version = version or prompt_version(name)
+    template = PROMPT_TEMPLATES.get((name, version))
+    if template is None:
+        raise ValueError(f"Unknown prompt template: {name} v{version}")
+    return version, template
+
+
+def build_messages(name, prompt, version=None):
+    """Chat messages for `prompt` laid out by the template; the template id is added to the current span."""
+    version, template = prompt_template(name, version)
+    current = tracer.current_span()
+    if current is not None:
+        current.set_attribute("llm.prompt_template", f"{name}@v{version}")
+    return [
+        {"role": "system", "content": template["system"]},
+        {"role": "user", "content": template["user"].format(prompt=prompt)},
+    ]
@@ -3,9 +3,33 @@ from qdrant_client.models import PointStruct
 from extract_text import extract_text_from_docx
 import uuid
 import os
+import logging
 from config import embedding_model
 from sentence_transformers import util
 
+logger = logging.getLogger(__name__)
+
+
+def initialize_qdrant_client():
+    """
+    Qdrant client for the configured index storage.
+
+    COPILOT_QDRANT_URL points at a shared Qdrant server (gRPC unless COPILOT_QDRANT_PREFER_GRPC=0,
+    on COPILOT_QDRANT_GRPC_PORT; COPILOT_QDRANT_API_KEY if it needs one). COPILOT_QDRANT_PATH keeps
+    the index on disk; Qdrant locks that directory, so only one process can open it at a time.
+    Without either the index lives in memory. The client pools its connections and is safe to
+    share between threads.
+    """
+    url = os.getenv("COPILOT_QDRANT_URL")
+    if url:
+        return QdrantClient(
+            url=url,
+            api_key=os.getenv("COPILOT_QDRANT_API_KEY"),
+            prefer_grpc=os.getenv("COPILOT_QDRANT_PREFER_GRPC", "1") == "1",
+            grpc_port=int(os.getenv("COPILOT_QDRANT_GRPC_PORT", "6334")),
+        )
+    return QdrantClient(path=os.getenv("COPILOT_QDRANT_PATH") or ":memory:")
+
 
 def create_qdrant_collection(client, collection_name, vector_size, distance):
     """Create or recreate a Qdrant collection."""
@@ -17,9 +41,9 @@ def create_qdrant_collection(client, collection_name, vector_size, distance):
                 "distance": distance,
             },
         )
-        print(f"Collection '{collection_name}' created successfully.")
+        logger.info("Collection '%s' created successfully.", collection_name)
     except Exception as e:
-        print(f"Error creating Qdrant collection: {e}")
+        logger.error("Error creating Qdrant collection %s: %s", collection_name, e)
 
 
 
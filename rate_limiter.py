@@ -0,0 +1,355 @@
+# rate_limiter.py
+
+"""
+Client-side rate limiting and request coalescing for the LLM providers.
+
+RateLimiter holds two token buckets per provider, one for tokens per minute and one for requests
+per minute, shared by every session of the process. A request reserves its prompt tokens plus
+its max_tokens (the way Azure OpenAI counts it against the quota) and waits in a priority queue
+until both buckets can cover it, so bursts from several sessions are spread out instead of
+turning into 429s. settle() returns the unused part of the reservation once the real usage is
+known, and penalize() stops the whole queue when the service answers 429 anyway.
+
+    limiter = get_limiter("Azure")
+    reservation = limiter.acquire(tokens, priority=PRIORITY_INTERACTIVE)
+    ...
+    limiter.settle(reservation, used_tokens)
+
+RequestCoalescer lets identical in-flight requests share one completion: the first caller runs
+it and the others wait for its result.
+
+Limits come from <PREFIX>_TPM and <PREFIX>_RPM (AZURE_OPENAI_TPM, AWS_BEDROCK_RPM, ...); a
+provider without them is not limited.
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+from telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REPAIR = 1
+PRIORITY_BATCH = 10
+# Environment variable prefix of each provider's limits.
+LIMIT_SETTINGS = {
+    "Azure": "AZURE_OPENAI",
+    "AWS": "AWS_BEDROCK",
+}
+# Retries of a request the service rejected with 429 despite the limiter.
+RATE_LIMIT_RETRIES = 3
+DEFAULT_RETRY_AFTER_SECONDS = 10
+# Upper bound of a single wait so async waiters notice cancellation and queue changes.
+MAX_WAIT_SLICE_SECONDS = 0.5
+
+
+class RateLimited(Exception):
+    """Raised by the provider backends when the service answers 429 / throttles the request."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after_seconds(headers):
+    """Seconds the service asked to wait (retry-after-ms or retry-after header), or None."""
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1)):
+        value = headers.get(header) if headers else None
+        try:
+            return float(value) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class TokenBucket:
+    """`capacity` units refilled continuously over a minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        # A request larger than the whole bucket only waits for a full bucket
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class RateLimiter:
+    def __init__(self, name, tokens_per_minute=None, requests_per_minute=None):
+        self.name = name
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.paused_until = 0.0
+        self._queue = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    @property
+    def limited(self):
+        return self.tokens is not None or self.requests is not None
+
+    def _try_take(self, ticket, tokens):
+        """Take the capacity for the ticket if it is first in line; otherwise return the seconds to wait."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self._queue[0] != ticket:
+            return MAX_WAIT_SLICE_SECONDS
+        waits = [0.0]
+        for bucket, amount in ((self.tokens, tokens), (self.requests, 1)):
+            if bucket is not None:
+                bucket.refill(now)
+                waits.append(bucket.wait_time(amount))
+        if max(waits) > 0:
+            return max(waits)
+        if self.tokens is not None:
+            self.tokens.level -= tokens
+        if self.requests is not None:
+            self.requests.level -= 1
+        heapq.heappop(self._queue)
+        self._condition.notify_all()
+        return 0.0
+
+    def _enqueue(self, priority):
+        ticket = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _leave(self, ticket):
+        with self._condition:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+
+    def acquire(self, tokens, priority=PRIORITY_INTERACTIVE):
+        """Block until `tokens` and one request are available; returns the reservation for settle()."""
+        if not self.limited and time.monotonic() >= self.paused_until:
+            return tokens
+        started = time.monotonic()
+        ticket = self._enqueue(priority)
+        try:
+            with self._condition:
+                while True:
+                    wait = self._try_take(ticket, tokens)
+                    if not wait:
+                        break
+                    self._condition.wait(min(wait, MAX_WAIT_SLICE_SECONDS))
+        finally:
+            self._leave(ticket)
+        metrics.observe("copilot_rate_limit_wait_seconds", time.monotonic() - started, provider=self.name)
+        return tokens
+
+    async def acquire_async(self, tokens, priority=PRIORITY_INTERACTIVE):
+        """acquire() for coroutines; cancelling the waiting task gives up its place in the queue."""
+        if not self.limited and time.monotonic() >= self.paused_until:
+            return tokens
+        started = time.monotonic()
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_take(ticket, tokens)
+                if not wait:
+                    break
+                await asyncio.sleep(min(wait, MAX_WAIT_SLICE_SECONDS))
+        finally:
+            self._leave(ticket)
+        metrics.observe("copilot_rate_limit_wait_seconds", time.monotonic() - started, provider=self.name)
+        return tokens
+
+    def settle(self, reserved, used):
+        """Give back the part of a reservation the request did not use (`used` None keeps it all)."""
+        if self.tokens is None or used is None or used >= reserved:
+            return
+        with self._condition:
+            self.tokens.refill(time.monotonic())
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved - used)
+            self._condition.notify_all()
+
+    def penalize(self, retry_after=None):
+        """The service answered 429: hold every queued request for `retry_after` seconds."""
+        seconds = retry_after or DEFAULT_RETRY_AFTER_SECONDS
+        metrics.increment("copilot_rate_limited_total", provider=self.name)
+        logger.warning("%s rate limited the client; pausing requests for %.1f s", self.name, seconds)
+        with self._condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            if self.tokens is not None:
+                self.tokens.level = min(self.tokens.level, 0.0)
+
+
+class RequestCoalescer:
+    """Share one result between identical requests that are in flight at the same time."""
+
+    def __init__(self):
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = self._in_flight[key] = concurrent.futures.Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self, key, function):
+        """Call function() unless an identical request is running, in which case wait for its result."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                metrics.increment("copilot_coalesced_requests_total")
+                try:
+                    return future.result()
+                except concurrent.futures.CancelledError:
+                    continue  # the leader gave up; run it ourselves
+            try:
+                result = function()
+            except BaseException as e:
+                self._finish(key, future, error=e)
+                raise
+            self._finish(key, future, result)
+            return result
+
+    async def run_async(self, key, function):
+        """run() for coroutine functions; a cancelled leader hands the request to one of its waiters."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                metrics.increment("copilot_coalesced_requests_total")
+                try:
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except asyncio.CancelledError:
+                    if future.cancelled():
+                        continue
+                    raise
+            try:
+                result = await function()
+            except asyncio.CancelledError:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+                future.cancel()
+                raise
+            except Exception as e:
+                self._finish(key, future, error=e)
+                raise
+            self._finish(key, future, result)
+            return result
+
+
+def call_limited(provider, tokens, call, priority=PRIORITY_INTERACTIVE):
+    """
+    Run call() within the provider's limits, queueing it again after a 429.
+
+    call() returns (result, tokens used or None) and raises RateLimited when throttled.
+    """
+    limiter = get_limiter(provider)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        reserved = limiter.acquire(tokens, priority)
+        try:
+            result, used = call()
+        except RateLimited as e:
+            limiter.penalize(e.retry_after)
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            continue
+        limiter.settle(reserved, used)
+        return result
+
+
+def stream_limited(provider, tokens, start, priority=PRIORITY_INTERACTIVE):
+    """
+    call_limited() for a streamed response; yields the pieces of the stream.
+
+    start() opens the stream, raising RateLimited when throttled, and returns an iterator of
+    (piece, tokens used or None). The usage usually comes with the last item, so the reservation
+    is settled when the stream ends.
+    """
+    limiter = get_limiter(provider)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        reserved = limiter.acquire(tokens, priority)
+        try:
+            stream = start()
+        except RateLimited as e:
+            limiter.penalize(e.retry_after)
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            continue
+        break
+    used = None
+    try:
+        for piece, piece_used in stream:
+            if piece_used is not None:
+                used = piece_used
+            if piece:
+                yield piece
+    finally:
+        limiter.settle(reserved, used)
+
+
+async def call_limited_async(provider, tokens, call, priority=PRIORITY_INTERACTIVE):
+    """call_limited() for a coroutine function `call`."""
+    limiter = get_limiter(provider)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        reserved = await limiter.acquire_async(tokens, priority)
+        try:
+            result, used = await call()
+        except RateLimited as e:
+            limiter.penalize(e.retry_after)
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            continue
+        limiter.settle(reserved, used)
+        return result
+
+
+def request_key(*parts):
+    """Coalescing key of a request made of its provider, model, settings and prompt."""
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def _limit(prefix, kind):
+    value = os.getenv(f"{prefix}_{kind}")
+    return int(value) if value else None
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+coalescer = RequestCoalescer()
+
+
+def get_limiter(provider):
+    """The process-wide limiter of a provider, configured from the environment on first use."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            prefix = LIMIT_SETTINGS.get(provider)
+            _limiters[provider] = RateLimiter(
+                provider,
+                _limit(prefix, "TPM") if prefix else None,
+                _limit(prefix, "RPM") if prefix else None,
+            )
+        return _limiters[provider]
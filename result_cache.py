@@ -0,0 +1,94 @@
+# result_cache.py
+
+"""
+Size-bounded cache of generation results for the Streamlit UI.
+
+Every widget interaction reruns the Streamlit script, so whatever a generation produced (the
+code, the parsed pipeline, diagrams, reports, the retrieved context) must be kept somewhere to be
+shown again. The UI keeps one ResultCache per session in st.session_state, keyed by the prompt
+and the generation settings, and renders from it on every rerun:
+
+    results = st.session_state.results
+    key = result_key(user_prompt, provider_flag)
+    results.put(key, {"code": ..., "pipeline": ..., ...})
+    result = results.get(key)
+
+The least recently used results are dropped beyond RESULT_CACHE_ENTRIES entries or
+RESULT_CACHE_BYTES bytes of code, text and images.
+"""
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+from telemetry import record_cache
+
+RESULT_CACHE_ENTRIES = 8
+RESULT_CACHE_BYTES = 32 * 1024 * 1024
+
+
+def result_key(*parts):
+    """Key of a result made of its prompt and settings."""
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def result_size(value):
+    """Approximate bytes of the strings, bytes and images in a result; other objects count their shallow size."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, dict):
+        return sum(result_size(key) + result_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(result_size(item) for item in value)
+    if hasattr(value, "getbuffer"):  # BytesIO diagrams
+        return value.getbuffer().nbytes
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    def __init__(self, max_entries=RESULT_CACHE_ENTRIES, max_bytes=RESULT_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The result stored under `key` (now the most recently used), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        record_cache("result", entry is not None)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, result):
+        """Store (or re-measure, after adding to it) a result, dropping the least recently used ones over the limits."""
+        size = result_size(result)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            # The newest result stays even when it alone is over the byte limit
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+
+    def latest(self):
+        """The most recently stored or read result, or None."""
+        with self._lock:
+            return next(reversed(self._entries.values()))[0] if self._entries else None
+
+    @property
+    def bytes(self):
+        return self._bytes
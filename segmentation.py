@@ -0,0 +1,72 @@
+# segmentation.py
+
+"""
+Pluggable sentence segmentation for document ingestion.
+
+Ingestion only needs sentence boundaries, but the full en_core_web_sm pipeline also tags,
+lemmatizes and runs NER over every document. The segmenters, from fastest to slowest:
+
+    sentencizer   spaCy's rule-based splitter on punctuation; no model is loaded
+    parser        en_core_web_sm with only the components the dependency parser needs; the same
+                  boundaries as "full"
+    full          the whole en_core_web_sm pipeline, as before
+
+    sentences = get_segmenter("parser").split(paragraphs)   # one list of sentences per text
+
+COPILOT_SEGMENTER picks the default; `python benchmark.py --segmentation` compares throughput
+and boundary agreement on the documents.
+"""
+
+import logging
+import os
+import threading
+
+import spacy
+
+logger = logging.getLogger(__name__)
+
+SEGMENTERS = ("sentencizer", "parser", "full")
+SEGMENTER = os.getenv("COPILOT_SEGMENTER", "parser")
+SPACY_MODEL = "en_core_web_sm"
+# Components the parser does not read; tok2vec stays as the parser listens to it.
+UNUSED_COMPONENTS = ["tagger", "attribute_ruler", "lemmatizer", "ner"]
+PIPE_BATCH_SIZE = 64
+
+
+def _load(name):
+    if name == "sentencizer":
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+        return nlp
+    if name == "parser":
+        return spacy.load(SPACY_MODEL, exclude=UNUSED_COMPONENTS)
+    if name == "full":
+        return spacy.load(SPACY_MODEL)
+    raise ValueError(f"Unknown segmenter: {name}")
+
+
+class Segmenter:
+    def __init__(self, name):
+        self.name = name
+        self.nlp = _load(name)
+
+    def split(self, texts):
+        """The sentences of each text, as a list per text."""
+        return [
+            [sentence.text for sentence in doc.sents]
+            for doc in self.nlp.pipe(texts, batch_size=PIPE_BATCH_SIZE)
+        ]
+
+
+_segmenters = {}
+_segmenters_lock = threading.Lock()
+
+
+def get_segmenter(name=None):
+    """The process-wide segmenter `name` (default COPILOT_SEGMENTER), loaded on first use."""
+    name = name or SEGMENTER
+    with _segmenters_lock:
+        if name not in _segmenters:
+            _segmenters[name] = Segmenter(name)
+            logger.info("Loaded the %s sentence segmenter (%s).", name, ", ".join(_segmenters[name].nlp.pipe_names))
+        return _segmenters[name]
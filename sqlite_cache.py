@@ -0,0 +1,144 @@
+# sqlite_cache.py
+
+"""
+Persistent key/value caches of model outputs, shared by the embedding and summary caches.
+
+Values are stored in SQLite keyed by (model id, SHA-256 of the normalized text), so a text is
+run through a model once however often it is ingested. A subclass names its table and converts
+its values to and from what SQLite stores:
+
+    class SummaryCache(SqliteCache):
+        TABLE, COLUMN, COLUMN_TYPE, KIND = "summaries", "summary", "TEXT", "summary"
+
+    summaries = SummaryCache(path, "t5-small").get_or_compute(texts, summarize_batch)
+
+The databases use WAL mode, so several processes can share them.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import unicodedata
+
+from telemetry import record_cache
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement.
+LOOKUP_BATCH_SIZE = 500
+
+
+def normalize_sentence(text):
+    """The form sentences are hashed in: NFC, with runs of whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def sentence_hash(text):
+    return hashlib.sha256(normalize_sentence(text).encode("utf-8")).digest()
+
+
+class SqliteCache:
+    TABLE = None
+    COLUMN = "value"
+    COLUMN_TYPE = "BLOB"
+    KIND = None  # cache label of the copilot_cache_* metrics
+
+    def __init__(self, path, model_id=None):
+        self.path = path
+        self.model_id = model_id
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def dump_value(self, value):
+        """What SQLite stores for a computed value."""
+        return value
+
+    def load_value(self, stored):
+        """The value of a stored one."""
+        return stored
+
+    def _connect(self):
+        if self._connection is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} (model TEXT NOT NULL, hash BLOB NOT NULL, "
+                f"{self.COLUMN} {self.COLUMN_TYPE} NOT NULL, PRIMARY KEY (model, hash))"
+            )
+        return self._connection
+
+    def _lookup(self, hashes):
+        found = {}
+        for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+            batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+            rows = self._connect().execute(
+                f"SELECT hash, {self.COLUMN} FROM {self.TABLE} "
+                f"WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                [self.model_id, *batch],
+            )
+            for key, stored in rows:
+                found[key] = self.load_value(stored)
+        return found
+
+    def get_or_compute(self, texts, compute):
+        """
+        Values of `texts`, calling compute(list of texts) once for the distinct texts not cached yet.
+
+        Returns:
+            list: One value per text, in order.
+        """
+        hashes = [sentence_hash(text) for text in texts]
+        with self._lock:
+            cached = self._lookup(list(set(hashes)))
+
+        # Each distinct missing text is computed once, however often it occurs
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            stored = {key: self.dump_value(value) for key, value in zip(missing, compute(list(missing.values())))}
+            with self._lock:
+                connection = self._connect()
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO {self.TABLE} (model, hash, {self.COLUMN}) VALUES (?, ?, ?)",
+                    [(self.model_id, key, value) for key, value in stored.items()],
+                )
+                connection.commit()
+            # Read back as from the database, so that a value is the same whether it was cached or not
+            cached.update((key, self.load_value(value)) for key, value in stored.items())
+
+        hits = len(texts) - len(missing)
+        self.hits += hits
+        self.misses += len(missing)
+        record_cache(self.KIND, True, hits)
+        record_cache(self.KIND, False, len(missing))
+        return [cached[key] for key in hashes]
+
+    def stats(self):
+        """{"entries", "bytes", "hits", "misses", "hit_rate"} of this model's part of the cache."""
+        with self._lock:
+            entries, size = self._connect().execute(
+                f"SELECT COUNT(*), COALESCE(SUM(LENGTH({self.COLUMN})), 0) FROM {self.TABLE} WHERE model = ?",
+                (self.model_id,),
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -2,14 +2,25 @@ import streamlit as st
 import os
 from datetime import datetime
 import asyncio
-from git_utils import commit_to_git
+from git_publisher import DEFAULT_BRANCH, default_branch_name, publisher, remote_url
 from visualdiagram import generate_diagram_from_pipeline
 from pipeline_patterns import PIPELINE_TYPE_PATTERNS
 import re
+import uuid
 from conversion import * 
 from pipelineparser import PipelineParser, parse_yaml_code  # Import functions from pipelineparser
-from main import generate_pipeline
+from main import generate_pipeline, get_patch_completion, retrieval_prefetcher, stream_pipeline
+from llm_router import configured_providers, get_router
+from pipeline_converter import SUPPORTED_PIPELINE_TYPES, convert_pipeline_code
+from pipeline_editor import edit_pipeline
+from pipeline_analyzer import analyze_pipeline, format_analysis_report
+from pipeline_linter import lint_pipeline, format_lint_report
+from pipeline_repair import CODE_BLOCK_LANGUAGES, repair_pipeline_code
+from incremental_parser import IncrementalPipelineParser
+from svg_diagram import IncrementalSvgDiagram
+from telemetry import cache_hit_rate, cached_token_rate, configure_from_environment, profiler, set_profiling, traced, tracer
 from pipelinetypes import *
+from result_cache import ResultCache, result_key
 import utils
 
 
@@ -26,10 +37,157 @@ def initialize_session_state():
         "generated_file_path": None,
         "show_commit_ui": False,
         "repo_path": "",
+        "pending_files": {},
+        "publish_future": None,
+        "results": None,
+        "result_key": None,
+        "session_id": None,
+        "edit_result": None,
     }
     for key, default_value in session_defaults.items():
         if key not in st.session_state:
             st.session_state[key] = default_value
+    if st.session_state.results is None:
+        st.session_state.results = ResultCache()
+    if st.session_state.session_id is None:
+        st.session_state.session_id = uuid.uuid4().hex
+
+def prefetch_retrieval():
+    """Start retrieval for the prompt being written, so that generation can go straight to the provider."""
+    retrieval_prefetcher.schedule(st.session_state.session_id, st.session_state.user_prompt, "best_practices")
+
+@traced("generate_pipeline.stream")
+def render_streaming_generation(user_prompt, document_path, provider_flag, metrics=None):
+    """
+    Show the completion and a diagram of its finished stages while it streams; returns the whole completion.
+    `metrics` receives the prompt sent to the provider under "prompt".
+    """
+    code_placeholder = st.empty()
+    diagram_placeholder = st.empty()
+    diagram = IncrementalSvgDiagram(detail=st.session_state.get("diagram_detail", "jobs"))
+    parser = None
+    generated_code = ""
+    for chunk in stream_pipeline(user_prompt, document_path, provider_flag, metrics):
+        generated_code += chunk
+        if "\n" in chunk:
+            code_placeholder.code(generated_code)
+        if parser is None:
+            pipeline_type = identify_pipeline_type(generated_code)[0]
+            if pipeline_type not in CODE_BLOCK_LANGUAGES:
+                continue
+            parser = IncrementalPipelineParser(pipeline_type)
+            chunk = generated_code
+        pipeline = parser.feed(chunk)
+        if pipeline is not None and pipeline.stages:
+            diagram_placeholder.image(diagram.update(pipeline), caption=f"{len(pipeline.stages)} stage(s) so far")
+    # The finished pipeline is shown (and repaired) below
+    code_placeholder.empty()
+    diagram_placeholder.empty()
+    return generated_code
+
+def build_result(user_prompt, provider_flag, generated_code, final_prompt):
+    """Repair, save, parse and analyse a completion; returns the result that generate_pipeline_ui renders and caches."""
+    result = {
+        "prompt": user_prompt,
+        "provider": provider_flag,
+        "context": final_prompt,
+        "messages": [("success", "Pipeline generated successfully!")],
+        "pipeline": None,
+        "diagrams": {},
+    }
+    pipeline_type, file_extension, language = identify_pipeline_type(generated_code)
+
+    if pipeline_type in CODE_BLOCK_LANGUAGES:
+        repair = repair_pipeline_code(generated_code, pipeline_type, get_patch_completion(provider_flag))
+        generated_code = repair["code"]
+        if repair["patches"]:
+            result["messages"].append(("info", f"Repaired {len(repair['patches'])} region(s) of the generated pipeline "
+                                               f"using {repair['tokens_used']} tokens."))
+        if not repair["valid"]:
+            result["messages"].append(("warning", f"The generated pipeline is still invalid: {repair['errors'][0]['message']}"))
+
+    file_name = f"{pipeline_type}-{datetime.now().strftime('%Y%m%d%H%M%S')}{file_extension}"
+    pipelines_dir = "pipelines"
+    os.makedirs(pipelines_dir, exist_ok=True)
+    file_path = os.path.join(pipelines_dir, file_name)
+    with open(file_path, "w") as file:
+        file.write(generated_code)
+    result.update(code=generated_code, pipeline_type=pipeline_type, language=language, file_name=file_name,
+                  file_path=file_path)
+
+    try:
+        # Initialize PipelineParser
+        pipeline_parser = PipelineParser(pipeline_code=generated_code, pipeline_type=pipeline_type)
+        parsed_data = pipeline_parser.parse_pipeline_code()
+        result["parsed_types"] = (str(type(parsed_data)), str(type(pipeline_type)))
+
+        # Ensure parsed_data is a valid Pipeline object with stages and jobs
+        if isinstance(parsed_data, Pipeline):  # Only proceed if it's a subclass of Pipeline
+            pipeline_type = pipeline_type.lower().strip()  # Ensure consistent lowercase input
+            pipeline_type_class = PIPELINE_TYPE_CLASSES.get(pipeline_type)
+
+            if pipeline_type_class is None:
+                result["errors"] = [f"Unsupported or invalid pipeline type: {pipeline_type}. Please check your input."]
+            elif utils.validate_pipeline_type(parsed_data, pipeline_type_class):
+                result.update(
+                    pipeline=parsed_data,
+                    pipeline_class=pipeline_type_class,
+                    analysis=format_analysis_report(analyze_pipeline(parsed_data, raw_code=generated_code)),
+                    lint=format_lint_report(lint_pipeline(parsed_data, raw_code=generated_code)),
+                )
+        else:
+            result["errors"] = ["Parsed data is not a valid pipeline object."]
+    except Exception as e:
+        result["errors"] = [f"An error occurred while generating the diagram: {e}"]
+    return result
+
+def render_diagram(result, results, key):
+    """Show the result's diagram in the selected format and detail, drawing it only the first time."""
+    options = (st.session_state.get("diagram_format", "png"), st.session_state.get("diagram_detail", "jobs"))
+    if options not in result["diagrams"]:
+        try:
+            diagram = generate_diagram_from_pipeline(result["pipeline"], result["pipeline_class"], options[0],
+                                                     detail=options[1])
+            result["diagrams"][options] = ("image", diagram.getvalue()) if diagram else (
+                "error", "Failed to generate pipeline diagram. Please check the pipeline data.")
+        except Exception as e:
+            result["diagrams"][options] = ("error", f"An error occurred while generating the diagram: {str(e)}")
+        results.put(key, result)  # account for the new image
+
+    kind, value = result["diagrams"][options]
+    if kind == "error":
+        st.error(value)
+        return
+    # The layered renderer produces SVG whatever the selected format
+    image = value if value.startswith(b"\x89PNG") else value.decode("utf-8")
+    st.image(image, caption=f"{result['pipeline_type'].title()} Pipeline Visualization")
+
+def render_result(result, results, key):
+    """Everything a generation produced, from the session's result cache; cheap enough for every rerun."""
+    for level, message in result["messages"]:
+        getattr(st, level)(message)
+    st.code(result["code"], language=result["language"])
+    st.download_button(
+        label="Download Pipeline",
+        data=result["code"],
+        file_name=result["file_name"],
+        mime="text/plain"
+    )
+
+    if "parsed_types" in result:
+        st.write(f"Parsed Data Type: {result['parsed_types'][0]}")
+        st.write(f"Parsed stream Type: {result['parsed_types'][1]}")
+    for error in result.get("errors", []):
+        st.error(error)
+    if result["pipeline"] is not None:
+        render_diagram(result, results, key)
+        with st.expander("Performance analysis"):
+            st.markdown(result["analysis"])
+        with st.expander("DevSecOps compliance"):
+            st.markdown(result["lint"])
+    if result["context"]:
+        with st.expander("Retrieved context"):
+            st.text(result["context"])
 
 async def generate_pipeline_ui():
     initialize_session_state()
@@ -37,11 +195,13 @@ async def generate_pipeline_ui():
     user_prompt = st.text_input(
         "Enter your prompt (e.g., 'Generate an Azure DevOps Pipeline to deploy Microservices application to AKS.'): ",
         key="user_prompt",
-        placeholder="Type your pipeline generation request here..."
+        placeholder="Type your pipeline generation request here...",
+        on_change=prefetch_retrieval,
     )
 
-    
-    provider_flag = "Azure"
+    provider_flag = st.session_state.get("provider_flag", "Auto")
+    results = st.session_state.results
+    key = result_key(user_prompt, provider_flag)
 
     if st.button("Generate Pipeline"):
         if not user_prompt:
@@ -50,83 +210,151 @@ async def generate_pipeline_ui():
             with st.spinner("Generating pipeline based on industry best practices and your needs...."):
                 try:
                     document_path = "best_practices"
-                    generated_code = await generate_pipeline(user_prompt, document_path, provider_flag)
+                    metrics = {}
+                    generated_code = render_streaming_generation(user_prompt, document_path, provider_flag, metrics)
 
                     if generated_code:
-                        st.success("Pipeline generated successfully!")
-                        pipeline_type, file_extension, language = identify_pipeline_type(generated_code)
-                        
-                        st.code(generated_code, language=language)
-
-                        file_name = f"{pipeline_type}-{datetime.now().strftime('%Y%m%d%H%M%S')}{file_extension}"
-                        pipelines_dir = "pipelines"
-                        os.makedirs(pipelines_dir, exist_ok=True)
-                        file_path = os.path.join(pipelines_dir, file_name)
-                        with open(file_path, "w") as file:
-                            file.write(generated_code)
-
-                        st.session_state.generated_code = generated_code
-                        st.session_state.generated_file_path = file_path
-                        st.session_state.show_commit_ui = True
+                        result = build_result(user_prompt, provider_flag, generated_code, metrics.get("prompt"))
+                        results.put(key, result)
+                        st.session_state.result_key = key
 
-                        st.download_button(
-                            label="Download Pipeline",
-                            data=generated_code,
-                            file_name=file_name,
-                            mime="text/plain"
-                        )
-                        
-                        
-
-                        try:
-                            # Initialize PipelineParser and generate diagram
-                            pipeline_parser = PipelineParser(pipeline_code=generated_code, pipeline_type=pipeline_type)
-                            parsed_data = pipeline_parser.parse_pipeline_code()
-                            st.write(f"Parsed Data Type: {type(parsed_data)}")
-                            st.write(f"Parsed stream Type: {type(pipeline_type)}")
-
-                            # Ensure parsed_data is a valid Pipeline object with stages and jobs
-                            if isinstance(parsed_data, Pipeline):  # Only proceed if it's a subclass of Pipeline
-                                pipeline_type = pipeline_type.lower().strip()  # Ensure consistent lowercase input
-                                pipeline_type_class = {
-                                    "jenkinsfile-scripted": JenkinsPipeline,
-                                    "jenkinsfile-declarative": JenkinsPipeline,
-                                    "azure-pipelines": AzureDevOpsPipeline,
-                                    "gitlab-ci": GitLabPipeline,
-                                    "github-actions": GitHubActionsPipeline,
-                                    "codepipeline": AWSPipeline,
-                                }.get(pipeline_type)
-
-                                print(f"Pipeline Type Class: {pipeline_type_class}")
-
-                                if pipeline_type_class is None:
-                                    st.error(f"Unsupported or invalid pipeline type: {pipeline_type}. Please check your input.")
-                                else:
-                                    # Validate the pipeline type using the helper function
-                                    if utils.validate_pipeline_type(parsed_data, pipeline_type_class):
-                                        # Pass the appropriate subclass to generate_diagram
-                                        try:
-                                            diagram = generate_diagram_from_pipeline(parsed_data, pipeline_type_class)
-                                            if diagram:
-                                                st.image(diagram, caption=f"{pipeline_type.title()} Pipeline Visualization")
-                                            else:
-                                                st.error("Failed to generate pipeline diagram. Please check the pipeline data.")
-                                        except Exception as e:
-                                            st.error(f"An error occurred while generating the diagram: {str(e)}")
-                            else:
-                                st.error("Parsed data is not a valid pipeline object.")
-                                                            
-
-                        except Exception as e:
-                            st.error(f"An error occurred while generating the diagram: {e}")
+                        st.session_state.generated_code = result["code"]
+                        st.session_state.generated_file_path = result["file_path"]
+                        st.session_state.pending_files[result["file_path"]] = result["code"]
+                        st.session_state.show_commit_ui = True
                     else:
                         st.warning("No code was generated. Please review your prompt and try again.")
                 except Exception as e:
                     st.error(f"An error occurred during pipeline generation: {e}")
 
+    # Reruns (any widget change) show the result of this prompt, or else of the last generation, without recomputing it
+    if key not in results:
+        key = st.session_state.result_key
+    result = results.get(key) if key else None
+    if result is not None:
+        if result["prompt"] != user_prompt:
+            st.caption(f"Last generated for: {result['prompt']}")
+        render_result(result, results, key)
+
     if st.session_state.get("show_commit_ui", False):
         render_commit_ui()
 
+def render_conversion_ui():
+    """Port an existing pipeline to another platform locally, without calling the LLM."""
+    st.markdown("### Convert an Existing Pipeline")
+
+    source_code = st.text_area("Paste the pipeline to convert:", key="conversion_source", height=250)
+    col_source, col_target = st.columns(2)
+    source_type = col_source.selectbox("From:", SUPPORTED_PIPELINE_TYPES, key="conversion_source_type")
+    target_type = col_target.selectbox("To:", SUPPORTED_PIPELINE_TYPES, index=2, key="conversion_target_type")
+
+    if st.button("Convert Pipeline"):
+        if not source_code.strip():
+            st.warning("Please paste a pipeline to convert.")
+            return
+        try:
+            converted_code, warnings = convert_pipeline_code(source_code, source_type, target_type)
+        except ValueError as e:
+            st.error(f"Conversion failed: {e}")
+            return
+
+        st.code(converted_code, language=PIPELINE_TYPE_PATTERNS[target_type]["language"])
+        for warning in warnings:
+            st.warning(warning)
+
+def render_edit_ui():
+    """Change a saved or pasted pipeline with a patch from the LLM instead of regenerating it."""
+    st.markdown("### Edit an Existing Pipeline")
+
+    source = st.radio("Pipeline:", ("Saved pipeline", "Paste"), key="edit_source", horizontal=True)
+    pipeline_code = ""
+    if source == "Saved pipeline":
+        saved = sorted(os.listdir("pipelines"), reverse=True) if os.path.isdir("pipelines") else []
+        file_name = st.selectbox("Saved pipelines:", saved, key="edit_file")
+        if file_name:
+            with open(os.path.join("pipelines", file_name)) as file:
+                pipeline_code = file.read()
+    else:
+        pipeline_code = st.text_area("Paste the pipeline to edit:", key="edit_code", height=250)
+
+    detected = identify_pipeline_type(pipeline_code)[0]
+    pipeline_type = st.selectbox(
+        "Platform:", SUPPORTED_PIPELINE_TYPES, key=f"edit_type_{detected}",
+        index=SUPPORTED_PIPELINE_TYPES.index(detected) if detected in SUPPORTED_PIPELINE_TYPES else 0,
+    )
+    request = st.text_input("Change to make (e.g. 'Add a Trivy image scan after the build job'):", key="edit_request")
+
+    if st.button("Apply Edit"):
+        if not pipeline_code.strip() or not request.strip():
+            st.warning("Please choose a pipeline and describe the change.")
+        else:
+            provider_flag = st.session_state.get("provider_flag", "Auto")
+            with st.spinner("Asking for a patch..."):
+                try:
+                    edit = edit_pipeline(pipeline_code, pipeline_type, request, get_patch_completion(provider_flag, "edit"))
+                except ValueError as e:
+                    st.error(f"The pipeline could not be edited: {e}")
+                    edit = None
+            if edit is not None and edit["applied"]:
+                pattern = PIPELINE_TYPE_PATTERNS[pipeline_type]
+                edit["file_name"] = f"{pipeline_type}-{datetime.now().strftime('%Y%m%d%H%M%S')}{pattern['file_extension']}"
+                edit["language"] = pattern["language"]
+                os.makedirs("pipelines", exist_ok=True)
+                file_path = os.path.join("pipelines", edit["file_name"])
+                with open(file_path, "w") as file:
+                    file.write(edit["code"])
+                st.session_state.edit_result = edit
+                st.session_state.pending_files[file_path] = edit["code"]
+                if not st.session_state.show_commit_ui:
+                    st.session_state.show_commit_ui = True
+                    st.rerun()
+            elif edit is not None:
+                st.session_state.edit_result = None
+                st.error(f"No patch could be applied: {edit['errors'][-1] if edit['errors'] else 'the token budget was exhausted'}")
+
+    edit = st.session_state.edit_result
+    if edit is not None:
+        st.success(f"Applied {len(edit['operations'])} change(s) using {edit['tokens_used']} tokens; "
+                   f"saved as {edit['file_name']}.")
+        for warning in edit["warnings"]:
+            st.warning(warning)
+        st.code(edit["code"], language=edit["language"])
+        st.download_button(label="Download Edited Pipeline", data=edit["code"], file_name=edit["file_name"],
+                           mime="text/plain")
+        with st.expander("Patch"):
+            st.json(edit["operations"])
+
+def render_telemetry_ui():
+    """Latest trace, cache hit rate and profiler hot spots for this server process."""
+    if tracer.recent_traces:
+        spans = sorted(tracer.recent_traces[-1], key=lambda span: span.start_ns)
+        depth = {}
+        rows = []
+        for span in spans:
+            depth[span.span_id] = depth.get(span.parent_id, -1) + 1
+            rows.append({
+                "span": "  " * depth[span.span_id] + span.name,
+                "ms": round(span.duration * 1000, 1),
+                "error": span.error or "",
+            })
+        st.markdown("**Last trace**")
+        st.dataframe(rows, use_container_width=True)
+    else:
+        st.write("No traces recorded yet.")
+
+    for cache in ("diagram", "embedding", "summary", "result", "prefetch"):
+        hit_rate = cache_hit_rate(cache)
+        if hit_rate is not None:
+            st.write(f"{cache.capitalize()} cache hit rate: {hit_rate:.0%}")
+    for provider in ("Azure", "AWS"):
+        cached_rate = cached_token_rate(provider)
+        if cached_rate is not None:
+            st.write(f"{provider} prompt tokens served from the prompt cache: {cached_rate:.0%}")
+
+    if profiler.running or profiler.samples:
+        st.markdown(f"**Profiler hot spots** ({profiler.samples} samples)")
+        st.dataframe(profiler.report(), use_container_width=True)
+
 def render_commit_ui():
     st.markdown("### Commit Generated Code to Git")
 
@@ -152,26 +380,59 @@ def render_commit_ui():
         if st.button("Authorize with GitHub"):
             st.experimental_rerun()
 
+    pending_files = st.session_state.pending_files
+    selected_files = st.multiselect("Files to commit:", list(pending_files), default=list(pending_files))
+    base_branch = st.text_input("Branch:", value=DEFAULT_BRANCH)
+    open_pull_request = st.checkbox("Push to a new branch, ready for a pull request")
+
     if st.button("Commit"):
-        file_path = st.session_state.generated_file_path
-        if not os.path.isfile(file_path):
-            st.error(f"The file {file_path} does not exist. Please generate the pipeline first.")
+        if not selected_files:
+            st.error("No generated files to commit. Please generate a pipeline first.")
         else:
             try:
-                commit_message = "Generated pipeline code"
-                success, message = commit_to_git(
-                    repo_path, commit_message, file_path,
-                    st.session_state.generated_code,
-                    github_token=token if auth_method == "Personal Access Token (PAT)" else None
-                )
-                if success:
-                    st.success(message)
+                token_value = token if auth_method == "Personal Access Token (PAT)" else None
+                if not token_value and repo_path == remote_url(repo_path):
+                    url = repo_path  # local repository or URL with its own credentials
                 else:
-                    st.error(message)
+                    url = remote_url(repo_path, token_value)
+                commit_message = (f"Generated pipeline code ({len(selected_files)} files)" if len(selected_files) > 1
+                                  else "Generated pipeline code")
+                # Pushes run in the background; commits to the same target still waiting are batched together
+                st.session_state.publish_future = publisher.submit(
+                    url, {path: pending_files[path] for path in selected_files}, commit_message,
+                    branch=base_branch, new_branch=default_branch_name() if open_pull_request else None,
+                )
             except Exception as e:
                 st.error(f"An error occurred during Git commit: {e}")
 
+    render_publish_status()
+
+def render_publish_status():
+    future = st.session_state.publish_future
+    if future is None:
+        return
+    if not future.done():
+        st.info("Pushing to Git in the background...")
+        st.button("Refresh status")
+        return
+    try:
+        result = future.result()
+    except Exception as e:
+        st.error(f"Git operation failed: {e}")
+    else:
+        for path in result["files"]:
+            st.session_state.pending_files.pop(path, None)
+        if result["commit"] is None:
+            st.success("The files are already up to date in the repository.")
+        elif result["pull_request_url"]:
+            st.success(f"Pushed {len(result['files'])} file(s) to branch {result['branch']}. "
+                       f"[Open a pull request]({result['pull_request_url']})")
+        else:
+            st.success(f"Pushed {len(result['files'])} file(s) to {result['branch']} in commit {result['commit'][:8]}.")
+    st.session_state.publish_future = None
+
 if __name__ == "__main__":
+    configure_from_environment()
     st.set_page_config(page_title="Pipeline Generator",  layout="wide")
     st.markdown(
     """
@@ -193,4 +454,16 @@ if __name__ == "__main__":
     st.title("Dev(Sec)Ops Co-Pilot")
     st.sidebar.title("About")
     st.sidebar.text("DevSecOps Co-pilot to assist in generating CI/CD Pipelines as per industry standards.")
+    st.sidebar.radio("Diagram format", ("png", "svg"), key="diagram_format", horizontal=True)
+    st.sidebar.radio("Diagram detail", ("stages", "jobs", "steps"), index=1, key="diagram_detail", horizontal=True)
+    st.sidebar.selectbox("LLM provider", ("Auto", "Azure", "AWS"), key="provider_flag")
+    if st.session_state.provider_flag == "Auto" and configured_providers():
+        get_router().hedge = st.sidebar.checkbox("Hedge slow requests", value=get_router().hedge)
+    set_profiling(st.sidebar.checkbox("Sampling profiler", value=profiler.running))
     asyncio.run(generate_pipeline_ui())
+    with st.expander("Convert an existing pipeline to another platform"):
+        render_conversion_ui()
+    with st.expander("Edit an existing pipeline"):
+        render_edit_ui()
+    with st.expander("Telemetry"):
+        render_telemetry_ui()
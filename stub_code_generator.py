@@ -0,0 +1,138 @@
+# stub_code_generator.py
+
+"""
+Deterministic offline stand-in for the LLM providers, used by the benchmark harness.
+
+The reply only depends on the user prompt: it picks the platform named in the prompt (Azure
+DevOps when none is) and returns a fixed pipeline for it, wrapped the way the real models answer.
+"""
+
+import re
+
+STUB_PIPELINES = {
+    "github-actions": ("yaml", """name: CI
+on:
+  push:
+    branches: [main]
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+      - run: npm ci
+      - run: npm run build
+  test:
+    needs: build
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+      - run: npm test
+  security:
+    needs: build
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+      - run: gitleaks detect --source .
+      - run: trivy fs .
+  deploy:
+    needs: [test, security]
+    runs-on: ubuntu-latest
+    steps:
+      - run: ./deploy.sh"""),
+    "gitlab-ci": ("yaml", """# Build, test and deploy jobs for GitLab CI
+stages:
+  - build
+  - test
+  - deploy
+build:
+  stage: build
+  script:
+    - make build
+sast:
+  stage: test
+  script:
+    - semgrep ci
+test:
+  stage: test
+  script:
+    - make test
+deploy:
+  stage: deploy
+  script:
+    - ./deploy.sh
+  only:
+    - main"""),
+    "jenkinsfile-declarative": ("groovy", """pipeline {
+    agent any
+    stages {
+        stage('Build') {
+            steps {
+                sh 'mvn -B package'
+            }
+        }
+        stage('Security Scan') {
+            steps {
+                sh 'dependency-check.sh --scan .'
+                sh 'gitleaks detect --source .'
+            }
+        }
+        stage('Deploy') {
+            steps {
+                sh './deploy.sh'
+            }
+        }
+    }
+}"""),
+    "azure-pipelines": ("yaml", """trigger:
+  - main
+pool:
+  vmImage: ubuntu-latest
+stages:
+  - stage: Build
+    jobs:
+      - job: Build
+        steps:
+          - checkout: self
+          - script: docker build -t app .
+  - stage: Scan
+    jobs:
+      - job: Scan
+        steps:
+          - script: trivy image app
+          - script: gitleaks detect --source .
+  - stage: Deploy
+    jobs:
+      - job: Deploy
+        steps:
+          - script: kubectl apply -f k8s/"""),
+}
+
+# Words in the user prompt that select a platform, checked in order.
+STUB_PLATFORM_WORDS = [
+    ("github", "github-actions"),
+    ("gitlab", "gitlab-ci"),
+    ("jenkins", "jenkinsfile-declarative"),
+]
+
+
+def generate_code_from_stub(prompt):
+    """Return the canned pipeline for the platform named in the user prompt."""
+    # create_dynamic_prompt puts the user's request last, after the retrieved sentences
+    user_prompt = prompt.rsplit("User Prompt:", 1)[-1].lower()
+    pipeline_type = next((kind for word, kind in STUB_PLATFORM_WORDS if word in user_prompt), "azure-pipelines")
+    language, code = STUB_PIPELINES[pipeline_type]
+    return (
+        f"Here is the {pipeline_type} pipeline:\n\n```{language}\n{code}\n```\n\n"
+        "Placeholders to replace:\n- None, this is a stub response."
+    )
+
+
+def generate_patch_from_stub(prompt, template="repair"):
+    """
+    Answer a patch request without changing anything, so the repair and edit loops run offline:
+    a repair prompt gets its excerpt back unchanged and an edit prompt an empty list of operations.
+    """
+    if template == "edit":
+        return '```json\n{"operations": []}\n```'
+    match = re.search(r"Excerpt to fix \(lines \d+-\d+\):\n```\n(.*?)\n```", prompt, re.DOTALL)
+    return f"```\n{match.group(1) if match else ''}\n```"
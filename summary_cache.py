@@ -0,0 +1,42 @@
+# summary_cache.py
+
+"""
+Persistent cache of the section summaries made at ingestion.
+
+Summaries are stored as text in a SqliteCache keyed by (summarizer model, SHA-256 of the normalized
+text), like the sentence embeddings in embedding_cache.py, so a section is summarized once however
+often its document is re-ingested:
+
+    cache = SummaryCache(SUMMARY_CACHE_PATH, "t5-small")
+    summaries = cache.summarize(texts, summarize_batch)   # summarize_batch(list of texts) -> list of summaries
+
+COPILOT_SUMMARY_CACHE moves the database.
+"""
+
+import logging
+import os
+
+from sqlite_cache import SqliteCache
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_CACHE_PATH = os.getenv("COPILOT_SUMMARY_CACHE", os.path.join(".cache", "summaries.sqlite3"))
+
+
+class SummaryCache(SqliteCache):
+    TABLE = "summaries"
+    COLUMN = "summary"
+    COLUMN_TYPE = "TEXT"
+    KIND = "summary"
+
+    def __init__(self, path=SUMMARY_CACHE_PATH, model_id=None):
+        super().__init__(path, model_id)
+
+    def summarize(self, texts, summarize_batch):
+        """
+        Summaries of `texts`, calling summarize_batch() once for the texts not cached yet.
+
+        Returns:
+            list: One summary per text, in order.
+        """
+        return self.get_or_compute(texts, summarize_batch)
@@ -0,0 +1,373 @@
+# svg_diagram.py
+
+"""
+Lightweight pipeline diagrams for large pipelines.
+
+Lays the job graph out in-process (a Sugiyama-style layered layout: longest-path layering,
+barycenter ordering sweeps to reduce crossings, then coordinate assignment) and writes SVG
+directly, so pipelines with thousands of jobs render in well under a second without Graphviz.
+Diagrams can show whole stages, jobs, or jobs with their steps, and individual stages can be
+collapsed into a single node. IncrementalSvgDiagram redraws a pipeline that is still being
+generated without moving the nodes already on screen.
+"""
+
+import html
+import time
+
+from pipeline_analyzer import classify_job, classify_step, step_text
+from pipelinetypes import *
+
+DETAIL_LEVELS = ("stages", "jobs", "steps")
+
+NODE_WIDTH = 200
+NODE_HEIGHT = 40
+STEP_HEIGHT = 16
+MAX_STEPS_SHOWN = 12
+LAYER_GAP = 80
+NODE_GAP = 16
+MARGIN = 24
+MAX_LABEL_CHARS = 28
+# Barycenter sweeps (down and up) used to reduce edge crossings.
+ORDERING_SWEEPS = 4
+
+CATEGORY_COLORS = {
+    "checkout": "#D6EAF8",
+    "setup": "#D6EAF8",
+    "cache": "#D6EAF8",
+    "install": "#D6EAF8",
+    "build": "#AED6F1",
+    "container-build": "#A9CCE3",
+    "test": "#ABEBC6",
+    "lint": "#D5F5E3",
+    "scan": "#F5B7B1",
+    "deploy": "#FCF3CF",
+    "other": "#E5E8E8",
+    "stage": "#FAD7A0",
+}
+
+
+def _label(text, limit=MAX_LABEL_CHARS):
+    text = " ".join(str(text).split())
+    return html.escape(text if len(text) <= limit else text[:limit - 1] + "…")
+
+
+class _Node:
+    def __init__(self, node_id, label, category, steps=None, tooltip=""):
+        self.id = node_id
+        self.label = label
+        self.category = category
+        self.steps = steps or []
+        self.tooltip = tooltip
+        self.layer = 0
+        self.order = 0
+        self.barycenter = 0.0
+        self.x = 0
+        self.y = 0
+        self.height = NODE_HEIGHT + STEP_HEIGHT * min(len(self.steps), MAX_STEPS_SHOWN + 1)
+
+
+def _build_graph(pipeline, detail, collapsed_stages):
+    """
+    Nodes and predecessor groups of the diagram.
+
+    Jobs that wait for a whole previous stage share one predecessor group, which keeps the graph
+    linear in size (a stage of n jobs followed by a stage of m jobs has n + m edges, not n * m).
+    """
+    collapsed_stages = set(collapsed_stages or [])
+    # Colours come from the job category; pipelines repeat steps, so each distinct step is classified once.
+    category_of_text = {}
+    step_categories = {}
+    for stage in pipeline.stages:
+        for job in stage.jobs:
+            for step in job.steps:
+                key = (step.task, step_text(step))
+                if key not in category_of_text:
+                    category_of_text[key] = classify_step(step)
+                step_categories[id(step)] = category_of_text[key]
+
+    nodes = {}
+    node_of_job = {}  # (stage name, job name) -> node id; stages may reuse job names
+    for stage_index, stage in enumerate(pipeline.stages):
+        collapse = detail == "stages" or stage.name in collapsed_stages
+        if collapse and stage.jobs:
+            node_id = f"stage:{stage_index}"
+            nodes[node_id] = _Node(node_id, stage.name, "stage",
+                                   tooltip=f"{stage.name}: {len(stage.jobs)} job(s)")
+            for job in stage.jobs:
+                node_of_job[(stage.name, job.name)] = node_id
+            continue
+        for job in stage.jobs:
+            node_id = f"job:{stage_index}:{job.name}"
+            steps = [step.name for step in job.steps] if detail == "steps" else []
+            nodes[node_id] = _Node(node_id, job.name, classify_job(job, step_categories), steps,
+                                   tooltip=f"{stage.name} / {job.name}: {len(job.steps)} step(s)")
+            node_of_job[(stage.name, job.name)] = node_id
+
+    # predecessor group key -> set of node ids; node id -> group key
+    dependencies = pipeline.job_dependencies()
+    groups = {}
+    group_of = {}
+    for stage_index, stage in enumerate(pipeline.stages):
+        for job in stage.jobs:
+            predecessors = dependencies[(stage.name, job.name)]
+            key = ("stage", stage_index) if job.depends_on is None else ("needs",) + tuple(predecessors)
+            node_id = node_of_job[(stage.name, job.name)]
+            members = {node_of_job[predecessor] for predecessor in predecessors} - {node_id}
+            if not members:
+                continue
+            groups.setdefault(key, set()).update(members)
+            group_of.setdefault(node_id, set()).add(key)
+    return nodes, groups, group_of
+
+
+def _assign_layers(nodes, groups, group_of):
+    """Longest-path layering: every node sits one layer right of its furthest predecessor."""
+    successors = {}
+    indegree = {node_id: 0 for node_id in nodes}
+    for node_id, keys in group_of.items():
+        predecessors = set().union(*(groups[key] for key in keys))
+        indegree[node_id] = len(predecessors)
+        for predecessor in predecessors:
+            successors.setdefault(predecessor, []).append(node_id)
+
+    order = [node_id for node_id, count in indegree.items() if count == 0]
+    for node_id in order:  # `order` grows while we iterate over it
+        for successor in successors.get(node_id, []):
+            nodes[successor].layer = max(nodes[successor].layer, nodes[node_id].layer + 1)
+            indegree[successor] -= 1
+            if indegree[successor] == 0:
+                order.append(successor)
+    if len(order) != len(nodes):
+        raise ValueError("Job dependencies contain a cycle.")
+
+    layers = {}
+    for node_id in order:
+        layers.setdefault(nodes[node_id].layer, []).append(nodes[node_id])
+    return [layers[index] for index in sorted(layers)], successors
+
+
+def _order_layers(layers, nodes, groups, group_of, successors):
+    """Barycenter heuristic: sort each layer by the mean position of its neighbours, sweeping both ways."""
+    for layer in layers:
+        for position, node in enumerate(layer):
+            node.order = position
+
+    for sweep in range(ORDERING_SWEEPS):
+        downward = sweep % 2 == 0
+        for layer in (layers[1:] if downward else layers[-2::-1]):
+            group_center = {}
+            for node in layer:
+                if downward:
+                    centers = []
+                    for key in group_of.get(node.id, ()):
+                        if key not in group_center:
+                            members = groups[key]
+                            group_center[key] = sum(nodes[member].order for member in members) / len(members)
+                        centers.append(group_center[key])
+                else:
+                    centers = [nodes[successor].order for successor in successors.get(node.id, ())]
+                if centers:
+                    node.barycenter = sum(centers) / len(centers)
+                else:
+                    node.barycenter = node.order
+            layer.sort(key=lambda node: node.barycenter)
+            for position, node in enumerate(layer):
+                node.order = position
+
+
+def _place(layers):
+    """Coordinates: layers left to right, nodes stacked top to bottom and centred vertically."""
+    heights = [sum(node.height for node in layer) + NODE_GAP * (len(layer) - 1) for layer in layers]
+    total_height = max(heights, default=0)
+    for index, layer in enumerate(layers):
+        y = MARGIN + (total_height - heights[index]) / 2
+        for node in layer:
+            node.x = MARGIN + index * (NODE_WIDTH + LAYER_GAP)
+            node.y = y
+            y += node.height + NODE_GAP
+    width = 2 * MARGIN + len(layers) * NODE_WIDTH + max(len(layers) - 1, 0) * LAYER_GAP
+    return width, total_height + 2 * MARGIN
+
+
+def _curve(x1, y1, x2, y2):
+    middle = (x1 + x2) / 2
+    return f'<path d="M{x1:.0f},{y1:.0f} C{middle:.0f},{y1:.0f} {middle:.0f},{y2:.0f} {x2:.0f},{y2:.0f}"/>'
+
+
+def _edges_svg(nodes, groups, group_of):
+    """
+    Edges of the diagram. A predecessor group with several members and several successors is
+    drawn through a junction point instead of as a complete bipartite set of edges.
+    """
+    successors_of_group = {}
+    for node_id, keys in group_of.items():
+        for key in keys:
+            successors_of_group.setdefault(key, []).append(nodes[node_id])
+
+    paths = []
+    for key, targets in successors_of_group.items():
+        sources = [nodes[member] for member in groups[key]]
+        if not sources:
+            continue
+        if len(sources) > 1 and len(targets) > 1:
+            junction_x = min(target.x for target in targets) - LAYER_GAP / 2
+            junction_y = sum(target.y + target.height / 2 for target in targets) / len(targets)
+            for source in sources:
+                paths.append(_curve(source.x + NODE_WIDTH, source.y + source.height / 2, junction_x, junction_y))
+            for target in targets:
+                paths.append(_curve(junction_x, junction_y, target.x, target.y + target.height / 2))
+            paths.append(f'<circle class="junction" cx="{junction_x:.0f}" cy="{junction_y:.0f}" r="3"/>')
+        else:
+            for source in sources:
+                for target in targets:
+                    paths.append(_curve(source.x + NODE_WIDTH, source.y + source.height / 2,
+                                        target.x, target.y + target.height / 2))
+    return paths
+
+
+def _node_svg(node):
+    parts = [
+        f'<g class="node"><title>{html.escape(node.tooltip)}</title>',
+        f'<rect x="{node.x:.0f}" y="{node.y:.0f}" width="{NODE_WIDTH}" height="{node.height}" rx="6" '
+        f'fill="{CATEGORY_COLORS.get(node.category, CATEGORY_COLORS["other"])}"/>',
+        f'<text class="label" x="{node.x + 10:.0f}" y="{node.y + 24:.0f}">{_label(node.label)}</text>',
+    ]
+    shown = node.steps[:MAX_STEPS_SHOWN]
+    for index, step in enumerate(shown):
+        y = node.y + NODE_HEIGHT + index * STEP_HEIGHT + 10
+        parts.append(f'<text class="step" x="{node.x + 16:.0f}" y="{y:.0f}">• {_label(step, MAX_LABEL_CHARS - 2)}</text>')
+    if len(node.steps) > MAX_STEPS_SHOWN:
+        y = node.y + NODE_HEIGHT + MAX_STEPS_SHOWN * STEP_HEIGHT + 10
+        parts.append(f'<text class="step" x="{node.x + 16:.0f}" y="{y:.0f}">+{len(node.steps) - MAX_STEPS_SHOWN} more</text>')
+    parts.append("</g>")
+    return "".join(parts)
+
+
+def render_pipeline_svg(pipeline, detail="jobs", collapsed_stages=None, title=None):
+    """
+    Render a pipeline as an SVG document.
+
+    Args:
+        pipeline: A parsed Pipeline.
+        detail: "stages" (one node per stage), "jobs" or "steps" (jobs listing their steps).
+        collapsed_stages: Optional names of stages drawn as a single node.
+        title: Optional caption drawn above the diagram.
+
+    Returns:
+        str: The SVG markup.
+    """
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"Unsupported detail level: {detail}")
+
+    nodes, groups, group_of = _build_graph(pipeline, detail, collapsed_stages)
+    layers, successors = _assign_layers(nodes, groups, group_of)
+    _order_layers(layers, nodes, groups, group_of, successors)
+    width, height = _place(layers)
+    node_fragments = [_node_svg(node) for layer in layers for node in layer]
+    return _svg_document(width, height, title, _edges_svg(nodes, groups, group_of), node_fragments)
+
+
+def _svg_document(width, height, title, edge_paths, node_fragments):
+    title_height = 28 if title else 0
+    svg = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height + title_height}" '
+        f'viewBox="0 0 {width} {height + title_height}" font-family="Sans-Serif">',
+        "<style>.edges path{fill:none;stroke:#7F8C8D;stroke-width:1.2}.junction{fill:#7F8C8D}"
+        ".node rect{stroke:#2D3436;stroke-width:1}.label{font-size:13px;font-weight:bold;fill:#2D3436}"
+        ".step{font-size:11px;fill:#2D3436}.title{font-size:16px;fill:#2D3436}</style>",
+        f'<rect width="100%" height="100%" fill="#F8F8F8"/>',
+    ]
+    if title:
+        svg.append(f'<text class="title" x="{MARGIN}" y="22">{html.escape(title)}</text>')
+    svg.append(f'<g transform="translate(0,{title_height})">')
+    svg.append('<g class="edges">' + "".join(edge_paths) + "</g>")
+    svg.extend(node_fragments)
+    svg.append("</g></svg>")
+    return "\n".join(svg)
+
+
+class IncrementalSvgDiagram:
+    """
+    A layered diagram that grows with a pipeline while it is being generated.
+
+    Nodes keep the position and markup they got when they first appeared: each update lays out
+    only new or changed nodes, appending them below the existing nodes of their layer, and
+    redraws the edges. The layout is therefore stable between updates, at the cost of the
+    crossing reduction that render_pipeline_svg does on the finished pipeline.
+    """
+
+    def __init__(self, detail="jobs", collapsed_stages=None, title=None):
+        if detail not in DETAIL_LEVELS:
+            raise ValueError(f"Unsupported detail level: {detail}")
+        self.detail = detail
+        self.collapsed_stages = collapsed_stages
+        self.title = title
+        self.placed = {}  # node id -> (signature, x, y, svg)
+        self.layer_bottom = {}  # layer -> y below its lowest node
+        self.reused = 0
+        self.laid_out = 0
+
+    def update(self, pipeline):
+        """Return the SVG for the pipeline as it is now; `reused` and `laid_out` count the nodes of this update."""
+        nodes, groups, group_of = _build_graph(pipeline, self.detail, self.collapsed_stages)
+        layers, successors = _assign_layers(nodes, groups, group_of)
+
+        self.reused = self.laid_out = 0
+        node_fragments = []
+        for layer in layers:
+            for node in layer:
+                signature = (node.layer, node.label, node.category, node.tooltip, tuple(node.steps))
+                placed = self.placed.get(node.id)
+                if placed and placed[0] == signature:
+                    node.x, node.y = placed[1], placed[2]
+                    node_fragments.append(placed[3])
+                    self.reused += 1
+                    continue
+                node.x = MARGIN + node.layer * (NODE_WIDTH + LAYER_GAP)
+                node.y = self.layer_bottom.get(node.layer, MARGIN)
+                self.layer_bottom[node.layer] = node.y + node.height + NODE_GAP
+                fragment = _node_svg(node)
+                self.placed[node.id] = (signature, node.x, node.y, fragment)
+                node_fragments.append(fragment)
+                self.laid_out += 1
+
+        width = 2 * MARGIN + len(layers) * NODE_WIDTH + max(len(layers) - 1, 0) * LAYER_GAP
+        height = max(self.layer_bottom.values(), default=MARGIN + NODE_GAP) - NODE_GAP + MARGIN
+        return _svg_document(width, height, self.title, _edges_svg(nodes, groups, group_of), node_fragments)
+
+
+def synthetic_pipeline(job_count, jobs_per_stage=10, steps_per_job=3):
+    """A GitLab-style pipeline of `job_count` jobs with stage ordering and some explicit needs."""
+    pipeline = GitLabPipeline()
+    for index in range(job_count):
+        if index % jobs_per_stage == 0:
+            pipeline.add_stage(PipelineStage(f"stage-{index // jobs_per_stage}"))
+        # Every third job uses `needs` on a job two stages back; the rest wait for the previous stage.
+        needs = [f"job-{index - 2 * jobs_per_stage}"] if index % 3 == 0 and index >= 2 * jobs_per_stage else None
+        job = PipelineJob(f"job-{index}", depends_on=needs)
+        for step in range(steps_per_job):
+            job.add_step(script_step(["make build", "make test", "trivy fs ."][step % 3]))
+        pipeline.stages[-1].add_job(job)
+    return pipeline
+
+
+def benchmark_render(sizes=(10, 100, 500, 1000, 5000), detail="jobs", repeat=3):
+    """Time render_pipeline_svg on synthetic pipelines. Returns a list of result dictionaries."""
+    results = []
+    for size in sizes:
+        pipeline = synthetic_pipeline(size)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            svg = render_pipeline_svg(pipeline, detail)
+            timings.append(time.perf_counter() - start)
+        results.append({"nodes": size, "detail": detail, "best_ms": round(min(timings) * 1000, 2),
+                        "svg_kb": round(len(svg) / 1024, 1)})
+    return results
+
+
+if __name__ == "__main__":
+    for detail in ("jobs", "steps"):
+        for result in benchmark_render(detail=detail):
+            print(f"{result['nodes']:>6} nodes  detail={result['detail']:<6} "
+                  f"{result['best_ms']:>9.2f} ms  {result['svg_kb']:>8.1f} KB")
@@ -0,0 +1,481 @@
+# telemetry.py
+
+"""
+Tracing, metrics and profiling for the generation pipeline.
+
+Spans:
+    with span("llm", provider="Azure"):
+        ...
+    @traced("diagram.render")
+    def render(...): ...
+
+Every finished span is observed in the `copilot_span_seconds` histogram, and whole traces are
+handed to the exporters: InMemorySpanExporter (tests and the UI), OtlpJsonFileExporter (one
+OTLP/JSON document per trace) and OtlpHttpExporter (any OpenTelemetry collector's /v1/traces).
+Counters cover LLM token usage and cache hit rates; metrics.prometheus_text() renders everything
+in the Prometheus text format and start_metrics_server() serves it on /metrics.
+
+SamplingProfiler samples the stacks of all threads at a fixed interval; set_profiling(True) (or
+COPILOT_PROFILE=1) turns it on and profiler.report() lists where the time goes.
+
+configure_from_environment() reads:
+    COPILOT_LOG_LEVEL              logging level (INFO)
+    COPILOT_TRACE_FILE             file for the OTLP/JSON exporter
+    OTEL_EXPORTER_OTLP_ENDPOINT    collector base URL for the OTLP/HTTP exporter
+    COPILOT_METRICS_PORT           port of the Prometheus endpoint
+    COPILOT_PROFILE                "1" starts the sampling profiler
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "devsecops-copilot"
+# Histogram buckets in seconds, from a cached diagram to a slow completion.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+MAX_RECENT_TRACES = 100
+PROFILE_INTERVAL_SECONDS = 0.005
+DEFAULT_METRICS_PORT = 9464
+
+METRIC_HELP = {
+    "copilot_span_seconds": "Duration of traced operations.",
+    "copilot_stage_seconds": "Time spent per generation stage.",
+    "copilot_span_errors_total": "Traced operations that raised.",
+    "copilot_llm_tokens_total": "Tokens sent to and received from the LLM providers.",
+    "copilot_cache_requests_total": "Cache lookups by result.",
+    "copilot_llm_requests_total": "LLM provider calls by outcome.",
+    "copilot_llm_hedges_total": "Hedged LLM requests started because the first provider was slow.",
+    "copilot_rate_limit_wait_seconds": "Time LLM requests waited for the client-side rate limiter.",
+    "copilot_rate_limited_total": "LLM requests the provider rejected with 429.",
+    "copilot_coalesced_requests_total": "LLM requests served by an identical request already in flight.",
+    "copilot_index_refreshes_total": "Document index rebuilds by kind (initial or incremental).",
+    "copilot_prefetches_total": "Speculative retrievals by outcome (completed, cancelled or failed).",
+}
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_otlp(self):
+        """The span in OTLP/JSON form."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def otlp_document(spans):
+    """An OTLP/JSON ExportTraceServiceRequest holding the spans."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+        }]
+    }
+
+
+class InMemorySpanExporter:
+    """Keeps exported spans in memory; enough for tests and for showing the last traces in the UI."""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def clear(self):
+        self.spans = []
+
+
+class OtlpJsonFileExporter:
+    """Appends one OTLP/JSON document per trace to a file (the OpenTelemetry collector's file format)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        line = json.dumps(otlp_document(spans))
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+class OtlpHttpExporter:
+    """Posts traces to an OpenTelemetry collector's OTLP/HTTP JSON endpoint."""
+
+    def __init__(self, endpoint, timeout=2):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, spans):
+        request = urllib.request.Request(self.url, data=json.dumps(otlp_document(spans)).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError as e:
+            logger.warning("Could not export %d span(s) to %s: %s", len(spans), self.url, e)
+
+
+class Metrics:
+    """Counters and latency histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[index] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def counter_value(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def quantile(self, name, fraction, **labels):
+        """Upper bucket bound below which `fraction` of the observations fall (None without observations)."""
+        histogram = self.histograms.get((name, tuple(sorted(labels.items()))))
+        if not histogram or not histogram[-1]:
+            return None
+        target = fraction * histogram[-1]
+        for index, bound in enumerate(self.buckets):
+            if histogram[index] >= target:
+                return bound
+        return float("inf")
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            describe(name, "histogram")
+            for index, bound in enumerate(self.buckets):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', repr(float(bound))),))} {histogram[index]}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram[-2]}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class Tracer:
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.exporters = []
+        self.recent_traces = deque(maxlen=MAX_RECENT_TRACES)
+        # (current span, list of the spans of its trace)
+        self._current = contextvars.ContextVar("copilot_span", default=(None, None))
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent, trace_spans = self._current.get()
+        if parent is None:
+            trace_spans = []
+            span = Span(name, f"{random.getrandbits(128):032x}", None, attributes)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        token = self._current.set((span, trace_spans))
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._current.reset(token)
+            span.end_ns = time.time_ns()
+            span.duration = time.perf_counter() - span._started
+            trace_spans.append(span)
+            self.metrics.observe("copilot_span_seconds", span.duration, span=name)
+            if span.error:
+                self.metrics.increment("copilot_span_errors_total", span=name)
+            if parent is None:
+                self._export(trace_spans)
+
+    def current_span(self):
+        return self._current.get()[0]
+
+    def _export(self, spans):
+        self.recent_traces.append(spans)
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                logger.warning("Span exporter %s failed: %s", type(exporter).__name__, e)
+
+
+metrics = Metrics()
+tracer = Tracer(metrics)
+span = tracer.span
+
+
+def traced(name=None):
+    """Decorator running the function (sync or async) inside a span named `name` or after the function."""
+    def decorator(function):
+        span_name = name or function.__qualname__
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_tokens(provider, prompt_tokens=None, completion_tokens=None, cached_tokens=None):
+    """Count LLM token usage reported by a provider (missing counts are skipped).
+
+    cached_tokens are the prompt tokens the provider served from its prompt cache (part of prompt_tokens).
+    """
+    if prompt_tokens:
+        metrics.increment("copilot_llm_tokens_total", prompt_tokens, provider=provider, kind="prompt")
+    if completion_tokens:
+        metrics.increment("copilot_llm_tokens_total", completion_tokens, provider=provider, kind="completion")
+    if cached_tokens:
+        metrics.increment("copilot_llm_tokens_total", cached_tokens, provider=provider, kind="cached")
+    current = tracer.current_span()
+    if current is not None:
+        current.set_attribute("llm.prompt_tokens", prompt_tokens or 0)
+        current.set_attribute("llm.completion_tokens", completion_tokens or 0)
+        current.set_attribute("llm.cached_tokens", cached_tokens or 0)
+
+
+def cached_token_rate(provider):
+    """Share of the provider's prompt tokens that came from its prompt cache, or None before any usage."""
+    prompt = metrics.counter_value("copilot_llm_tokens_total", provider=provider, kind="prompt")
+    cached = metrics.counter_value("copilot_llm_tokens_total", provider=provider, kind="cached")
+    return cached / prompt if prompt else None
+
+
+def record_cache(cache, hit, count=1):
+    if count:
+        metrics.increment("copilot_cache_requests_total", count, cache=cache, result="hit" if hit else "miss")
+
+
+def cache_hit_rate(cache):
+    hits = metrics.counter_value("copilot_cache_requests_total", cache=cache, result="hit")
+    misses = metrics.counter_value("copilot_cache_requests_total", cache=cache, result="miss")
+    return hits / (hits + misses) if hits + misses else None
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of the application's threads every `interval` seconds."""
+
+    def __init__(self, interval=PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.self_samples = Counter()  # function -> samples where it was running
+        self.total_samples = Counter()  # function -> samples where it was on the stack
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="copilot-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        self.self_samples.clear()
+        self.total_samples.clear()
+        self.samples = 0
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            # Skip our own threads (profiler, metrics endpoint); they only ever wait
+            ignored = {thread.ident for thread in threading.enumerate() if thread.name.startswith("copilot-")}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in ignored:
+                    continue
+                self.samples += 1
+                self.self_samples[_frame_label(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    label = _frame_label(frame)
+                    if label not in seen:
+                        seen.add(label)
+                        self.total_samples[label] += 1
+                    frame = frame.f_back
+
+    def report(self, top=20):
+        """The functions with the most samples: [{function, self, total, self_share, total_share}]."""
+        samples = self.samples or 1
+        return [
+            {
+                "function": function,
+                "self": self.self_samples[function],
+                "total": total,
+                "self_share": self.self_samples[function] / samples,
+                "total_share": total / samples,
+            }
+            for function, total in self.total_samples.most_common(top)
+        ]
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}:{code.co_name}"
+
+
+profiler = SamplingProfiler()
+
+
+def set_profiling(enabled):
+    """Start or stop the sampling profiler."""
+    if enabled:
+        profiler.start()
+    else:
+        profiler.stop()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = metrics.prometheus_text().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/profile":
+            body = json.dumps(profiler.report()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics endpoint: " + format, *args)
+
+
+def start_metrics_server(port=DEFAULT_METRICS_PORT, host="127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /profile (profiler report) from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="copilot-metrics", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%d/metrics", host, server.server_port)
+    return server
+
+
+_configured = False
+
+
+def configure_from_environment():
+    """Set up logging, exporters, the metrics endpoint and the profiler from environment variables, once."""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    logging.basicConfig(level=os.getenv("COPILOT_LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if os.getenv("COPILOT_TRACE_FILE"):
+        tracer.add_exporter(OtlpJsonFileExporter(os.getenv("COPILOT_TRACE_FILE")))
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        tracer.add_exporter(OtlpHttpExporter(os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")))
+    if os.getenv("COPILOT_METRICS_PORT"):
+        try:
+            start_metrics_server(int(os.getenv("COPILOT_METRICS_PORT")))
+        except OSError as e:
+            logger.warning("Could not start the metrics endpoint: %s", e)
+    if os.getenv("COPILOT_PROFILE") == "1":
+        profiler.start()
@@ -0,0 +1,15 @@
+# conftest.py
+
+"""
+The modules live at the top of the repository; make them importable from the tests.
+
+    python -m pytest -q
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PIPELINES_DIR = os.path.join(ROOT, "pipelines")
@@ -0,0 +1,47 @@
+# test_azure_code_generator.py
+
+"""Token usage of streamed Azure OpenAI completions."""
+
+from types import SimpleNamespace
+
+import azure_code_generator
+from rate_limiter import get_limiter
+from telemetry import metrics, span
+
+
+def chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeClient:
+    requests = []
+
+    def __init__(self, **_):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **request):
+        FakeClient.requests.append(request)
+        usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30, total_tokens=150,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=100))
+        return iter([chunk(), chunk("stages:"), chunk("\n  - build"), chunk(usage=usage)])
+
+
+def test_stream_records_usage_and_settles_the_reservation(monkeypatch):
+    monkeypatch.setattr(azure_code_generator, "AzureOpenAI", FakeClient)
+    limiter = get_limiter("Azure")
+    settled = []
+    monkeypatch.setattr(limiter, "settle", lambda reserved, used: settled.append(used))
+    before = {kind: metrics.counter_value("copilot_llm_tokens_total", provider="Azure", kind=kind)
+              for kind in ("prompt", "completion", "cached")}
+
+    with span("llm", provider="Azure") as llm_span:
+        pieces = list(azure_code_generator.stream_code_from_azure("https://example", "key", "prompt", "2024-10-21",
+                                                                  "gpt-4o-mini"))
+
+    assert pieces == ["stages:", "\n  - build"]
+    assert FakeClient.requests[-1]["stream_options"] == {"include_usage": True}
+    assert settled == [150]
+    assert {kind: metrics.counter_value("copilot_llm_tokens_total", provider="Azure", kind=kind) - before[kind]
+            for kind in before} == {"prompt": 120, "completion": 30, "cached": 100}
+    assert llm_span.attributes["llm.prompt_tokens"] == 120
@@ -0,0 +1,143 @@
+# test_conversion.py
+
+"""YAML loading, GitHub matrices and GitLab extends/include/parallel in the conversion to Pipeline objects."""
+
+import pytest
+
+from conversion import (GitLabReference, convert_github_actions_to_pipeline, convert_gitlab_ci_to_pipeline,
+                        expand_matrix, load_ci_yaml, load_gitlab_includes)
+
+
+def jobs_by_stage(pipeline):
+    return [(stage.name, [job.name for job in stage.jobs]) for stage in pipeline.stages]
+
+
+def steps(pipeline, job_name):
+    job = next(job for stage in pipeline.stages for job in stage.jobs if job.name == job_name)
+    return [step.inputs["script"] for step in job.steps]
+
+
+def test_yaml_keeps_on_as_a_key_and_resolves_merge_keys_and_references():
+    config = load_ci_yaml(
+        "on: push\n"
+        "flags: [yes, no, off, true, False]\n"
+        ".base: &base {image: alpine, script: [make]}\n"
+        "job:\n"
+        "  <<: *base\n"
+        "  after_script: !reference [.base, script]\n"
+    )
+
+    assert config["on"] == "push"
+    assert config["flags"] == ["yes", "no", "off", True, False]
+    assert config["job"] == {"image": "alpine", "script": ["make"], "after_script": [".base", "script"]}
+    assert isinstance(config["job"]["after_script"], GitLabReference)
+
+
+def test_matrix_combinations_with_exclude_and_include():
+    matrix = {
+        "os": ["ubuntu", "windows"],
+        "python": [3.9, 3.11],
+        "exclude": [{"os": "windows", "python": 3.9}],
+        "include": [{"python": 3.11, "experimental": True}, {"os": "macos", "python": 3.12}],
+    }
+
+    assert expand_matrix(matrix) == [
+        {"os": "ubuntu", "python": 3.9},
+        {"os": "ubuntu", "python": 3.11, "experimental": True},
+        {"os": "windows", "python": 3.11, "experimental": True},
+        {"os": "macos", "python": 3.12},
+    ]
+    assert expand_matrix("${{ fromJson(needs.setup.outputs.matrix) }}") == []
+
+
+def test_matrix_jobs_are_named_after_their_values_and_needed_together():
+    pipeline = convert_github_actions_to_pipeline(load_ci_yaml(
+        "on: push\n"
+        "jobs:\n"
+        "  test:\n"
+        "    strategy: {matrix: {os: [ubuntu, windows]}}\n"
+        "    steps: [{run: 'pytest on ${{ matrix.os }}'}]\n"
+        "  release:\n"
+        "    needs: test\n"
+        "    steps: [{run: make release}]\n"
+    ))
+
+    assert jobs_by_stage(pipeline) == [("test", ["test (ubuntu)", "test (windows)"]), ("release", ["release"])]
+    assert steps(pipeline, "test (windows)") == ["pytest on windows"]
+    assert pipeline.job_dependencies()[("release", "release")] == [
+        ("test", "test (ubuntu)"), ("test", "test (windows)")]
+
+
+def test_extends_chains_merge_mappings_and_replace_the_rest():
+    pipeline = convert_gitlab_ci_to_pipeline(load_ci_yaml(
+        "stages: [build, test]\n"
+        "default:\n"
+        "  before_script: [setup]\n"
+        ".base:\n"
+        "  stage: test\n"
+        "  script: [base]\n"
+        "  variables: {A: '1', B: '1'}\n"
+        ".tested:\n"
+        "  extends: .base\n"
+        "  script: [tested]\n"
+        "unit:\n"
+        "  extends: .tested\n"
+        "  inherit: {default: false}\n"
+        "lint:\n"
+        "  extends: .base\n"
+        "  stage: build\n"
+    ))
+
+    assert jobs_by_stage(pipeline) == [("build", ["lint"]), ("test", ["unit"])]
+    assert steps(pipeline, "unit") == ["tested"]
+    assert steps(pipeline, "lint") == ["setup", "base"]
+
+
+def test_circular_extends_is_rejected():
+    config = load_ci_yaml("a: {extends: b, script: [x]}\nb: {extends: a, script: [y]}\n")
+
+    with pytest.raises(ValueError, match="maximum `extends` depth"):
+        convert_gitlab_ci_to_pipeline(config)
+
+
+def test_local_includes_are_merged_before_the_including_file(tmp_path):
+    (tmp_path / "ci").mkdir()
+    (tmp_path / "ci" / "build.yml").write_text(
+        "include: ci/common.yml\n"
+        "build: {stage: build, extends: .common, script: [make]}\n"
+    )
+    (tmp_path / "ci" / "common.yml").write_text(".common: {before_script: [setup]}\n")
+    config = load_ci_yaml(
+        "include:\n"
+        "  - local: /ci/build.yml\n"
+        "  - remote: https://example.com/ci.yml\n"
+        "build: {script: [make all]}\n"
+    )
+
+    merged = load_gitlab_includes(config, str(tmp_path))
+
+    assert merged["build"] == {"stage": "build", "extends": ".common", "script": ["make all"]}
+    pipeline = convert_gitlab_ci_to_pipeline(config, str(tmp_path))
+    assert steps(pipeline, "build") == ["setup", "make all"]
+
+
+def test_parallel_jobs_and_their_needs():
+    pipeline = convert_gitlab_ci_to_pipeline(load_ci_yaml(
+        "stages: [build, test, deploy]\n"
+        "build: {stage: build, script: [make], parallel: {matrix: [{ARCH: [amd64, arm64], OS: linux}]}}\n"
+        "test: {stage: test, script: [make test], parallel: 2, needs: [build]}\n"
+        "deploy: {stage: deploy, script: [make deploy]}\n"
+    ))
+
+    assert jobs_by_stage(pipeline) == [
+        ("build", ["build: [amd64, linux]", "build: [arm64, linux]"]),
+        ("test", ["test 1/2", "test 2/2"]),
+        ("deploy", ["deploy"]),
+    ]
+    build = [("build", "build: [amd64, linux]"), ("build", "build: [arm64, linux]")]
+    assert pipeline.job_dependencies()[("test", "test 2/2")] == build
+    assert pipeline.execution_levels() == [build, [("test", "test 1/2"), ("test", "test 2/2")],
+                                           [("deploy", "deploy")]]
+    path, length = pipeline.critical_path({("test", "test 1/2"): 5})
+    assert path == [("build", "build: [amd64, linux]"), ("test", "test 1/2"), ("deploy", "deploy")]
+    assert length == 7
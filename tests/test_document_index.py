@@ -0,0 +1,206 @@
+# test_document_index.py
+
+"""DocumentIndex following a directory that changes while queries run against it."""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")  # document_index -> nlp_processing -> config loads the model
+pytest.importorskip("spacy")
+
+from docx import Document  # noqa: E402
+from qdrant_client import QdrantClient  # noqa: E402
+
+import document_index  # noqa: E402
+from document_index import DocumentIndex  # noqa: E402
+from extract_text import extract_text_from_docx  # noqa: E402
+from vector_index import NumpyVectorStore, QdrantVectorStore  # noqa: E402
+
+QUERY = np.ones((1, 4), dtype=np.float32)
+
+
+def write_document(directory, filename, *paragraphs):
+    document = Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    # Written next to the directory and renamed in, as editors do, so that no scan sees half a file
+    path = os.path.join(os.path.dirname(directory), filename + ".tmp")
+    document.save(path)
+    os.replace(path, os.path.join(directory, filename))
+
+
+def write_corrupt(directory, filename):
+    with open(os.path.join(directory, filename), "wb") as file:
+        file.write(b"PK\x03\x04 not a zip archive")
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    """Reads the documents for real and gives every line a fixed vector; records the files it was asked for."""
+    calls = []
+
+    def embed_document(file_path, metrics=None):
+        calls.append(os.path.basename(file_path))
+        texts = extract_text_from_docx(file_path).splitlines()
+        return texts, [[1.0, float(len(text)), 0.0, 1.0] for text in texts], None
+
+    monkeypatch.setattr(document_index, "embed_document", embed_document)
+    monkeypatch.setattr(document_index, "select_vector_store", lambda *args: NumpyVectorStore(path=None))
+    return calls
+
+
+@pytest.fixture
+def index(tmp_path, embedded):
+    directory = tmp_path / "documents"
+    directory.mkdir()
+    write_document(str(directory), "a.docx", "alpha one", "alpha two")
+    index = DocumentIndex(str(directory), client=QdrantClient(":memory:"), poll_interval=0.05)
+    yield index
+    index.stop()
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "the index did not catch up"
+        time.sleep(0.02)
+
+
+def contents(index):
+    with index.snapshot() as snapshot:
+        [hits] = index.store.search(snapshot.collections, QUERY, limit=100)
+    return sorted(hit["content"] for hit in hits)
+
+
+def test_queries_see_whole_snapshots_while_the_directory_changes(index, embedded):
+    index.start()
+    directory = index.directory_path
+    errors = []
+    stop = threading.Event()
+
+    def query():
+        while not stop.is_set():
+            try:
+                with index.snapshot() as snapshot:
+                    collections = snapshot.collections
+                    assert all(index.store.exists(collection) for collection in collections)
+                    [hits] = index.store.search(collections, QUERY, limit=100)
+                    # Every document of the snapshot answers, and only those
+                    assert {hit["collection"] for hit in hits} == set(collections)
+            except Exception as e:  # reported by the main thread
+                errors.append(e)
+
+    readers = [threading.Thread(target=query) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        write_document(directory, "b.docx", "beta")
+        wait_for(lambda: contents(index) == ["alpha one", "alpha two", "beta"])
+
+        write_document(directory, "a.docx", "alpha changed")
+        wait_for(lambda: contents(index) == ["alpha changed", "beta"])
+
+        # An unreadable document keeps its last good version, and is not read again on every poll
+        write_corrupt(directory, "b.docx")
+        wait_for(lambda: "b.docx" in index._failures)
+        attempts = embedded.count("b.docx")
+        time.sleep(10 * index.poll_interval)
+        assert embedded.count("b.docx") == attempts
+        assert contents(index) == ["alpha changed", "beta"]
+
+        # Once it changes it is read again at once
+        write_document(directory, "b.docx", "beta repaired")
+        wait_for(lambda: contents(index) == ["alpha changed", "beta repaired"])
+        assert "b.docx" not in index._failures
+
+        os.remove(os.path.join(directory, "a.docx"))
+        wait_for(lambda: contents(index) == ["beta repaired"])
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert not errors, errors[0]
+    # Replaced collections are dropped once no query holds them
+    index._drop_retired()
+    assert len(index.store.collections) == 1
+
+
+def test_a_failed_document_backs_off(index, embedded, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(document_index.time, "time", lambda: clock[0])
+    write_corrupt(index.directory_path, "b.docx")
+
+    assert index.refresh()["failed"] == ["b.docx"]
+    assert index.refresh()["failed"] == []  # still backing off
+    clock[0] += document_index.RETRY_BACKOFF_SECONDS
+    assert index.refresh()["failed"] == ["b.docx"]
+    clock[0] += document_index.RETRY_BACKOFF_SECONDS  # the wait has doubled
+    assert index.refresh()["failed"] == []
+    clock[0] += document_index.RETRY_BACKOFF_SECONDS
+    assert index.refresh()["failed"] == ["b.docx"]
+
+    assert embedded.count("b.docx") == 3
+    assert sorted(index.current.documents) == ["a.docx"]
+
+
+@pytest.fixture
+def shared(tmp_path, embedded, monkeypatch):
+    """An indexer and a read-only worker sharing one Qdrant, as with COPILOT_QDRANT_URL."""
+    monkeypatch.setattr(document_index, "select_vector_store", lambda client, *args: QdrantVectorStore(client))
+    directory = tmp_path / "documents"
+    directory.mkdir()
+    write_document(str(directory), "a.docx", "alpha one", "alpha two")
+    write_document(str(directory), "b.docx", "beta")
+    client = QdrantClient(":memory:")
+    return (DocumentIndex(str(directory), client=client, retire_after=60, shared=True),
+            DocumentIndex(str(directory), client=client, read_only=True, shared=True))
+
+
+def qdrant_collections(client):
+    return sorted(collection.name for collection in client.get_collections().collections)
+
+
+def test_read_only_workers_follow_the_published_manifest(shared, monkeypatch):
+    indexer, worker = shared
+    with pytest.raises(RuntimeError, match="has not been built yet"):
+        with worker.snapshot():
+            pass
+    with pytest.raises(RuntimeError, match="cannot be refreshed"):
+        worker.refresh()
+
+    indexer.refresh()
+    write_document(indexer.directory_path, "a.docx", "alpha changed")
+    indexer.refresh()
+
+    assert contents(worker) == ["alpha changed", "beta"]
+    with worker.snapshot() as snapshot:
+        assert snapshot.generation == 2 and snapshot.collections == ["a-2", "b-1"]
+    # The replaced collection stays for queries other processes may still run, until the grace period ends
+    assert "a-1" in qdrant_collections(indexer.client)
+    clock = time.time() + indexer.retire_after
+    monkeypatch.setattr(document_index.time, "time", lambda: clock)
+    indexer._drop_retired()
+    assert qdrant_collections(indexer.client) == ["a-2", "b-1", document_index.MANIFEST_COLLECTION]
+
+
+def test_a_restarted_indexer_only_ingests_what_changed(shared, embedded):
+    indexer, _ = shared
+    indexer.refresh()
+    write_document(indexer.directory_path, "a.docx", "alpha changed")
+    indexer.refresh()
+    write_document(indexer.directory_path, "b.docx", "beta changed")
+    del embedded[:]
+
+    restarted = DocumentIndex(indexer.directory_path, client=indexer.client, retire_after=60, shared=True)
+    restarted.resume()
+    result = restarted.refresh()
+
+    assert embedded == ["b.docx"] and result["changed"] == ["b.docx"] and result["added"] == []
+    assert restarted.current.generation == 3 and restarted.current.collections == ["a-2", "b-3"]
+    # The pending deletions of the previous run are still due
+    assert set(restarted._pending_deletion) == {"a-1", "b-1"}
@@ -0,0 +1,76 @@
+# test_embedding_cache.py
+
+"""EmbeddingCache: only new sentences are encoded, per model, and the vectors survive a restart."""
+
+import threading
+
+import sqlite_cache
+from embedding_cache import EmbeddingCache, normalize_sentence
+
+
+class CountingModel:
+    """Stands in for a SentenceTransformer: a 3-dimensional vector derived from each sentence."""
+
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.encoded = []
+
+    def encode(self, sentences):
+        self.encoded.extend(sentences)
+        return [[len(sentence) + self.offset, sentence.count(" "), 0.5] for sentence in sentences]
+
+
+def test_only_new_distinct_sentences_are_encoded(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), "model-a")
+    model = CountingModel()
+
+    first = cache.encode(model, ["Pin actions to a SHA.", "Scan images.", "Pin actions to a SHA."])
+    second = cache.encode(model, ["Scan  images.", "Cache dependencies."])
+
+    assert model.encoded == ["Pin actions to a SHA.", "Scan images.", "Cache dependencies."]
+    assert first[0] == first[2] == [21.0, 4.0, 0.5]
+    assert second[0] == first[1]  # whitespace is normalized before hashing
+    assert cache.stats() == {"vectors": 3, "bytes": 3 * 3 * 4, "hits": 2, "misses": 3, "hit_rate": 0.4}
+
+
+def test_vectors_survive_a_restart_and_models_do_not_share_them(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingCache(path, "model-a").encode(CountingModel(), ["Use OIDC for cloud credentials."])
+
+    restarted, other = CountingModel(), CountingModel(offset=100)
+    assert EmbeddingCache(path, "model-a").encode(restarted, ["Use OIDC for cloud credentials."]) == [[31.0, 4.0, 0.5]]
+    assert EmbeddingCache(path, "model-b").encode(other, ["Use OIDC for cloud credentials."]) == [[131.0, 4.0, 0.5]]
+    assert restarted.encoded == [] and other.encoded == ["Use OIDC for cloud credentials."]
+
+
+def test_lookups_larger_than_a_batch(monkeypatch):
+    monkeypatch.setattr(sqlite_cache, "LOOKUP_BATCH_SIZE", 7)
+    cache = EmbeddingCache(":memory:", "model-a")
+    sentences = [f"Sentence number {index}." for index in range(30)]
+    cache.encode(CountingModel(), sentences)
+    model = CountingModel()
+
+    vectors = cache.encode(model, sentences)
+
+    assert model.encoded == [] and len(vectors) == 30 and vectors[29] == [19.0, 2.0, 0.5]
+
+
+def test_threads_share_one_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), "model-a")
+    results = []
+
+    def encode(index):
+        results.append(cache.encode(CountingModel(), [f"Shared {index % 3}.", "Common sentence."]))
+
+    threads = [threading.Thread(target=encode, args=(index,)) for index in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 12 and cache.stats()["vectors"] == 4
+    assert all(result[1] == [16.0, 1.0, 0.5] for result in results)
+
+
+def test_normalized_form():
+    assert normalize_sentence("  Café\n  pipelines\t ") == "Café pipelines"
@@ -0,0 +1,217 @@
+# test_git_publisher.py
+
+"""publish_files, RepoLock and GitPublisher against local bare repositories."""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import git_publisher
+from git_publisher import GitPublisher, RepoLock, clone_directory, publish_files
+
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME="Test", GIT_AUTHOR_EMAIL="test@example.com",
+               GIT_COMMITTER_NAME="Test", GIT_COMMITTER_EMAIL="test@example.com")
+
+
+def git(directory, *args):
+    return subprocess.run(["git", *args], cwd=directory, env=GIT_ENV, check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+@pytest.fixture(autouse=True)
+def repo_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(git_publisher, "REPO_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """A bare repository serving partial clones, with a README, an executable script and a nested file on main."""
+    work = tmp_path / "work"
+    work.mkdir()
+    git(work, "init", "-q", "-b", "main")
+    (work / "README.md").write_text("# Service\n")
+    (work / "scripts").mkdir()
+    (work / "scripts" / "deploy.sh").write_text("#!/bin/sh\necho deploy\n")
+    os.chmod(work / "scripts" / "deploy.sh", 0o755)
+    (work / "ci" / "azure").mkdir(parents=True)
+    (work / "ci" / "azure" / "build.yml").write_text("steps: []\n")
+    git(work, "add", ".")
+    git(work, "update-index", "--chmod=+x", "scripts/deploy.sh")
+    git(work, "commit", "-q", "-m", "Initial commit")
+
+    bare = tmp_path / "remote.git"
+    git(tmp_path, "clone", "-q", "--bare", str(work), str(bare))
+    # What GitHub allows, so that the tree-less clone and its on-demand fetches work as they do there
+    git(bare, "config", "uploadpack.allowFilter", "true")
+    git(bare, "config", "uploadpack.allowAnySHA1InWant", "true")
+    return bare
+
+
+def remote_files(bare, ref="main"):
+    """{path: (mode, content)} of the tree at `ref`."""
+    files = {}
+    for line in git(bare, "ls-tree", "-r", ref).splitlines():
+        info, path = line.split("\t", 1)
+        mode, _, sha = info.split(" ")
+        files[path] = (mode, git(bare, "cat-file", "blob", sha) + "\n")
+    return files
+
+
+def urls(remote):
+    return {"path": str(remote), "file-url": remote.as_uri()}
+
+
+@pytest.mark.parametrize("url_kind", ["path", "file-url"])
+@pytest.mark.parametrize("mode", ["objects", "worktree"])
+def test_publish_files_commits_once_and_keeps_the_rest_of_the_tree(remote, mode, url_kind):
+    url = urls(remote)[url_kind]
+    base = git(remote, "rev-parse", "main")
+    files = {
+        "pipelines/azure-pipelines.yml": "stages: []\n",
+        "ci/azure/deploy.yml": "steps:\n  - script: ./deploy.sh\n",  # next to an existing file
+        "scripts/deploy.sh": "#!/bin/sh\necho deploy --safe\n",  # existing executable
+    }
+
+    result = publish_files(url, files, "Add pipelines", mode=mode)
+
+    assert result["pushed"] and result["branch"] == "main" and result["pull_request_url"] is None
+    assert git(remote, "rev-parse", "main") == result["commit"]
+    assert git(remote, "rev-parse", "main^") == base  # one commit on top of the old tip
+    assert git(remote, "log", "-1", "--format=%s%n%an", "main").splitlines() == [
+        "Add pipelines", git_publisher.COMMIT_AUTHOR_NAME]
+    assert remote_files(remote) == {
+        "README.md": ("100644", "# Service\n"),
+        "ci/azure/build.yml": ("100644", "steps: []\n"),
+        "ci/azure/deploy.yml": ("100644", files["ci/azure/deploy.yml"]),
+        "pipelines/azure-pipelines.yml": ("100644", files["pipelines/azure-pipelines.yml"]),
+        "scripts/deploy.sh": ("100755", files["scripts/deploy.sh"]),
+    }
+    git(remote, "fsck", "--strict")
+
+
+def test_objects_mode_uses_a_bare_tree_less_clone(remote):
+    publish_files(remote.as_uri(), {"pipelines/a.yml": "a\n"}, "Add a", mode="objects")
+    clone = clone_directory(remote.as_uri(), "objects")
+    assert git(clone, "rev-parse", "--is-bare-repository") == "true"
+    assert git(clone, "config", "remote.origin.partialclonefilter") == "tree:0"
+    # A second publish reuses the clone and fetches only the trees it changes
+    result = publish_files(remote.as_uri(), {"pipelines/b.yml": "b\n"}, "Add b", mode="objects")
+    assert result["pushed"]
+    assert set(remote_files(remote)) >= {"pipelines/a.yml", "pipelines/b.yml", "scripts/deploy.sh"}
+    git(remote, "fsck", "--strict")
+
+
+@pytest.mark.parametrize("mode", ["objects", "worktree"])
+def test_unchanged_files_are_not_committed(remote, mode):
+    publish_files(str(remote), {"pipelines/a.yml": "a\n"}, "Add a", mode=mode)
+    tip = git(remote, "rev-parse", "main")
+
+    result = publish_files(str(remote), {"pipelines/a.yml": "a\n"}, "Add a again", mode=mode)
+
+    assert result["commit"] is None and not result["pushed"]
+    assert git(remote, "rev-parse", "main") == tip
+
+
+@pytest.mark.parametrize("mode", ["objects", "worktree"])
+def test_new_branch_leaves_the_base_branch_alone(remote, mode):
+    base = git(remote, "rev-parse", "main")
+
+    result = publish_files(str(remote), {"pipelines/a.yml": "a\n"}, "Add a", new_branch="copilot/test", mode=mode)
+
+    assert result["branch"] == "copilot/test"
+    assert git(remote, "rev-parse", "main") == base
+    assert git(remote, "rev-parse", "copilot/test^") == base
+    assert remote_files(remote, "copilot/test")["pipelines/a.yml"] == ("100644", "a\n")
+
+
+@pytest.mark.parametrize("mode", ["objects", "worktree"])
+def test_first_commit_of_an_empty_remote(tmp_path, mode):
+    bare = tmp_path / "empty.git"
+    git(tmp_path, "init", "-q", "--bare", "-b", "main", str(bare))
+
+    result = publish_files(str(bare), {"pipelines/a.yml": "a\n"}, "Add a", mode=mode)
+
+    assert result["pushed"]
+    assert remote_files(bare) == {"pipelines/a.yml": ("100644", "a\n")}
+
+
+def test_paths_outside_the_repository_are_refused(remote):
+    with pytest.raises(ValueError):
+        publish_files(str(remote), {"../escape.yml": "x\n"}, "Escape", mode="objects")
+
+
+def test_repo_lock_excludes_other_threads(tmp_path):
+    directory = str(tmp_path / "clone")
+    acquired = threading.Event()
+    order = []
+
+    def contender():
+        with RepoLock(directory):
+            order.append("contender")
+        acquired.set()
+
+    with RepoLock(directory):
+        thread = threading.Thread(target=contender)
+        thread.start()
+        assert not acquired.wait(0.3)
+        order.append("holder")
+    assert acquired.wait(5)
+    thread.join()
+    assert order == ["holder", "contender"]
+
+
+def test_repo_lock_excludes_other_processes(tmp_path):
+    directory = str(tmp_path / "clone")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    holder = subprocess.Popen(
+        [sys.executable, "-c",
+         "import sys, time\n"
+         f"sys.path.insert(0, {root!r})\n"
+         "from git_publisher import RepoLock\n"
+         f"with RepoLock({directory!r}):\n"
+         "    print('locked', flush=True)\n"
+         "    time.sleep(0.5)\n"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        started = time.monotonic()
+        with RepoLock(directory):
+            waited = time.monotonic() - started
+        assert waited >= 0.2
+    finally:
+        holder.wait(10)
+
+
+def test_publisher_merges_queued_publishes(remote):
+    url = str(remote)
+    publisher = GitPublisher()
+    base = git(remote, "rev-parse", "main")
+
+    # Hold the clone so that the first publish waits and the next two queue up behind it
+    with RepoLock(clone_directory(url, "objects")):
+        first = publisher.submit(url, {"pipelines/a.yml": "a\n"}, "Add a", mode="objects")
+        deadline = time.monotonic() + 5
+        while publisher._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not publisher._pending  # the worker took the first publish
+        second = publisher.submit(url, {"pipelines/b.yml": "b\n"}, "Add b", mode="objects")
+        third = publisher.submit(url, {"pipelines/c.yml": "c\n", "pipelines/b.yml": "b2\n"}, "Add c",
+                                 mode="objects")
+
+    assert second is third and second is not first
+    first_result = first.result(30)
+    merged = second.result(30)
+    assert merged["files"] == ["pipelines/b.yml", "pipelines/c.yml"]
+    assert git(remote, "rev-parse", "main") == merged["commit"]
+    assert git(remote, "rev-parse", "main^") == first_result["commit"]
+    assert git(remote, "rev-parse", "main^^") == base
+    assert git(remote, "log", "-1", "--format=%B", "main").splitlines()[:4] == [
+        "Publish 2 generated pipeline files", "", "- Add b", "- Add c"]
+    files = remote_files(remote)
+    assert files["pipelines/b.yml"] == ("100644", "b2\n")  # the later publish of a path wins
+    assert files["pipelines/c.yml"] == ("100644", "c\n")
@@ -0,0 +1,111 @@
+# test_incremental_parser.py
+
+"""Streaming parse: a snapshot per completed block, and a diagram that keeps the nodes already drawn."""
+
+import os
+
+import pytest
+
+from conftest import PIPELINES_DIR
+from incremental_parser import IncrementalPipelineParser
+from pipeline_converter import parse_pipeline
+from svg_diagram import IncrementalSvgDiagram
+
+GITHUB = """\
+Here is the workflow:
+
+```yaml
+name: CI
+on: push
+jobs:
+  lint:
+    runs-on: ubuntu-latest
+    steps:
+      - run: make lint
+  build:
+    runs-on: ubuntu-latest
+    steps:
+      - run: make
+  test:
+    needs: build
+    runs-on: ubuntu-latest
+    steps:
+      - run: make test
+```
+
+Placeholders to replace: none.
+"""
+
+
+def stream(text, pipeline_type, chunk_size):
+    """Feed the text in chunks; returns the job names of every snapshot and the final pipeline."""
+    parser = IncrementalPipelineParser(pipeline_type)
+    snapshots = []
+    for start in range(0, len(text), chunk_size):
+        pipeline = parser.feed(text[start:start + chunk_size])
+        if pipeline:
+            snapshots.append(job_names(pipeline))
+    return snapshots, parser.finish()
+
+
+def job_names(pipeline):
+    return [job.name for stage in pipeline.stages for job in stage.jobs]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+def test_github_jobs_appear_as_they_are_completed(chunk_size):
+    snapshots, final = stream(GITHUB, "github-actions", chunk_size)
+
+    assert snapshots == [["lint"], ["lint", "build"], ["lint", "build", "test"]]
+    assert final.structure_hash() == parse_pipeline(GITHUB, "github-actions").structure_hash()
+
+
+def test_nothing_is_parsed_before_the_code_block_opens():
+    parser = IncrementalPipelineParser("github-actions")
+
+    assert parser.feed("jobs:\n  lint:\n    steps: []\n  build:\n") is None
+    assert parser.pipeline is None and parser.snapshots == 0
+
+
+def test_gitlab_blocks_and_the_final_parse():
+    code = "```yaml\nstages: [build, test]\nbuild:\n  stage: build\n  script: [make]\ntest:\n  script: [make test]\n```\n"
+
+    snapshots, final = stream(code, "gitlab-ci", 5)
+
+    # `stages:` is a block of its own and gives a pipeline without stages yet, which the UI does not draw
+    assert snapshots == [[], ["build"], ["build", "test"]]
+    assert job_names(final) == ["build", "test"]
+
+
+def test_jenkins_stages_appear_once_their_braces_close():
+    with open(os.path.join(PIPELINES_DIR, "jenkinsfile-scripted-20250221091109.groovy"), encoding="utf-8") as file:
+        code = file.read()
+    expected = job_names(parse_pipeline(code, "jenkinsfile-scripted"))
+
+    snapshots, final = stream(code, "jenkinsfile-scripted", 16)
+
+    assert snapshots == [expected[:count] for count in range(1, len(expected) + 1)]
+    assert job_names(final) == expected
+
+
+def test_unknown_pipeline_types_are_rejected():
+    with pytest.raises(ValueError, match="Unsupported pipeline type"):
+        IncrementalPipelineParser("bitbucket")
+
+
+def test_incremental_diagram_only_lays_out_new_nodes():
+    parser = IncrementalPipelineParser("github-actions")
+    diagram = IncrementalSvgDiagram()
+    counts = []
+    svg = None
+    for character in GITHUB:
+        pipeline = parser.feed(character)
+        if pipeline:
+            svg = diagram.update(pipeline)
+            counts.append((diagram.reused, diagram.laid_out))
+
+    assert counts == [(0, 1), (1, 1), (2, 1)]
+    assert svg.count('<g class="node">') == 3 and svg.count("<path") == 1
+    # The first node keeps its markup (and so its position) through every update
+    first = diagram.placed["job:0:lint"][3]
+    assert first in svg
@@ -0,0 +1,161 @@
+# test_llm_router.py
+
+"""LLMRouter against local stub servers: routing order, failover, hedging and cancellation."""
+
+import asyncio
+import contextlib
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import llm_router
+from llm_router import LLMProvider, LLMRouter
+from telemetry import metrics
+
+
+@contextlib.asynccontextmanager
+async def stub_servers(behaviour):
+    """
+    One local HTTP server answering POST /<provider> after behaviour[provider] = (seconds, status).
+    Yields the base URL and the list of providers whose request was dropped by the client.
+    """
+    dropped = []
+
+    async def handle(request):
+        name = request.match_info["name"]
+        seconds, status = behaviour[name]
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:  # the client closed the connection
+            dropped.append(name)
+            raise
+        return web.Response(text=f"{name}: {await request.text()}", status=status)
+
+    app = web.Application()
+    app.router.add_post("/{name}", handle)
+    runner = web.AppRunner(app, handler_cancellation=True)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}", dropped
+    finally:
+        await runner.cleanup()
+
+
+def provider(base_url, name):
+    async def complete(prompt):
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{base_url}/{name}", data=prompt) as response:
+                response.raise_for_status()
+                return await response.text()
+    return LLMProvider(name, complete)
+
+
+def measured(provider, *latencies):
+    for seconds in latencies:
+        provider.stats.record(seconds, True)
+    return provider
+
+
+async def wait_until(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_route_prefers_unmeasured_then_fast_then_unhealthy():
+    slow = measured(LLMProvider("slow", None), *[2.0] * llm_router.MIN_LATENCY_SAMPLES)
+    fast = measured(LLMProvider("fast", None), *[0.5] * llm_router.MIN_LATENCY_SAMPLES)
+    new = LLMProvider("new", None)
+    broken = measured(LLMProvider("broken", None), *[0.1] * llm_router.MIN_LATENCY_SAMPLES)
+    for _ in range(llm_router.UNHEALTHY_AFTER_FAILURES):
+        broken.stats.record(1.0, False)
+
+    router = LLMRouter([slow, broken, fast, new])
+
+    assert [provider.name for provider in router.route()] == ["new", "fast", "slow", "broken"]
+    assert router.stats()["broken"]["healthy"] is False
+
+
+def test_failed_provider_falls_through_to_the_next():
+    async def run():
+        async with stub_servers({"first": (0, 500), "second": (0, 200)}) as (url, _):
+            first, second = provider(url, "first"), provider(url, "second")
+            result = await LLMRouter([first, second]).generate("prompt")
+            return result, first.stats, second.stats
+
+    result, first_stats, second_stats = asyncio.run(run())
+
+    assert result == "second: prompt"
+    assert list(first_stats.outcomes) == [False] and first_stats.consecutive_failures == 1
+    assert list(second_stats.outcomes) == [True]
+
+
+def test_every_provider_failing_raises():
+    async def run():
+        async with stub_servers({"first": (0, 500), "second": (0, 503)}) as (url, _):
+            await LLMRouter([provider(url, "first"), provider(url, "second")]).generate("prompt")
+
+    with pytest.raises(RuntimeError, match="All LLM providers failed: first: .*; second: "):
+        asyncio.run(run())
+
+
+def test_hedged_request_wins_and_the_slow_one_is_cancelled_and_measured():
+    async def run():
+        async with stub_servers({"slow": (5, 200), "fast": (0.05, 200)}) as (url, dropped):
+            # Both measured, the slow one ranked first: its p90 is 0.1 s, so the hedge goes out after 0.1 s
+            slow = measured(provider(url, "slow"), *[0.1] * llm_router.MIN_LATENCY_SAMPLES)
+            fast = measured(provider(url, "fast"), *[0.2] * llm_router.MIN_LATENCY_SAMPLES)
+            router = LLMRouter([slow, fast], hedge=True)
+            assert router.route() == [slow, fast]
+            hedges = metrics.counter_value("copilot_llm_hedges_total", provider="slow")
+
+            result = await router.generate("prompt")
+
+            await wait_until(lambda: dropped == ["slow"])
+            assert metrics.counter_value("copilot_llm_hedges_total", provider="slow") == hedges + 1
+            return result, router, slow
+
+    result, router, slow = asyncio.run(run())
+
+    assert result == "fast: prompt"
+    # The cancelled request ran for at least the hedge delay plus the fast answer: a lower bound of its latency
+    assert len(slow.stats.latencies) == llm_router.MIN_LATENCY_SAMPLES + 1
+    assert slow.stats.latencies[-1] >= 0.15
+    assert list(slow.stats.outcomes) == [True] * llm_router.MIN_LATENCY_SAMPLES  # neither a success nor a failure
+
+
+def test_cancelled_request_closes_its_connection_and_records_a_lower_bound():
+    async def run():
+        async with stub_servers({"slow": (5, 200)}) as (url, dropped):
+            slow = provider(url, "slow")
+            cancelled = metrics.counter_value("copilot_llm_requests_total", provider="slow", outcome="cancelled")
+            task = asyncio.ensure_future(LLMRouter([slow]).generate("prompt"))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            await wait_until(lambda: dropped == ["slow"])
+            assert metrics.counter_value("copilot_llm_requests_total", provider="slow",
+                                         outcome="cancelled") == cancelled + 1
+            return slow
+
+    slow = asyncio.run(run())
+
+    assert len(slow.stats.latencies) == 1 and slow.stats.latencies[0] >= 0.2
+    assert not slow.stats.outcomes
+
+
+def test_cancelled_request_faster_than_the_median_is_not_a_sample():
+    stats = measured(LLMProvider("p", None), 1.0, 2.0, 3.0).stats
+
+    stats.record_cancelled(0.5)
+    stats.record_cancelled(4.0)
+
+    assert list(stats.latencies) == [1.0, 2.0, 3.0, 4.0]
@@ -0,0 +1,42 @@
+# test_main.py
+
+"""Provider dispatch of main: the Stub provider answers generation, streaming and patch requests."""
+
+import pytest
+
+pytest.importorskip("sentence_transformers")  # main -> config loads the model
+pytest.importorskip("spacy")
+
+import main
+from llm_router import LLMProvider, LLMRouter
+from pipeline_repair import build_patch_prompt, extract_patch
+from stub_code_generator import generate_patch_from_stub
+
+
+def test_stub_is_streamed_in_one_piece(monkeypatch):
+    monkeypatch.setattr(main, "build_generation_prompt", lambda *args: "A Jenkins pipeline")
+
+    chunks = list(main.stream_pipeline("A Jenkins pipeline", "docs", "Stub"))
+
+    assert len(chunks) == 1 and "```groovy" in chunks[0]
+
+
+def test_stub_answers_patch_requests():
+    lines = ["stages: [build]", "build:", "  script: make"]
+    prompt = build_patch_prompt("gitlab-ci", {"message": "bad", "line": 2}, lines, 1, 3)
+
+    text, tokens_used = main.get_patch_completion("Stub")(prompt, 100)
+
+    assert extract_patch(text) == lines[1:3] and tokens_used is None
+    assert "operations" in main.get_patch_completion("Stub", "edit")("Add a job", 100)[0]
+
+
+def test_auto_routed_to_the_stub_gets_stub_patches(monkeypatch):
+    monkeypatch.setattr(main, "get_router", lambda: LLMRouter([LLMProvider("Stub", None)]))
+
+    assert main.get_patch_completion("Auto", "edit")("Add a job", 100)[0] == generate_patch_from_stub("", "edit")
+
+
+def test_unknown_provider_is_rejected():
+    with pytest.raises(ValueError, match="Invalid provider flag"):
+        main.get_patch_completion("Nope")
@@ -0,0 +1,128 @@
+# test_pipeline_analyzer.py
+
+"""analyze_pipeline: the job graph it reports and the missing-dependency-cache rule, decided for each job."""
+
+from conversion import convert_gitlab_ci_to_pipeline, load_ci_yaml
+from pipeline_analyzer import analyze_pipeline, format_analysis_report
+from pipelineparser import PipelineParser
+
+
+def cache_findings(code, pipeline_type):
+    pipeline = PipelineParser(code, pipeline_type).parse_pipeline_code()
+    report = analyze_pipeline(pipeline, raw_code=code)
+    return {job for finding in report["findings"] if finding["rule"] == "missing-dependency-cache"
+            for job in finding["jobs"]}
+
+
+GITHUB = """\
+on: push
+jobs:
+  web:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+      - uses: actions/setup-node@v4
+        with:
+          cache: npm
+      - run: npm ci
+  api:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+      - run: pip install -r requirements.txt
+"""
+
+
+def test_cache_step_in_one_job_does_not_cover_another():
+    assert cache_findings(GITHUB, "github-actions") == {"api"}
+
+
+GITLAB = """\
+stages: [build, test]
+.npm:
+  cache:
+    paths: [.npm]
+web:
+  extends: .npm
+  stage: build
+  script: [npm ci]
+api:
+  stage: build
+  script: [pip install -r requirements.txt]
+"""
+
+
+def test_gitlab_job_level_cache():
+    assert cache_findings(GITLAB, "gitlab-ci") == {"api"}
+
+
+def test_gitlab_default_cache_unless_turned_off():
+    code = "default:\n  cache:\n    paths: [.cache/pip]\n" + GITLAB + "lint:\n  cache: []\n  script: [pip install ruff]\n"
+    assert cache_findings(code, "gitlab-ci") == {"lint"}
+
+
+def test_gitlab_cache_settings_that_cannot_be_read_skip_the_rule(tmp_path):
+    # `.npm` comes from an include the analyzer is not given: no job may be reported as uncached
+    (tmp_path / "npm.yml").write_text(".npm:\n  cache:\n    paths: [.npm]\n")
+    code = "include: npm.yml\n" + GITLAB.replace(".npm:\n  cache:\n    paths: [.npm]\n", "")
+    pipeline = convert_gitlab_ci_to_pipeline(load_ci_yaml(code), str(tmp_path))
+
+    report = analyze_pipeline(pipeline, raw_code=code)
+
+    assert not [finding for finding in report["findings"] if finding["rule"] == "missing-dependency-cache"]
+    assert report["warnings"] == ["Dependency caches were not checked: GitLab job '.npm' extends an unknown job."]
+    assert report["warnings"][0] in format_analysis_report(report)
+
+
+JENKINS = """\
+pipeline {
+    agent any
+    stages {
+        stage('Web') {
+            steps {
+                cache(maxCacheSize: 250, caches: [arbitraryFileCache(path: 'node_modules')]) {
+                    sh 'npm ci'
+                }
+            }
+        }
+        stage('Api') {
+            steps {
+                sh 'pip install -r requirements.txt'
+            }
+        }
+    }
+}
+"""
+
+
+def test_jenkins_jobcacher_covers_its_stage_only():
+    assert cache_findings(JENKINS, "jenkinsfile-declarative") == {"Api"}
+
+
+AZURE_DEV_PROD = """\
+stages:
+  - stage: Dev
+    jobs:
+      - job: deploy
+        steps:
+          - script: npm ci && ./deploy.sh dev
+  - stage: Prod
+    jobs:
+      - job: deploy
+        steps:
+          - task: Cache@2
+          - script: npm ci && ./deploy.sh prod
+"""
+
+
+def test_jobs_of_the_same_name_in_two_stages_are_reported_apart():
+    pipeline = PipelineParser(AZURE_DEV_PROD, "azure-pipelines").parse_pipeline_code()
+
+    report = analyze_pipeline(pipeline, durations={"deploy (Prod)": 100})
+
+    assert report["dependencies"] == {"deploy (Dev)": [], "deploy (Prod)": ["deploy (Dev)"]}
+    assert report["critical_path"] == ["deploy (Dev)", "deploy (Prod)"]
+    assert report["critical_path_seconds"] == report["job_seconds"]["deploy (Dev)"] + 100
+    assert report["max_parallelism"] == 1
+    assert [finding["jobs"] for finding in report["findings"] if finding["rule"] == "missing-dependency-cache"] == [
+        ["deploy (Dev)"]]
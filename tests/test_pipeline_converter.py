@@ -0,0 +1,169 @@
+# test_pipeline_converter.py
+
+"""Round trips of the sample pipelines in pipelines/ through every platform."""
+
+import os
+
+import pytest
+
+from conftest import PIPELINES_DIR
+from pipeline_converter import SUPPORTED_PIPELINE_TYPES, convert_pipeline_code, verify_round_trip
+
+# The committed samples; the UI saves new generations next to them.
+SAMPLES = {
+    "azure-pipelines-20250221091455.yaml": "azure-pipelines",
+    "azure-pipelines-20250221091556.yaml": "azure-pipelines",
+    "codepipeline-20250221091714.yaml": "codepipeline",
+    "jenkinsfile-scripted-20250212050224.groovy": "jenkinsfile-scripted",
+    "jenkinsfile-scripted-20250212051525.groovy": "jenkinsfile-scripted",
+    "jenkinsfile-scripted-20250212052235.groovy": "jenkinsfile-scripted",
+    "jenkinsfile-scripted-20250212052434.groovy": "jenkinsfile-scripted",
+    "jenkinsfile-scripted-20250213092904.groovy": "jenkinsfile-scripted",
+    "jenkinsfile-scripted-20250221060106.groovy": "jenkinsfile-scripted",
+    "jenkinsfile-scripted-20250221091109.groovy": "jenkinsfile-scripted",
+    "unknown-20250221091352.txt": "azure-pipelines",
+}
+# Its 'Cleanup' stage has no steps, and every emitter fills an empty job with a placeholder echo.
+EMPTY_JOB_SAMPLE = "jenkinsfile-scripted-20250212050224.groovy"
+YAML_TYPES = ("azure-pipelines", "gitlab-ci", "github-actions")
+
+
+def read_sample(name):
+    with open(os.path.join(PIPELINES_DIR, name)) as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("name", sorted(set(SAMPLES) - {EMPTY_JOB_SAMPLE}))
+def test_same_platform_round_trip_keeps_every_step(name):
+    lossless, differences, warnings = verify_round_trip(read_sample(name), SAMPLES[name], SAMPLES[name])
+    assert differences == []
+    # Every sample has settings outside the model (triggers, pools, `agent`...), which make it lossy
+    assert warnings and not lossless
+
+
+def test_unmodelled_settings_of_the_source_are_reported():
+    lossless, differences, warnings = verify_round_trip(read_sample("azure-pipelines-20250221091455.yaml"),
+                                                        "azure-pipelines", "azure-pipelines")
+    assert not lossless and differences == []
+    assert warnings == [
+        "Settings of the pipeline are not converted: `trigger`, `pr`.",
+        "Settings of job 'Validate Terraform Configuration' are not converted: `pool`.",
+        "Settings of job 'Apply Terraform Configuration' are not converted: `condition`, `pool`.",
+    ]
+
+
+def test_pipeline_within_the_model_round_trips_losslessly():
+    code = """\
+stages: [build, test]
+build:
+  stage: build
+  script: [make]
+unit:
+  stage: test
+  needs: [build]
+  script: [make test]
+"""
+    for target_type in ("gitlab-ci", "azure-pipelines", "github-actions"):
+        assert verify_round_trip(code, "gitlab-ci", target_type) == (True, [], [])
+
+
+def test_github_job_and_workflow_settings_are_reported():
+    code = """\
+on:
+  pull_request:
+jobs:
+  build:
+    runs-on: windows-latest
+    if: github.actor != 'dependabot[bot]'
+    env:
+      CI: "true"
+    steps:
+      - run: make
+        env:
+          GOFLAGS: -mod=vendor
+"""
+    _, warnings = convert_pipeline_code(code, "github-actions", "github-actions")
+    assert warnings == [
+        "Settings of the workflow are not converted: `on`.",
+        "Settings of job 'build' are not converted: `runs-on`, `if`, `env`.",
+        "Settings of step 'make' of job 'build' are not converted: `env`.",
+    ]
+    assert not verify_round_trip(code, "github-actions", "github-actions")[0]
+
+
+def test_gitlab_job_settings_are_reported_after_extends():
+    code = """\
+variables:
+  GIT_DEPTH: 20
+.rules:
+  rules:
+    - if: $CI_COMMIT_BRANCH == "main"
+deploy:
+  extends: .rules
+  image: alpine
+  when: manual
+  variables:
+    TARGET: prod
+  script: [./deploy.sh]
+"""
+    _, warnings = convert_pipeline_code(code, "gitlab-ci", "azure-pipelines")
+    assert warnings == [
+        "Settings of the pipeline are not converted: `variables`.",
+        "Settings of job 'deploy' are not converted: `rules`, `image`, `when`, `variables`.",
+    ]
+
+
+def test_checkout_options_dropped_by_jenkins_are_reported():
+    code = """\
+on: push
+jobs:
+  build:
+    steps:
+      - uses: actions/checkout@v4
+        with:
+          fetch-depth: 0
+          repository: octo/tools
+      - run: make
+"""
+    converted, warnings = convert_pipeline_code(code, "github-actions", "jenkinsfile-declarative")
+    assert "checkout scm" in converted
+    assert "Options `fetch-depth`, `repository` of checkout step 'Checkout' were dropped; " \
+           "pass them to a GitSCM checkout instead." in warnings
+    lossless, differences, _ = verify_round_trip(code, "github-actions", "jenkinsfile-declarative")
+    assert not lossless and differences
+    # GitHub itself keeps them
+    assert "repository: octo/tools" in convert_pipeline_code(code, "github-actions", "github-actions")[0]
+
+
+def test_empty_job_gains_placeholder_step():
+    lossless, differences, _ = verify_round_trip(read_sample(EMPTY_JOB_SAMPLE), "jenkinsfile-scripted",
+                                                 "jenkinsfile-scripted")
+    assert not lossless
+    assert differences == ["Job 'Cleanup' gained step groovy {\"statement\": \"echo 'Cleanup'\"}."]
+
+
+@pytest.mark.parametrize("target_type", YAML_TYPES)
+def test_jenkins_echo_steps_are_lost_in_yaml_targets(target_type):
+    lossless, differences, warnings = verify_round_trip(
+        read_sample("jenkinsfile-scripted-20250212051525.groovy"), "jenkinsfile-scripted", target_type)
+    assert not lossless
+    assert "Job 'Build' lost step groovy {\"statement\": \"echo \\\"Building the Java application...\\\"\"}." \
+        in differences
+    assert warnings
+
+
+@pytest.mark.parametrize("target_type", [t for t in SUPPORTED_PIPELINE_TYPES if t != "codepipeline"])
+def test_codepipeline_round_trip_reports_failed_conversion(target_type):
+    # CodeCommit and CodeBuild actions have no equivalent elsewhere, so nothing comes back.
+    lossless, differences, warnings = verify_round_trip(read_sample("codepipeline-20250221091714.yaml"),
+                                                        "codepipeline", target_type)
+    assert not lossless
+    assert differences == ["Conversion back to codepipeline failed: No actions found in any stage of the pipeline."]
+    assert any("CodeCommit" in warning for warning in warnings)
+
+
+@pytest.mark.parametrize("name", sorted(SAMPLES))
+@pytest.mark.parametrize("target_type", SUPPORTED_PIPELINE_TYPES)
+def test_round_trip_never_raises(name, target_type):
+    lossless, differences, warnings = verify_round_trip(read_sample(name), SAMPLES[name], target_type)
+    assert lossless == (not differences and not warnings)
@@ -0,0 +1,155 @@
+# test_pipeline_editor.py
+
+"""edit_pipeline against the sample pipelines, with a fake LLM answering a fixed patch."""
+
+import difflib
+import json
+import os
+
+from conftest import PIPELINES_DIR
+from pipeline_converter import convert_pipeline_code, parse_pipeline
+from pipeline_editor import edit_pipeline, round_trip_losses
+from pipelineparser import find_code_block
+
+AZURE_SAMPLE = "azure-pipelines-20250221091455.yaml"
+JENKINS_SAMPLE = "jenkinsfile-scripted-20250221091109.groovy"
+
+
+def read_sample(filename):
+    with open(os.path.join(PIPELINES_DIR, filename), encoding="utf-8") as file:
+        return file.read()
+
+
+def answering(*operations):
+    """A `complete` callable that answers every prompt with the same patch and keeps the prompts."""
+    def complete(prompt, max_tokens):
+        complete.prompts.append(prompt)
+        return json.dumps({"operations": list(operations)}), 10
+    complete.prompts = []
+    return complete
+
+
+def changed_lines(before, after):
+    """(removed, added) lines of the diff between two texts."""
+    diff = list(difflib.ndiff(before.splitlines(), after.splitlines()))
+    return ([line[2:] for line in diff if line.startswith("- ")],
+            [line[2:] for line in diff if line.startswith("+ ")])
+
+
+def test_step_edits_leave_the_rest_of_the_azure_source_alone():
+    code = read_sample(AZURE_SAMPLE)
+    complete = answering(
+        {"op": "add_step", "job": "Apply Terraform Configuration", "after": "Checkout@2",
+         "step": {"name": "Scan", "script": "trivy config ."}},
+        {"op": "remove_step", "job": "Validate Terraform Configuration", "step": "Checkout@2"},
+    )
+
+    result = edit_pipeline(code, "azure-pipelines", "Scan before applying", complete)
+
+    assert result["applied"] and result["errors"] == [] and result["warnings"] == []
+    removed, added = changed_lines(code, result["code"])
+    assert removed == ["          - task: Checkout@2  # Checkout the source code"]
+    assert added == ["          - script: trivy config .", "            displayName: Scan"]
+    edited = result["code"]
+    assert "trigger: none\n\npr:\n  branches:\n    include:\n      - main  # Replace" in edited
+    assert "condition: and(succeeded(), eq(variables['Build.Reason'], 'PullRequest'))" in edited
+    assert "- job: Validate\n" in edited and "- job: Apply\n" in edited
+    assert "# Replace with the desired Terraform version" in edited
+
+
+def test_structural_edits_of_a_lossy_source_are_refused():
+    code = read_sample(AZURE_SAMPLE)
+    complete = answering({"op": "remove_job", "job": "Apply Terraform Configuration"})
+
+    result = edit_pipeline(code, "azure-pipelines", "Drop the apply job", complete, max_attempts=2)
+
+    assert not result["applied"] and result["code"] == code
+    assert result["attempts"] == 2
+    assert "`pr`" in result["errors"][-1] and "add_step, update_step and remove_step" in result["errors"][-1]
+    # The model is told up front, and the refusal is passed back with the retry
+    assert "only the steps of existing jobs can be changed" in complete.prompts[0]
+    assert result["errors"][0] in complete.prompts[1]
+
+
+def test_updated_steps_keep_their_unmodelled_keys():
+    code = (
+        "name: CI\n"
+        "on:\n"
+        "  push:\n"
+        "    branches: [main]\n"
+        "jobs:\n"
+        "  build:\n"
+        "    runs-on: ubuntu-latest  # runner\n"
+        "    steps:\n"
+        "    - uses: actions/checkout@v4\n"
+        "    - name: Build\n"
+        "      run: make build\n"
+        "      env:\n"
+        "        CGO_ENABLED: 0\n"
+        "      working-directory: src\n"
+    )
+    complete = answering({"op": "update_step", "job": "build", "step": "Build", "set": {"script": "make all"}})
+
+    result = edit_pipeline(code, "github-actions", "Build everything", complete)
+
+    assert result["applied"]
+    assert changed_lines(code, result["code"]) == (["      run: make build"], ["      run: make all"])
+
+
+def test_gitlab_script_lines_are_spliced():
+    code = (
+        "stages: [build, test]\n"
+        "variables:\n"
+        "  GIT_DEPTH: 1\n"
+        "build:\n"
+        "  stage: build\n"
+        "  script:\n"
+        "    - go build ./...\n"
+        "    - go vet ./...\n"
+        "test:\n"
+        "  stage: test\n"
+        "  script:\n"
+        "    - go test ./...\n"
+        "  rules:\n"
+        "    - if: $CI_PIPELINE_SOURCE == \"merge_request_event\"\n"
+    )
+    complete = answering(
+        {"op": "add_step", "job": "test", "step": {"script": "gosec ./..."}},
+        {"op": "remove_step", "job": "build", "step": "go vet ./..."},
+    )
+
+    result = edit_pipeline(code, "gitlab-ci", "Add gosec", complete)
+
+    assert result["applied"]
+    assert changed_lines(code, result["code"]) == (["    - go vet ./..."], ["    - gosec ./..."])
+    assert result["code"].index("- gosec ./...") > result["code"].index("- go test ./...")
+
+
+def test_jenkins_steps_are_spliced_into_the_groovy():
+    code = read_sample(JENKINS_SAMPLE)
+    complete = answering(
+        {"op": "add_step", "job": "Build", "after": "mvn clean package",
+         "step": {"name": "Trivy", "script": "trivy fs .\ntrivy config ."}},
+        {"op": "update_step", "job": "Build", "step": "mvn clean package", "set": {"script": "mvn -B clean package"}},
+    )
+
+    result = edit_pipeline(code, "jenkinsfile-scripted", "Scan the sources", complete)
+
+    assert result["applied"]
+    removed, added = changed_lines(code, result["code"])
+    assert [line.strip() for line in removed] == ["sh 'mvn clean package'"]
+    assert [line.strip() for line in added] == [
+        "sh 'mvn -B clean package'", "sh script: '''trivy fs .", "trivy config .''', label: 'Trivy'"]
+
+
+def test_structural_edits_of_a_lossless_source_are_written_out():
+    span = find_code_block(read_sample(AZURE_SAMPLE), ("yaml",))
+    code, _ = convert_pipeline_code(read_sample(AZURE_SAMPLE)[span[0]:span[1]], "azure-pipelines", "azure-pipelines")
+    assert round_trip_losses(code, parse_pipeline(code, "azure-pipelines"), "azure-pipelines") == []
+    complete = answering({"op": "remove_job", "job": "Apply Terraform Configuration"})
+
+    result = edit_pipeline(code, "azure-pipelines", "Drop the apply job", complete)
+
+    assert result["applied"]
+    jobs = [job.name for stage in parse_pipeline(result["code"], "azure-pipelines").stages for job in stage.jobs]
+    assert jobs == ["Validate Terraform Configuration"]
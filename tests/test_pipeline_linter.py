@@ -0,0 +1,176 @@
+# test_pipeline_linter.py
+
+"""lint_pipeline: the rule index (keyword index, GuardTree, buckets) finds what checking every rule would."""
+
+import glob
+import os
+import re
+from collections import Counter
+
+import pytest
+
+from conftest import PIPELINES_DIR
+from pipeline_analyzer import step_text
+from pipeline_converter import parse_pipeline
+from pipeline_linter import (CompiledRule, GuardTree, RuleIndex, _step_fields, _task_family, lint_pipeline,
+                             pipeline_type_from_filename)
+from pipeline_rules import DEVSECOPS_RULES
+from pipelinetypes import *
+
+
+def naive_lint(pipeline, raw_code, rules):
+    """Every rule checked against every node, as pipeline_rules describes them."""
+    pipeline_class = type(pipeline) if pipeline is not None else Pipeline
+    rules = [rule for rule in rules if rule.platforms is None or any(
+        issubclass(pipeline_class, PIPELINE_TYPE_CLASSES.get(platform, type(None))) for platform in rule.platforms)]
+    findings = []
+    steps = [(stage, job, step) for stage in (pipeline.stages if pipeline else []) for job in stage.jobs
+             for step in job.steps]
+    for stage, job, step in steps:
+        fields = _step_fields(step, step_text(step))
+        for rule in rules:
+            applies = "*" in rule.tasks or _task_family(step.task) in rule.tasks
+            if rule.node == "step" and applies and rule.violations(fields):
+                findings.append((rule.id, f"{stage.name} / {job.name} / {step.name}"))
+    if pipeline is not None:
+        texts = [step_text(step) for _, _, step in steps]
+        for rule in rules:
+            if rule.node != "pipeline":
+                continue
+            condition = not rule.when_any_step or any(rule.when_any_step[0][1].search(text) for text in texts)
+            if condition and not any(rule.require_any_step[0][1].search(text) for text in texts):
+                findings.append((rule.id, "pipeline"))
+    if raw_code:
+        for rule in rules:
+            if rule.node != "raw" or not all(regex.search(raw_code) for _, regex, _ in rule.when):
+                continue
+            for _, regex, _ in rule.forbid:
+                findings.extend((rule.id, f"line {raw_code.count(chr(10), 0, match.start()) + 1}")
+                                for match in regex.finditer(raw_code))
+            if any(not regex.search(raw_code) for _, regex, _ in rule.require):
+                findings.append((rule.id, "pipeline"))
+    return Counter(findings)
+
+
+def indexed_lint(pipeline, raw_code, index):
+    return Counter((finding["rule"], finding["location"]) for finding in lint_pipeline(pipeline, raw_code, index))
+
+
+def samples():
+    for path in sorted(glob.glob(os.path.join(PIPELINES_DIR, "*"))):
+        with open(path, encoding="utf-8") as file:
+            code = file.read()
+        pipeline_type = pipeline_type_from_filename(path)
+        try:
+            pipeline = parse_pipeline(code, pipeline_type)
+        except Exception:
+            pipeline = None
+        yield os.path.basename(path), pipeline, code
+
+
+SAMPLES = list(samples())
+
+
+@pytest.mark.parametrize("name, pipeline, code", SAMPLES, ids=[name for name, _, _ in SAMPLES])
+def test_built_in_rules_match_naive_evaluation(name, pipeline, code):
+    index = RuleIndex(DEVSECOPS_RULES)
+
+    assert indexed_lint(pipeline, code, index) == naive_lint(pipeline, code, index.rules)
+
+
+SYNTHETIC_CODE = """\
+stages:
+  - stage: Build
+    jobs:
+      - job: build
+        steps:
+          - script: tool3 --fast && tool17 build
+          - script: tool40 scan .
+          - task: Docker@2
+            inputs:
+              command: tool8
+      - job: deploy
+        steps:
+          - script: kubectl apply -f tool25.yaml
+"""
+
+
+def synthetic_rules():
+    """Enough rules of every shape to fill keyword buckets and GuardTrees several levels deep."""
+    rules = []
+    for number in range(60):
+        step = {"id": f"forbid-{number}", "severity": "warning", "message": "m", "node": "step",
+                "forbid": {"text": rf"\btool{number}\b"}}
+        if number % 2:
+            step["keywords"] = [f"tool{number}"]
+        if number % 3 == 0:
+            step["task"] = "script"
+        rules.append(step)
+        rules.append({"id": f"when-{number}", "severity": "info", "message": "m", "node": "step",
+                      "when": {"text": rf"(?i)TOOL{number}"}, "require": {"text": r"--fast"}})
+        rules.append({"id": f"input-{number}", "severity": "info", "message": "m", "node": "step", "task": "Docker",
+                      "forbid": {"inputs.command": rf"^tool{number}$"}})
+        rules.append({"id": f"raw-{number}", "severity": "error", "message": "m", "node": "raw",
+                      "when": {"text": rf"tool{number}\b"}, "require": {"text": rf"^# reviewed tool{number}$"}})
+        rules.append({"id": f"pipeline-{number}", "severity": "info", "message": "m", "node": "pipeline",
+                      "when_any_step": rf"tool{number}\b", "require_any_step": rf"tool{number + 1}\b",
+                      "platforms": ["azure-pipelines"] if number % 2 else ["gitlab-ci"]})
+    return rules
+
+
+def test_synthetic_rules_match_naive_evaluation():
+    index = RuleIndex(synthetic_rules())
+    code = SYNTHETIC_CODE + "# reviewed tool17\n"
+    pipeline = parse_pipeline(code, "azure-pipelines")
+
+    found = indexed_lint(pipeline, code, index)
+
+    assert found == naive_lint(pipeline, code, index.rules)
+    assert found[("forbid-17", "Build / build / tool3 --fast && tool17 build")] == 1
+    assert found[("forbid-3", "Build / build / tool3 --fast && tool17 build")] == 1
+    assert found[("when-40", "Build / build / tool40 scan .")] == 1
+    assert found[("input-8", "Build / build / Docker@2")] == 1
+    assert found[("raw-40", "pipeline")] == 1 and ("raw-17", "pipeline") not in found
+    assert found[("pipeline-25", "pipeline")] == 1 and ("pipeline-40", "pipeline") not in found
+    # Without a parsed pipeline only the raw rules run
+    assert indexed_lint(None, code, index) == naive_lint(None, code, index.rules)
+
+
+def test_raw_rules_forbid_per_line():
+    rule = {"id": "no-sudo", "severity": "warning", "message": "m", "node": "raw", "when": {"text": "script"},
+            "forbid": {"text": r"\bsudo\b"}}
+    code = "steps:\n  - script: sudo make\n  - script: make\n  - script: sudo make install\n"
+
+    assert indexed_lint(None, code, RuleIndex([rule])) == Counter({("no-sudo", "line 2"): 1, ("no-sudo", "line 4"): 1})
+    assert indexed_lint(None, code.replace("script", "run"), RuleIndex([rule])) == Counter()
+
+
+def test_guard_tree_finds_the_patterns_a_search_of_each_would():
+    patterns = [rf"(?:\bw{number}\b)" for number in range(50)] + [r"(?i:ANY)", r"(?:^x$)"]
+    tree = GuardTree(list(enumerate(patterns)))
+
+    for text in ("", "w3 and w49", "w1 w10 w11 any", "w7w8", "x", "none of them"):
+        assert tree.matches(text) == [number for number, pattern in enumerate(patterns) if re.search(pattern, text)]
+
+
+def test_keyword_index_selects_rules_by_word():
+    rules = RuleIndex([
+        {"id": "uses-kw", "severity": "info", "message": "m", "node": "step", "keywords": ["Curl"],
+         "forbid": {"text": "curl"}},
+        {"id": "always", "severity": "info", "message": "m", "node": "step", "require": {"text": "x"}},
+    ])
+    group = rules.group("step", Pipeline)
+
+    assert {rule.id for rule in group.candidates("CURL -sSL https://example.com")} == {"uses-kw", "always"}
+    assert {rule.id for rule in group.candidates("curling")} == {"always"}
+
+
+@pytest.mark.parametrize("rule, message", [
+    ({"node": "raw", "forbid": {"name": "x"}}, "can only match the field 'text'"),
+    ({"node": "raw", "when": {"task": "x"}, "require": {"text": "y"}}, "can only match the field 'text'"),
+    ({"node": "step", "keywords": ["sonar"], "require": {"text": "sonar"}}, "no 'when'"),
+    ({"node": "step"}, "needs 'forbid' or 'require'"),
+])
+def test_rules_that_could_never_fire_as_written_are_rejected(rule, message):
+    with pytest.raises(ValueError, match=message):
+        CompiledRule({"id": "r", "severity": "info", "message": "m", **rule})
@@ -0,0 +1,131 @@
+# test_pipeline_repair.py
+
+"""Validate-repair loop: error localization, patch splicing and the attempt and token limits."""
+
+import re
+
+from pipeline_repair import (extract_patch, failing_region, repair_pipeline_code, splice_patch,
+                             validate_pipeline_code)
+
+GITHUB = """\
+Here is the workflow:
+
+```yaml
+name: CI
+on: push
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+      - name: Build
+        run: make
+        uses: actions/setup-go@v5
+  test:
+    needs: build
+    runs-on: ubuntu-latest
+    steps:
+      - run: make test
+```
+
+Replace nothing.
+"""
+
+
+def answering(*responses):
+    """A `complete` callable answering the given responses in turn and keeping the prompts."""
+    def complete(prompt, max_tokens):
+        complete.prompts.append(prompt)
+        return responses[min(len(complete.prompts), len(responses)) - 1], 25
+    complete.prompts = []
+    return complete
+
+
+def excerpt(prompt):
+    """The lines a patch prompt asks to fix."""
+    return re.search(r"Excerpt to fix \(lines \d+-\d+\):\n```\n(.*?)\n```", prompt, re.DOTALL).group(1)
+
+
+def test_errors_point_at_their_line_in_the_code_block():
+    errors = validate_pipeline_code(GITHUB, "github-actions")
+
+    assert errors == [{"message": "Step 2 of job 'build' needs exactly one of `run` or `uses`.", "line": 7}]
+    assert validate_pipeline_code("```yaml\n```", "github-actions") == [
+        {"message": "No code block found in the generated output.", "line": None}]
+
+
+def test_failing_region_is_the_block_around_the_error():
+    lines = GITHUB.split("```yaml\n")[1].split("```")[0].splitlines()
+
+    start, end = failing_region(lines, 7)
+
+    assert lines[start:end] == [
+        "    steps:", "      - uses: actions/checkout@v4", "      - name: Build", "        run: make",
+        "        uses: actions/setup-go@v5"]
+
+
+def test_patches_are_extracted_and_reindented():
+    patch = extract_patch("Fixed:\n```yaml\n- name: Build\n  run: make\n```\nDone.")
+    lines = ["steps:", "  - run: old", "  - run: other"]
+
+    assert patch == ["- name: Build", "  run: make"]
+    assert splice_patch(lines, 1, 2, patch) == ["steps:", "  - name: Build", "    run: make", "  - run: other"]
+    assert extract_patch("  - run: make\n") == ["  - run: make"]
+
+
+def test_only_the_failing_region_is_replaced():
+    complete = answering(
+        "```yaml\n"
+        "    steps:\n"
+        "      - uses: actions/checkout@v4\n"
+        "      - uses: actions/setup-go@v5\n"
+        "      - name: Build\n"
+        "        run: make\n"
+        "```"
+    )
+
+    result = repair_pipeline_code(GITHUB, "github-actions", complete)
+
+    assert result["valid"] and result["attempts"] == 1 and result["tokens_used"] == 25
+    assert result["patches"] == [{"start": 6, "end": 10, "error": "Step 2 of job 'build' needs exactly one of "
+                                                                  "`run` or `uses`."}]
+    assert result["code"] == GITHUB.replace(
+        "      - name: Build\n        run: make\n        uses: actions/setup-go@v5\n",
+        "      - uses: actions/setup-go@v5\n      - name: Build\n        run: make\n")
+    # The prompt carries the region and a few lines of context, not the whole workflow
+    assert "Excerpt to fix (lines 6-10)" in complete.prompts[0] and "make test" not in complete.prompts[0]
+
+
+def test_a_patch_that_does_not_help_widens_the_region_up_to_the_attempt_limit():
+    unchanged = "```yaml\n    steps:\n      - run: make\n        uses: actions/setup-go@v5\n```"
+    complete = answering(unchanged)
+
+    result = repair_pipeline_code(GITHUB, "github-actions", complete, max_attempts=2)
+
+    assert not result["valid"] and result["attempts"] == 2
+    assert len(complete.prompts) == 2
+    assert excerpt(complete.prompts[0]).startswith("    steps:")
+    # The error is still inside the patch, so the region around it is widened to its parent block
+    assert excerpt(complete.prompts[1]).startswith("jobs:\n  build:")
+
+
+def test_token_budget_stops_the_loop_before_the_request():
+    complete = answering("```\n```")
+
+    result = repair_pipeline_code(GITHUB, "github-actions", complete, token_budget=50)
+
+    assert result == {"code": GITHUB, "valid": False, "errors": validate_pipeline_code(GITHUB, "github-actions"),
+                      "attempts": 0, "tokens_used": 0, "patches": []}
+    assert complete.prompts == []
+
+
+def test_unclosed_groovy_block_is_repaired():
+    code = "```groovy\npipeline {\n    agent any\n    stages {\n        stage('Build') {\n            steps {\n" \
+           "                sh 'make'\n            }\n    }\n}\n```"
+
+    errors = validate_pipeline_code(code, "jenkinsfile-declarative")
+    result = repair_pipeline_code(code, "jenkinsfile-declarative", lambda prompt, max_tokens: (
+        f"```groovy\n{excerpt(prompt)}\n        }}\n```", None))
+
+    assert errors and "never closed" in errors[0]["message"]
+    assert result["valid"] and result["attempts"] == 1
@@ -0,0 +1,89 @@
+# test_pipelinetypes.py
+
+"""The job graph of a parsed Pipeline: dependencies, critical path and execution levels."""
+
+import pytest
+
+from pipelineparser import PipelineParser
+from pipelinetypes import *
+
+AZURE_DEV_PROD = """\
+stages:
+  - stage: Build
+    jobs:
+      - job: compile
+        steps:
+          - script: make
+  - stage: Dev
+    jobs:
+      - job: deploy
+        steps:
+          - script: ./deploy.sh dev
+  - stage: Prod
+    dependsOn: Dev
+    jobs:
+      - job: deploy
+        steps:
+          - script: ./deploy.sh prod
+      - job: smoke
+        dependsOn: deploy
+        steps:
+          - script: ./smoke.sh
+"""
+
+
+def parse(code, pipeline_type):
+    return PipelineParser(code, pipeline_type).parse_pipeline_code()
+
+
+def test_jobs_of_the_same_name_in_two_stages_stay_apart():
+    pipeline = parse(AZURE_DEV_PROD, "azure-pipelines")
+
+    assert pipeline.job_dependencies() == {
+        ("Build", "compile"): [],
+        ("Dev", "deploy"): [("Build", "compile")],
+        ("Prod", "deploy"): [("Dev", "deploy")],
+        # A name in dependsOn is the job of the same stage first; Prod's deploy waits for Dev's in turn
+        ("Prod", "smoke"): [("Prod", "deploy")],
+    }
+    assert pipeline.critical_path() == (
+        [("Build", "compile"), ("Dev", "deploy"), ("Prod", "deploy"), ("Prod", "smoke")], 4)
+    assert pipeline.execution_levels() == [
+        [("Build", "compile")], [("Dev", "deploy")], [("Prod", "deploy")], [("Prod", "smoke")]]
+
+
+def test_needs_graph_levels_and_critical_path():
+    code = """\
+on: push
+jobs:
+  lint:
+    runs-on: ubuntu-latest
+    steps: [{run: make lint}]
+  build:
+    runs-on: ubuntu-latest
+    steps: [{run: make}]
+  test:
+    needs: build
+    runs-on: ubuntu-latest
+    steps: [{run: make test}]
+  release:
+    needs: [lint, test]
+    runs-on: ubuntu-latest
+    steps: [{run: make release}]
+"""
+    pipeline = parse(code, "github-actions")
+
+    assert pipeline.execution_levels() == [
+        [("lint", "lint"), ("build", "build")], [("test", "test")], [("release", "release")]]
+    path, length = pipeline.critical_path({("lint", "lint"): 10, ("build", "build"): 1, ("test", "test"): 1,
+                                           ("release", "release"): 1})
+    assert (path, length) == ([("lint", "lint"), ("release", "release")], 11)
+
+
+def test_cyclic_needs_are_reported():
+    pipeline = Pipeline()
+    stage = PipelineStage("Default", [PipelineJob("a", ["b"]), PipelineJob("b", ["a"])])
+    pipeline.add_stage(stage)
+
+    with pytest.raises(ValueError, match="cycle: a \\(Default\\), b \\(Default\\)"):
+        pipeline.topological_order()
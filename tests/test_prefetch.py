@@ -0,0 +1,112 @@
+# test_prefetch.py
+
+"""RetrievalPrefetcher: debounced and replaced prefetches, take() joining a running one, stale generations."""
+
+import os
+import threading
+import time
+
+from prefetch import RetrievalPrefetcher
+from telemetry import metrics
+
+
+class Retrieval:
+    """Stands in for main._retrieve: records the prompts, optionally held until released."""
+
+    def __init__(self, generation=1, hold=False):
+        self.generation = generation
+        self.prompts = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def __call__(self, prompt, directory):
+        self.prompts.append(prompt)
+        self.started.set()
+        self.release.wait(10)
+        return self.generation, f"context for {prompt}"
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "the prefetch did not run"
+        time.sleep(0.01)
+
+
+def test_only_the_last_prompt_of_a_burst_is_retrieved(tmp_path):
+    retrieval = Retrieval()
+    prefetcher = RetrievalPrefetcher(retrieval, debounce_seconds=0.1)
+    cancelled = metrics.counter_value("copilot_prefetches_total", result="cancelled")
+
+    for prompt in ("a Git", "a GitLab pipe", "a GitLab pipeline"):
+        prefetcher.schedule("session", prompt, str(tmp_path))
+        time.sleep(0.02)
+    wait_for(lambda: retrieval.prompts)
+    time.sleep(0.15)
+
+    assert retrieval.prompts == ["a GitLab pipeline"]
+    assert metrics.counter_value("copilot_prefetches_total", result="cancelled") == cancelled + 2
+    assert prefetcher.take("a GitLab pipeline", str(tmp_path), 1) == "context for a GitLab pipeline"
+
+
+def test_sessions_do_not_replace_each_other(tmp_path):
+    retrieval = Retrieval()
+    prefetcher = RetrievalPrefetcher(retrieval, debounce_seconds=0.05)
+
+    prefetcher.schedule("first", "a GitHub workflow", str(tmp_path))
+    prefetcher.schedule("second", "a Jenkinsfile", str(tmp_path))
+    prefetcher.schedule("second", "  ", str(tmp_path))  # cleared: nothing to prefetch
+    wait_for(lambda: retrieval.prompts)
+    time.sleep(0.1)
+
+    assert retrieval.prompts == ["a GitHub workflow"]
+
+
+def test_take_waits_for_a_running_prefetch_of_the_same_prompt(tmp_path):
+    retrieval = Retrieval(hold=True)
+    prefetcher = RetrievalPrefetcher(retrieval, debounce_seconds=0)
+    prefetcher.schedule("session", "a GitLab pipeline", str(tmp_path))
+    assert retrieval.started.wait(5)
+    threading.Timer(0.2, retrieval.release.set).start()
+
+    started = time.monotonic()
+    result = prefetcher.take("a GitLab pipeline", os.path.join(str(tmp_path), "."), 1)
+
+    assert result == "context for a GitLab pipeline" and time.monotonic() - started >= 0.15
+    assert retrieval.prompts == ["a GitLab pipeline"]
+
+
+def test_take_does_not_wait_for_a_prefetch_that_has_not_started(tmp_path):
+    retrieval = Retrieval()
+    prefetcher = RetrievalPrefetcher(retrieval, debounce_seconds=0.2)
+    prefetcher.schedule("session", "a GitLab pipeline", str(tmp_path))
+
+    assert prefetcher.take("a GitLab pipeline", str(tmp_path), 1, timeout=1) is None
+    time.sleep(0.3)
+    assert retrieval.prompts == []  # the caller retrieves itself, so the pending prefetch is dropped
+
+
+def test_results_of_an_older_index_generation_are_not_used(tmp_path):
+    retrieval = Retrieval(generation=3)
+    prefetcher = RetrievalPrefetcher(retrieval, debounce_seconds=0)
+    prefetcher.schedule("session", "a GitLab pipeline", str(tmp_path))
+    assert retrieval.started.wait(5)
+
+    # The index moved on while the prompt was being written
+    assert prefetcher.take("a GitLab pipeline", str(tmp_path), 4) is None
+    assert prefetcher.take("a GitLab pipeline", str(tmp_path / "other"), 3) is None
+    assert prefetcher.take("a GitLab pipeline", str(tmp_path), 3) == "context for a GitLab pipeline"
+
+
+def test_failed_prefetches_leave_no_result(tmp_path):
+    def retrieve(prompt, directory):
+        raise RuntimeError("index not built")
+
+    prefetcher = RetrievalPrefetcher(retrieve, debounce_seconds=0)
+    failed = metrics.counter_value("copilot_prefetches_total", result="failed")
+    prefetcher.schedule("session", "a GitLab pipeline", str(tmp_path))
+    wait_for(lambda: metrics.counter_value("copilot_prefetches_total", result="failed") > failed)
+
+    assert prefetcher.take("a GitLab pipeline", str(tmp_path), 1) is None
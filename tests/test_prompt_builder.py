@@ -0,0 +1,62 @@
+# test_prompt_builder.py
+
+"""Versioned prompt templates: the static prefix, version pinning and frozen published versions."""
+
+import hashlib
+import json
+
+import pytest
+
+from prompt_builder import PROMPT_TEMPLATES, build_messages, prompt_template, prompt_version
+from telemetry import tracer
+
+# Fingerprints of the published templates; a changed template needs a new version instead.
+PUBLISHED = {
+    ("generation", 1): "8f71d5c051e0f334",
+    ("generation", 2): "a143c4aa31fbd9a4",
+    ("repair", 1): "b3d36e9ad540f6fd",
+    ("edit", 1): "8212eb278b027732",
+}
+
+
+def test_published_templates_are_not_edited():
+    fingerprints = {key: hashlib.sha256(json.dumps(template, sort_keys=True).encode()).hexdigest()[:16]
+                    for key, template in PROMPT_TEMPLATES.items() if key in PUBLISHED}
+
+    assert fingerprints == PUBLISHED
+
+
+def test_generation_requests_share_the_system_prefix(monkeypatch):
+    monkeypatch.delenv("COPILOT_PROMPT_VERSION", raising=False)
+    first = build_messages("generation", "Kubernetes rollout guidance\nUser Prompt: a GitLab pipeline")
+    second = build_messages("generation", "Terraform guidance\nUser Prompt: an Azure pipeline {with braces}")
+
+    assert first[0] == second[0] and first[0]["role"] == "system"
+    assert "list of all placeholders" in first[0]["content"]
+    # Only the retrieved context and the request follow the prefix
+    assert second[1] == {"role": "user", "content": "Terraform guidance\nUser Prompt: an Azure pipeline {with braces}"}
+
+
+def test_version_1_keeps_the_instructions_after_the_request(monkeypatch):
+    monkeypatch.setenv("COPILOT_PROMPT_VERSION", "1")
+
+    messages = build_messages("generation", "User Prompt: a GitLab pipeline")
+
+    assert prompt_version("generation") == 1 and prompt_version("repair") == 1
+    assert messages[1]["content"].startswith("User Prompt: a GitLab pipeline\n\n")
+    assert "list of all placeholders" in messages[1]["content"]
+    assert "list of all placeholders" not in messages[0]["content"]
+
+
+def test_unknown_versions_are_rejected():
+    with pytest.raises(ValueError, match="Unknown prompt template: generation v9"):
+        prompt_template("generation", 9)
+    with pytest.raises(ValueError, match="Unknown prompt template: summary v1"):
+        prompt_template("summary", 1)
+
+
+def test_the_template_in_use_is_recorded_on_the_span():
+    with tracer.span("llm") as span:
+        build_messages("repair", "Excerpt to fix", version=1)
+
+    assert span.attributes["llm.prompt_template"] == "repair@v1"
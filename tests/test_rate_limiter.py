@@ -0,0 +1,198 @@
+# test_rate_limiter.py
+
+"""Token buckets, the priority queue of RateLimiter, 429 retries and request coalescing under concurrency."""
+
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import (PRIORITY_BATCH, PRIORITY_INTERACTIVE, RateLimited, RateLimiter, RequestCoalescer,
+                          TokenBucket, call_limited, call_limited_async, retry_after_seconds)
+from telemetry import metrics
+
+_providers = itertools.count()
+
+
+def unlimited_provider():
+    """Name of a provider without limits, fresh for each test."""
+    return f"Test-{next(_providers)}"
+
+
+def in_threads(count, target):
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+
+def test_token_bucket_refills_over_a_minute():
+    bucket = TokenBucket(600)
+    bucket.level = 0.0
+
+    assert bucket.wait_time(30) == pytest.approx(3.0)
+    bucket.refill(bucket.updated + 2)
+    assert bucket.level == pytest.approx(20)
+    # Requests larger than the bucket only wait until it is full
+    assert bucket.wait_time(10_000) == pytest.approx(58.0)
+    bucket.refill(bucket.updated + 3600)
+    assert bucket.level == 600
+
+
+def test_concurrent_requests_never_exceed_the_bucket():
+    limiter = RateLimiter("test", tokens_per_minute=1000)
+    limiter.tokens.rate = 1000.0  # refilled in a second instead of a minute
+    started = time.monotonic()
+    granted = []
+
+    def request(index):
+        limiter.acquire(100)
+        granted.append(time.monotonic() - started)
+
+    in_threads(20, request)
+
+    # 10 requests fit the full bucket; the other 10 wait for the refill, one every 0.1 s
+    granted.sort()
+    assert len(granted) == 20
+    assert granted[9] < 0.08 and granted[10] >= 0.09
+    assert granted[19] >= 0.95
+    assert all(later - earlier >= 0.09 for earlier, later in zip(granted[10:], granted[11:]))
+
+
+def test_interactive_requests_go_before_queued_batch_requests():
+    limiter = RateLimiter("test", tokens_per_minute=6000)
+    limiter.acquire(6000)
+    order = []
+
+    def request(index):
+        if index:
+            time.sleep(0.05)  # the batch request is queued first
+        limiter.acquire(20, PRIORITY_INTERACTIVE if index else PRIORITY_BATCH)
+        order.append("interactive" if index else "batch")
+
+    in_threads(2, request)
+
+    assert order == ["interactive", "batch"]
+
+
+def test_settle_returns_the_unused_reservation():
+    limiter = RateLimiter("test", tokens_per_minute=600)
+    reserved = limiter.acquire(500)
+
+    limiter.settle(reserved, 100)
+
+    assert limiter.tokens.level == pytest.approx(500, abs=1)
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    limiter = RateLimiter("test", tokens_per_minute=600)
+    limiter.acquire(600)
+
+    async def run():
+        waiter = asyncio.ensure_future(limiter.acquire_async(100))
+        await asyncio.sleep(0.1)
+        assert len(limiter._queue) == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(run())
+    assert limiter._queue == []
+
+
+def test_rate_limited_calls_pause_the_queue_and_retry(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "DEFAULT_RETRY_AFTER_SECONDS", 0.01)
+    provider = unlimited_provider()
+    answers = iter([RateLimited("429", retry_after=0.2), RateLimited("429"), ("done", 10)])
+
+    def call():
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    started = time.monotonic()
+    assert call_limited(provider, 100, call) == "done"
+    assert time.monotonic() - started >= 0.2
+    assert metrics.counter_value("copilot_rate_limited_total", provider=provider) == 2
+
+
+def test_rate_limited_gives_up_after_the_retries(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "DEFAULT_RETRY_AFTER_SECONDS", 0.01)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise RateLimited("429")
+
+    with pytest.raises(RateLimited):
+        asyncio.run(call_limited_async(unlimited_provider(), 100, call))
+    assert len(calls) == rate_limiter.RATE_LIMIT_RETRIES + 1
+
+
+def test_retry_after_headers():
+    assert retry_after_seconds({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert retry_after_seconds({"retry-after": "2"}) == 2
+    assert retry_after_seconds({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) is None
+    assert retry_after_seconds(None) is None
+
+
+def test_identical_requests_share_one_call():
+    coalescer = RequestCoalescer()
+    calls = []
+    results = {}
+
+    def complete():
+        calls.append(1)
+        time.sleep(0.2)
+        return "pipeline"
+
+    def request(index):
+        results[index] = coalescer.run("same prompt" if index < 8 else f"prompt {index}", complete)
+
+    in_threads(10, request)
+
+    assert len(calls) == 3 and set(results.values()) == {"pipeline"} and len(results) == 10
+
+
+def test_the_error_of_a_shared_call_reaches_every_waiter():
+    coalescer = RequestCoalescer()
+    errors = []
+
+    def failing():
+        time.sleep(0.2)
+        raise RuntimeError("service down")
+
+    def request(index):
+        try:
+            coalescer.run("key", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    in_threads(4, request)
+
+    assert errors == ["service down"] * 4
+
+
+def test_a_cancelled_leader_hands_the_request_to_a_waiter():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    async def complete():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return len(calls)
+
+    async def run():
+        leader = asyncio.ensure_future(coalescer.run_async("key", complete))
+        await asyncio.sleep(0.05)
+        waiter = asyncio.ensure_future(coalescer.run_async("key", complete))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(run()) == 2
@@ -0,0 +1,35 @@
+# test_stub_code_generator.py
+
+"""The offline stub provider: fixed pipelines and patches that change nothing."""
+
+import json
+
+from pipeline_editor import edit_pipeline
+from pipeline_repair import build_patch_prompt, extract_patch, repair_pipeline_code
+from stub_code_generator import generate_code_from_stub, generate_patch_from_stub
+
+
+def test_repair_patch_is_the_excerpt_unchanged():
+    lines = ["jobs:", "  build:", "    steps:", "      - run: make", "      - run make test", "  lint: {}"]
+    error = {"message": "steps must be mappings", "line": 4}
+    prompt = build_patch_prompt("github-actions", error, lines, 2, 5)
+
+    assert extract_patch(generate_patch_from_stub(prompt)) == lines[2:5]
+
+
+def test_repair_loop_runs_offline_and_gives_up():
+    code = "```yaml\njobs:\n  build:\n    steps: 3\n```"
+
+    result = repair_pipeline_code(code, "github-actions", lambda prompt, max_tokens: (
+        generate_patch_from_stub(prompt), None), max_attempts=2)
+
+    assert not result["valid"] and result["attempts"] == 2 and result["code"] == code
+
+
+def test_edit_patch_has_no_operations():
+    code = generate_code_from_stub("A GitLab pipeline")
+
+    assert json.loads(generate_patch_from_stub("Add a lint job", "edit").strip("`json\n")) == {"operations": []}
+    result = edit_pipeline(code, "gitlab-ci", "Add a lint job", lambda prompt, max_tokens: (
+        generate_patch_from_stub(prompt, "edit"), None))
+    assert result["code"] == code
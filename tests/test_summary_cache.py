@@ -0,0 +1,49 @@
+# test_summary_cache.py
+
+"""SummaryCache: sections are summarized once per summarizer model, across restarts."""
+
+from summary_cache import SummaryCache
+
+
+class Summarizer:
+    """Stands in for the T5 pipeline: records every batch it is given."""
+
+    def __init__(self, prefix="summary of"):
+        self.prefix = prefix
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(texts)
+        return [f"{self.prefix} {text}" for text in texts]
+
+
+def test_each_new_section_is_summarized_once(tmp_path):
+    cache = SummaryCache(str(tmp_path / "summaries.sqlite3"), "t5-small")
+    summarizer = Summarizer()
+
+    first = cache.summarize(["Cache pip downloads.", "Pin images.", "Cache pip downloads."], summarizer)
+    second = cache.summarize(["Pin  images.", "Scan dependencies."], summarizer)
+
+    assert summarizer.batches == [["Cache pip downloads.", "Pin images."], ["Scan dependencies."]]
+    assert first == ["summary of Cache pip downloads.", "summary of Pin images.", "summary of Cache pip downloads."]
+    assert second == ["summary of Pin images.", "summary of Scan dependencies."]
+    assert cache.stats()["entries"] == 3 and (cache.hits, cache.misses) == (2, 3)
+
+
+def test_summaries_survive_a_restart_per_model(tmp_path):
+    path = str(tmp_path / "summaries.sqlite3")
+    SummaryCache(path, "t5-small").summarize(["Use OIDC."], Summarizer())
+    SummaryCache(path, "t5-small").close()
+
+    restarted, other = Summarizer(), Summarizer("t5-base:")
+
+    assert SummaryCache(path, "t5-small").summarize(["Use OIDC."], restarted) == ["summary of Use OIDC."]
+    assert SummaryCache(path, "t5-base").summarize(["Use OIDC."], other) == ["t5-base: Use OIDC."]
+    assert restarted.batches == [] and other.batches == [["Use OIDC."]]
+
+
+def test_nothing_to_summarize():
+    cache = SummaryCache(":memory:", "t5-small")
+
+    assert cache.summarize([], Summarizer()) == []
+    assert cache.stats() == {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "hit_rate": None}
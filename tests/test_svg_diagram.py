@@ -0,0 +1,100 @@
+# test_svg_diagram.py
+
+"""The pure-Python layered SVG renderer: layers, shared stage edges, detail levels and collapsed stages."""
+
+import re
+
+import pytest
+
+from pipelineparser import PipelineParser
+from pipelinetypes import *
+from svg_diagram import MAX_STEPS_SHOWN, render_pipeline_svg, synthetic_pipeline
+
+AZURE_DEV_PROD = """\
+stages:
+  - stage: Build
+    jobs:
+      - job: compile
+        steps: [{script: make}]
+      - job: lint
+        steps: [{script: make lint}]
+  - stage: Dev
+    jobs:
+      - job: deploy
+        steps: [{script: ./deploy.sh dev}]
+      - job: smoke
+        steps: [{script: ./smoke.sh dev}]
+  - stage: Prod
+    jobs:
+      - job: deploy
+        steps: [{script: ./deploy.sh prod}]
+"""
+
+_NODE = re.compile(r'<g class="node"><title>([^<]*)</title><rect x="(\d+)" y="(\d+)"')
+
+
+def nodes(svg):
+    """Tooltip -> (x, y) of every node."""
+    return {title: (int(x), int(y)) for title, x, y in _NODE.findall(svg)}
+
+
+def columns(svg):
+    """Tooltips grouped by their x position, left to right."""
+    by_x = {}
+    for title, (x, _) in nodes(svg).items():
+        by_x.setdefault(x, []).append(title.split(":")[0])
+    return [sorted(by_x[x]) for x in sorted(by_x)]
+
+
+def test_jobs_are_layered_after_the_jobs_they_wait_for():
+    svg = render_pipeline_svg(PipelineParser(AZURE_DEV_PROD, "azure-pipelines").parse_pipeline_code())
+
+    assert columns(svg) == [["Build / compile", "Build / lint"], ["Dev / deploy", "Dev / smoke"], ["Prod / deploy"]]
+    # Build -> Dev goes through one junction (2 + 2 edges, not 2 * 2); Dev -> Prod is drawn directly
+    assert svg.count('class="junction"') == 1
+    assert svg.count("<path") == 4 + 2
+
+
+def test_explicit_needs_are_edges_of_their_own():
+    pipeline = GitHubActionsPipeline()
+    for name, needs in (("lint", []), ("build", []), ("test", ["build"]), ("release", ["lint", "test"])):
+        stage = PipelineStage(name)
+        stage.add_job(PipelineJob(name, needs))
+        pipeline.add_stage(stage)
+
+    svg = render_pipeline_svg(pipeline)
+
+    assert columns(svg) == [["build / build", "lint / lint"], ["test / test"], ["release / release"]]
+    assert svg.count("<path") == 3 and 'class="junction"' not in svg
+
+
+def test_detail_levels_and_collapsed_stages():
+    pipeline = PipelineParser(AZURE_DEV_PROD, "azure-pipelines").parse_pipeline_code()
+    job = pipeline.stages[2].jobs[0]
+    for index in range(MAX_STEPS_SHOWN + 3):
+        job.add_step(script_step(f"echo {index}", f"Step <{index}>"))
+
+    assert columns(render_pipeline_svg(pipeline, "stages")) == [["Build"], ["Dev"], ["Prod"]]
+    assert columns(render_pipeline_svg(pipeline, collapsed_stages=["Dev"])) == [
+        ["Build / compile", "Build / lint"], ["Dev"], ["Prod / deploy"]]
+    steps = render_pipeline_svg(pipeline, "steps")
+    assert "• Step &lt;0&gt;" in steps and f"+{len(job.steps) - MAX_STEPS_SHOWN} more" in steps
+    assert "• Step &lt;0&gt;" not in render_pipeline_svg(pipeline, "jobs")
+
+
+def test_cycles_and_unknown_detail_levels_are_rejected():
+    pipeline = Pipeline()
+    pipeline.add_stage(PipelineStage("Default", [PipelineJob("a", ["b"]), PipelineJob("b", ["a"])]))
+
+    with pytest.raises(ValueError, match="cycle"):
+        render_pipeline_svg(pipeline)
+    with pytest.raises(ValueError, match="Unsupported detail level"):
+        render_pipeline_svg(pipeline, "tasks")
+
+
+def test_edges_stay_linear_in_the_number_of_jobs():
+    svg = render_pipeline_svg(synthetic_pipeline(2000, jobs_per_stage=50))
+
+    assert len(nodes(svg)) == 2000
+    # Each job has at most one stage edge and one `needs` edge, plus one edge per junction source
+    assert svg.count("<path") < 3 * 2000
@@ -0,0 +1,52 @@
+# test_vector_index.py
+
+"""NumpyVectorStore with empty collections and caller-owned query arrays."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")  # vector_index -> qdrant_populate -> config loads the model
+
+from vector_index import NumpyVectorStore  # noqa: E402
+
+
+@pytest.fixture(params=["memory", "disk"])
+def store(request, tmp_path):
+    return NumpyVectorStore(path=str(tmp_path / "index") if request.param == "disk" else None)
+
+
+def test_empty_collection_is_created_and_searchable(store):
+    store.create("empty", [], [])
+
+    assert store.exists("empty") and len(store) == 0
+    assert store.search(["empty"], np.ones((1, 3), dtype=np.float32), limit=5) == [[]]
+
+
+def test_empty_collection_next_to_a_full_one(store):
+    store.create("empty", [], [])
+    store.create("full", ["a", "b"], [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+    [hits] = store.search(["empty", "full"], np.array([[0.0, 2.0, 0.0]], dtype=np.float32), limit=5)
+
+    assert [(hit["collection"], hit["content"], hit["position"]) for hit in hits] == [
+        ("full", "b", 1), ("full", "a", 0)]
+    assert hits[0]["score"] == pytest.approx(1.0)
+
+
+def test_empty_collection_is_read_back_from_disk(tmp_path):
+    path = str(tmp_path / "index")
+    NumpyVectorStore(path=path).create("empty", [], [])
+
+    reopened = NumpyVectorStore(path=path)
+
+    assert reopened.exists("empty")
+    assert reopened.search(["empty"], np.ones((1, 3), dtype=np.float32), limit=5) == [[]]
+
+
+def test_search_leaves_the_query_vectors_alone(store):
+    store.create("full", ["a"], [[3.0, 4.0]])
+    queries = np.array([[3.0, 4.0]], dtype=np.float32)
+
+    store.search(["full"], queries, limit=1)
+
+    assert queries.tolist() == [[3.0, 4.0]]
@@ -0,0 +1,102 @@
+# test_visualdiagram.py
+
+"""generate_diagram_from_pipeline: in-memory rendering, renderer choice and the LRU diagram cache."""
+
+import os
+import shutil
+
+import pytest
+
+import visualdiagram
+from pipelinetypes import *
+from svg_diagram import synthetic_pipeline
+from telemetry import metrics
+from visualdiagram import InMemoryDiagram, clear_diagram_cache, generate_diagram_from_pipeline
+
+
+def small_pipeline(name="build"):
+    pipeline = GitLabPipeline()
+    stage = PipelineStage("build")
+    job = PipelineJob(name)
+    job.add_step(script_step("make"))
+    stage.add_job(job)
+    pipeline.add_stage(stage)
+    return pipeline
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Count the layered renders that actually run."""
+    clear_diagram_cache()
+    calls = []
+    render = visualdiagram.render_pipeline_svg
+
+    def counting(pipeline, *args, **kwargs):
+        calls.append(pipeline)
+        return render(pipeline, *args, **kwargs)
+
+    monkeypatch.setattr(visualdiagram, "render_pipeline_svg", counting)
+    yield calls
+    clear_diagram_cache()
+
+
+def test_equal_pipelines_are_rendered_once(renders):
+    hits = metrics.counter_value("copilot_cache_requests_total", cache="diagram", result="hit")
+
+    first = generate_diagram_from_pipeline(small_pipeline(), GitLabPipeline, renderer="layered")
+    second = generate_diagram_from_pipeline(small_pipeline(), GitLabPipeline, renderer="layered")
+
+    assert first.getvalue() == second.getvalue() and first.getvalue().startswith(b"<svg")
+    assert len(renders) == 1
+    assert metrics.counter_value("copilot_cache_requests_total", cache="diagram", result="hit") == hits + 1
+    # Other detail levels are different diagrams
+    generate_diagram_from_pipeline(small_pipeline(), GitLabPipeline, renderer="layered", detail="steps")
+    assert len(renders) == 2
+
+
+def test_least_recently_used_diagram_is_evicted(renders, monkeypatch):
+    monkeypatch.setattr(visualdiagram, "DIAGRAM_CACHE_SIZE", 2)
+    render = lambda name: generate_diagram_from_pipeline(small_pipeline(name), GitLabPipeline, renderer="layered")
+
+    render("a"), render("b"), render("a"), render("c")
+    assert [pipeline.stages[0].jobs[0].name for pipeline in renders] == ["a", "b", "c"]
+
+    render("a"), render("b")
+    assert [pipeline.stages[0].jobs[0].name for pipeline in renders] == ["a", "b", "c", "b"]
+
+
+def test_large_pipelines_use_the_layered_renderer(renders):
+    pipeline = synthetic_pipeline(visualdiagram.LARGE_PIPELINE_JOBS + 1)
+
+    diagram = generate_diagram_from_pipeline(pipeline, GitLabPipeline, output_format="png")
+
+    assert renders == [pipeline] and diagram.getvalue().startswith(b"<svg")
+
+
+def test_unsupported_options_render_nothing(renders):
+    assert generate_diagram_from_pipeline(small_pipeline(), GitLabPipeline, output_format="pdf") is None
+    assert generate_diagram_from_pipeline(small_pipeline(), GitLabPipeline, renderer="mermaid") is None
+    assert generate_diagram_from_pipeline(small_pipeline(), JenkinsPipeline) is None
+    assert renders == []
+
+
+def test_graphviz_diagram_is_not_written_to_disk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with InMemoryDiagram("Pipeline", show=False) as diagram:
+        visualdiagram.handle_gitlab_pipeline(visualdiagram.Github("Source Code"), small_pipeline().stages)
+
+    assert "build" in diagram.dot.source
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.skipif(shutil.which("dot") is None, reason="Graphviz is not installed")
+def test_graphviz_renders_svg_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clear_diagram_cache()
+
+    diagram = generate_diagram_from_pipeline(small_pipeline(), GitLabPipeline, output_format="svg",
+                                             renderer="graphviz")
+
+    assert b"<svg" in diagram.getvalue()
+    assert os.listdir(tmp_path) == []
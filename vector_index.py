@@ -0,0 +1,230 @@
+# vector_index.py
+
+"""
+Vector stores behind one retrieval interface.
+
+Both stores keep one collection per indexed document and answer top-k cosine-similarity queries
+across a list of collections:
+
+    store.create(collection_name, texts, vectors, summaries=None)
+    store.search(collections, query_vectors, limit, score_threshold)   # one result list per query
+    store.delete(collection_name)
+
+QdrantVectorStore wraps a QdrantClient (in memory, on disk or a shared server).
+NumpyVectorStore keeps the normalized embeddings of each collection in one contiguous matrix and
+answers a batch of queries with a single matrix product and argpartition; for a corpus of a few
+thousand sentences that is far cheaper than qdrant_client's local mode, which goes through
+per-point Python objects. With a path it persists every collection with np.save and memory-maps
+it back.
+
+select_vector_store() picks one: COPILOT_VECTOR_INDEX=numpy or qdrant forces it, "auto" (the
+default) uses NumPy for private indexes of up to NUMPY_INDEX_MAX_VECTORS vectors and Qdrant
+otherwise. `python benchmark.py --vector-index` compares the two.
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+
+import numpy as np
+from qdrant_client.models import PointStruct
+
+from qdrant_populate import create_qdrant_collection
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX = os.getenv("COPILOT_VECTOR_INDEX", "auto")
+# Above this many vectors a brute-force scan stops being cheaper than Qdrant's HNSW index.
+NUMPY_INDEX_MAX_VECTORS = 50000
+# An on-disk Qdrant index (COPILOT_QDRANT_PATH) gets its NumPy matrices next to it.
+NUMPY_INDEX_PATH = os.getenv("COPILOT_NUMPY_INDEX_PATH") or (
+    os.getenv("COPILOT_QDRANT_PATH") + ".numpy" if os.getenv("COPILOT_QDRANT_PATH") else None
+)
+# float16 halves the memory of the matrix at a small cost in precision.
+NUMPY_INDEX_DTYPE = os.getenv("COPILOT_NUMPY_INDEX_DTYPE", "float32")
+SCORE_BLOCK_ROWS = 16384
+
+
+def _top_hits(scores, owners, texts, summaries, positions, limit, score_threshold):
+    """The `limit` best hits of one row of scores, best first."""
+    count = min(limit, len(scores))
+    if count == 0:
+        return []
+    top = np.argpartition(-scores, count - 1)[:count]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [
+        {"score": float(scores[index]), "collection": owners[index], "content": texts[index],
+         "summary": summaries[index], "position": int(positions[index])}
+        for index in top if score_threshold is None or scores[index] >= score_threshold
+    ]
+
+
+class NumpyVectorStore:
+    kind = "numpy"
+
+    def __init__(self, path=NUMPY_INDEX_PATH, dtype=NUMPY_INDEX_DTYPE):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.collections = {}  # name -> (matrix, texts, summaries)
+        self._combined = None  # (collection names, matrix, owners, texts, summaries, positions) of the last query
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self):
+        return sum(len(entry[1]) for entry in self.collections.values())
+
+    def create(self, collection_name, texts, vectors, summaries=None):
+        if texts:
+            matrix = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        else:
+            # A document without text is an empty collection; encode() gives no vectors to take a width from
+            matrix = np.zeros((0, np.shape(vectors)[-1] if np.ndim(vectors) == 2 else 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = np.ascontiguousarray(matrix / np.where(norms == 0, 1, norms), dtype=self.dtype)
+        summaries = list(summaries) if summaries is not None else [None] * len(texts)
+        if self.path:
+            base = os.path.join(self.path, collection_name)
+            with open(base + ".npy.tmp", "wb") as file:
+                np.save(file, matrix)
+            with open(base + ".json.tmp", "w", encoding="utf-8") as file:
+                json.dump({"texts": texts, "summaries": summaries}, file)
+            os.replace(base + ".npy.tmp", base + ".npy")
+            os.replace(base + ".json.tmp", base + ".json")
+            matrix = np.load(base + ".npy", mmap_mode="r")
+        with self._lock:
+            self.collections[collection_name] = (matrix, list(texts), summaries)
+            self._combined = None
+
+    def _collection(self, collection_name):
+        entry = self.collections.get(collection_name)
+        if entry is None and self.path and os.path.exists(os.path.join(self.path, collection_name + ".npy")):
+            base = os.path.join(self.path, collection_name)
+            with open(base + ".json", encoding="utf-8") as file:
+                payload = json.load(file)
+            entry = (np.load(base + ".npy", mmap_mode="r"), payload["texts"], payload["summaries"])
+            with self._lock:
+                self.collections[collection_name] = entry
+        return entry
+
+    def exists(self, collection_name):
+        return self._collection(collection_name) is not None
+
+    def delete(self, collection_name):
+        with self._lock:
+            self.collections.pop(collection_name, None)
+            self._combined = None
+        if self.path:
+            for suffix in (".npy", ".json"):
+                try:
+                    os.remove(os.path.join(self.path, collection_name + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def _matrix(self, collections):
+        """One matrix for all the collections, rebuilt only when the set of collections changes."""
+        key = tuple(collections)
+        combined = self._combined
+        if combined is not None and combined[0] == key:
+            return combined[1:]
+        entries = [(name, self._collection(name)) for name in collections]
+        entries = [(name, entry) for name, entry in entries if entry is not None]
+        matrices = [entry[0] for _, entry in entries if len(entry[1])]  # an empty collection may have width 0
+        if matrices:
+            matrix = np.concatenate(matrices) if len(matrices) > 1 else matrices[0]
+        else:
+            matrix = np.zeros((0, 0), dtype=self.dtype)
+        owners = [name for name, entry in entries for _ in entry[1]]
+        texts = [text for _, entry in entries for text in entry[1]]
+        summaries = [summary for _, entry in entries for summary in entry[2]]
+        positions = np.concatenate([np.arange(len(entry[1])) for _, entry in entries]) if entries else np.zeros(0)
+        self._combined = (key, matrix, owners, texts, summaries, positions)
+        return matrix, owners, texts, summaries, positions
+
+    def search(self, collections, query_vectors, limit, score_threshold=None):
+        matrix, owners, texts, summaries, positions = self._matrix(collections)
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1)
+        if not texts:
+            return [[] for _ in queries]
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        # Row blocks keep the float32 copy of a float16 matrix small; a float32 block is a view
+        scores = np.empty((len(queries), len(texts)), dtype=np.float32)
+        for start in range(0, len(texts), SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS]
+            scores[:, start:start + len(block)] = queries @ np.asarray(block, dtype=np.float32).T
+        return [_top_hits(row, owners, texts, summaries, positions, limit, score_threshold) for row in scores]
+
+
+class QdrantVectorStore:
+    kind = "qdrant"
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, collection_name, texts, vectors, summaries=None):
+        vectors = [list(map(float, vector)) for vector in vectors]
+        summaries = summaries if summaries is not None else [None] * len(texts)
+        create_qdrant_collection(self.client, collection_name, len(vectors[0]) if vectors else 1, "Cosine")
+        if texts:
+            self.client.upsert(collection_name=collection_name, points=[
+                PointStruct(id=str(uuid.uuid4()), vector=vector,
+                            payload={"content": text, "summary": summary, "position": position})
+                for position, (text, vector, summary) in enumerate(zip(texts, vectors, summaries))
+            ])
+
+    def exists(self, collection_name):
+        return self.client.collection_exists(collection_name)
+
+    def delete(self, collection_name):
+        self.client.delete_collection(collection_name=collection_name)
+
+    def search(self, collections, query_vectors, limit, score_threshold=None):
+        results = []
+        for query in query_vectors:
+            hits = []
+            for collection_name in collections:
+                response = self.client.query_points(
+                    collection_name=collection_name,
+                    query=[float(value) for value in query],
+                    limit=limit,
+                    score_threshold=score_threshold,
+                    with_payload=True,
+                )
+                hits.extend(
+                    {"score": point.score, "collection": collection_name, "content": point.payload.get("content"),
+                     "summary": point.payload.get("summary"), "position": point.payload.get("position", 0)}
+                    for point in response.points
+                )
+            hits.sort(key=lambda hit: -hit["score"])
+            results.append(hits[:limit])
+        return results
+
+
+def as_vector_store(store):
+    """Accept a plain QdrantClient wherever a vector store is expected."""
+    return store if hasattr(store, "search") and hasattr(store, "create") else QdrantVectorStore(store)
+
+
+def select_vector_store(client, vector_count=0, shared=False):
+    """
+    The store for a document index: NumPy for a private index of a small corpus, otherwise Qdrant.
+
+    `vector_count` is the size of the corpus; `shared` means other processes read the index
+    through Qdrant, so it always lives there.
+    """
+    if VECTOR_INDEX not in ("auto", "numpy", "qdrant"):
+        raise ValueError(f"Unknown COPILOT_VECTOR_INDEX: {VECTOR_INDEX}")
+    if shared:
+        if VECTOR_INDEX == "numpy":
+            logger.warning("A shared index is read through Qdrant; ignoring COPILOT_VECTOR_INDEX=numpy.")
+        return QdrantVectorStore(client)
+    if VECTOR_INDEX == "numpy" or (VECTOR_INDEX == "auto" and vector_count <= NUMPY_INDEX_MAX_VECTORS):
+        return NumpyVectorStore()
+    return QdrantVectorStore(client)
+
+
+def vector_store_of_kind(kind, client):
+    """The store a published index was built in ("numpy" or "qdrant")."""
+    return NumpyVectorStore() if kind == "numpy" else QdrantVectorStore(client)
@@ -1,25 +1,104 @@
-from diagrams import Diagram, Cluster
+from diagrams import Diagram, Cluster, setdiagram
 from diagrams.onprem.compute import Server
 from diagrams.onprem.ci import Jenkins
 from diagrams.onprem.vcs import Github
 from diagrams.aws.devtools import Codepipeline, Codebuild, Codedeploy
 
 from diagrams.azure.devops import Devops
+from collections import OrderedDict
+from graphviz import ExecutableNotFound
 from io import BytesIO
 import streamlit as st
-from datetime import datetime
-import os
+import threading
 from pipelinetypes import *
+from svg_diagram import render_pipeline_svg
+from telemetry import record_cache, traced
 import utils
 from contextlib import suppress
 from diagrams.custom import Custom
 
-def generate_diagram_from_pipeline(pipeline, pipeline_type_class):
+DIAGRAM_FORMATS = ("png", "svg")
+DIAGRAM_RENDERERS = ("auto", "graphviz", "layered")
+# Pipelines with more jobs than this use the in-process layered renderer when the renderer is "auto";
+# Graphviz layout time grows quickly with one cluster per stage.
+LARGE_PIPELINE_JOBS = 40
+# Rendered diagrams kept in memory, keyed by the pipeline's structure hash and output format.
+DIAGRAM_CACHE_SIZE = 64
+
+_diagram_cache = OrderedDict()
+_diagram_cache_lock = threading.Lock()
+
+
+class InMemoryDiagram(Diagram):
+    """
+    A Diagram that is not written to disk when its `with` block ends.
+
+    The graph is kept as DOT source and rendered with `pipe()`, which feeds it to Graphviz on
+    stdin and reads the image from stdout, so no file names can collide between sessions.
+    """
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        setdiagram(None)
+
+    def pipe(self, output_format="png"):
+        return self.dot.pipe(format=output_format)
+
+
+def _cached_diagram(key):
+    with _diagram_cache_lock:
+        diagram_bytes = _diagram_cache.get(key)
+        if diagram_bytes is not None:
+            _diagram_cache.move_to_end(key)
+    record_cache("diagram", diagram_bytes is not None)
+    return diagram_bytes
+
+
+def _cache_diagram(key, diagram_bytes):
+    with _diagram_cache_lock:
+        _diagram_cache[key] = diagram_bytes
+        _diagram_cache.move_to_end(key)
+        while len(_diagram_cache) > DIAGRAM_CACHE_SIZE:
+            _diagram_cache.popitem(last=False)
+
+
+def clear_diagram_cache():
+    """Drop every cached diagram."""
+    with _diagram_cache_lock:
+        _diagram_cache.clear()
+
+
+@traced("diagram.render")
+def generate_diagram_from_pipeline(pipeline, pipeline_type_class, output_format="png", renderer="auto",
+                                   detail="jobs", collapsed_stages=None):
     """
     Generate a CI/CD pipeline diagram with enhanced styling and layout.
+
+    Diagrams are rendered in memory and cached by the pipeline's structure, so Streamlit reruns
+    and repeated pipelines do not run Graphviz again.
+
+    Args:
+        pipeline: The parsed Pipeline.
+        pipeline_type_class: The expected Pipeline subclass.
+        output_format: "png" or "svg" for the Graphviz renderer.
+        renderer: "graphviz", "layered" (pure Python, always SVG) or "auto", which picks the
+            layered renderer for pipelines with more than LARGE_PIPELINE_JOBS jobs.
+        detail: "stages", "jobs" or "steps"; used by the layered renderer.
+        collapsed_stages: Optional stage names the layered renderer draws as one node.
+
+    Returns:
+        BytesIO: The rendered diagram (PNG or SVG bytes), or None on error.
     """
     if not utils.validate_pipeline_type(pipeline, pipeline_type_class):
         return None
+    if output_format not in DIAGRAM_FORMATS:
+        st.error(f"Unsupported diagram format: {output_format}")
+        return None
+    if renderer not in DIAGRAM_RENDERERS:
+        st.error(f"Unsupported diagram renderer: {renderer}")
+        return None
+    if renderer == "auto":
+        job_count = sum(len(stage.jobs) for stage in pipeline.stages)
+        renderer = "layered" if job_count > LARGE_PIPELINE_JOBS else "graphviz"
 
     try:
         parsed_stages = pipeline.stages
@@ -27,11 +106,24 @@ def generate_diagram_from_pipeline(pipeline, pipeline_type_class):
             st.error("No stages found in the pipeline.")
             return None
 
-        filename = f"pipeline_diagram_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-        with Diagram(
+        if renderer == "layered":
+            cache_key = (pipeline.structure_hash(), pipeline_type_class.__name__, "layered", detail,
+                         tuple(sorted(collapsed_stages or [])))
+        else:
+            cache_key = (pipeline.structure_hash(), pipeline_type_class.__name__, output_format)
+        diagram_bytes = _cached_diagram(cache_key)
+        if diagram_bytes is not None:
+            return BytesIO(diagram_bytes)
+
+        if renderer == "layered":
+            svg = render_pipeline_svg(pipeline, detail, collapsed_stages,
+                                      title=f"CI/CD Pipeline ({pipeline_type_class.__name__})")
+            diagram_bytes = svg.encode("utf-8")
+            _cache_diagram(cache_key, diagram_bytes)
+            return BytesIO(diagram_bytes)
+
+        with InMemoryDiagram(
             f"CI/CD Pipeline ({pipeline_type_class.__name__})",
-            filename=filename,
             show=False,
             graph_attr={'rankdir': 'LR', 'nodesep': '1.2', 'bgcolor': '#F8F8F8', 'splines': 'spline'},
         ) as diag:
@@ -51,12 +143,13 @@ def generate_diagram_from_pipeline(pipeline, pipeline_type_class):
                 st.error("Unsupported pipeline type.")
                 return None
 
-        output_file = f"{filename}.png"
-        with open(output_file, "rb") as f:
-            diagram_stream = BytesIO(f.read())
-        os.remove(output_file)
-        return diagram_stream
+        diagram_bytes = diag.pipe(output_format)
+        _cache_diagram(cache_key, diagram_bytes)
+        return BytesIO(diagram_bytes)
 
+    except ExecutableNotFound:
+        st.error("Graphviz is not installed; install it to render pipeline diagrams.")
+        return None
     except Exception as e:
         st.error(f"Error: {e}")
         return None
@@ -112,6 +205,19 @@ def handle_github_actions_pipeline(source, stages):
             previous_stage_node >> stage_node
             previous_stage_node = stage_node
 
+def aws_stage_service(stage):
+    """Diagram node class for a CodePipeline stage, based on the category of its actions."""
+    categories = {
+        AWSPipeline.ACTION_CATEGORIES.get(step.task, "Build")
+        for job in stage.jobs for step in job.steps
+    }
+    if "Deploy" in categories:
+        return Codedeploy
+    if "Build" in categories:
+        return Codebuild
+    return Server
+
+
 def handle_aws_codepipeline(source, stages):
     """ AWS CodePipeline visualization. """
     with Cluster("AWS CodePipeline", graph_attr={'style': 'filled', 'fillcolor': '#ABEBC6'}):
@@ -120,11 +226,10 @@ def handle_aws_codepipeline(source, stages):
             source >> aws_pipeline
             previous_stage_node = aws_pipeline
 
-            # Iterate over the stages and visualize each one with user-specified services
+            # Iterate over the stages and draw each one with the service its actions run on
             for stage in stages:
-                with Cluster(stage['name'], graph_attr={'style': 'filled', 'fillcolor': '#D5F5E3'}):
-                    # Use the actual service passed in the stage dictionary
-                    stage_node = stage['service'](stage['name'])
+                with Cluster(stage.name, graph_attr={'style': 'filled', 'fillcolor': '#D5F5E3'}):
+                    stage_node = aws_stage_service(stage)(stage.name)
                     
                     # Connect the stages
                     previous_stage_node >> stage_node